@@ -0,0 +1,276 @@
+"""Decoupled actor-learner training of the SAC agents on one machine
+
+In the actor-learner mode of 'train_sac' the environments are stepped by collector processes instead of the
+learner. Every collector holds a CPU copy of the actor and its own shard of 'sac_num_processes' environments, and
+streams its transitions to the learner in chunks through a queue. The learner assembles them into rows of one
+transition per environment of every collector, in the order they were collected, so that the columns of the replay
+buffer remain the trajectories of single environments (as 'optimize_memory_usage' and n-step returns require),
+and updates the agent while the collectors keep stepping.
+
+The learner publishes the weights of its actor into shared memory at the end of every epoch and the collectors
+load them before their next step whenever the version changed. The staleness of the collected data is bounded: a
+collector does not start collecting epoch 'e' of a task before the learner has finished epoch
+'e - actor_learner_max_policy_lag', so with the default lag of 1 the collectors step the next epoch while the
+learner updates on the current one. The update-to-data ratio and the epochs are the same as in lockstep training
+with 'sac_num_processes * actor_learner_num_collectors' environments, including the random actions: like the
+lockstep loop, which counts the steps of a task once per epoch, a collector takes random actions for every whole
+epoch that starts before 'sac_init_steps' transitions of the task, so the last random epoch may step past it.
+
+Task switches are synchronized: each collector collects exactly its share of a task and then waits for the
+learner, which runs the task boundary hooks, resets the agent, publishes its weights and only then sends the next
+task to the collectors.
+"""
+
+import atexit
+import os
+import queue
+import time
+from collections import deque
+
+import numpy as np
+import torch
+
+from agent import make_agent
+from environment import make_continual_vec_envs
+import utils
+
+
+# seconds between checks of the liveness of the collectors while the learner waits for transitions
+_POLL_INTERVAL = 1.0
+
+
+def _is_multi_head(algo):
+    # same test as 'train_sac'
+    return any(x in algo for x in ['mh', 'mi', 'individual', 'hypernet', 'distilled'])
+
+
+class PolicyWeights(object):
+    """Weights of a module in shared memory, published by the learner and pulled by the collectors
+
+    'version' counts the publications, a collector only copies the weights when it changed.
+    """
+    def __init__(self, module, ctx):
+        self.tensors = {name: value.detach().cpu().clone().share_memory_()
+                        for name, value in module.state_dict().items()}
+        self.version = ctx.Value('l', 0, lock=False)
+        self.lock = ctx.Lock()
+
+    def publish(self, module):
+        with self.lock:
+            for name, value in module.state_dict().items():
+                self.tensors[name].copy_(value.detach())
+            self.version.value += 1
+
+    def pull(self, module, version):
+        """Load the weights into 'module' if they are newer than 'version', return the version of 'module'"""
+        if self.version.value == version:
+            return version
+        with self.lock:
+            module.load_state_dict(self.tensors)
+            return self.version.value
+
+
+class _Chunk(object):
+    """Consecutive transitions of the environments of one collector"""
+    def __init__(self, task_id, start_step):
+        self.task_id = task_id
+        self.start_step = start_step
+        self.min_version = None
+        self.obses, self.actions, self.rewards, self.next_obses, self.dones, self.infos = [], [], [], [], [], []
+
+    def __len__(self):
+        return len(self.obses)
+
+    def append(self, obs, action, reward, next_obs, done, infos, version):
+        self.obses.append(obs)
+        self.actions.append(action)
+        self.rewards.append(reward)
+        self.next_obses.append(next_obs)
+        self.dones.append(done)
+        self.infos.append(infos)
+        self.min_version = version if self.min_version is None else min(self.min_version, version)
+
+    def pack(self):
+        return dict(task_id=self.task_id, start_step=self.start_step, min_version=self.min_version,
+                    obses=np.stack(self.obses), actions=np.stack(self.actions), rewards=np.stack(self.rewards),
+                    next_obses=np.stack(self.next_obses), dones=np.stack(self.dones), infos=self.infos)
+
+
+def run_collector(rank, args, weights, learner_epoch, stop, commands, transitions, log_dir):
+    """Collector process: step a shard of environments with a copy of the actor and send the transitions
+
+    Waits for '(task_id, start_step)' commands on 'commands' and collects the share of 'task_id' of the collector
+    from 'start_step' (per environment) on, until a None command or 'stop' is set.
+    """
+    torch.set_num_threads(1)
+    num_envs = args.sac_num_processes * args.actor_learner_num_collectors
+    steps_per_task = int(args.train_steps_per_task) // args.sac_num_expl_steps_per_process // num_envs \
+        * args.sac_num_expl_steps_per_process
+    # seeds of the learner environments are 'seed' to 'seed + sac_num_processes - 1'
+    seed = args.seed + (rank + 1) * args.sac_num_processes
+    utils.set_seed_everywhere(seed)
+
+    env = make_continual_vec_envs(
+        args.env_names, seed, args.sac_num_processes,
+        args.discount, log_dir,
+        allow_early_resets=True,
+        normalize=False,
+        add_onehot=args.add_onehot,
+    )
+    env.action_space.seed(seed)
+    agent = make_agent(
+        obs_space=env.observation_space,
+        action_space=[env.action_space for _ in range(env.get_attr('num_tasks')[0])]
+        if _is_multi_head(args.algo) else env.action_space,
+        device=torch.device('cpu'),
+        args=args
+    )
+    version = weights.pull(agent.actor, -1)
+
+    while not stop.is_set():
+        try:
+            command = commands.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        if command is None:
+            break
+
+        task_id, step = command
+        head_kwargs = {'head_idx': task_id} if _is_multi_head(args.algo) else {}
+        env.env_method('set_task', task_id)
+        obs = env.reset()
+        chunk = _Chunk(task_id, step)
+        while step < steps_per_task and not stop.is_set():
+            epoch = step // args.sac_num_expl_steps_per_process
+            # bounded staleness: wait for the learner to finish epoch 'epoch - actor_learner_max_policy_lag'
+            while epoch - learner_epoch.value > args.actor_learner_max_policy_lag and not stop.is_set():
+                time.sleep(1e-3)
+            version = weights.pull(agent.actor, version)
+
+            # random actions for the whole epochs that start before 'sac_init_steps' transitions of the task, the
+            # lockstep loop counts the steps of a task once per epoch and decides per epoch as well
+            if epoch * args.sac_num_expl_steps_per_process * num_envs < args.sac_init_steps:
+                action = np.array([env.action_space.sample() for _ in range(env.unwrapped.num_envs)])
+            else:
+                with utils.eval_mode(agent):
+                    action = agent.act(obs, sample=True, **head_kwargs)
+            next_obs, reward, done, infos = env.step(action)
+            chunk.append(obs, action, reward, next_obs, done, infos, version)
+            obs = next_obs
+            step += 1
+
+            # the end of an epoch is always sent, the learner waits for it before allowing the next epochs
+            if len(chunk) == args.actor_learner_chunk_steps or step % args.sac_num_expl_steps_per_process == 0:
+                transitions.put((rank, chunk.pack()))
+                chunk = _Chunk(task_id, step)
+
+    if stop.is_set():
+        # the learner is gone or stopping, do not wait for it to read the queue
+        transitions.cancel_join_thread()
+    env.close()
+
+
+class CollectorPool(object):
+    """Collector processes and the learner side of their transitions and weights
+
+    'start_method' is the multiprocessing start method of the collectors, 'spawn' by default so that a learner on
+    CUDA can start them safely.
+    """
+    def __init__(self, args, agent, log_dir, profiler, start_method='spawn'):
+        ctx = torch.multiprocessing.get_context(start_method)
+        self.num_collectors = args.actor_learner_num_collectors
+        self.num_envs = args.sac_num_processes * self.num_collectors
+        self.weights = PolicyWeights(agent.actor, ctx)
+        self.learner_epoch = ctx.Value('i', 0, lock=False)
+        self.profiler = profiler
+        self._stop = ctx.Event()
+        self._commands = [ctx.Queue() for _ in range(self.num_collectors)]
+        self._transitions = ctx.Queue()
+        # received chunks of every collector and the position in the first one
+        self._chunks = [deque() for _ in range(self.num_collectors)]
+        self._offsets = [0] * self.num_collectors
+        self._policy_lags = []
+
+        self._processes = []
+        for rank in range(self.num_collectors):
+            collector_log_dir = None
+            if log_dir is not None:
+                collector_log_dir = utils.make_dir(os.path.join(log_dir, f'collector_{rank}'))
+            process = ctx.Process(target=run_collector, name=f'collector_{rank}',
+                                  args=(rank, args, self.weights, self.learner_epoch, self._stop,
+                                        self._commands[rank], self._transitions, collector_log_dir))
+            process.start()
+            self._processes.append(process)
+        atexit.register(self.close)
+
+    def start_task(self, task_id, agent, task_steps=0, task_epoch=0):
+        """Publish the weights of 'agent' and let the collectors collect task 'task_id' from 'task_steps' on"""
+        self.publish(agent, task_epoch)
+        for commands in self._commands:
+            commands.put((task_id, task_steps // self.num_envs))
+
+    def publish(self, agent, task_epoch):
+        """Publish the weights of 'agent' after its updates on the first 'task_epoch' epochs of the task"""
+        self.weights.publish(agent.actor)
+        self.learner_epoch.value = task_epoch
+
+    def _receive(self):
+        while True:
+            try:
+                return self._transitions.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                for process in self._processes:
+                    if not process.is_alive():
+                        raise RuntimeError(f'{process.name} exited with code {process.exitcode}')
+
+    def transitions(self, num_rows):
+        """Yield 'num_rows' rows (obs, action, reward, next_obs, done, infos) of the environments of all collectors
+
+        The environments of collector 'i' are the columns 'i * sac_num_processes' to
+        '(i + 1) * sac_num_processes - 1' of the rows.
+        """
+        while num_rows > 0:
+            while any(len(chunks) == 0 for chunks in self._chunks):
+                with self.profiler.phase('wait'):
+                    rank, chunk = self._receive()
+                self._chunks[rank].append(chunk)
+                self._policy_lags.append(self.weights.version.value - chunk['min_version'])
+
+            heads = [chunks[0] for chunks in self._chunks]
+            num_block_rows = min([len(head['obses']) - offset for head, offset in zip(heads, self._offsets)] +
+                                 [num_rows])
+            block = {name: np.concatenate([head[name][offset:offset + num_block_rows]
+                                           for head, offset in zip(heads, self._offsets)], axis=1)
+                     for name in ['obses', 'actions', 'rewards', 'next_obses', 'dones']}
+            for row in range(num_block_rows):
+                infos = [info for head, offset in zip(heads, self._offsets) for info in head['infos'][offset + row]]
+                yield (block['obses'][row], block['actions'][row], block['rewards'][row],
+                       block['next_obses'][row], block['dones'][row], infos)
+
+            for rank, head in enumerate(heads):
+                self._offsets[rank] += num_block_rows
+                if self._offsets[rank] == len(head['obses']):
+                    self._chunks[rank].popleft()
+                    self._offsets[rank] = 0
+            num_rows -= num_block_rows
+
+    def policy_lag(self):
+        """Mean number of weight publications the received chunks lagged behind, since the last call"""
+        lag = np.mean(self._policy_lags) if len(self._policy_lags) > 0 else 0.0
+        self._policy_lags = []
+        return lag
+
+    def close(self, timeout=10.0):
+        """Stop the collectors and wait for them to exit"""
+        if len(self._processes) == 0:
+            return
+        # collectors in the middle of a task (the learner failed) stop at their next step
+        self._stop.set()
+        for commands in self._commands:
+            commands.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        atexit.unregister(self.close)
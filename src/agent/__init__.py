@@ -1,149 +1,473 @@
-from src.agent.dqn_agent import DqnCnnSSEnsembleAgent
-from src.agent.sac import EwcSacMlpAgent, SiSacMlpAgent, AgemSacMlpAgent, SacMlpAgent, \
-    MultiHeadSacMlpAgent, EwcMultiHeadSacMlpAgent, SiMultiHeadSacMlpAgent, AgemMultiHeadSacMlpAgent
-from src.agent.sac import MultiHeadSacMlpAgentV2, EwcMultiHeadSacMlpAgentV2, SiMultiHeadSacMlpAgentV2, \
-    AgemMultiHeadSacMlpAgentV2, AgemMultiInputSacMlpAgentV2, EwcV2MultiHeadSacMlpAgentV2, \
-    AgemV2MultiHeadSacMlpAgentV2, IndividualSacMlpAgentV2, EwcV2MultiInputSacMlpAgentV2, \
-    AgemV2MultiInputSacMlpAgentV2, SiMultiInputSacMlpAgentV2, MultiInputSacMlpAgentV2, \
-    OracleAgemV2MultiHeadSacMlpAgentV2, OracleAgemV2MultiInputSacMlpAgentV2, \
-    OracleGradAgemV2MultiHeadSacMlpAgentV2, OracleGradAgemV2MultiInputSacMlpAgentV2, \
-    OracleActorAgemV2MultiHeadSacMlpAgentV2,  OracleActorAgemV2MultiInputSacMlpAgentV2
-from src.agent.sac import FisherBRCMTBCMlpCriticMultiHeadSacMlpAgent, \
-    FisherBRCMTBCOffsetCriticMultiHeadSacMlpAgent, \
-    FisherBRCMHBCMlpCriticMultiHeadSacMlpAgent, \
-    FisherBRCMHBCOffsetCriticMultiHeadSacMlpAgent
-from src.agent.sac import EwcV2GradNormRegCriticMultiHeadSacMlpAgentV2, \
-    EwcV2GradNormRegCriticMultiInputSacMlpAgentV2, \
-    AgemV2GradNormRegCriticMultiHeadSacMlpAgentV2, \
-    AgemContinualActorCriticMultiHeadSacMlpAgent, \
-    AgemContinualActorCriticMultiInputSacMlpAgent, \
-    AgemContinualActorCriticGradNormRegCriticMultiHeadSacMlpAgent, \
-    AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent, \
-    AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiHeadSacMlpAgent, \
-    AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiInputSacMlpAgent, \
-    DistilledActorMultiHeadSacMlpAgent, \
-    DistilledActorMultiInputSacMlpAgent
-from src.agent.sac import \
-    TaskEmbeddingHyperNetActorSacMlpAgent, \
-    EwcTaskEmbeddingHyperNetActorSacMlpAgent, \
-    SiTaskEmbeddingHyperNetActorSacMlpAgent, \
-    AgemTaskEmbeddingHyperNetActorSacMlpAgent
-from src.agent.sac import \
-    TaskEmbeddingDistilledActorSacMlpAgent, \
-    EwcTaskEmbeddingDistilledActorSacMlpAgent, \
-    SiTaskEmbeddingDistilledActorSacMlpAgent, \
-    AgemTaskEmbeddingDistilledActorSacMlpAgent
-from src.agent.sac import \
-    AdversarialWeightPermutationSacMlpAgent
-from src.agent.sac import \
-    SparseGPHyperNetActorSacMlpAgent
-from src.agent.sac import \
-    GPLatentVariableModelHyperNetActorSacMlpAgent
-from src.agent.td3 import Td3MlpAgent, MultiHeadTd3MlpAgent, MultiInputTd3MlpAgent, \
-    EwcMultiHeadTd3MlpAgent, EwcMultiInputTd3MlpAgent, \
-    SiMultiHeadTd3MlpAgent, SiMultiInputTd3MlpAgent, \
-    AgemBothMultiHeadTd3MlpAgent, AgemBothMultiInputTd3MlpAgent, \
-    OracleCriticAgemMultiHeadTd3MlpAgent, OracleCriticAgemMultiInputTd3MlpAgent, \
-    OracleActorCriticAgemMultiHeadTd3MlpAgent, OracleActorCriticAgemMultiInputTd3MlpAgent, \
-    OracleGradAgemMultiHeadTd3MlpAgent, OracleGradAgemMultiInputTd3MlpAgent
-from src.agent.ppo import PpoMlpAgent, EwcPpoMlpAgent, SiPpoMlpAgent, AgemPpoMlpAgent, \
-    MultiHeadPpoMlpAgent, EwcMultiHeadPpoMlpAgent, SiMultiHeadPpoMlpAgent, AgemMultiHeadPpoMlpAgent
-from src.agent.ppo import EwcPpoMlpAgentV2, SiPpoMlpAgentV2, AgemPpoMlpAgentV2, CmamlPpoMlpAgentV2
-from src.agent.ppo import MultiHeadPpoMlpAgentV2, EwcMultiHeadPpoMlpAgentV2, SiMultiHeadPpoMlpAgentV2, \
-    AgemMultiHeadPpoMlpAgentV2
-
-from agent.trash import SacMlpSSEnsembleAgent, SacCnnSSEnsembleAgent
-
-
-ALGOS = [
-    'dqn_cnn_ss_ensem',
-    'sac_cnn_ss_ensem',
-    'sac_mlp_ss_ensem',
-    'sac_mlp',
-    'awp_sac_mlp',
-    'ewc_sac_mlp',
-    'si_sac_mlp',
-    'agem_sac_mlp',
-    'mh_sac_mlp',
-    'mh_sac_mlp_v2',
-    'mi_sac_mlp_v2',
-    'individual_sac_mlp_v2',
-    'ewc_mh_sac_mlp',
-    'ewc_mh_sac_mlp_v2',
-    'ewc_v2_mh_sac_mlp_v2',
-    'ewc_v2_mi_sac_mlp_v2',
-    'ewc_v2_grad_norm_reg_critic_mh_sac_mlp_v2',
-    'ewc_v2_grad_norm_reg_critic_mi_sac_mlp_v2',
-    'si_mh_sac_mlp',
-    'si_mh_sac_mlp_v2',
-    'si_mi_sac_mlp_v2',
-    'distilled_actor_mh_sac_mlp',
-    'distilled_actor_mi_sac_mlp',
-    'sparse_gp_hypernet_actor_sac_mlp',
-    'gp_lvm_hypernet_actor_sac_mlp',
-    'task_embedding_hypernet_actor_sac_mlp',
-    'ewc_task_embedding_hypernet_actor_sac_mlp',
-    'si_task_embedding_hypernet_actor_sac_mlp',
-    'agem_task_embedding_hypernet_actor_sac_mlp',
-    'task_embedding_distilled_actor_sac_mlp',
-    'ewc_task_embedding_distilled_actor_sac_mlp',
-    'si_task_embedding_distilled_actor_sac_mlp',
-    'agem_task_embedding_distilled_actor_sac_mlp',
-    'agem_mh_sac_mlp',
-    'agem_mh_sac_mlp_v2',
-    'agem_mi_sac_mlp_v2',
-    'agem_v2_mh_sac_mlp_v2',
-    'agem_v2_mi_sac_mlp_v2',
-    'agem_v2_grad_norm_reg_critic_mh_sac_mlp_v2',
-    'agem_v2_grad_norm_reg_critic_mi_sac_mlp_v2',
-    'agem_continual_actor_critic_mh_sac_mlp',
-    'agem_continual_actor_critic_mi_sac_mlp',
-    'agem_continual_actor_critic_grad_norm_reg_critic_mh_sac_mlp',
-    'agem_continual_actor_critic_grad_norm_reg_critic_mi_sac_mlp',
-    'agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mh_sac_mlp',
-    'agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mi_sac_mlp',
-    'oracle_agem_v2_mh_sac_mlp_v2',
-    'oracle_agem_v2_mi_sac_mlp_v2',
-    'oracle_grad_agem_v2_mh_sac_mlp_v2',
-    'oracle_grad_agem_v2_mi_sac_mlp_v2',
-    'oracle_actor_agem_v2_mh_sac_mlp_v2',
-    'oracle_actor_agem_v2_mi_sac_mlp_v2',
-    'fisher_brc_mt_bc_mlp_critic_mh_sac_mlp',
-    'fisher_brc_mt_bc_offset_critic_mh_sac_mlp',
-    'fisher_brc_mh_bc_mlp_critic_mh_sac_mlp',
-    'fisher_brc_mh_bc_offset_critic_mh_sac_mlp',
-    'td3_mlp',
-    'mh_td3_mlp',
-    'mi_td3_mlp',
-    'ewc_mh_td3_mlp',
-    'ewc_mi_td3_mlp',
-    'si_mh_td3_mlp',
-    'si_mi_td3_mlp',
-    'agem_both_mh_td3_mlp',
-    'agem_both_mi_td3_mlp',
-    'oracle_critic_agem_mh_td3_mlp',
-    'oracle_critic_agem_mi_td3_mlp',
-    'oracle_actor_critic_agem_mh_td3_mlp',
-    'oracle_actor_critic_agem_mi_td3_mlp',
-    'oracle_grad_agem_mh_td3_mlp',
-    'oracle_grad_agem_mi_td3_mlp',
-    'ppo_mlp',
-    'ewc_ppo_mlp',
-    'ewc_ppo_mlp_v2',
-    'si_ppo_mlp',
-    'si_ppo_mlp_v2',
-    'agem_ppo_mlp',
-    'agem_ppo_mlp_v2',
-    'cmaml_ppo_mlp_v2',
-    'mh_ppo_mlp',
-    'mh_ppo_mlp_v2',
-    'ewc_mh_ppo_mlp',
-    'ewc_mh_ppo_mlp_v2',
-    'si_mh_ppo_mlp',
-    'si_mh_ppo_mlp_v2',
-    'agem_mh_ppo_mlp',
-    'agem_mh_ppo_mlp_v2',
-]
+"""Registry of the agents
+
+Every algorithm maps to the module and class of its agent and to the builders of its constructor arguments. The
+module is imported only when 'make_agent' builds the agent, so starting a run imports just the agent it trains
+(and e.g. gpytorch only for the GP hypernets).
+"""
+
+import importlib
+
+
+def _dqn_kwargs(args, action_space):
+    return {
+        'feature_dim': args.encoder_feature_dim,
+        'double_q': args.double_q,
+        'dueling': args.dueling,
+        'exploration_fraction': args.exploration_fraction,
+        'exploration_initial_eps': args.exploration_initial_eps,
+        'exploration_final_eps': args.exploration_final_eps,
+        'target_update_interval': args.target_update_interval,
+        'max_grad_norm': args.max_grad_norm,
+        'q_net_lr': args.q_net_lr,
+        'q_net_tau': args.q_net_tau,
+        'batch_size': args.batch_size,
+    }
+
+
+def _sac_kwargs(args, action_space):
+    if isinstance(action_space, list):
+        action_range = [[float(ac.low.min()),
+                         float(ac.high.max())]
+                        for ac in action_space]
+    else:
+        action_range = [float(action_space.low.min()),
+                        float(action_space.high.max())]
+
+    return {
+        'action_range': action_range,
+        'actor_hidden_dim': args.sac_actor_hidden_dim,
+        'critic_hidden_dim': args.sac_critic_hidden_dim,
+        'init_temperature': args.init_temperature,
+        'alpha_lr': args.alpha_lr,
+        'actor_lr': args.actor_lr,
+        'actor_log_std_min': args.actor_log_std_min,
+        'actor_log_std_max': args.actor_log_std_max,
+        'actor_update_freq': args.actor_update_freq,
+        'critic_lr': args.critic_lr,
+        'critic_tau': args.critic_tau,
+        'critic_target_update_freq': args.critic_target_update_freq,
+        'batch_size': args.batch_size,
+    }
+
+
+def _sac_ss_ensem_kwargs(args, action_space):
+    return {
+        'use_fwd': args.use_fwd,
+        'use_inv': args.use_inv,
+        'ss_lr': args.ss_lr,
+        'ss_update_freq': args.ss_update_freq,
+        'num_ensem_comps': args.num_ensem_comps,
+    }
+
+
+def _sac_cnn_kwargs(args, action_space):
+    return {
+        'encoder_feature_dim': args.encoder_feature_dim,
+        'encoder_lr': args.encoder_lr,
+        'encoder_tau': args.encoder_tau,
+        'ss_stop_shared_layers_grad': args.ss_stop_shared_layers_grad,
+        'num_layers': args.num_layers,
+        'num_shared_layers': args.num_shared_layers,
+        'num_filters': args.num_filters,
+        'curl_latent_dim': args.curl_latent_dim,
+    }
+
+
+def _sac_awp_kwargs(args, action_space):
+    return {'awp_coeff': args.sac_awp_coeff}
+
+
+def _sac_ewc_kwargs(args, action_space):
+    return {
+        'ewc_lambda': args.sac_ewc_lambda,
+        'ewc_estimate_fisher_iters': args.sac_ewc_estimate_fisher_iters,
+        'ewc_estimate_fisher_batch_size': args.sac_ewc_estimate_fisher_sample_num,
+        'online_ewc': args.sac_online_ewc,
+        'online_ewc_gamma': args.sac_online_ewc_gamma,
+    }
+
+
+def _sac_ewc_v2_kwargs(args, action_space):
+    return {
+        'ewc_lambda': args.sac_ewc_lambda,
+        'ewc_estimate_fisher_iters': args.sac_ewc_estimate_fisher_iters,
+        'ewc_estimate_fisher_sample_num': args.sac_ewc_estimate_fisher_sample_num,
+        'online_ewc': args.sac_online_ewc,
+        'online_ewc_gamma': args.sac_online_ewc_gamma,
+    }
+
+
+def _sac_ewc_grad_norm_reg_critic_kwargs(args, action_space):
+    return {'critic_grad_norm_reg_coeff': args.sac_ewc_critic_grad_norm_reg_coeff}
+
+
+def _sac_si_kwargs(args, action_space):
+    return {
+        'si_c': args.sac_si_c,
+        'si_epsilon': args.sac_si_epsilon,
+    }
+
+
+def _sac_agem_kwargs(args, action_space):
+    return {
+        'agem_memory_budget': args.sac_agem_memory_budget,
+        'agem_ref_grad_batch_size': args.sac_agem_ref_grad_batch_size,
+        'agem_memory_dtype': args.sac_agem_memory_dtype,
+    }
+
+
+def _sac_agem_clip_kwargs(args, action_space):
+    return {'agem_clip_param': args.sac_agem_clip_param}
+
+
+def _sac_agem_grad_norm_reg_critic_kwargs(args, action_space):
+    return {'critic_grad_norm_reg_coeff': args.sac_agem_critic_grad_norm_reg_coeff}
+
+
+def _sac_distilled_actor_kwargs(args, action_space):
+    return {
+        'distill_epochs': args.sac_distillation_epochs,
+        'distill_iters_per_epoch': args.sac_distillation_iters_per_epoch,
+        'distill_batch_size': args.sac_distillation_batch_size,
+        'distill_memory_budget_per_task': args.sac_distillation_memory_budget_per_task,
+        'distill_refresh_interval': args.sac_distillation_refresh_interval,
+        'distill_prev_task_batch_num': args.sac_distillation_prev_task_batch_num,
+        'distill_memory_device': args.sac_distillation_memory_device,
+        'distill_memory_dtype': args.sac_distillation_memory_dtype,
+    }
+
+
+def _sac_sparse_gp_kwargs(args, action_space):
+    return {'gp_num_inducing_points': args.sac_gp_num_inducing_points}
+
+
+def _sac_gp_lvm_kwargs(args, action_space):
+    return {
+        'gp_chunk_size': args.sac_gp_chunk_size,
+        'gp_latent_dim': args.sac_gp_latent_dim,
+        'gp_num_inducing_points': args.sac_gp_num_inducing_points,
+    }
+
+
+def _sac_hypernet_kwargs(args, action_space):
+    return {
+        'hypernet_hidden_dim': args.sac_hypernet_hidden_dim,
+        'hypernet_task_embedding_dim': args.sac_hypernet_task_embedding_dim,
+        'hypernet_reg_coeff': args.sac_hypernet_reg_coeff,
+        'hypernet_on_the_fly_reg': args.sac_hypernet_on_the_fly_reg,
+        'hypernet_online_uniform_reg': args.sac_hypernet_online_uniform_reg,
+        'hypernet_first_order': args.sac_hypernet_first_order,
+    }
+
+
+def _sac_hypernet_chunk_kwargs(args, action_space):
+    return {
+        'hypernet_chunked': args.sac_hypernet_chunked,
+        'hypernet_chunk_embedding_dim': args.sac_hypernet_chunk_embedding_dim,
+        'hypernet_chunk_size': args.sac_hypernet_chunk_size,
+    }
+
+
+def _sac_task_embedding_distillation_kwargs(args, action_space):
+    return {
+        'distillation_hidden_dim': args.sac_distillation_hidden_dim,
+        'distillation_task_embedding_dim': args.sac_distillation_task_embedding_dim,
+        'distillation_epochs': args.sac_distillation_epochs,
+        'distillation_iters_per_epoch': args.sac_distillation_iters_per_epoch,
+        'distillation_batch_size': args.sac_distillation_batch_size,
+        'distillation_memory_budget_per_task': args.sac_distillation_memory_budget_per_task,
+    }
+
+
+def _sac_fisher_brc_kwargs(args, action_space):
+    return {
+        'behavioral_cloning_hidden_dim': args.sac_fisher_brc_behavioral_cloning_hidden_dim,
+        'memory_budget': args.sac_fisher_brc_memory_budget,
+        'fisher_coeff': args.sac_fisher_brc_fisher_coeff,
+        'reward_bonus': args.sac_fisher_brc_reward_bonus,
+    }
+
+
+def _td3_kwargs(args, action_space):
+    if isinstance(action_space, list):
+        action_range = [[ac.low, ac.high] for ac in action_space]
+    else:
+        action_range = [action_space.low, action_space.high]
+
+    return {
+        'action_range': action_range,
+        'actor_hidden_dim': args.td3_actor_hidden_dim,
+        'critic_hidden_dim': args.td3_critic_hidden_dim,
+        'actor_lr': args.td3_actor_lr,
+        'actor_noise': args.td3_actor_noise,
+        'actor_noise_clip': args.td3_actor_noise_clip,
+        'critic_lr': args.td3_critic_lr,
+        'expl_noise_std': args.td3_expl_noise_std,
+        'target_tau': args.td3_target_tau,
+        'actor_and_target_update_freq': args.td3_actor_and_target_update_freq,
+        'batch_size': args.td3_batch_size,
+    }
+
+
+def _td3_ewc_kwargs(args, action_space):
+    return {
+        'ewc_lambda': args.td3_ewc_lambda,
+        'ewc_estimate_fisher_iters': args.td3_ewc_estimate_fisher_iters,
+        'ewc_estimate_fisher_batch_size': args.td3_ewc_estimate_fisher_batch_size,
+        'online_ewc': args.td3_online_ewc,
+        'online_ewc_gamma': args.td3_online_ewc_gamma,
+    }
+
+
+def _td3_si_kwargs(args, action_space):
+    return {
+        'si_c': args.td3_si_c,
+        'si_epsilon': args.td3_si_epsilon,
+    }
+
+
+def _td3_agem_kwargs(args, action_space):
+    return {
+        'agem_memory_budget': args.td3_agem_memory_budget,
+        'agem_ref_grad_batch_size': args.td3_agem_ref_grad_batch_size,
+    }
+
+
+def _ppo_kwargs(args, action_space):
+    return {
+        'hidden_dim': args.ppo_hidden_dim,
+        'clip_param': args.ppo_clip_param,
+        'ppo_epoch': args.ppo_epoch,
+        'critic_loss_coef': args.ppo_critic_loss_coef,
+        'entropy_coef': args.ppo_entropy_coef,
+        'lr': args.ppo_lr,
+        'eps': args.ppo_eps,
+        'grad_clip_norm': args.ppo_grad_clip_norm,
+        'use_clipped_critic_loss': args.ppo_use_clipped_critic_loss,
+        'num_batch': args.ppo_num_batch,
+    }
+
+
+def _ppo_ewc_kwargs(args, action_space):
+    return {
+        'ewc_lambda': args.ppo_ewc_lambda,
+        'ewc_estimate_fisher_epochs': args.ppo_ewc_estimate_fisher_epochs,
+        'online_ewc': args.ppo_online_ewc,
+        'online_ewc_gamma': args.ppo_online_ewc_gamma,
+    }
+
+
+def _ppo_si_kwargs(args, action_space):
+    return {
+        'si_c': args.ppo_si_c,
+        'si_epsilon': args.ppo_si_epsilon,
+    }
+
+
+def _ppo_agem_kwargs(args, action_space):
+    return {
+        'agem_memory_budget': args.ppo_agem_memory_budget,
+        'agem_ref_grad_batch_size': args.ppo_agem_ref_grad_batch_size,
+    }
+
+
+def _ppo_cmaml_kwargs(args, action_space):
+    return {
+        'cmaml_inner_grad_steps': args.ppo_cmaml_inner_grad_steps,
+        'cmaml_fast_lr': args.ppo_cmaml_fast_lr,
+        'cmaml_meta_lr': args.ppo_cmaml_meta_lr,
+        'cmaml_memory_budget': args.ppo_cmaml_memory_budget,
+        'cmaml_first_order': args.ppo_cmaml_first_order,
+    }
+
+
+# algo: (module, agent class, builders of the constructor arguments applied in order)
+_AGENTS = {
+    'dqn_cnn_ss_ensem': ('src.agent.dqn_agent', 'DqnCnnSSEnsembleAgent', (_dqn_kwargs,)),
+    'sac_cnn_ss_ensem': ('agent.trash.sac_agent', 'SacCnnSSEnsembleAgent',
+                         (_sac_kwargs, _sac_ss_ensem_kwargs, _sac_cnn_kwargs)),
+    'sac_mlp_ss_ensem': ('agent.trash.sac_agent', 'SacMlpSSEnsembleAgent', (_sac_kwargs, _sac_ss_ensem_kwargs)),
+    'sac_mlp': ('agent.sac.base_sac_agent', 'SacMlpAgent', (_sac_kwargs,)),
+    'awp_sac_mlp': ('agent.sac.awp_sac_agent', 'AdversarialWeightPermutationSacMlpAgent',
+                    (_sac_kwargs, _sac_awp_kwargs)),
+    'ewc_sac_mlp': ('agent.sac.ewc_sac_agent', 'EwcSacMlpAgent', (_sac_kwargs, _sac_ewc_kwargs)),
+    'si_sac_mlp': ('agent.sac.si_sac_agent', 'SiSacMlpAgent', (_sac_kwargs, _sac_si_kwargs)),
+    'agem_sac_mlp': ('agent.sac.agem_sac_agent', 'AgemSacMlpAgent', (_sac_kwargs, _sac_agem_kwargs)),
+    'mh_sac_mlp': ('agent.sac.mh_sac_agent', 'MultiHeadSacMlpAgent', (_sac_kwargs,)),
+    'mh_sac_mlp_v2': ('agent.sac.mh_sac_agent_v2', 'MultiHeadSacMlpAgentV2', (_sac_kwargs,)),
+    'mi_sac_mlp_v2': ('agent.sac.mi_sac_agent_v2', 'MultiInputSacMlpAgentV2', (_sac_kwargs,)),
+    'individual_sac_mlp_v2': ('agent.sac.individual_sac_agent_v2', 'IndividualSacMlpAgentV2', (_sac_kwargs,)),
+    'ewc_mh_sac_mlp': ('agent.sac.ewc_mh_sac_agent', 'EwcMultiHeadSacMlpAgent', (_sac_kwargs, _sac_ewc_kwargs)),
+    'ewc_mh_sac_mlp_v2': ('agent.sac.ewc_mh_sac_agent_v2', 'EwcMultiHeadSacMlpAgentV2',
+                          (_sac_kwargs, _sac_ewc_kwargs)),
+    'ewc_v2_mh_sac_mlp_v2': ('agent.sac.ewc_v2_mh_sac_agent_v2', 'EwcV2MultiHeadSacMlpAgentV2',
+                             (_sac_kwargs, _sac_ewc_v2_kwargs)),
+    'ewc_v2_mi_sac_mlp_v2': ('agent.sac.ewc_v2_mi_sac_agent_v2', 'EwcV2MultiInputSacMlpAgentV2',
+                             (_sac_kwargs, _sac_ewc_v2_kwargs)),
+    'ewc_v2_grad_norm_reg_critic_mh_sac_mlp_v2': (
+        'agent.sac.ewc_v2_grad_norm_reg_critic_mh_sac_agent_v2', 'EwcV2GradNormRegCriticMultiHeadSacMlpAgentV2',
+        (_sac_kwargs, _sac_ewc_v2_kwargs, _sac_ewc_grad_norm_reg_critic_kwargs)),
+    'ewc_v2_grad_norm_reg_critic_mi_sac_mlp_v2': (
+        'agent.sac.ewc_v2_grad_norm_reg_critic_mi_sac_agent_v2', 'EwcV2GradNormRegCriticMultiInputSacMlpAgentV2',
+        (_sac_kwargs, _sac_ewc_v2_kwargs, _sac_ewc_grad_norm_reg_critic_kwargs)),
+    'si_mh_sac_mlp': ('agent.sac.si_mh_sac_agent', 'SiMultiHeadSacMlpAgent', (_sac_kwargs, _sac_si_kwargs)),
+    'si_mh_sac_mlp_v2': ('agent.sac.si_mh_sac_agent_v2', 'SiMultiHeadSacMlpAgentV2', (_sac_kwargs, _sac_si_kwargs)),
+    'si_mi_sac_mlp_v2': ('agent.sac.si_mi_sac_agent_v2', 'SiMultiInputSacMlpAgentV2',
+                         (_sac_kwargs, _sac_si_kwargs)),
+    'distilled_actor_mh_sac_mlp': ('agent.sac.distilled_actor_mh_sac_agent', 'DistilledActorMultiHeadSacMlpAgent',
+                                   (_sac_kwargs, _sac_distilled_actor_kwargs)),
+    'distilled_actor_mi_sac_mlp': ('agent.sac.distilled_actor_mi_sac_agent', 'DistilledActorMultiInputSacMlpAgent',
+                                   (_sac_kwargs, _sac_distilled_actor_kwargs)),
+    'sparse_gp_hypernet_actor_sac_mlp': ('agent.sac.sparse_gp_hypernet_actor_sac_agent',
+                                         'SparseGPHyperNetActorSacMlpAgent', (_sac_kwargs, _sac_sparse_gp_kwargs)),
+    'gp_lvm_hypernet_actor_sac_mlp': ('agent.sac.gp_lvm_hypernet_actor_sac_agent',
+                                      'GPLatentVariableModelHyperNetActorSacMlpAgent',
+                                      (_sac_kwargs, _sac_gp_lvm_kwargs)),
+    'task_embedding_hypernet_actor_sac_mlp': ('agent.sac.task_embedding_hypernet_actor_sac_agent',
+                                              'TaskEmbeddingHyperNetActorSacMlpAgent',
+                                              (_sac_kwargs, _sac_hypernet_kwargs, _sac_hypernet_chunk_kwargs)),
+    'ewc_task_embedding_hypernet_actor_sac_mlp': ('agent.sac.ewc_task_embedding_hypernet_actor_sac_agent',
+                                                  'EwcTaskEmbeddingHyperNetActorSacMlpAgent',
+                                                  (_sac_kwargs, _sac_hypernet_kwargs, _sac_ewc_v2_kwargs)),
+    'si_task_embedding_hypernet_actor_sac_mlp': ('agent.sac.si_task_embedding_hypernet_actor_sac_agent',
+                                                 'SiTaskEmbeddingHyperNetActorSacMlpAgent',
+                                                 (_sac_kwargs, _sac_hypernet_kwargs, _sac_si_kwargs)),
+    'agem_task_embedding_hypernet_actor_sac_mlp': ('agent.sac.agem_task_embedding_hypernet_actor_sac_agent',
+                                                   'AgemTaskEmbeddingHyperNetActorSacMlpAgent',
+                                                   (_sac_kwargs, _sac_hypernet_kwargs, _sac_agem_kwargs,
+                                                    _sac_agem_clip_kwargs)),
+    'task_embedding_distilled_actor_sac_mlp': ('agent.sac.task_embedding_distilled_actor_sac_agent',
+                                               'TaskEmbeddingDistilledActorSacMlpAgent',
+                                               (_sac_kwargs, _sac_task_embedding_distillation_kwargs)),
+    'ewc_task_embedding_distilled_actor_sac_mlp': ('agent.sac.ewc_task_embedding_distilled_actor_sac_agent',
+                                                   'EwcTaskEmbeddingDistilledActorSacMlpAgent',
+                                                   (_sac_kwargs, _sac_task_embedding_distillation_kwargs,
+                                                    _sac_ewc_v2_kwargs)),
+    'si_task_embedding_distilled_actor_sac_mlp': ('agent.sac.si_task_embedding_distilled_actor_sac_agent',
+                                                  'SiTaskEmbeddingDistilledActorSacMlpAgent',
+                                                  (_sac_kwargs, _sac_task_embedding_distillation_kwargs,
+                                                   _sac_si_kwargs)),
+    'agem_task_embedding_distilled_actor_sac_mlp': ('agent.sac.agem_task_embedding_distilled_actor_sac_agent',
+                                                    'AgemTaskEmbeddingDistilledActorSacMlpAgent',
+                                                    (_sac_kwargs, _sac_task_embedding_distillation_kwargs,
+                                                     _sac_agem_kwargs)),
+    'agem_mh_sac_mlp': ('agent.sac.agem_mh_sac_agent', 'AgemMultiHeadSacMlpAgent', (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_mh_sac_mlp_v2': ('agent.sac.agem_mh_sac_agent_v2', 'AgemMultiHeadSacMlpAgentV2',
+                           (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_mi_sac_mlp_v2': ('agent.sac.agem_mi_sac_agent_v2', 'AgemMultiInputSacMlpAgentV2',
+                           (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_v2_mh_sac_mlp_v2': ('agent.sac.agem_continual_actor_mh_sac_agent', 'AgemV2MultiHeadSacMlpAgentV2',
+                              (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_v2_mi_sac_mlp_v2': ('agent.sac.agem_continual_actor_mi_sac_agent', 'AgemV2MultiInputSacMlpAgentV2',
+                              (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_v2_grad_norm_reg_critic_mh_sac_mlp_v2': (
+        'agent.sac.agem_continual_actor_grad_norm_reg_critic_mh_sac_agent',
+        'AgemV2GradNormRegCriticMultiHeadSacMlpAgentV2',
+        (_sac_kwargs, _sac_agem_kwargs, _sac_agem_grad_norm_reg_critic_kwargs)),
+    'agem_continual_actor_critic_mh_sac_mlp': ('agent.sac.agem_continual_actor_critic_mh_sac_agent',
+                                               'AgemContinualActorCriticMultiHeadSacMlpAgent',
+                                               (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_continual_actor_critic_mi_sac_mlp': ('agent.sac.agem_continual_actor_critic_mi_sac_agent',
+                                               'AgemContinualActorCriticMultiInputSacMlpAgent',
+                                               (_sac_kwargs, _sac_agem_kwargs)),
+    'agem_continual_actor_critic_grad_norm_reg_critic_mh_sac_mlp': (
+        'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_mh_sac_agent',
+        'AgemContinualActorCriticGradNormRegCriticMultiHeadSacMlpAgent',
+        (_sac_kwargs, _sac_agem_kwargs, _sac_agem_grad_norm_reg_critic_kwargs)),
+    'agem_continual_actor_critic_grad_norm_reg_critic_mi_sac_mlp': (
+        'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_mi_sac_agent',
+        'AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent',
+        (_sac_kwargs, _sac_agem_kwargs, _sac_agem_grad_norm_reg_critic_kwargs)),
+    'agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mh_sac_mlp': (
+        'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mh_sac_agent',
+        'AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiHeadSacMlpAgent',
+        (_sac_kwargs, _sac_agem_kwargs, _sac_agem_grad_norm_reg_critic_kwargs)),
+    'agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mi_sac_mlp': (
+        'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mi_sac_agent',
+        'AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiInputSacMlpAgent',
+        (_sac_kwargs, _sac_agem_kwargs, _sac_agem_grad_norm_reg_critic_kwargs)),
+    'oracle_agem_v2_mh_sac_mlp_v2': ('agent.sac.oracle_agem_v2_mh_sac_agent_v2',
+                                     'OracleAgemV2MultiHeadSacMlpAgentV2', (_sac_kwargs, _sac_agem_kwargs)),
+    'oracle_agem_v2_mi_sac_mlp_v2': ('agent.sac.oracle_agem_v2_mi_sac_agent_v2',
+                                     'OracleAgemV2MultiInputSacMlpAgentV2', (_sac_kwargs, _sac_agem_kwargs)),
+    'oracle_grad_agem_v2_mh_sac_mlp_v2': ('agent.sac.oracle_grad_agem_v2_mh_sac_agent_v2',
+                                          'OracleGradAgemV2MultiHeadSacMlpAgentV2', (_sac_kwargs, _sac_agem_kwargs)),
+    'oracle_grad_agem_v2_mi_sac_mlp_v2': ('agent.sac.oracle_grad_agem_v2_mi_sac_agent_v2',
+                                          'OracleGradAgemV2MultiInputSacMlpAgentV2',
+                                          (_sac_kwargs, _sac_agem_kwargs)),
+    'oracle_actor_agem_v2_mh_sac_mlp_v2': ('agent.sac.oracle_actor_agem_v2_mh_sac_agent_v2',
+                                           'OracleActorAgemV2MultiHeadSacMlpAgentV2',
+                                           (_sac_kwargs, _sac_agem_kwargs)),
+    'oracle_actor_agem_v2_mi_sac_mlp_v2': ('agent.sac.oracle_actor_agem_v2_mi_sac_agent_v2',
+                                           'OracleActorAgemV2MultiInputSacMlpAgentV2',
+                                           (_sac_kwargs, _sac_agem_kwargs)),
+    'fisher_brc_mt_bc_mlp_critic_mh_sac_mlp': ('agent.sac.fisher_brc_mt_bc_mlp_critic_mh_sac_agent',
+                                               'FisherBRCMTBCMlpCriticMultiHeadSacMlpAgent',
+                                               (_sac_kwargs, _sac_fisher_brc_kwargs)),
+    'fisher_brc_mt_bc_offset_critic_mh_sac_mlp': ('agent.sac.fisher_brc_mt_bc_offset_critic_mh_sac_agent',
+                                                  'FisherBRCMTBCOffsetCriticMultiHeadSacMlpAgent',
+                                                  (_sac_kwargs, _sac_fisher_brc_kwargs)),
+    'fisher_brc_mh_bc_mlp_critic_mh_sac_mlp': ('agent.sac.fisher_brc_mh_bc_mlp_critic_mh_sac_agent',
+                                               'FisherBRCMHBCMlpCriticMultiHeadSacMlpAgent',
+                                               (_sac_kwargs, _sac_fisher_brc_kwargs)),
+    'fisher_brc_mh_bc_offset_critic_mh_sac_mlp': ('agent.sac.fisher_brc_mh_bc_offset_critic_mh_sac_agent',
+                                                  'FisherBRCMHBCOffsetCriticMultiHeadSacMlpAgent',
+                                                  (_sac_kwargs, _sac_fisher_brc_kwargs)),
+    'td3_mlp': ('agent.td3.base_td3_agent', 'Td3MlpAgent', (_td3_kwargs,)),
+    'mh_td3_mlp': ('agent.td3.mh_td3_agent', 'MultiHeadTd3MlpAgent', (_td3_kwargs,)),
+    'mi_td3_mlp': ('agent.td3.mi_td3_agent', 'MultiInputTd3MlpAgent', (_td3_kwargs,)),
+    'ewc_mh_td3_mlp': ('agent.td3.ewc_mh_td3_agent', 'EwcMultiHeadTd3MlpAgent', (_td3_kwargs, _td3_ewc_kwargs)),
+    'ewc_mi_td3_mlp': ('agent.td3.ewc_mi_td3_agent', 'EwcMultiInputTd3MlpAgent', (_td3_kwargs, _td3_ewc_kwargs)),
+    'si_mh_td3_mlp': ('agent.td3.si_mh_td3_agent', 'SiMultiHeadTd3MlpAgent', (_td3_kwargs, _td3_si_kwargs)),
+    'si_mi_td3_mlp': ('agent.td3.si_mi_td3_agent', 'SiMultiInputTd3MlpAgent', (_td3_kwargs, _td3_si_kwargs)),
+    'agem_both_mh_td3_mlp': ('agent.td3.agem_both_mh_td3_agent', 'AgemBothMultiHeadTd3MlpAgent',
+                             (_td3_kwargs, _td3_agem_kwargs)),
+    'agem_both_mi_td3_mlp': ('agent.td3.agem_both_mi_td3_agent', 'AgemBothMultiInputTd3MlpAgent',
+                             (_td3_kwargs, _td3_agem_kwargs)),
+    'oracle_critic_agem_mh_td3_mlp': ('agent.td3.oracle_critic_agem_mh_td3_agent',
+                                      'OracleCriticAgemMultiHeadTd3MlpAgent', (_td3_kwargs, _td3_agem_kwargs)),
+    'oracle_critic_agem_mi_td3_mlp': ('agent.td3.oracle_critic_agem_mi_td3_agent',
+                                      'OracleCriticAgemMultiInputTd3MlpAgent', (_td3_kwargs, _td3_agem_kwargs)),
+    'oracle_actor_critic_agem_mh_td3_mlp': ('agent.td3.oracle_actor_critic_agem_mh_td3_agent',
+                                            'OracleActorCriticAgemMultiHeadTd3MlpAgent',
+                                            (_td3_kwargs, _td3_agem_kwargs)),
+    'oracle_actor_critic_agem_mi_td3_mlp': ('agent.td3.oracle_actor_critic_agem_mi_td3_agent',
+                                            'OracleActorCriticAgemMultiInputTd3MlpAgent',
+                                            (_td3_kwargs, _td3_agem_kwargs)),
+    'oracle_grad_agem_mh_td3_mlp': ('agent.td3.oracle_grad_agem_mh_td3_agent', 'OracleGradAgemMultiHeadTd3MlpAgent',
+                                    (_td3_kwargs, _td3_agem_kwargs)),
+    'oracle_grad_agem_mi_td3_mlp': ('agent.td3.oracle_grad_agem_mi_td3_agent',
+                                    'OracleGradAgemMultiInputTd3MlpAgent', (_td3_kwargs, _td3_agem_kwargs)),
+    'ppo_mlp': ('agent.ppo.base_ppo_agent', 'PpoMlpAgent', (_ppo_kwargs,)),
+    'ewc_ppo_mlp': ('agent.ppo.ewc_ppo_agent', 'EwcPpoMlpAgent', (_ppo_kwargs, _ppo_ewc_kwargs)),
+    'ewc_ppo_mlp_v2': ('agent.ppo.ewc_ppo_agent_v2', 'EwcPpoMlpAgentV2', (_ppo_kwargs, _ppo_ewc_kwargs)),
+    'si_ppo_mlp': ('agent.ppo.si_ppo_agent', 'SiPpoMlpAgent', (_ppo_kwargs, _ppo_si_kwargs)),
+    'si_ppo_mlp_v2': ('agent.ppo.si_ppo_agent_v2', 'SiPpoMlpAgentV2', (_ppo_kwargs, _ppo_si_kwargs)),
+    'agem_ppo_mlp': ('agent.ppo.agem_ppo_agent', 'AgemPpoMlpAgent', (_ppo_kwargs, _ppo_agem_kwargs)),
+    'agem_ppo_mlp_v2': ('agent.ppo.agem_ppo_agent_v2', 'AgemPpoMlpAgentV2', (_ppo_kwargs, _ppo_agem_kwargs)),
+    'cmaml_ppo_mlp_v2': ('agent.ppo.cmaml_ppo_agent_v2', 'CmamlPpoMlpAgentV2', (_ppo_kwargs, _ppo_cmaml_kwargs)),
+    'mh_ppo_mlp': ('agent.ppo.mh_ppo_agent', 'MultiHeadPpoMlpAgent', (_ppo_kwargs,)),
+    'mh_ppo_mlp_v2': ('agent.ppo.mh_ppo_agent_v2', 'MultiHeadPpoMlpAgentV2', (_ppo_kwargs,)),
+    'ewc_mh_ppo_mlp': ('agent.ppo.ewc_mh_ppo_agent', 'EwcMultiHeadPpoMlpAgent', (_ppo_kwargs, _ppo_ewc_kwargs)),
+    'ewc_mh_ppo_mlp_v2': ('agent.ppo.ewc_mh_ppo_agent_v2', 'EwcMultiHeadPpoMlpAgentV2',
+                          (_ppo_kwargs, _ppo_ewc_kwargs)),
+    'si_mh_ppo_mlp': ('agent.ppo.si_mh_ppo_agent', 'SiMultiHeadPpoMlpAgent', (_ppo_kwargs, _ppo_si_kwargs)),
+    'si_mh_ppo_mlp_v2': ('agent.ppo.si_mh_ppo_agent_v2', 'SiMultiHeadPpoMlpAgentV2', (_ppo_kwargs, _ppo_si_kwargs)),
+    'agem_mh_ppo_mlp': ('agent.ppo.agem_mh_ppo_agent', 'AgemMultiHeadPpoMlpAgent', (_ppo_kwargs, _ppo_agem_kwargs)),
+    'agem_mh_ppo_mlp_v2': ('agent.ppo.agem_mh_ppo_agent_v2', 'AgemMultiHeadPpoMlpAgentV2',
+                           (_ppo_kwargs, _ppo_agem_kwargs)),
+}
+
+ALGOS = list(_AGENTS)
+
+
+def agent_class(algo):
+    """Import the module of the agent of 'algo' and return its class"""
+    if algo not in _AGENTS:
+        raise ValueError(f"Unknown algorithm {algo}")
+    module, class_name = _AGENTS[algo][:2]
+
+    return getattr(importlib.import_module(module), class_name)
 
 
 def make_agent(obs_space, action_space, device, args):
@@ -165,519 +489,8 @@ def make_agent(obs_space, action_space, device, args):
         'device': device,
     }
 
-    if args.algo == 'dqn_cnn_ss_ensem':
-        kwargs['feature_dim'] = args.encoder_feature_dim
-        kwargs['double_q'] = args.double_q
-        kwargs['dueling'] = args.dueling
-        kwargs['exploration_fraction'] = args.exploration_fraction
-        kwargs['exploration_initial_eps'] = args.exploration_initial_eps
-        kwargs['exploration_final_eps'] = args.exploration_final_eps
-        kwargs['target_update_interval'] = args.target_update_interval
-        kwargs['max_grad_norm'] = args.max_grad_norm
-        kwargs['q_net_lr'] = args.q_net_lr
-        kwargs['q_net_tau'] = args.q_net_tau
-        kwargs['batch_size'] = args.batch_size
-
-        agent = DqnCnnSSEnsembleAgent(**kwargs)
-    elif 'sac' in args.algo:
-        if isinstance(action_space, list):
-            action_range = [[float(ac.low.min()),
-                             float(ac.high.max())]
-                            for ac in action_space]
-        else:
-            action_range = [float(action_space.low.min()),
-                            float(action_space.high.max())]
-
-        kwargs['action_range'] = action_range
-        kwargs['actor_hidden_dim'] = args.sac_actor_hidden_dim
-        kwargs['critic_hidden_dim'] = args.sac_critic_hidden_dim
-        kwargs['init_temperature'] = args.init_temperature
-        kwargs['alpha_lr'] = args.alpha_lr
-        kwargs['actor_lr'] = args.actor_lr
-        kwargs['actor_log_std_min'] = args.actor_log_std_min
-        kwargs['actor_log_std_max'] = args.actor_log_std_max
-        kwargs['actor_update_freq'] = args.actor_update_freq
-        kwargs['critic_lr'] = args.critic_lr
-        kwargs['critic_tau'] = args.critic_tau
-        kwargs['critic_target_update_freq'] = args.critic_target_update_freq
-        kwargs['batch_size'] = args.batch_size
-
-        if args.algo == 'sac_cnn_ss_ensem':
-            kwargs['use_fwd'] = args.use_fwd
-            kwargs['use_inv'] = args.use_inv
-            kwargs['ss_lr'] = args.ss_lr
-            kwargs['ss_update_freq'] = args.ss_update_freq
-            kwargs['num_ensem_comps'] = args.num_ensem_comps
-            kwargs['encoder_feature_dim'] = args.encoder_feature_dim
-            kwargs['encoder_lr'] = args.encoder_lr
-            kwargs['encoder_tau'] = args.encoder_tau
-            kwargs['ss_stop_shared_layers_grad'] = args.ss_stop_shared_layers_grad
-            kwargs['num_layers'] = args.num_layers
-            kwargs['num_shared_layers'] = args.num_shared_layers
-            kwargs['num_filters'] = args.num_filters
-            kwargs['curl_latent_dim'] = args.curl_latent_dim
-            agent = SacCnnSSEnsembleAgent(**kwargs)
-        elif args.algo == 'sac_mlp_ss_ensem':
-            kwargs['action_range'] = [float(action_space.low.min()),
-                                      float(action_space.high.max())]
-            kwargs['use_fwd'] = args.use_fwd
-            kwargs['use_inv'] = args.use_inv
-            kwargs['ss_lr'] = args.ss_lr
-            kwargs['ss_update_freq'] = args.ss_update_freq
-            kwargs['num_ensem_comps'] = args.num_ensem_comps
-            agent = SacMlpSSEnsembleAgent(**kwargs)
-        elif args.algo == 'sac_mlp':
-            agent = SacMlpAgent(**kwargs)
-        elif args.algo == 'awp_sac_mlp':
-            kwargs['awp_coeff'] = args.sac_awp_coeff
-            agent = AdversarialWeightPermutationSacMlpAgent(**kwargs)
-        elif args.algo == 'ewc_sac_mlp':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_batch_size'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcSacMlpAgent(**kwargs)
-        elif args.algo == 'si_sac_mlp':
-            kwargs['si_c'] = args.sac_si_c
-            kwargs['si_epsilon'] = args.sac_si_epsilon
-            agent = SiSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemSacMlpAgent(**kwargs)
-        elif args.algo == 'mh_sac_mlp':
-            agent = MultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'mh_sac_mlp_v2':
-            agent = MultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'mi_sac_mlp_v2':
-            agent = MultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'individual_sac_mlp_v2':
-            agent = IndividualSacMlpAgentV2(**kwargs)
-        elif args.algo == 'ewc_mh_sac_mlp':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_batch_size'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'ewc_mh_sac_mlp_v2':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_batch_size'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcMultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'ewc_v2_mh_sac_mlp_v2':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_sample_num'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcV2MultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'ewc_v2_mi_sac_mlp_v2':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_sample_num'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcV2MultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'ewc_v2_grad_norm_reg_critic_mh_sac_mlp_v2':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_sample_num'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_ewc_critic_grad_norm_reg_coeff
-            agent = EwcV2GradNormRegCriticMultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'ewc_v2_grad_norm_reg_critic_mi_sac_mlp_v2':
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_sample_num'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_ewc_critic_grad_norm_reg_coeff
-            agent = EwcV2GradNormRegCriticMultiInputSacMlpAgentV2(**kwargs)
-            pass
-        elif args.algo == 'si_mh_sac_mlp':
-            kwargs['si_c'] = args.sac_si_c
-            kwargs['si_epsilon'] = args.sac_si_epsilon
-            agent = SiMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'si_mh_sac_mlp_v2':
-            kwargs['si_c'] = args.sac_si_c
-            kwargs['si_epsilon'] = args.sac_si_epsilon
-            agent = SiMultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'si_mi_sac_mlp_v2':
-            kwargs['si_c'] = args.sac_si_c
-            kwargs['si_epsilon'] = args.sac_si_epsilon
-            agent = SiMultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'distilled_actor_mh_sac_mlp':
-            kwargs['distill_epochs'] = args.sac_distill_epochs
-            kwargs['distill_iters_per_epoch'] = args.sac_distill_iters_per_epoch
-            kwargs['distill_batch_size'] = args.sac_distill_batch_size
-            kwargs['distill_memory_budget_per_task'] = args.sac_distill_memory_budget_per_task
-            agent = DistilledActorMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'distilled_actor_mi_sac_mlp':
-            kwargs['distill_epochs'] = args.sac_distill_epochs
-            kwargs['distill_iters_per_epoch'] = args.sac_distill_iters_per_epoch
-            kwargs['distill_batch_size'] = args.sac_distill_batch_size
-            kwargs['distill_memory_budget_per_task'] = args.sac_distill_memory_budget_per_task
-            agent = DistilledActorMultiInputSacMlpAgent(**kwargs)
-        elif args.algo == 'sparse_gp_hypernet_actor_sac_mlp':
-            kwargs['gp_num_inducing_points'] = args.sac_gp_num_inducing_points
-            agent = SparseGPHyperNetActorSacMlpAgent(**kwargs)
-        elif args.algo == 'gp_lvm_hypernet_actor_sac_mlp':
-            kwargs['gp_chunk_size'] = args.sac_gp_chunk_size
-            kwargs['gp_latent_dim'] = args.sac_gp_latent_dim
-            kwargs['gp_num_inducing_points'] = args.sac_gp_num_inducing_points
-            agent = GPLatentVariableModelHyperNetActorSacMlpAgent(**kwargs)
-        elif args.algo == 'task_embedding_hypernet_actor_sac_mlp':
-            kwargs['hypernet_hidden_dim'] = args.sac_hypernet_hidden_dim
-            kwargs['hypernet_task_embedding_dim'] = args.sac_hypernet_task_embedding_dim
-            kwargs['hypernet_chunked'] = args.sac_hypernet_chunked
-            kwargs['hypernet_chunk_embedding_dim'] = args.sac_hypernet_chunk_embedding_dim
-            kwargs['hypernet_chunk_size'] = args.sac_hypernet_chunk_size
-            kwargs['hypernet_reg_coeff'] = args.sac_hypernet_reg_coeff
-            kwargs['hypernet_on_the_fly_reg'] = args.sac_hypernet_on_the_fly_reg
-            kwargs['hypernet_online_uniform_reg'] = args.sac_hypernet_online_uniform_reg
-            kwargs['hypernet_first_order'] = args.sac_hypernet_first_order
-            agent = TaskEmbeddingHyperNetActorSacMlpAgent(**kwargs)
-        elif args.algo == 'ewc_task_embedding_hypernet_actor_sac_mlp':
-            kwargs['hypernet_hidden_dim'] = args.sac_hypernet_hidden_dim
-            kwargs['hypernet_task_embedding_dim'] = args.sac_hypernet_task_embedding_dim
-            kwargs['hypernet_reg_coeff'] = args.sac_hypernet_reg_coeff
-            kwargs['hypernet_on_the_fly_reg'] = args.sac_hypernet_on_the_fly_reg
-            kwargs['hypernet_online_uniform_reg'] = args.sac_hypernet_online_uniform_reg
-            kwargs['hypernet_first_order'] = args.sac_hypernet_first_order
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_sample_num'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcTaskEmbeddingHyperNetActorSacMlpAgent(**kwargs)
-        elif args.algo == 'si_task_embedding_hypernet_actor_sac_mlp':
-            kwargs['hypernet_hidden_dim'] = args.sac_hypernet_hidden_dim
-            kwargs['hypernet_task_embedding_dim'] = args.sac_hypernet_task_embedding_dim
-            kwargs['hypernet_reg_coeff'] = args.sac_hypernet_reg_coeff
-            kwargs['hypernet_on_the_fly_reg'] = args.sac_hypernet_on_the_fly_reg
-            kwargs['hypernet_online_uniform_reg'] = args.sac_hypernet_online_uniform_reg
-            kwargs['hypernet_first_order'] = args.sac_hypernet_first_order
-            kwargs['si_c'] = args.sac_si_c
-            kwargs['si_epsilon'] = args.sac_si_epsilon
-            agent = SiTaskEmbeddingHyperNetActorSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_task_embedding_hypernet_actor_sac_mlp':
-            kwargs['hypernet_hidden_dim'] = args.sac_hypernet_hidden_dim
-            kwargs['hypernet_task_embedding_dim'] = args.sac_hypernet_task_embedding_dim
-            kwargs['hypernet_reg_coeff'] = args.sac_hypernet_reg_coeff
-            kwargs['hypernet_on_the_fly_reg'] = args.sac_hypernet_on_the_fly_reg
-            kwargs['hypernet_online_uniform_reg'] = args.sac_hypernet_online_uniform_reg
-            kwargs['hypernet_first_order'] = args.sac_hypernet_first_order
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            kwargs['agem_clip_param'] = args.sac_agem_clip_param
-            agent = AgemTaskEmbeddingHyperNetActorSacMlpAgent(**kwargs)
-        elif args.algo == 'task_embedding_distilled_actor_sac_mlp':
-            kwargs['distillation_hidden_dim'] = args.sac_distillation_hidden_dim
-            kwargs['distillation_task_embedding_dim'] = args.sac_distillation_task_embedding_dim
-            kwargs['distillation_epochs'] = args.sac_distillation_epochs
-            kwargs['distillation_iters_per_epoch'] = args.sac_distillation_iters_per_epoch
-            kwargs['distillation_batch_size'] = args.sac_distillation_batch_size
-            kwargs['distillation_memory_budget_per_task'] = args.sac_distillation_memory_budget_per_task
-            agent = TaskEmbeddingDistilledActorSacMlpAgent(**kwargs)
-        elif args.algo == 'ewc_task_embedding_distilled_actor_sac_mlp':
-            kwargs['distillation_hidden_dim'] = args.sac_distillation_hidden_dim
-            kwargs['distillation_task_embedding_dim'] = args.sac_distillation_task_embedding_dim
-            kwargs['distillation_epochs'] = args.sac_distillation_epochs
-            kwargs['distillation_iters_per_epoch'] = args.sac_distillation_iters_per_epoch
-            kwargs['distillation_batch_size'] = args.sac_distillation_batch_size
-            kwargs['distillation_memory_budget_per_task'] = args.sac_distillation_memory_budget_per_task
-            kwargs['ewc_lambda'] = args.sac_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.sac_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_sample_num'] = args.sac_ewc_estimate_fisher_sample_num
-            kwargs['online_ewc'] = args.sac_online_ewc
-            kwargs['online_ewc_gamma'] = args.sac_online_ewc_gamma
-            agent = EwcTaskEmbeddingDistilledActorSacMlpAgent(**kwargs)
-        elif args.algo == 'si_task_embedding_distilled_actor_sac_mlp':
-            kwargs['distillation_hidden_dim'] = args.sac_distillation_hidden_dim
-            kwargs['distillation_task_embedding_dim'] = args.sac_distillation_task_embedding_dim
-            kwargs['distillation_epochs'] = args.sac_distillation_epochs
-            kwargs['distillation_iters_per_epoch'] = args.sac_distillation_iters_per_epoch
-            kwargs['distillation_batch_size'] = args.sac_distillation_batch_size
-            kwargs['distillation_memory_budget_per_task'] = args.sac_distillation_memory_budget_per_task
-            kwargs['si_c'] = args.sac_si_c
-            kwargs['si_epsilon'] = args.sac_si_epsilon
-            agent = SiTaskEmbeddingDistilledActorSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_task_embedding_distilled_actor_sac_mlp':
-            kwargs['distillation_hidden_dim'] = args.sac_distillation_hidden_dim
-            kwargs['distillation_task_embedding_dim'] = args.sac_distillation_task_embedding_dim
-            kwargs['distillation_epochs'] = args.sac_distillation_epochs
-            kwargs['distillation_iters_per_epoch'] = args.sac_distillation_iters_per_epoch
-            kwargs['distillation_batch_size'] = args.sac_distillation_batch_size
-            kwargs['distillation_memory_budget_per_task'] = args.sac_distillation_memory_budget_per_task
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemTaskEmbeddingDistilledActorSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_mh_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_mh_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemMultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'agem_mi_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemMultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'agem_v2_grad_norm_reg_critic_mh_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_agem_critic_grad_norm_reg_coeff
-            agent = AgemV2GradNormRegCriticMultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'agem_continual_actor_critic_mh_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemContinualActorCriticMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_continual_actor_critic_mi_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemContinualActorCriticMultiInputSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_continual_actor_critic_grad_norm_reg_critic_mh_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_agem_critic_grad_norm_reg_coeff
-            agent = AgemContinualActorCriticGradNormRegCriticMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_continual_actor_critic_grad_norm_reg_critic_mi_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_agem_critic_grad_norm_reg_coeff
-            agent = AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mh_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_agem_critic_grad_norm_reg_coeff
-            agent = AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mi_sac_mlp':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            kwargs['critic_grad_norm_reg_coeff'] = args.sac_agem_critic_grad_norm_reg_coeff
-            agent = AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiInputSacMlpAgent(**kwargs)
-        elif args.algo == 'agem_v2_mh_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemV2MultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'agem_v2_mi_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = AgemV2MultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'oracle_agem_v2_mh_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = OracleAgemV2MultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'oracle_agem_v2_mi_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = OracleAgemV2MultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'oracle_grad_agem_v2_mh_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = OracleGradAgemV2MultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'oracle_grad_agem_v2_mi_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = OracleGradAgemV2MultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'oracle_actor_agem_v2_mh_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = OracleActorAgemV2MultiHeadSacMlpAgentV2(**kwargs)
-        elif args.algo == 'oracle_actor_agem_v2_mi_sac_mlp_v2':
-            kwargs['agem_memory_budget'] = args.sac_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.sac_agem_ref_grad_batch_size
-            agent = OracleActorAgemV2MultiInputSacMlpAgentV2(**kwargs)
-        elif args.algo == 'fisher_brc_mt_bc_mlp_critic_mh_sac_mlp':
-            kwargs['behavioral_cloning_hidden_dim'] = args.sac_fisher_brc_behavioral_cloning_hidden_dim
-            kwargs['memory_budget'] = args.sac_fisher_brc_memory_budget
-            kwargs['fisher_coeff'] = args.sac_fisher_brc_fisher_coeff
-            kwargs['reward_bonus'] = args.sac_fisher_brc_reward_bonus
-            agent = FisherBRCMTBCMlpCriticMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'fisher_brc_mt_bc_offset_critic_mh_sac_mlp':
-            kwargs['behavioral_cloning_hidden_dim'] = args.sac_fisher_brc_behavioral_cloning_hidden_dim
-            kwargs['memory_budget'] = args.sac_fisher_brc_memory_budget
-            kwargs['fisher_coeff'] = args.sac_fisher_brc_fisher_coeff
-            kwargs['reward_bonus'] = args.sac_fisher_brc_reward_bonus
-            agent = FisherBRCMTBCOffsetCriticMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'fisher_brc_mh_bc_mlp_critic_mh_sac_mlp':
-            kwargs['behavioral_cloning_hidden_dim'] = args.sac_fisher_brc_behavioral_cloning_hidden_dim
-            kwargs['memory_budget'] = args.sac_fisher_brc_memory_budget
-            kwargs['fisher_coeff'] = args.sac_fisher_brc_fisher_coeff
-            kwargs['reward_bonus'] = args.sac_fisher_brc_reward_bonus
-            agent = FisherBRCMHBCMlpCriticMultiHeadSacMlpAgent(**kwargs)
-        elif args.algo == 'fisher_brc_mh_bc_offset_critic_mh_sac_mlp':
-            kwargs['behavioral_cloning_hidden_dim'] = args.sac_fisher_brc_behavioral_cloning_hidden_dim
-            kwargs['memory_budget'] = args.sac_fisher_brc_memory_budget
-            kwargs['fisher_coeff'] = args.sac_fisher_brc_fisher_coeff
-            kwargs['reward_bonus'] = args.sac_fisher_brc_reward_bonus
-            agent = FisherBRCMHBCOffsetCriticMultiHeadSacMlpAgent(**kwargs)
-    elif 'td3' in args.algo:
-        if isinstance(action_space, list):
-            action_range = [[ac.low, ac.high] for ac in action_space]
-        else:
-            action_range = [action_space.low, action_space.high]
-
-        kwargs['action_range'] = action_range
-        kwargs['actor_hidden_dim'] = args.td3_actor_hidden_dim
-        kwargs['critic_hidden_dim'] = args.td3_critic_hidden_dim
-        kwargs['actor_lr'] = args.td3_actor_lr
-        kwargs['actor_noise'] = args.td3_actor_noise
-        kwargs['actor_noise_clip'] = args.td3_actor_noise_clip
-        kwargs['critic_lr'] = args.td3_critic_lr
-        kwargs['expl_noise_std'] = args.td3_expl_noise_std
-        kwargs['target_tau'] = args.td3_target_tau
-        kwargs['actor_and_target_update_freq'] = args.td3_actor_and_target_update_freq
-        kwargs['batch_size'] = args.td3_batch_size
-
-        if args.algo == 'td3_mlp':
-            agent = Td3MlpAgent(**kwargs)
-        elif args.algo == 'mh_td3_mlp':
-            agent = MultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'mi_td3_mlp':
-            agent = MultiInputTd3MlpAgent(**kwargs)
-        elif args.algo == 'ewc_mh_td3_mlp':
-            kwargs['ewc_lambda'] = args.td3_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.td3_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_batch_size'] = args.td3_ewc_estimate_fisher_batch_size
-            kwargs['online_ewc'] = args.td3_online_ewc
-            kwargs['online_ewc_gamma'] = args.td3_online_ewc_gamma
-            agent = EwcMultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'ewc_mi_td3_mlp':
-            kwargs['ewc_lambda'] = args.td3_ewc_lambda
-            kwargs['ewc_estimate_fisher_iters'] = args.td3_ewc_estimate_fisher_iters
-            kwargs['ewc_estimate_fisher_batch_size'] = args.td3_ewc_estimate_fisher_batch_size
-            kwargs['online_ewc'] = args.td3_online_ewc
-            kwargs['online_ewc_gamma'] = args.td3_online_ewc_gamma
-            agent = EwcMultiInputTd3MlpAgent(**kwargs)
-        elif args.algo == 'si_mh_td3_mlp':
-            kwargs['si_c'] = args.td3_si_c
-            kwargs['si_epsilon'] = args.td3_si_epsilon
-            agent = SiMultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'si_mi_td3_mlp':
-            kwargs['si_c'] = args.td3_si_c
-            kwargs['si_epsilon'] = args.td3_si_epsilon
-            agent = SiMultiInputTd3MlpAgent(**kwargs)
-        elif args.algo == 'agem_both_mh_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = AgemBothMultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'agem_both_mi_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = AgemBothMultiInputTd3MlpAgent(**kwargs)
-        elif args.algo == 'oracle_critic_agem_mh_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = OracleCriticAgemMultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'oracle_critic_agem_mi_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = OracleCriticAgemMultiInputTd3MlpAgent(**kwargs)
-        elif args.algo == 'oracle_actor_critic_agem_mh_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = OracleActorCriticAgemMultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'oracle_actor_critic_agem_mi_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = OracleActorCriticAgemMultiInputTd3MlpAgent(**kwargs)
-        elif args.algo == 'oracle_grad_agem_mh_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = OracleGradAgemMultiHeadTd3MlpAgent(**kwargs)
-        elif args.algo == 'oracle_grad_agem_mi_td3_mlp':
-            kwargs['agem_memory_budget'] = args.td3_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.td3_agem_ref_grad_batch_size
-            agent = OracleGradAgemMultiInputTd3MlpAgent(**kwargs)
-    elif 'ppo' in args.algo:
-        kwargs['hidden_dim'] = args.ppo_hidden_dim
-        kwargs['clip_param'] = args.ppo_clip_param
-        kwargs['ppo_epoch'] = args.ppo_epoch
-        kwargs['critic_loss_coef'] = args.ppo_critic_loss_coef
-        kwargs['entropy_coef'] = args.ppo_entropy_coef
-        kwargs['lr'] = args.ppo_lr
-        kwargs['eps'] = args.ppo_eps
-        kwargs['grad_clip_norm'] = args.ppo_grad_clip_norm
-        kwargs['use_clipped_critic_loss'] = args.ppo_use_clipped_critic_loss
-        kwargs['num_batch'] = args.ppo_num_batch
-
-        if args.algo == 'ppo_mlp':
-            agent = PpoMlpAgent(**kwargs)
-        elif args.algo == 'ewc_ppo_mlp':
-            kwargs['ewc_lambda'] = args.ppo_ewc_lambda
-            kwargs['ewc_estimate_fisher_epochs'] = args.ppo_ewc_estimate_fisher_epochs
-            kwargs['online_ewc'] = args.ppo_online_ewc
-            kwargs['online_ewc_gamma'] = args.ppo_online_ewc_gamma
-            agent = EwcPpoMlpAgent(**kwargs)
-        elif args.algo == 'ewc_ppo_mlp_v2':
-            kwargs['ewc_lambda'] = args.ppo_ewc_lambda
-            kwargs['ewc_estimate_fisher_epochs'] = args.ppo_ewc_estimate_fisher_epochs
-            kwargs['online_ewc'] = args.ppo_online_ewc
-            kwargs['online_ewc_gamma'] = args.ppo_online_ewc_gamma
-            agent = EwcPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'si_ppo_mlp':
-            kwargs['si_c'] = args.ppo_si_c
-            kwargs['si_epsilon'] = args.ppo_si_epsilon
-            agent = SiPpoMlpAgent(**kwargs)
-        elif args.algo == 'si_ppo_mlp_v2':
-            kwargs['si_c'] = args.ppo_si_c
-            kwargs['si_epsilon'] = args.ppo_si_epsilon
-            agent = SiPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'agem_ppo_mlp':
-            kwargs['agem_memory_budget'] = args.ppo_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.ppo_agem_ref_grad_batch_size
-            agent = AgemPpoMlpAgent(**kwargs)
-        elif args.algo == 'agem_ppo_mlp_v2':
-            kwargs['agem_memory_budget'] = args.ppo_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.ppo_agem_ref_grad_batch_size
-            agent = AgemPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'cmaml_ppo_mlp_v2':
-            kwargs['cmaml_inner_grad_steps'] = args.ppo_cmaml_inner_grad_steps
-            kwargs['cmaml_fast_lr'] = args.ppo_cmaml_fast_lr
-            kwargs['cmaml_meta_lr'] = args.ppo_cmaml_meta_lr
-            kwargs['cmaml_memory_budget'] = args.ppo_cmaml_memory_budget
-            kwargs['cmaml_first_order'] = args.ppo_cmaml_first_order
-            agent = CmamlPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'mh_ppo_mlp':
-            agent = MultiHeadPpoMlpAgent(**kwargs)
-        elif args.algo == 'mh_ppo_mlp_v2':
-            agent = MultiHeadPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'ewc_mh_ppo_mlp':
-            kwargs['ewc_lambda'] = args.ppo_ewc_lambda
-            kwargs['ewc_estimate_fisher_epochs'] = args.ppo_ewc_estimate_fisher_epochs
-            kwargs['online_ewc'] = args.ppo_online_ewc
-            kwargs['online_ewc_gamma'] = args.ppo_online_ewc_gamma
-            agent = EwcMultiHeadPpoMlpAgent(**kwargs)
-        elif args.algo == 'ewc_mh_ppo_mlp_v2':
-            kwargs['ewc_lambda'] = args.ppo_ewc_lambda
-            kwargs['ewc_estimate_fisher_epochs'] = args.ppo_ewc_estimate_fisher_epochs
-            kwargs['online_ewc'] = args.ppo_online_ewc
-            kwargs['online_ewc_gamma'] = args.ppo_online_ewc_gamma
-            agent = EwcMultiHeadPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'si_mh_ppo_mlp':
-            kwargs['si_c'] = args.ppo_si_c
-            kwargs['si_epsilon'] = args.ppo_si_epsilon
-            agent = SiMultiHeadPpoMlpAgent(**kwargs)
-        elif args.algo == 'si_mh_ppo_mlp_v2':
-            kwargs['si_c'] = args.ppo_si_c
-            kwargs['si_epsilon'] = args.ppo_si_epsilon
-            agent = SiMultiHeadPpoMlpAgentV2(**kwargs)
-        elif args.algo == 'agem_mh_ppo_mlp':
-            kwargs['agem_memory_budget'] = args.ppo_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.ppo_agem_ref_grad_batch_size
-            agent = AgemMultiHeadPpoMlpAgent(**kwargs)
-        elif args.algo == 'agem_mh_ppo_mlp_v2':
-            kwargs['agem_memory_budget'] = args.ppo_agem_memory_budget
-            kwargs['agem_ref_grad_batch_size'] = args.ppo_agem_ref_grad_batch_size
-            agent = AgemMultiHeadPpoMlpAgentV2(**kwargs)
-    else:
-        raise ValueError(f"Unknown algorithm {args.algo}")
+    agent_cls = agent_class(args.algo)
+    for build_kwargs in _AGENTS[args.algo][2]:
+        kwargs.update(build_kwargs(args, action_space))
 
-    return agent
+    return agent_cls(**kwargs)
@@ -10,7 +10,7 @@ from itertools import chain
 from collections import OrderedDict
 
 from src.agent.encoder import PixelEncoder, DqnEncoder
-from src.utils import weight_init, SquashedNormal, gaussian_logprob, squash, DiagGaussian
+from src.utils import weight_init, SquashedNormal, gaussian_logprob, squash, DiagGaussian, mlp_action_grad
 
 
 class QFunction(nn.Module):
@@ -43,6 +43,13 @@ class QFunction(nn.Module):
         obs_action = torch.cat([obs, action], dim=-1)
         return self.trunk(obs_action)
 
+    def forward_with_action_grad(self, obs, action):
+        """Q estimates and their gradients w.r.t. the action, see utils.mlp_action_grad"""
+        assert obs.size(0) == action.size(0)
+
+        obs_action = torch.cat([obs, action], dim=-1)
+        return mlp_action_grad(self.trunk, obs_action, action.size(-1))
+
 
 class MultiHeadQFunction(nn.Module):
     """MLP for q-function."""
@@ -70,6 +77,13 @@ class MultiHeadQFunction(nn.Module):
         hidden = self.trunk(obs_action)
         return self.heads[head_idx](hidden)
 
+    def forward_with_action_grad(self, obs, action, head_idx):
+        """Q estimates and their gradients w.r.t. the action, see utils.mlp_action_grad"""
+        assert obs.size(0) == action.size(0)
+
+        obs_action = torch.cat([obs, action], dim=-1)
+        return mlp_action_grad([*self.trunk, self.heads[head_idx]], obs_action, action.size(-1))
+
 
 class MultiInputQFunction(nn.Module):
     """MLP for q-function."""
@@ -99,6 +113,13 @@ class MultiInputQFunction(nn.Module):
         hidden = self.trunk(obs_action)
         return self.heads[head_idx](hidden)
 
+    def forward_with_action_grad(self, obs, action, head_idx):
+        """Q estimates and their gradients w.r.t. the action, see utils.mlp_action_grad"""
+        assert obs.size(0) == action.size(0)
+
+        obs_action = torch.cat([obs, action], dim=-1)
+        return mlp_action_grad([*self.trunk, *self.heads[head_idx]], obs_action, action.size(-1))
+
 
 class RotFunction(nn.Module):
     """MLP for rotation prediction."""
@@ -443,6 +464,29 @@ class MultiHeadSacActorMlp(nn.Module):
 
         return mu, pi, log_pi, log_std
 
+    def forward_heads(self, obs, head_idxs):
+        """Compute squashed means and log stds for a batch mixing several heads
+
+        The trunk runs once over the whole batch and every head only over its own rows.
+
+        :param head_idxs: LongTensor of shape (batch_size,) with the head of each row.
+        """
+        hidden = self.trunk(obs)
+        out = hidden.new_empty((hidden.shape[0], self.dist_heads[0].out_features))
+        for head_idx in torch.unique(head_idxs).tolist():
+            mask = head_idxs == head_idx
+            out[mask] = self.dist_heads[head_idx](hidden[mask])
+        mu, log_std = out.chunk(2, dim=-1)
+
+        # constrain log_std inside [log_std_min, log_std_max]
+        log_std = torch.tanh(log_std)
+        log_std = self.log_std_min + 0.5 * (
+                self.log_std_max - self.log_std_min
+        ) * (log_std + 1)
+        mu, _, _ = squash(mu, None, None)
+
+        return mu, log_std
+
     def compute_log_probs(self, obs, action, head_idx):
         hidden = self.trunk(obs)
         mu, log_std = self.dist_heads[head_idx](hidden).chunk(2, dim=-1)
@@ -523,6 +567,29 @@ class MultiInputSacActorMlp(nn.Module):
 
         return mu, pi, log_pi, log_std
 
+    def forward_heads(self, obs, head_idxs):
+        """Compute squashed means and log stds for a batch mixing several heads
+
+        The trunk runs once over the whole batch and every head only over its own rows.
+
+        :param head_idxs: LongTensor of shape (batch_size,) with the head of each row.
+        """
+        hidden = self.trunk(obs)
+        out = hidden.new_empty((hidden.shape[0], self.dist_heads[0][-1].out_features))
+        for head_idx in torch.unique(head_idxs).tolist():
+            mask = head_idxs == head_idx
+            out[mask] = self.dist_heads[head_idx](hidden[mask])
+        mu, log_std = out.chunk(2, dim=-1)
+
+        # constrain log_std inside [log_std_min, log_std_max]
+        log_std = torch.tanh(log_std)
+        log_std = self.log_std_min + 0.5 * (
+                self.log_std_max - self.log_std_min
+        ) * (log_std + 1)
+        mu, _, _ = squash(mu, None, None)
+
+        return mu, log_std
+
     def compute_log_probs(self, obs, action, head_idx):
         hidden = self.trunk(obs)
         mu, log_std = self.dist_heads[head_idx](hidden).chunk(2, dim=-1)
@@ -627,6 +694,12 @@ class SacCriticMlp(nn.Module):
 
         return q1, q2
 
+    def forward_with_action_grads(self, obs, action, **kwargs):
+        q1, q1_grad = self.Q1.forward_with_action_grad(obs, action)
+        q2, q2_grad = self.Q2.forward_with_action_grad(obs, action)
+
+        return q1, q2, q1_grad, q2_grad
+
 
 class MultiHeadSacCriticMlp(nn.Module):
     """Critic network with MLP, employes two q-functions."""
@@ -656,6 +729,12 @@ class MultiHeadSacCriticMlp(nn.Module):
 
         return q1, q2
 
+    def forward_with_action_grads(self, obs, action, head_idx):
+        q1, q1_grad = self.Q1.forward_with_action_grad(obs, action, head_idx)
+        q2, q2_grad = self.Q2.forward_with_action_grad(obs, action, head_idx)
+
+        return q1, q2, q1_grad, q2_grad
+
 
 class MultiInputSacCriticMlp(nn.Module):
     """Critic network with MLP, employes two q-functions."""
@@ -685,6 +764,12 @@ class MultiInputSacCriticMlp(nn.Module):
 
         return q1, q2
 
+    def forward_with_action_grads(self, obs, action, head_idx):
+        q1, q1_grad = self.Q1.forward_with_action_grad(obs, action, head_idx)
+        q2, q2_grad = self.Q2.forward_with_action_grad(obs, action, head_idx)
+
+        return q1, q2, q1_grad, q2_grad
+
 
 class SacOffsetCriticMlp(nn.Module):
     """Critic network with MLP, employes two q-functions."""
@@ -965,8 +1050,8 @@ class Td3ActorMlp(nn.Module):
 
     def forward(self, obs):
         normalized_out = self.trunk(obs)
-        low, high = torch.as_tensor(self.action_ranges[0], device=obs.device), \
-                    torch.as_tensor(self.action_ranges[1], device=obs.device)
+        low, high = torch.as_tensor(self.action_range[0], device=obs.device), \
+                    torch.as_tensor(self.action_range[1], device=obs.device)
         out = 0.5 * (normalized_out + 1.0) * (high - low) + low
 
         return out
@@ -1,16 +1,36 @@
-from agent.ppo.base_ppo_agent import PpoMlpAgent
-from agent.ppo.ewc_ppo_agent import EwcPpoMlpAgent
-from agent.ppo.ewc_ppo_agent_v2 import EwcPpoMlpAgentV2
-from agent.ppo.si_ppo_agent import SiPpoMlpAgent
-from agent.ppo.si_ppo_agent_v2 import SiPpoMlpAgentV2
-from agent.ppo.agem_ppo_agent import AgemPpoMlpAgent
-from agent.ppo.agem_ppo_agent_v2 import AgemPpoMlpAgentV2
-from agent.ppo.cmaml_ppo_agent_v2 import CmamlPpoMlpAgentV2
-from agent.ppo.mh_ppo_agent import MultiHeadPpoMlpAgent
-from agent.ppo.mh_ppo_agent_v2 import MultiHeadPpoMlpAgentV2
-from agent.ppo.ewc_mh_ppo_agent import EwcMultiHeadPpoMlpAgent
-from agent.ppo.ewc_mh_ppo_agent_v2 import EwcMultiHeadPpoMlpAgentV2
-from agent.ppo.si_mh_ppo_agent import SiMultiHeadPpoMlpAgent
-from agent.ppo.si_mh_ppo_agent_v2 import SiMultiHeadPpoMlpAgentV2
-from agent.ppo.agem_mh_ppo_agent import AgemMultiHeadPpoMlpAgent
-from agent.ppo.agem_mh_ppo_agent_v2 import AgemMultiHeadPpoMlpAgentV2
+"""PPO agents, imported on first access so that using one of them does not import all of them"""
+
+import importlib
+
+
+_AGENT_MODULES = {
+    'PpoMlpAgent': 'agent.ppo.base_ppo_agent',
+    'EwcPpoMlpAgent': 'agent.ppo.ewc_ppo_agent',
+    'EwcPpoMlpAgentV2': 'agent.ppo.ewc_ppo_agent_v2',
+    'SiPpoMlpAgent': 'agent.ppo.si_ppo_agent',
+    'SiPpoMlpAgentV2': 'agent.ppo.si_ppo_agent_v2',
+    'AgemPpoMlpAgent': 'agent.ppo.agem_ppo_agent',
+    'AgemPpoMlpAgentV2': 'agent.ppo.agem_ppo_agent_v2',
+    'CmamlPpoMlpAgentV2': 'agent.ppo.cmaml_ppo_agent_v2',
+    'MultiHeadPpoMlpAgent': 'agent.ppo.mh_ppo_agent',
+    'MultiHeadPpoMlpAgentV2': 'agent.ppo.mh_ppo_agent_v2',
+    'EwcMultiHeadPpoMlpAgent': 'agent.ppo.ewc_mh_ppo_agent',
+    'EwcMultiHeadPpoMlpAgentV2': 'agent.ppo.ewc_mh_ppo_agent_v2',
+    'SiMultiHeadPpoMlpAgent': 'agent.ppo.si_mh_ppo_agent',
+    'SiMultiHeadPpoMlpAgentV2': 'agent.ppo.si_mh_ppo_agent_v2',
+    'AgemMultiHeadPpoMlpAgent': 'agent.ppo.agem_mh_ppo_agent',
+    'AgemMultiHeadPpoMlpAgentV2': 'agent.ppo.agem_mh_ppo_agent_v2',
+}
+
+
+def __getattr__(name):
+    if name not in _AGENT_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_AGENT_MODULES[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_AGENT_MODULES))
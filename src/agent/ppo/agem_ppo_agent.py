@@ -116,7 +116,7 @@ class AgemPpoMlpAgent(PpoMlpAgent):
                                          self.device)
 
         obs = env.reset()
-        memory.obs[0].copy_(torch.Tensor(obs).to(self.device))
+        memory.reset_obs(obs)
 
         for _ in range(memory_size_per_task):
             with utils.eval_mode(self):
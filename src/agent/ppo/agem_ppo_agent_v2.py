@@ -113,7 +113,7 @@ class AgemPpoMlpAgentV2(PpoMlpAgent):
                                          self.device)
 
         obs = env.reset()
-        memory.obs[0].copy_(torch.Tensor(obs).to(self.device))
+        memory.reset_obs(obs)
 
         # construct memory using final policy for each task
         for _ in range(memory_size_per_task):
@@ -1,10 +1,9 @@
 import torch
-import numpy as np
 import copy
 from itertools import chain
 from collections import OrderedDict
 
-
+from reservoir import ReservoirMemory
 from agent.ppo.base_ppo_agent import PpoMlpAgent
 from agent.network import CmamlPpoActorMlp, PpoCriticMlp
 
@@ -42,18 +41,15 @@ class CmamlPpoMlpAgentV2(PpoMlpAgent):
                          critic_loss_coef, entropy_coef, lr, eps, grad_clip_norm, use_clipped_critic_loss,
                          num_batch)
 
-        self.cmaml_total_sample_num = 0
-
         # initialize memory
-        self.cmaml_memory = {
-            'obses': torch.zeros(self.cmaml_memory_budget, *obs_shape).to(self.device),
-            'actions': torch.zeros(self.cmaml_memory_budget, *action_shape).to(self.device),
-            'value_preds': torch.zeros(self.cmaml_memory_budget, 1).to(self.device),
-            'returns': torch.zeros(self.cmaml_memory_budget, 1).to(self.device),
-            'old_log_pis': torch.zeros(self.cmaml_memory_budget, 1).to(self.device),
-            'adv_targets': torch.zeros(self.cmaml_memory_budget, 1).to(self.device),
-            'sample_num': 0
-        }
+        self.cmaml_memory = ReservoirMemory(self.cmaml_memory_budget, {
+            'obses': (obs_shape, torch.float32),
+            'actions': (action_shape, torch.float32),
+            'value_preds': ((1,), torch.float32),
+            'returns': ((1,), torch.float32),
+            'old_log_pis': ((1,), torch.float32),
+            'adv_targets': ((1,), torch.float32),
+        }, self.device)
 
     def _setup_agent(self):
         if hasattr(self, 'actor') and hasattr(self, 'critic') \
@@ -79,16 +75,15 @@ class CmamlPpoMlpAgentV2(PpoMlpAgent):
 
     def _augment_prev_samples(self, obses, actions, value_preds,
                               returns, old_log_pis, adv_targets):
-        aug_size = min(obses.size(0), self.cmaml_memory['sample_num'])
+        aug_size = min(obses.size(0), len(self.cmaml_memory))
         if aug_size > 0:
-            sample_idxs = np.random.randint(
-                0, self.cmaml_memory['sample_num'], size=aug_size)
-            aug_obses = torch.cat([obses, self.cmaml_memory['obses'][sample_idxs]])
-            aug_actions = torch.cat([actions, self.cmaml_memory['actions'][sample_idxs]])
-            aug_value_preds = torch.cat([value_preds, self.cmaml_memory['value_preds'][sample_idxs]])
-            aug_returns = torch.cat([returns, self.cmaml_memory['returns'][sample_idxs]])
-            aug_old_log_pis = torch.cat([old_log_pis, self.cmaml_memory['old_log_pis'][sample_idxs]])
-            aug_adv_targets = torch.cat([adv_targets, self.cmaml_memory['adv_targets'][sample_idxs]])
+            samples = self.cmaml_memory.sample(aug_size)
+            aug_obses = torch.cat([obses, samples['obses']])
+            aug_actions = torch.cat([actions, samples['actions']])
+            aug_value_preds = torch.cat([value_preds, samples['value_preds']])
+            aug_returns = torch.cat([returns, samples['returns']])
+            aug_old_log_pis = torch.cat([old_log_pis, samples['old_log_pis']])
+            aug_adv_targets = torch.cat([adv_targets, samples['adv_targets']])
         else:
             aug_obses = obses
             aug_actions = actions
@@ -102,27 +97,8 @@ class CmamlPpoMlpAgentV2(PpoMlpAgent):
 
     def _reservoir_sampling(self, obses, actions, value_preds,
                             returns, old_log_pis, adv_targets):
-        for obs, action, value_pred, ret, old_log_pi, adv_target \
-                in zip(obses, actions, value_preds, returns, old_log_pis, adv_targets):
-            self.cmaml_total_sample_num += 1
-            sample_num = self.cmaml_memory['sample_num']
-            if sample_num < self.cmaml_memory_budget:
-                self.cmaml_memory['obses'][sample_num].copy_(obs)
-                self.cmaml_memory['actions'][sample_num].copy_(action)
-                self.cmaml_memory['value_preds'][sample_num].copy_(value_pred)
-                self.cmaml_memory['returns'][sample_num].copy_(ret)
-                self.cmaml_memory['old_log_pis'][sample_num].copy_(old_log_pi)
-                self.cmaml_memory['adv_targets'][sample_num].copy_(adv_target)
-                self.cmaml_memory['sample_num'] += 1
-            else:
-                idx = np.random.randint(0, self.cmaml_total_sample_num)
-                if idx < self.cmaml_memory_budget:
-                    self.cmaml_memory['obses'][idx].copy_(obs)
-                    self.cmaml_memory['actions'][idx].copy_(action)
-                    self.cmaml_memory['value_preds'][idx].copy_(value_pred)
-                    self.cmaml_memory['returns'][idx].copy_(ret)
-                    self.cmaml_memory['old_log_pis'][idx].copy_(old_log_pi)
-                    self.cmaml_memory['adv_targets'][idx].copy_(adv_target)
+        self.cmaml_memory.add(obses=obses, actions=actions, value_preds=value_preds,
+                              returns=returns, old_log_pis=old_log_pis, adv_targets=adv_targets)
 
     def reset(self):
         self.critic.load_state_dict(self._critic_init_state)
@@ -225,11 +201,11 @@ class CmamlPpoMlpAgentV2(PpoMlpAgent):
         # TODO (chongyi zheng)
         super().save(model_dir, step)
         torch.save(
-            self.cmaml_memories, '%s/cmaml_memories_%s.pt' % (model_dir, step)
+            self.cmaml_memory.state_dict(), '%s/cmaml_memory_%s.pt' % (model_dir, step)
         )
 
     def load(self, model_dir, step):
         super().load(model_dir, step)
-        self.cmaml_memories = torch.load(
-            '%s/cmaml_memories_%s.pt' % (model_dir, step)
-        )
+        self.cmaml_memory.load_state_dict(torch.load(
+            '%s/cmaml_memory_%s.pt' % (model_dir, step)
+        ))
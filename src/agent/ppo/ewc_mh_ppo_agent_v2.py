@@ -39,7 +39,7 @@ class EwcMultiHeadPpoMlpAgentV2(MultiHeadPpoMlpAgentV2, EwcPpoMlpAgentV2):
     def estimate_fisher(self, env, rollouts, compute_returns_kwargs, **kwargs):
         fishers = {}
         obs = env.reset()
-        rollouts.obs[0].copy_(torch.Tensor(obs).to(self.device))
+        rollouts.reset_obs(obs)
         for epoch in range(self.ewc_estimate_fisher_epochs):
             for step in range(rollouts.num_steps):
                 with utils.eval_mode(self):
@@ -2,6 +2,7 @@ import torch
 from itertools import chain
 
 from agent.ppo import MultiHeadPpoMlpAgent, SiPpoMlpAgent
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiMultiHeadPpoMlpAgent(MultiHeadPpoMlpAgent, SiPpoMlpAgent):
@@ -34,35 +35,9 @@ class SiMultiHeadPpoMlpAgent(MultiHeadPpoMlpAgent, SiPpoMlpAgent):
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in chain(self.actor.named_common_parameters(),
-                                 self.critic.named_common_parameters()):
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().clone()
-                self.prev_params[name] = param.detach().clone()
-
-    def update_omegas(self):
-        for name, param in chain(self.actor.named_common_parameters(),
-                                 self.critic.named_common_parameters()):
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(name, torch.zeros_like(param))
-
-        # clear importance buffers for the next task
-        self.params_w = {}
-
-    def _estimate_importance(self):
-        for name, param in chain(self.actor.named_common_parameters(),
-                                 self.critic.named_common_parameters()):
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach() * (param.detach() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param))
-                self.prev_params[name] = param.detach().clone()
+        self.si = SynapticIntelligence(chain(self.actor.named_common_parameters(),
+                                             self.critic.named_common_parameters()),
+                                       self.si_epsilon)
 
     def update(self, rollouts, logger, step, **kwargs):
         advantages = rollouts.returns[:-1] - rollouts.value_preds[:-1]
@@ -87,10 +62,7 @@ class SiMultiHeadPpoMlpAgent(MultiHeadPpoMlpAgent, SiPpoMlpAgent):
                     obs_batch, actions_batch, old_log_pis, adv_targets, **kwargs)
                 critic_loss = self.compute_critic_loss(
                     obs_batch, value_preds_batch, return_batch, **kwargs)
-                si_surrogate_loss = self._compute_surrogate_loss(
-                    chain(self.actor.named_common_parameters(),
-                          self.critic.named_common_parameters())
-                )
+                si_surrogate_loss = self._compute_surrogate_loss()
                 loss = actor_loss + self.critic_loss_coef * critic_loss - \
                        self.entropy_coef * entropy + self.si_c * si_surrogate_loss
 
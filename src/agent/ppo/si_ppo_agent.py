@@ -1,8 +1,8 @@
 import torch
 from itertools import chain
-from collections.abc import Iterable
 
 from agent.ppo.base_ppo_agent import PpoMlpAgent
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiPpoMlpAgent(PpoMlpAgent):
@@ -32,57 +32,22 @@ class SiPpoMlpAgent(PpoMlpAgent):
         self.si_c = si_c
         self.si_epsilon = si_epsilon
 
-        self.params_w = {}
-        self.omegas = {}
-        self.prev_params = {}
-        self.prev_task_params = {}
-
         self._save_init_params()
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in chain(self.actor.named_parameters(),
-                                 self.critic.named_parameters()):
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().clone()
-                self.prev_params[name] = param.detach().clone()
+        self.si = SynapticIntelligence(chain(self.actor.named_parameters(),
+                                             self.critic.named_parameters()),
+                                       self.si_epsilon)
 
     def update_omegas(self):
-        for name, param in chain(self.actor.named_parameters(),
-                                 self.critic.named_parameters()):
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(name, torch.zeros_like(param))
-
-        # clear importance buffers for the next task
-        self.params_w = {}
+        self.si.update_omegas()
 
     def _estimate_importance(self):
-        for name, param in chain(self.actor.named_parameters(),
-                                 self.critic.named_parameters()):
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach() * (param.detach() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param))
-                self.prev_params[name] = param.detach().clone()
-
-    def _compute_surrogate_loss(self, named_parameters):
-        assert isinstance(named_parameters, Iterable)
-
-        si_losses = []
-        for name, param in named_parameters:
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                omega = self.omegas.get(name, torch.zeros_like(param))
-                si_loss = torch.sum(omega * (param - prev_param) ** 2)
-                si_losses.append(si_loss)
-
-        return torch.sum(torch.stack(si_losses))
+        self.si.estimate_importance()
+
+    def _compute_surrogate_loss(self):
+        return self.si.compute_surrogate_loss()
 
     def update(self, rollouts, logger, step, **kwargs):
         advantages = rollouts.returns[:-1] - rollouts.value_preds[:-1]
@@ -107,10 +72,7 @@ class SiPpoMlpAgent(PpoMlpAgent):
                     obs_batch, actions_batch, old_log_pis, adv_targets, **kwargs)
                 critic_loss = self.compute_critic_loss(
                     obs_batch, value_preds_batch, return_batch, **kwargs)
-                si_surrogate_loss = self._compute_surrogate_loss(
-                    chain(self.actor.named_parameters(),
-                          self.critic.named_parameters())
-                )
+                si_surrogate_loss = self._compute_surrogate_loss()
                 loss = actor_loss + self.critic_loss_coef * critic_loss - \
                        self.entropy_coef * entropy + self.si_c * si_surrogate_loss
 
@@ -131,29 +93,11 @@ class SiPpoMlpAgent(PpoMlpAgent):
     def save(self, model_dir, step):
         super().save(model_dir, step)
         torch.save(
-            self.prev_params, '%s/prev_params_%s.pt' % (model_dir, step)
-        )
-        torch.save(
-            self.params_w, '%s/params_w_%s.pt' % (model_dir, step)
-        )
-        torch.save(
-            self.omegas, '%s/omegas_%s.pt' % (model_dir, step)
-        )
-        torch.save(
-            self.prev_task_params, '%s/prev_task_params_%s.pt' % (model_dir, step)
+            self.si.state_dict(), '%s/si_%s.pt' % (model_dir, step)
         )
 
     def load(self, model_dir, step):
         super().load(model_dir, step)
-        self.prev_params = torch.load(
-            '%s/prev_params_%s.pt' % (model_dir, step)
-        )
-        self.params_w = torch.load(
-            '%s/params_w_%s.pt' % (model_dir, step)
-        )
-        self.omegas = torch.load(
-            '%s/omegas_%s.pt' % (model_dir, step)
-        )
-        self.prev_task_params = torch.load(
-            '%s/prev_task_params_%s.pt' % (model_dir, step)
-        )
+        self.si.load_state_dict(torch.load(
+            '%s/si_%s.pt' % (model_dir, step)
+        ))
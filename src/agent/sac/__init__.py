@@ -1,84 +1,82 @@
-from agent.sac.base_sac_agent import SacMlpAgent
-from agent.sac.ewc_sac_agent import EwcSacMlpAgent
-from agent.sac.ewc_sac_agent_v2 import EwcSacMlpAgentV2
-from agent.sac.ewc_v2_sac_agent_v2 import EwcV2SacMlpAgentV2
-from agent.sac.si_sac_agent import SiSacMlpAgent
-from agent.sac.si_sac_agent_v2 import SiSacMlpAgentV2
-from agent.sac.agem_sac_agent import AgemSacMlpAgent
-from agent.sac.agem_sac_agent_v2 import AgemSacMlpAgentV2
-from agent.sac.agem_continual_actor_sac_agent import AgemV2SacMlpAgentV2
-from agent.sac.oracle_agem_v2_sac_agent_v2 import OracleAgemV2SacMlpAgentV2
-from agent.sac.oracle_grad_agem_v2_sac_agent_v2 import OracleGradAgemV2SacMlpAgentV2
-from agent.sac.oracle_actor_agem_v2_sac_agent_v2 import OracleActorAgemV2SacMlpAgentV2
-from agent.sac.mh_sac_agent import MultiHeadSacMlpAgent
-from agent.sac.mh_sac_agent_v2 import MultiHeadSacMlpAgentV2
-from agent.sac.individual_sac_agent_v2 import IndividualSacMlpAgentV2
-from agent.sac.mi_sac_agent_v2 import MultiInputSacMlpAgentV2
-from agent.sac.ewc_mh_sac_agent import EwcMultiHeadSacMlpAgent
-from agent.sac.ewc_mh_sac_agent_v2 import EwcMultiHeadSacMlpAgentV2
-from agent.sac.ewc_v2_mh_sac_agent_v2 import EwcV2MultiHeadSacMlpAgentV2
-from agent.sac.ewc_v2_mi_sac_agent_v2 import EwcV2MultiInputSacMlpAgentV2
-from agent.sac.si_mh_sac_agent import SiMultiHeadSacMlpAgent
-from agent.sac.si_mh_sac_agent_v2 import SiMultiHeadSacMlpAgentV2
-from agent.sac.si_mi_sac_agent_v2 import SiMultiInputSacMlpAgentV2
-from agent.sac.agem_mh_sac_agent import AgemMultiHeadSacMlpAgent
-from agent.sac.agem_mh_sac_agent_v2 import AgemMultiHeadSacMlpAgentV2
-from agent.sac.agem_mi_sac_agent_v2 import AgemMultiInputSacMlpAgentV2
-from agent.sac.agem_continual_actor_mh_sac_agent import AgemV2MultiHeadSacMlpAgentV2
-from agent.sac.oracle_agem_v2_mh_sac_agent_v2 import OracleAgemV2MultiHeadSacMlpAgentV2
-from agent.sac.oracle_grad_agem_v2_mh_sac_agent_v2 import OracleGradAgemV2MultiHeadSacMlpAgentV2
-from agent.sac.oracle_actor_agem_v2_mh_sac_agent_v2 import OracleActorAgemV2MultiHeadSacMlpAgentV2
-from agent.sac.agem_continual_actor_mi_sac_agent import AgemV2MultiInputSacMlpAgentV2
-from agent.sac.oracle_agem_v2_mi_sac_agent_v2 import OracleAgemV2MultiInputSacMlpAgentV2
-from agent.sac.oracle_grad_agem_v2_mi_sac_agent_v2 import OracleGradAgemV2MultiInputSacMlpAgentV2
-from agent.sac.oracle_actor_agem_v2_mi_sac_agent_v2 import OracleActorAgemV2MultiInputSacMlpAgentV2
-from agent.sac.fisher_brc_mt_bc_mlp_critic_mh_sac_agent import FisherBRCMTBCMlpCriticMultiHeadSacMlpAgent
-from agent.sac.fisher_brc_mt_bc_offset_critic_mh_sac_agent import FisherBRCMTBCOffsetCriticMultiHeadSacMlpAgent
-from agent.sac.fisher_brc_mh_bc_mlp_critic_mh_sac_agent import FisherBRCMHBCMlpCriticMultiHeadSacMlpAgent
-from agent.sac.fisher_brc_mh_bc_offset_critic_mh_sac_agent import FisherBRCMHBCOffsetCriticMultiHeadSacMlpAgent
-from agent.sac.ewc_v2_grad_norm_reg_critic_mh_sac_agent_v2 import EwcV2GradNormRegCriticMultiHeadSacMlpAgentV2
-from agent.sac.ewc_v2_grad_norm_reg_critic_mi_sac_agent_v2 import EwcV2GradNormRegCriticMultiInputSacMlpAgentV2
-from agent.sac.agem_continual_actor_grad_norm_reg_critic_mh_sac_agent import \
-    AgemV2GradNormRegCriticMultiHeadSacMlpAgentV2
+"""SAC agents, imported on first access so that using one of them does not import all of them"""
 
-from agent.sac.mi_sac_agent import MultiInputSacMlpAgent
-from agent.sac.agem_continual_actor_critic_sac_agent import AgemContinualActorCriticSacMlpAgent
-from agent.sac.agem_continual_actor_critic_mh_sac_agent import AgemContinualActorCriticMultiHeadSacMlpAgent
-from agent.sac.agem_continual_actor_critic_mi_sac_agent import AgemContinualActorCriticMultiInputSacMlpAgent
-from agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_mh_sac_agent import \
-    AgemContinualActorCriticGradNormRegCriticMultiHeadSacMlpAgent
-from agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_mi_sac_agent import \
-    AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent
-from agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mh_sac_agent import \
-    AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiHeadSacMlpAgent
-from agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mi_sac_agent import \
-    AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiInputSacMlpAgent
+import importlib
 
-from agent.sac.distilled_actor_mh_sac_agent import \
-    DistilledActorMultiHeadSacMlpAgent
-from agent.sac.distilled_actor_mi_sac_agent import \
-    DistilledActorMultiInputSacMlpAgent
 
-from agent.sac.task_embedding_hypernet_actor_sac_agent import \
-    TaskEmbeddingHyperNetActorSacMlpAgent
-from agent.sac.ewc_task_embedding_hypernet_actor_sac_agent import \
-    EwcTaskEmbeddingHyperNetActorSacMlpAgent
-from agent.sac.si_task_embedding_hypernet_actor_sac_agent import \
-    SiTaskEmbeddingHyperNetActorSacMlpAgent
-from agent.sac.agem_task_embedding_hypernet_actor_sac_agent import \
-    AgemTaskEmbeddingHyperNetActorSacMlpAgent
+_AGENT_MODULES = {
+    'SacMlpAgent': 'agent.sac.base_sac_agent',
+    'EwcSacMlpAgent': 'agent.sac.ewc_sac_agent',
+    'EwcSacMlpAgentV2': 'agent.sac.ewc_sac_agent_v2',
+    'EwcV2SacMlpAgentV2': 'agent.sac.ewc_v2_sac_agent_v2',
+    'SiSacMlpAgent': 'agent.sac.si_sac_agent',
+    'SiSacMlpAgentV2': 'agent.sac.si_sac_agent_v2',
+    'AgemSacMlpAgent': 'agent.sac.agem_sac_agent',
+    'AgemSacMlpAgentV2': 'agent.sac.agem_sac_agent_v2',
+    'AgemV2SacMlpAgentV2': 'agent.sac.agem_continual_actor_sac_agent',
+    'OracleAgemV2SacMlpAgentV2': 'agent.sac.oracle_agem_v2_sac_agent_v2',
+    'OracleGradAgemV2SacMlpAgentV2': 'agent.sac.oracle_grad_agem_v2_sac_agent_v2',
+    'OracleActorAgemV2SacMlpAgentV2': 'agent.sac.oracle_actor_agem_v2_sac_agent_v2',
+    'MultiHeadSacMlpAgent': 'agent.sac.mh_sac_agent',
+    'MultiHeadSacMlpAgentV2': 'agent.sac.mh_sac_agent_v2',
+    'IndividualSacMlpAgentV2': 'agent.sac.individual_sac_agent_v2',
+    'MultiInputSacMlpAgentV2': 'agent.sac.mi_sac_agent_v2',
+    'EwcMultiHeadSacMlpAgent': 'agent.sac.ewc_mh_sac_agent',
+    'EwcMultiHeadSacMlpAgentV2': 'agent.sac.ewc_mh_sac_agent_v2',
+    'EwcV2MultiHeadSacMlpAgentV2': 'agent.sac.ewc_v2_mh_sac_agent_v2',
+    'EwcV2MultiInputSacMlpAgentV2': 'agent.sac.ewc_v2_mi_sac_agent_v2',
+    'SiMultiHeadSacMlpAgent': 'agent.sac.si_mh_sac_agent',
+    'SiMultiHeadSacMlpAgentV2': 'agent.sac.si_mh_sac_agent_v2',
+    'SiMultiInputSacMlpAgentV2': 'agent.sac.si_mi_sac_agent_v2',
+    'AgemMultiHeadSacMlpAgent': 'agent.sac.agem_mh_sac_agent',
+    'AgemMultiHeadSacMlpAgentV2': 'agent.sac.agem_mh_sac_agent_v2',
+    'AgemMultiInputSacMlpAgentV2': 'agent.sac.agem_mi_sac_agent_v2',
+    'AgemV2MultiHeadSacMlpAgentV2': 'agent.sac.agem_continual_actor_mh_sac_agent',
+    'OracleAgemV2MultiHeadSacMlpAgentV2': 'agent.sac.oracle_agem_v2_mh_sac_agent_v2',
+    'OracleGradAgemV2MultiHeadSacMlpAgentV2': 'agent.sac.oracle_grad_agem_v2_mh_sac_agent_v2',
+    'OracleActorAgemV2MultiHeadSacMlpAgentV2': 'agent.sac.oracle_actor_agem_v2_mh_sac_agent_v2',
+    'AgemV2MultiInputSacMlpAgentV2': 'agent.sac.agem_continual_actor_mi_sac_agent',
+    'OracleAgemV2MultiInputSacMlpAgentV2': 'agent.sac.oracle_agem_v2_mi_sac_agent_v2',
+    'OracleGradAgemV2MultiInputSacMlpAgentV2': 'agent.sac.oracle_grad_agem_v2_mi_sac_agent_v2',
+    'OracleActorAgemV2MultiInputSacMlpAgentV2': 'agent.sac.oracle_actor_agem_v2_mi_sac_agent_v2',
+    'FisherBRCMTBCMlpCriticMultiHeadSacMlpAgent': 'agent.sac.fisher_brc_mt_bc_mlp_critic_mh_sac_agent',
+    'FisherBRCMTBCOffsetCriticMultiHeadSacMlpAgent': 'agent.sac.fisher_brc_mt_bc_offset_critic_mh_sac_agent',
+    'FisherBRCMHBCMlpCriticMultiHeadSacMlpAgent': 'agent.sac.fisher_brc_mh_bc_mlp_critic_mh_sac_agent',
+    'FisherBRCMHBCOffsetCriticMultiHeadSacMlpAgent': 'agent.sac.fisher_brc_mh_bc_offset_critic_mh_sac_agent',
+    'EwcV2GradNormRegCriticMultiHeadSacMlpAgentV2': 'agent.sac.ewc_v2_grad_norm_reg_critic_mh_sac_agent_v2',
+    'EwcV2GradNormRegCriticMultiInputSacMlpAgentV2': 'agent.sac.ewc_v2_grad_norm_reg_critic_mi_sac_agent_v2',
+    'AgemV2GradNormRegCriticMultiHeadSacMlpAgentV2': 'agent.sac.agem_continual_actor_grad_norm_reg_critic_mh_sac_agent',
+    'MultiInputSacMlpAgent': 'agent.sac.mi_sac_agent',
+    'AgemContinualActorCriticSacMlpAgent': 'agent.sac.agem_continual_actor_critic_sac_agent',
+    'AgemContinualActorCriticMultiHeadSacMlpAgent': 'agent.sac.agem_continual_actor_critic_mh_sac_agent',
+    'AgemContinualActorCriticMultiInputSacMlpAgent': 'agent.sac.agem_continual_actor_critic_mi_sac_agent',
+    'AgemContinualActorCriticGradNormRegCriticMultiHeadSacMlpAgent': 'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_mh_sac_agent',
+    'AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent': 'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_mi_sac_agent',
+    'AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiHeadSacMlpAgent': 'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mh_sac_agent',
+    'AgemContinualActorCriticGradNormRegCriticPrioritizedMemoryMultiInputSacMlpAgent': 'agent.sac.agem_continual_actor_critic_grad_norm_reg_critic_prioritized_memory_mi_sac_agent',
+    'DistilledActorMultiHeadSacMlpAgent': 'agent.sac.distilled_actor_mh_sac_agent',
+    'DistilledActorMultiInputSacMlpAgent': 'agent.sac.distilled_actor_mi_sac_agent',
+    'TaskEmbeddingHyperNetActorSacMlpAgent': 'agent.sac.task_embedding_hypernet_actor_sac_agent',
+    'EwcTaskEmbeddingHyperNetActorSacMlpAgent': 'agent.sac.ewc_task_embedding_hypernet_actor_sac_agent',
+    'SiTaskEmbeddingHyperNetActorSacMlpAgent': 'agent.sac.si_task_embedding_hypernet_actor_sac_agent',
+    'AgemTaskEmbeddingHyperNetActorSacMlpAgent': 'agent.sac.agem_task_embedding_hypernet_actor_sac_agent',
+    'TaskEmbeddingDistilledActorSacMlpAgent': 'agent.sac.task_embedding_distilled_actor_sac_agent',
+    'EwcTaskEmbeddingDistilledActorSacMlpAgent': 'agent.sac.ewc_task_embedding_distilled_actor_sac_agent',
+    'SiTaskEmbeddingDistilledActorSacMlpAgent': 'agent.sac.si_task_embedding_distilled_actor_sac_agent',
+    'AgemTaskEmbeddingDistilledActorSacMlpAgent': 'agent.sac.agem_task_embedding_distilled_actor_sac_agent',
+    'AdversarialWeightPermutationSacMlpAgent': 'agent.sac.awp_sac_agent',
+    'SparseGPHyperNetActorSacMlpAgent': 'agent.sac.sparse_gp_hypernet_actor_sac_agent',
+    'GPLatentVariableModelHyperNetActorSacMlpAgent': 'agent.sac.gp_lvm_hypernet_actor_sac_agent',
+}
 
-from agent.sac.task_embedding_distilled_actor_sac_agent import \
-    TaskEmbeddingDistilledActorSacMlpAgent
-from agent.sac.ewc_task_embedding_distilled_actor_sac_agent import \
-    EwcTaskEmbeddingDistilledActorSacMlpAgent
-from agent.sac.si_task_embedding_distilled_actor_sac_agent import \
-    SiTaskEmbeddingDistilledActorSacMlpAgent
-from agent.sac.agem_task_embedding_distilled_actor_sac_agent import \
-    AgemTaskEmbeddingDistilledActorSacMlpAgent
 
-from agent.sac.awp_sac_agent import AdversarialWeightPermutationSacMlpAgent
-from agent.sac.sparse_gp_hypernet_actor_sac_agent import \
-    SparseGPHyperNetActorSacMlpAgent
-from agent.sac.gp_lvm_hypernet_actor_sac_agent import \
-    GPLatentVariableModelHyperNetActorSacMlpAgent
+def __getattr__(name):
+    if name not in _AGENT_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_AGENT_MODULES[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_AGENT_MODULES))
@@ -27,6 +27,7 @@ class AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent(
                  batch_size=128,
                  agem_memory_budget=4500,
                  agem_ref_grad_batch_size=500,
+                 agem_memory_dtype='float32',
                  critic_grad_norm_reg_coeff=1.0,
                  ):
         AgemContinualActorCriticMultiInputSacMlpAgent.__init__(self, obs_shape, action_shape, action_range, device,
@@ -34,13 +35,14 @@ class AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent(
                                                                init_temperature, alpha_lr, actor_lr, actor_log_std_min,
                                                                actor_log_std_max, actor_update_freq, critic_lr,
                                                                critic_tau, critic_target_update_freq, batch_size,
-                                                               agem_memory_budget, agem_ref_grad_batch_size)
+                                                               agem_memory_budget, agem_ref_grad_batch_size,
+                                                               agem_memory_dtype)
 
         # TODO (cyzheng): agem_memory_budget is the memory budget for each task here
 
         self.critic_grad_norm_reg_coeff = critic_grad_norm_reg_coeff
 
-    def compute_critic_loss(self, obs, action, reward, next_obs, not_done, **kwargs):
+    def compute_critic_loss(self, obs, action, reward, next_obs, not_done, weights=None, **kwargs):
         with torch.no_grad():
             _, next_policy_action, next_log_pi, _ = self.actor(next_obs, **kwargs)
             target_Q1, target_Q2 = self.critic_target(next_obs, next_policy_action, **kwargs)
@@ -53,19 +55,14 @@ class AgemContinualActorCriticGradNormRegCriticMultiInputSacMlpAgent(
 
         # gradient norm regularization
         _, policy_action, _, _ = self.actor(obs, **kwargs)
-        reg_Q1, reg_Q2 = self.critic(obs, policy_action, **kwargs)
-
         # (cyzheng) reference: equation 10 in http://arxiv.org/abs/2103.08050.
-        # (cyzheng): create graph for second order derivatives
-        reg_Q1_grads = torch.autograd.grad(
-            reg_Q1.sum(), policy_action, create_graph=True)[0]
-        reg_Q2_grads = torch.autograd.grad(
-            reg_Q2.sum(), policy_action, create_graph=True)[0]
+        # (cyzheng): gradients w.r.t. actions are computed explicitly, i.e. no second order derivatives
+        _, _, reg_Q1_grads, reg_Q2_grads = self.critic.forward_with_action_grads(obs, policy_action, **kwargs)
         grad1_norm = torch.sum(torch.square(reg_Q1_grads), dim=-1)
         grad2_norm = torch.sum(torch.square(reg_Q2_grads), dim=-1)
         grad_norm_reg = torch.mean(grad1_norm + grad2_norm)
 
-        critic_loss = F.mse_loss(current_Q1, target_Q) + F.mse_loss(current_Q2, target_Q) + \
+        critic_loss = self._td_loss(current_Q1, current_Q2, target_Q, weights) + \
                       self.critic_grad_norm_reg_coeff * grad_norm_reg
 
         return critic_loss
@@ -2,7 +2,9 @@ import torch
 import numpy as np
 
 import utils
+from collectors import RolloutCollector
 from agent.sac.base_sac_agent import SacMlpAgent
+from buffers import compress_memory
 
 
 class AgemV2SacMlpAgentV2(SacMlpAgent):
@@ -27,6 +29,7 @@ class AgemV2SacMlpAgentV2(SacMlpAgent):
                  batch_size=128,
                  agem_memory_budget=4500,
                  agem_ref_grad_batch_size=500,
+                 agem_memory_dtype='float32',
                  ):
         super().__init__(obs_shape, action_shape, action_range, device, actor_hidden_dim, critic_hidden_dim,
                          discount, init_temperature, alpha_lr, actor_lr, actor_log_std_min, actor_log_std_max,
@@ -34,6 +37,7 @@ class AgemV2SacMlpAgentV2(SacMlpAgent):
 
         self.agem_memory_budget = agem_memory_budget
         self.agem_ref_grad_batch_size = agem_ref_grad_batch_size
+        self.agem_memory_dtype = agem_memory_dtype
 
         self.agem_task_count = 0
         self.agem_memories = {}
@@ -60,8 +64,8 @@ class AgemV2SacMlpAgentV2(SacMlpAgent):
 
             obses, actions, rewards, next_obses, not_dones, old_log_pis, qs = \
                 memory['obses'][idxs], memory['actions'][idxs], memory['rewards'][idxs], \
-                memory['next_obses'][idxs], memory['not_dones'][idxs], memory['log_pis'], \
-                memory['qs']
+                memory['next_obses'][idxs], memory['not_dones'][idxs], memory['log_pis'][idxs], \
+                memory['qs'][idxs]
 
             # (chongyi zheng): use PPO style gradient projection loss for actor
             log_pis = self.actor.compute_log_probs(obses, actions)
@@ -108,153 +112,71 @@ class AgemV2SacMlpAgentV2(SacMlpAgent):
                     param.grad.copy_(proj_grad[idx:idx + num_param].reshape(param.shape))
                     idx += num_param
 
+    def _memory_policy(self, obs, **kwargs):
+        # compute log_pi and Q for later gradient projection
+        _, action, log_pi, _ = self.actor(obs, compute_pi=True, compute_log_pi=True, **kwargs)
+        actor_Q1, actor_Q2 = self.critic(obs, action, **kwargs)
+        actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pi
+
+        if 'head_idx' in kwargs:
+            action = action.clamp(*self.action_range[kwargs['head_idx']])
+        else:
+            action = action.clamp(*self.action_range)
+
+        return {'actions': action, 'log_pis': log_pi, 'qs': actor_Q}
+
     def construct_memory(self, **kwargs):
         sample_src = kwargs.pop('sample_src', 'rollout')
         env = kwargs.pop('env')
         replay_buffer = kwargs.pop('replay_buffer')
 
+        # the budget counts environment steps, each step of a rollout stores one transition per environment
+        collector = RolloutCollector(env, self.device)
+        rows_per_step = 1 if sample_src == 'replay_buffer' else collector.num_envs
         memory_size_per_task = self.agem_memory_budget // (self.agem_task_count + 1)
-        self._adjust_memory_size(memory_size_per_task)
+        self._adjust_memory_size(memory_size_per_task * rows_per_step)
 
-        obs = env.reset()
-        self.agem_memories[self.agem_task_count] = {
-            'obses': [],
-            'actions': [],
-            'rewards': [],
-            'next_obses': [],
-            'not_dones': [],
-            'log_pis': [],
-            'qs': [],
-        }
         if sample_src == 'rollout':
-            for _ in range(memory_size_per_task):
-                with utils.eval_mode(self):
-                    # compute log_pi and Q for later gradient projection
-                    _, action, log_pi, _ = self.actor(
-                        torch.Tensor(obs).to(device=self.device),
-                        compute_pi=True, compute_log_pi=True, **kwargs)
-                    actor_Q1, actor_Q2 = self.critic(
-                        torch.Tensor(obs).to(device=self.device), action, **kwargs)
-                    actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pi
-
-                    if 'head_idx' in kwargs:
-                        action = utils.to_np(
-                            action.clamp(*self.action_range[kwargs['head_idx']]))
-                    else:
-                        action = utils.to_np(action.clamp(*self.action_range))
-
-                next_obs, reward, done, _ = env.step(action)
-
-                self.agem_memories[self.agem_task_count]['obses'].append(obs)
-                self.agem_memories[self.agem_task_count]['actions'].append(action)
-                self.agem_memories[self.agem_task_count]['rewards'].append(reward)
-                self.agem_memories[self.agem_task_count]['next_obses'].append(next_obs)
-                not_done = np.array([not done_ for done_ in done], dtype=np.float32)
-                self.agem_memories[self.agem_task_count]['not_dones'].append(not_done)
-                self.agem_memories[self.agem_task_count]['log_pis'].append(log_pi)
-                self.agem_memories[self.agem_task_count]['qs'].append(actor_Q)
-
-                obs = next_obs
-
-            self.agem_memories[self.agem_task_count]['obses'] = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['obses']).to(device=self.device)
-            self.agem_memories[self.agem_task_count]['actions'] = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['actions']).to(device=self.device)
-            self.agem_memories[self.agem_task_count]['rewards'] = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['rewards']).to(device=self.device).unsqueeze(-1)
-            self.agem_memories[self.agem_task_count]['next_obses'] = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['next_obses']).to(device=self.device)
-            self.agem_memories[self.agem_task_count]['not_dones'] = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['not_dones']).to(device=self.device).unsqueeze(-1)
-            self.agem_memories[self.agem_task_count]['log_pis'] = torch.cat(
-                self.agem_memories[self.agem_task_count]['log_pis']).unsqueeze(-1)
-            self.agem_memories[self.agem_task_count]['qs'] = torch.cat(
-                self.agem_memories[self.agem_task_count]['qs']).unsqueeze(-1)
+            rollout_size = memory_size_per_task
         elif sample_src == 'replay_buffer':
-            obses, actions, rewards, next_obses, not_dones = replay_buffer.sample(
-                memory_size_per_task)
-            with utils.eval_mode(self):
-                log_pis = self.actor.compute_log_probs(obses, actions, **kwargs)
-                actor_Q1, actor_Q2 = self.critic(
-                    obses, actions, **kwargs)
-                actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pis
-
-            self.agem_memories[self.agem_task_count]['obses'] = obses
-            self.agem_memories[self.agem_task_count]['actions'] = actions
-            self.agem_memories[self.agem_task_count]['rewards'] = rewards
-            self.agem_memories[self.agem_task_count]['next_obses'] = next_obses
-            self.agem_memories[self.agem_task_count]['not_dones'] = not_dones
-            self.agem_memories[self.agem_task_count]['log_pis'] = log_pis
-            self.agem_memories[self.agem_task_count]['qs'] = actor_Q
+            rollout_size = 0
         elif sample_src == 'hybrid':
-            for _ in range(memory_size_per_task // 2):
-                with utils.eval_mode(self):
-                    # compute log_pi and Q for later gradient projection
-                    _, action, log_pi, _ = self.actor(
-                        torch.Tensor(obs).to(device=self.device),
-                        compute_pi=True, compute_log_pi=True, **kwargs)
-                    actor_Q1, actor_Q2 = self.critic(
-                        torch.Tensor(obs).to(device=self.device), action, **kwargs)
-                    actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pi
-
-                    if 'head_idx' in kwargs:
-                        action = utils.to_np(
-                            action.clamp(*self.action_range[kwargs['head_idx']]))
-                    else:
-                        action = utils.to_np(action.clamp(*self.action_range))
-
-                next_obs, reward, done, _ = env.step(action)
-
-                self.agem_memories[self.agem_task_count]['obses'].append(obs)
-                self.agem_memories[self.agem_task_count]['actions'].append(action)
-                self.agem_memories[self.agem_task_count]['rewards'].append(reward)
-                self.agem_memories[self.agem_task_count]['next_obses'].append(next_obs)
-                not_done = np.array([not done_ for done_ in done], dtype=np.float32)
-                self.agem_memories[self.agem_task_count]['not_dones'].append(not_done)
-                self.agem_memories[self.agem_task_count]['log_pis'].append(log_pi)
-                self.agem_memories[self.agem_task_count]['qs'].append(actor_Q)
-
-                obs = next_obs
-
-            rollout_obses = torch.Tensor(self.agem_memories[self.agem_task_count]['obses']).to(device=self.device)
-            rollout_actions = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['actions']).to(device=self.device)
-            rollout_rewards = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['rewards']).to(device=self.device).unsqueeze(-1)
-            rollout_next_obses = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['next_obses']).to(device=self.device)
-            rollout_not_dones = torch.Tensor(
-                self.agem_memories[self.agem_task_count]['not_dones']).to(device=self.device).unsqueeze(-1)
-            rollout_log_pis = torch.cat(
-                self.agem_memories[self.agem_task_count]['log_pis']).unsqueeze(-1)
-            rollout_qs = torch.cat(
-                self.agem_memories[self.agem_task_count]['qs']).unsqueeze(-1)
+            rollout_size = memory_size_per_task // 2
+        else:
+            raise ValueError("Unknown sample source!")
+
+        memory = {}
+        if rollout_size > 0:
+            with utils.eval_mode(self):
+                rollouts = collector.collect(
+                    lambda obs: self._memory_policy(obs, **kwargs), rollout_size * collector.num_envs)
+            memory['rollout'] = rollouts
 
+        if rollout_size < memory_size_per_task:
             obses, actions, rewards, next_obses, not_dones = replay_buffer.sample(
-                memory_size_per_task - memory_size_per_task // 2)
+                memory_size_per_task - rollout_size)
             with utils.eval_mode(self):
                 log_pis = self.actor.compute_log_probs(obses, actions, **kwargs)
                 actor_Q1, actor_Q2 = self.critic(
                     obses, actions, **kwargs)
                 actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pis
 
-            self.agem_memories[self.agem_task_count]['obses'] = \
-                torch.cat([rollout_obses, obses], dim=0)
-            self.agem_memories[self.agem_task_count]['actions'] = \
-                torch.cat([rollout_actions, actions], dim=0)
-            self.agem_memories[self.agem_task_count]['rewards'] = \
-                torch.cat([rollout_rewards, rewards], dim=0)
-            self.agem_memories[self.agem_task_count]['next_obses'] = \
-                torch.cat([rollout_next_obses, next_obses], dim=0)
-            self.agem_memories[self.agem_task_count]['not_dones'] = \
-                torch.cat([rollout_not_dones, not_dones], dim=0)
-            self.agem_memories[self.agem_task_count]['log_pis'] = \
-                torch.cat([rollout_log_pis, log_pis], dim=0)
-            self.agem_memories[self.agem_task_count]['qs'] = \
-                torch.cat([rollout_qs, actor_Q], dim=0)
-        else:
-            raise ValueError("Unknown sample source!")
+            memory['replay_buffer'] = {
+                'obses': obses,
+                'actions': actions,
+                'rewards': rewards,
+                'next_obses': next_obses,
+                'not_dones': not_dones,
+                'log_pis': log_pis.detach(),
+                'qs': actor_Q.detach(),
+            }
+
+        self.agem_memories[self.agem_task_count] = {
+            key: torch.cat([samples[key] for samples in memory.values()], dim=0)
+            for key in ['obses', 'actions', 'rewards', 'next_obses', 'not_dones', 'log_pis', 'qs']
+        }
 
+        compress_memory(self.agem_memories[self.agem_task_count], self.agem_memory_dtype)
         self.agem_task_count += 1
 
     def update_actor_and_alpha(self, log_pi, actor_loss, logger, step, alpha_loss=None, ref_actor_grad=None):
@@ -279,12 +201,13 @@ class AgemV2SacMlpAgentV2(SacMlpAgent):
             self.log_alpha_optimizer.step()
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             ref_actor_grad = self._compute_ref_grad()
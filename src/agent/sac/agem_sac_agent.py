@@ -4,6 +4,7 @@ from collections.abc import Iterable
 
 import utils
 from agent.sac.base_sac_agent import SacMlpAgent
+from buffers import compress_memory
 
 
 class AgemSacMlpAgent(SacMlpAgent):
@@ -28,6 +29,7 @@ class AgemSacMlpAgent(SacMlpAgent):
                  batch_size=128,
                  agem_memory_budget=4500,
                  agem_ref_grad_batch_size=500,
+                 agem_memory_dtype='float32',
                  ):
         super().__init__(obs_shape, action_shape, action_range, device, actor_hidden_dim, critic_hidden_dim, discount,
                          init_temperature, alpha_lr, actor_lr, actor_log_std_min, actor_log_std_max,
@@ -35,6 +37,7 @@ class AgemSacMlpAgent(SacMlpAgent):
 
         self.agem_memory_budget = agem_memory_budget
         self.agem_ref_grad_batch_size = agem_ref_grad_batch_size
+        self.agem_memory_dtype = agem_memory_dtype
 
         self.agem_task_count = 0
         self.agem_memories = {}
@@ -149,6 +152,7 @@ class AgemSacMlpAgent(SacMlpAgent):
             'not_dones': not_dones,
         }
 
+        compress_memory(self.agem_memories[self.agem_task_count], self.agem_memory_dtype)
         self.agem_task_count += 1
 
     def update_critic(self, critic_loss, logger, step, ref_critic_grad=None):
@@ -187,14 +191,15 @@ class AgemSacMlpAgent(SacMlpAgent):
             self.log_alpha_optimizer.step()
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
         ref_critic_grad, ref_actor_grad, ref_alpha_grad = self._compute_ref_grad()
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         self.update_critic(critic_loss, logger, step, ref_critic_grad=ref_critic_grad)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
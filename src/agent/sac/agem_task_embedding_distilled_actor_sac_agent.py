@@ -3,8 +3,8 @@ import torch
 from torch.distributions import Independent, Normal
 from torch.distributions.kl import kl_divergence
 
-import utils
 from agent.sac import TaskEmbeddingDistilledActorSacMlpAgent
+from buffers import compress_memory
 
 
 class AgemTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacMlpAgent):
@@ -35,10 +35,12 @@ class AgemTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacM
             distillation_memory_budget_per_task=50000,
             agem_memory_budget=5000,
             agem_ref_grad_batch_size=500,
+            agem_memory_dtype='float32',
             agem_clip_param=0.2,
     ):
         self.agem_memory_budget = agem_memory_budget
         self.agem_ref_grad_batch_size = agem_ref_grad_batch_size
+        self.agem_memory_dtype = agem_memory_dtype
         self.agem_clip_param = agem_clip_param
 
         super().__init__(
@@ -69,96 +71,13 @@ class AgemTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacM
         # memory_size_per_task = self.agem_memory_budget // (self.agem_task_count + 1)
         # self._adjust_memory_size(memory_size_per_task)
 
-        obs = env.reset()
+        samples = self._collect_actor_samples(env, replay_buffer, sample_src, self.agem_memory_budget,
+                                              head_idx=task_idx, **kwargs)
         self.agem_memories[self.agem_task_count] = {
-            'obses': [],
-            'mus': [],
-            'log_stds': [],
+            key: samples[key] for key in ['obses', 'mus', 'log_stds']
         }
-        if sample_src == 'rollout':
-            rollout_obses, rollout_mus, rollout_log_stds = [], [], []
-            for _ in range(self.agem_memory_budget):
-                with utils.eval_mode(self):
-                    mu, action, _, log_std = self.actor(
-                        torch.Tensor(obs).to(device=self.device),
-                        compute_pi=True, compute_log_pi=True, **kwargs)
-
-                    action = utils.to_np(
-                        action.clamp(*self.action_range[task_idx]))
-                    mu = utils.to_np(mu)
-                    log_std = utils.to_np(log_std)
-
-                next_obs, reward, done, _ = env.step(action)
-
-                rollout_obses.append(obs)
-                rollout_mus.append(mu)
-                rollout_log_stds.append(log_std)
-
-                obs = next_obs
-            self.agem_memories[self.agem_task_count]['obses'] = np.asarray(rollout_obses)
-            self.agem_memories[self.agem_task_count]['mus'] = np.asarray(rollout_mus)
-            self.agem_memories[self.agem_task_count]['log_stds'] = np.asarray(rollout_log_stds)
-        elif sample_src == 'replay_buffer':  # FIXME (cyzheng)
-            obses, _, _, _, _ = replay_buffer.sample(
-                self.agem_memory_budget)
-
-            with utils.eval_mode(self):
-                mus, _, _, log_stds = self.actor(
-                    obses, compute_pi=True, compute_log_pi=True,
-                    **kwargs)
-
-                obses = utils.to_np(obses)
-                mus = utils.to_np(mus)
-                log_stds = utils.to_np(log_stds)
-
-            self.agem_memories[self.agem_task_count]['obses'] = obses
-            self.agem_memories[self.agem_task_count]['mus'] = mus
-            self.agem_memories[self.agem_task_count]['log_stds'] = log_stds
-        elif sample_src == 'hybrid':
-            rollout_obses, rollout_mus, rollout_log_stds = [], [], []
-            for _ in range(self.agem_memory_budget // 2):
-                with utils.eval_mode(self):
-                    mu, action, _, log_std = self.actor(
-                        torch.Tensor(obs).to(device=self.device),
-                        compute_pi=True, compute_log_pi=True, **kwargs)
-
-                    action = utils.to_np(
-                        action.clamp(*self.action_range[task_idx]))
-                    mu = utils.to_np(mu)
-                    log_std = utils.to_np(log_std)
-
-                next_obs, reward, done, _ = env.step(action)
-
-                rollout_obses.append(obs)
-                rollout_mus.append(mu)
-                rollout_log_stds.append(log_std)
-
-                obs = next_obs
-            rollout_obses = np.asarray(rollout_obses)
-            rollout_mus = np.asarray(rollout_mus)
-            rollout_log_stds = np.asarray(rollout_log_stds)
-
-            obses, _, _, _, _ = replay_buffer.sample(
-                self.agem_memory_budget -
-                self.agem_memory_budget // 2)
-            with utils.eval_mode(self):
-                mus, _, _, log_stds = self.actor(
-                    obses, compute_pi=True, compute_log_pi=True,
-                    **kwargs)
-
-                obses = utils.to_np(obses)
-                mus = utils.to_np(mus)
-                log_stds = utils.to_np(log_stds)
-
-            self.agem_memories[self.agem_task_count]['obses'] = \
-                np.concatenate([rollout_obses, obses], axis=0)
-            self.agem_memories[self.agem_task_count]['mus'] = \
-                np.concatenate([rollout_mus, mus], axis=0)
-            self.agem_memories[self.agem_task_count]['log_stds'] = \
-                np.concatenate([rollout_log_stds, log_stds], axis=0)
-        else:
-            raise ValueError("Unknown sample source!")
 
+        compress_memory(self.agem_memories[self.agem_task_count], self.agem_memory_dtype)
         self.agem_task_count += 1
 
     def _compute_ref_grad(self):
@@ -174,10 +93,6 @@ class AgemTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacM
             batch_obses, batch_mus, batch_log_stds = \
                 memory['obses'][idxs], memory['mus'][idxs], memory['log_stds'][idxs]
 
-            batch_obses = torch.Tensor(batch_obses).to(self.device).squeeze()
-            batch_mus = torch.Tensor(batch_mus).to(self.device).squeeze()
-            batch_log_stds = torch.Tensor(batch_log_stds).to(self.device).squeeze()
-
             # compute distillation loss
             mus, _, _, log_stds = self.distilled_actor(
                 batch_obses, task_idx,
@@ -228,11 +143,11 @@ class AgemTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacM
 
     def _train_distilled_actor(self, dataset, total_steps, epoch, logger):
         for iter in range(self.distillation_iters_per_epoch):
-            random_idxs = np.random.randint(0, self.distillation_memory_budget_per_task,
+            random_idxs = np.random.randint(0, len(dataset['obses']),
                                             size=self.distillation_batch_size)
-            batch_obses = torch.Tensor(dataset['obses'][random_idxs]).to(self.device).squeeze()
-            batch_mus = torch.Tensor(dataset['mus'][random_idxs]).to(self.device).squeeze()
-            batch_log_stds = torch.Tensor(dataset['log_stds'][random_idxs]).to(self.device).squeeze()
+            batch_obses = dataset['obses'][random_idxs].to(self.device)
+            batch_mus = dataset['mus'][random_idxs].to(self.device)
+            batch_log_stds = dataset['log_stds'][random_idxs].to(self.device)
             task_id = dataset['task_id']
 
             # regularize with AGEM
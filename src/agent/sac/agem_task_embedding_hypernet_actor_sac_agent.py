@@ -3,6 +3,8 @@ import torch
 
 import utils
 from agent.sac import TaskEmbeddingHyperNetActorSacMlpAgent
+from buffers import compress_memory
+from collectors import RolloutCollector
 
 
 class AgemTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlpAgent):
@@ -33,6 +35,7 @@ class AgemTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlp
             hypernet_first_order=True,
             agem_memory_budget=5000,
             agem_ref_grad_batch_size=500,
+            agem_memory_dtype='float32',
             agem_clip_param=0.2,
     ):
         super().__init__(
@@ -43,6 +46,7 @@ class AgemTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlp
 
         self.agem_memory_budget = agem_memory_budget
         self.agem_ref_grad_batch_size = agem_ref_grad_batch_size
+        self.agem_memory_dtype = agem_memory_dtype
         self.agem_clip_param = agem_clip_param
 
         self.agem_task_count = 0
@@ -57,6 +61,14 @@ class AgemTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlp
     #         mem['next_obses'] = mem['next_obses'][:size]
     #         mem['not_dones'] = mem['not_dones'][:size]
 
+    def _memory_policy(self, obs, weights, **kwargs):
+        # compute log_pi and Q for later gradient projection
+        _, action, log_pi, _ = self.actor(obs, compute_pi=True, compute_log_pi=True, weights=weights)
+        actor_Q1, actor_Q2 = self.critic(obs, action, **kwargs)
+        actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pi
+
+        return {'actions': action, 'log_pis': log_pi, 'qs': actor_Q}
+
     def construct_memory(self, **kwargs):
         sample_src = kwargs.pop('sample_src', 'rollout')
         env = kwargs.pop('env')
@@ -66,159 +78,52 @@ class AgemTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlp
         # memory_size_per_task = self.agem_memory_budget // (self.agem_task_count + 1)
         # self._adjust_memory_size(memory_size_per_task)
 
-        obs = env.reset()
-        self.agem_memories[self.agem_task_count] = {
-            'obses': [],
-            'actions': [],
-            'rewards': [],
-            'next_obses': [],
-            'not_dones': [],
-            'log_pis': [],
-            'qs': [],
-        }
         if sample_src == 'rollout':
-            rollout_obses, rollout_actions, rollout_rewards, rollout_next_obses, \
-            rollout_not_dones, rollout_log_pis, rollout_qs = [], [], [], [], [], [], []
-
-            with utils.eval_mode(self):
-                weights = self.hypernet(task_idx)
-
-            for _ in range(self.agem_memory_budget):
-                with utils.eval_mode(self):
-                    # compute log_pi and Q for later gradient projection
-                    _, action, log_pi, _ = self.actor(
-                        torch.Tensor(obs).to(device=self.device),
-                        compute_pi=True, compute_log_pi=True, weights=weights)
-                    actor_Q1, actor_Q2 = self.critic(
-                        torch.Tensor(obs).to(device=self.device), action, **kwargs)
-                    actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pi
-
-                    action = utils.to_np(action)
-                    log_pi = utils.to_np(log_pi)
-                    actor_Q = utils.to_np(actor_Q)
-
-                next_obs, reward, done, _ = env.step(action)
-
-                rollout_obses.append(obs)
-                rollout_actions.append(action)
-                rollout_rewards.append([reward])
-                rollout_next_obses.append(next_obs)
-                not_done = np.array([[not done_ for done_ in done]], dtype=np.float32)
-                rollout_not_dones.append(not_done)
-                rollout_log_pis.append(log_pi)
-                rollout_qs.append(actor_Q)
-
-                obs = next_obs
-
-            self.agem_memories[self.agem_task_count]['obses'] = np.asarray(rollout_obses)
-            self.agem_memories[self.agem_task_count]['actions'] = np.asarray(rollout_actions)
-            self.agem_memories[self.agem_task_count]['rewards'] = np.asarray(rollout_rewards)
-            self.agem_memories[self.agem_task_count]['next_obses'] = np.asarray(rollout_next_obses)
-            self.agem_memories[self.agem_task_count]['not_dones'] = np.asarray(rollout_not_dones)
-            self.agem_memories[self.agem_task_count]['log_pis'] = np.asarray(rollout_log_pis)
-            self.agem_memories[self.agem_task_count]['qs'] = np.asarray(rollout_qs)
-
+            rollout_size = self.agem_memory_budget
         elif sample_src == 'replay_buffer':
-            obses, actions, rewards, next_obses, not_dones = replay_buffer.sample(
-                self.agem_memory_budget)
-
-            with utils.eval_mode(self):
-                weights = self.hypernet(task_idx)
-                log_pis = self.actor.compute_log_probs(obses, actions, **kwargs, weights=weights)
-                actor_Q1, actor_Q2 = self.critic(
-                    obses, actions, **kwargs)
-                actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pis
-
-                obses = utils.to_np(obses)
-                actions = utils.to_np(actions)
-                rewards = utils.to_np(rewards)
-                next_obses = utils.to_np(next_obses)
-                not_dones = utils.to_np(not_dones)
-                log_pis = utils.to_np(log_pis)
-                actor_Q = utils.to_np(actor_Q)
-
-            self.agem_memories[self.agem_task_count]['obses'] = obses
-            self.agem_memories[self.agem_task_count]['actions'] = actions
-            self.agem_memories[self.agem_task_count]['rewards'] = rewards
-            self.agem_memories[self.agem_task_count]['next_obses'] = next_obses
-            self.agem_memories[self.agem_task_count]['not_dones'] = not_dones
-            self.agem_memories[self.agem_task_count]['log_pis'] = log_pis
-            self.agem_memories[self.agem_task_count]['qs'] = actor_Q
+            rollout_size = 0
         elif sample_src == 'hybrid':
-            rollout_obses, rollout_actions, rollout_rewards, rollout_next_obses, \
-            rollout_not_dones, rollout_log_pis, rollout_qs = [], [], [], [], [], [], []
+            rollout_size = self.agem_memory_budget // 2
+        else:
+            raise ValueError("Unknown sample source!")
 
+        with utils.eval_mode(self), torch.no_grad():
+            weights = self.hypernet(task_idx)
+
+        memory = []
+        if rollout_size > 0:
             with utils.eval_mode(self):
-                weights = self.hypernet(task_idx)
-
-            for _ in range(self.agem_memory_budget // 2):
-                with utils.eval_mode(self):
-                    # compute log_pi and Q for later gradient projection
-                    _, action, log_pi, _ = self.actor(
-                        torch.Tensor(obs).to(device=self.device),
-                        compute_pi=True, compute_log_pi=True, weights=weights)
-                    actor_Q1, actor_Q2 = self.critic(
-                        torch.Tensor(obs).to(device=self.device), action, **kwargs)
-                    actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pi
-
-                    action = utils.to_np(action)
-                    log_pi = utils.to_np(log_pi)
-                    actor_Q = utils.to_np(actor_Q)
-
-                next_obs, reward, done, _ = env.step(action)
-
-                rollout_obses.append(obs)
-                rollout_actions.append(action)
-                rollout_rewards.append([reward])
-                rollout_next_obses.append(next_obs)
-                not_done = np.array([[not done_ for done_ in done]], dtype=np.float32)
-                rollout_not_dones.append(not_done)
-                rollout_log_pis.append(log_pi)
-                rollout_qs.append(actor_Q)
-
-                obs = next_obs
-            rollout_obses = np.asarray(rollout_obses)
-            rollout_actions = np.asarray(rollout_actions)
-            rollout_rewards = np.asarray(rollout_rewards)
-            rollout_next_obses = np.asarray(rollout_next_obses)
-            rollout_not_dones = np.asarray(rollout_not_dones)
-            rollout_log_pis = np.asarray(rollout_log_pis)
-            rollout_qs = np.asarray(rollout_qs)
+                # the budget counts environment steps, each step stores one transition per environment
+                collector = RolloutCollector(env, self.device)
+                memory.append(collector.collect(
+                    lambda obs: self._memory_policy(obs, weights, **kwargs), rollout_size * collector.num_envs))
 
+        if rollout_size < self.agem_memory_budget:
             obses, actions, rewards, next_obses, not_dones = replay_buffer.sample(
-                self.agem_memory_budget - self.agem_memory_budget // 2)
+                self.agem_memory_budget - rollout_size)
 
-            with utils.eval_mode(self):
+            with utils.eval_mode(self), torch.no_grad():
                 log_pis = self.actor.compute_log_probs(obses, actions, weights=weights)
                 actor_Q1, actor_Q2 = self.critic(
                     obses, actions, **kwargs)
                 actor_Q = torch.min(actor_Q1, actor_Q2) - self.alpha.detach() * log_pis
 
-                obses = utils.to_np(obses)
-                actions = utils.to_np(actions)
-                rewards = utils.to_np(rewards)
-                next_obses = utils.to_np(next_obses)
-                not_dones = utils.to_np(not_dones)
-                log_pis = utils.to_np(log_pis)
-                actor_Q = utils.to_np(actor_Q)
-
-            self.agem_memories[self.agem_task_count]['obses'] = \
-                np.concatenate([rollout_obses, obses], axis=0)
-            self.agem_memories[self.agem_task_count]['actions'] = \
-                np.concatenate([rollout_actions, actions], axis=0)
-            self.agem_memories[self.agem_task_count]['rewards'] = \
-                np.concatenate([rollout_rewards, rewards], axis=0)
-            self.agem_memories[self.agem_task_count]['next_obses'] = \
-                np.concatenate([rollout_next_obses, next_obses], axis=0)
-            self.agem_memories[self.agem_task_count]['not_dones'] = \
-                np.concatenate([rollout_not_dones, not_dones], axis=0)
-            self.agem_memories[self.agem_task_count]['log_pis'] = \
-                np.concatenate([rollout_log_pis, log_pis], axis=0)
-            self.agem_memories[self.agem_task_count]['qs'] = \
-                np.concatenate([rollout_qs, actor_Q], axis=0)
-        else:
-            raise ValueError("Unknown sample source!")
+            memory.append({
+                'obses': obses,
+                'actions': actions,
+                'rewards': rewards,
+                'next_obses': next_obses,
+                'not_dones': not_dones,
+                'log_pis': log_pis,
+                'qs': actor_Q,
+            })
+
+        self.agem_memories[self.agem_task_count] = {
+            key: torch.cat([part[key] for part in memory], dim=0)
+            for key in ['obses', 'actions', 'rewards', 'next_obses', 'not_dones', 'log_pis', 'qs']
+        }
 
+        compress_memory(self.agem_memories[self.agem_task_count], self.agem_memory_dtype)
         self.agem_task_count += 1
 
     def _compute_ref_grad(self):
@@ -236,11 +141,6 @@ class AgemTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlp
                 memory['next_obses'][idxs], memory['not_dones'][idxs], memory['log_pis'][idxs], \
                 memory['qs'][idxs]
 
-            obses = torch.Tensor(obses).to(self.device)
-            actions = torch.Tensor(actions).to(self.device)
-            old_log_pis = torch.Tensor(old_log_pis).to(self.device)
-            qs = torch.Tensor(qs).to(self.device)
-
             # (cyzheng): Is it critical to normalize Q?
             qs = (qs - qs.mean()) / (qs.std() + 1e-5)
 
@@ -119,12 +119,13 @@ class AdversarialWeightPermutationSacMlpAgent(SacMlpAgent):
         return self.actor.diff_weights()
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             diff_weights = self.compute_actor_diff_weights(obs, **kwargs)
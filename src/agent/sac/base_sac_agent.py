@@ -47,6 +47,9 @@ class SacMlpAgent:
         self.batch_size = batch_size
 
         self.training = False
+        # indices and TD errors of the last prioritized batch, see 'sample_transitions' and 'update_priorities'
+        self._sampled_idxs = None
+        self._td_errors = None
 
         self._setup_agent()
 
@@ -117,17 +120,51 @@ class SacMlpAgent:
 
         return utils.to_np(action)
 
-    def compute_critic_loss(self, obs, action, reward, next_obs, not_done, **kwargs):
+    def sample_transitions(self, replay_buffer):
+        """Sample a batch of transitions, by priority if the buffer is prioritized
+
+        Returns:
+        The transitions and their importance sampling weights for 'compute_critic_loss', None if the batch is
+        sampled uniformly.
+        """
+        if hasattr(replay_buffer, 'sample_prioritized'):
+            obs, action, reward, next_obs, not_done, weights, self._sampled_idxs = \
+                replay_buffer.sample_prioritized(self.batch_size)
+        else:
+            obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+            weights = None
+
+        return obs, action, reward, next_obs, not_done, weights
+
+    def update_priorities(self, replay_buffer):
+        """Set the priorities of the last prioritized batch to the TD errors of its critic loss"""
+        if self._sampled_idxs is not None and self._td_errors is not None:
+            replay_buffer.update_priorities(self._sampled_idxs, self._td_errors)
+        self._sampled_idxs = None
+        self._td_errors = None
+
+    def _td_loss(self, current_Q1, current_Q2, target_Q, weights=None):
+        if weights is None:
+            return F.mse_loss(current_Q1, target_Q) + F.mse_loss(current_Q2, target_Q)
+
+        td_error1 = current_Q1 - target_Q
+        td_error2 = current_Q2 - target_Q
+        self._td_errors = (0.5 * (td_error1.abs() + td_error2.abs())).detach()
+
+        return (weights * (td_error1 ** 2 + td_error2 ** 2)).mean()
+
+    def compute_critic_loss(self, obs, action, reward, next_obs, not_done, weights=None, **kwargs):
         with torch.no_grad():
             _, policy_action, log_pi, _ = self.actor(next_obs, **kwargs)
             target_Q1, target_Q2 = self.critic_target(next_obs, policy_action, **kwargs)
             target_V = torch.min(target_Q1,
                                  target_Q2) - self.alpha.detach() * log_pi
+            # n-step transitions of the replay buffer carry discount^(n - 1) in not_done
             target_Q = reward + (not_done * self.discount * target_V)
 
         # get current Q estimates
         current_Q1, current_Q2 = self.critic(obs, action, **kwargs)
-        critic_loss = F.mse_loss(current_Q1, target_Q) + F.mse_loss(current_Q2, target_Q)
+        critic_loss = self._td_loss(current_Q1, current_Q2, target_Q, weights)
 
         return critic_loss
 
@@ -170,12 +207,13 @@ class SacMlpAgent:
             self.log_alpha_optimizer.step()
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
@@ -188,7 +226,7 @@ class SacMlpAgent:
     def save(self, model_dir, step=None):
         suffix = ''
         if step is not None:
-            suffix = '_%s'.format(step)
+            suffix = '_%s' % step
 
         torch.save(
             self.actor.state_dict(), '%s/actor%s.pt' % (model_dir, suffix)
@@ -200,7 +238,7 @@ class SacMlpAgent:
     def load(self, model_dir, step=None):
         suffix = ''
         if step is not None:
-            suffix = '_%s'.format(step)
+            suffix = '_%s' % step
 
         self.actor.load_state_dict(
             torch.load('%s/actor%s.pt' % (model_dir, suffix))
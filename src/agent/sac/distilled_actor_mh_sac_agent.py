@@ -5,6 +5,8 @@ from torch.distributions import Independent, Normal
 from torch.distributions.kl import kl_divergence
 
 import utils
+from buffers import DistillationMemory
+from collectors import RolloutCollector
 
 from agent.sac.base_sac_agent import SacMlpAgent
 from agent.network import MultiHeadSacActorMlp, SacCriticMlp
@@ -34,6 +36,10 @@ class DistilledActorMultiHeadSacMlpAgent(SacMlpAgent):
             distill_iters_per_epoch=50,
             distill_batch_size=1000,
             distill_memory_budget_per_task=50000,
+            distill_refresh_interval=1,
+            distill_prev_task_batch_num=3,
+            distill_memory_device='cpu',
+            distill_memory_dtype='float32',
     ):
         assert isinstance(action_shape, list)
         assert isinstance(action_range, list)
@@ -46,9 +52,14 @@ class DistilledActorMultiHeadSacMlpAgent(SacMlpAgent):
         self.distill_iters_per_epoch = distill_iters_per_epoch
         self.distill_batch_size = distill_batch_size
         self.distill_memory_budget_per_task = distill_memory_budget_per_task
+        self.distill_refresh_interval = distill_refresh_interval
+        self.distill_prev_task_batch_num = distill_prev_task_batch_num
 
         self.task_count = 0
-        self.memories = []
+        self.distill_memory = DistillationMemory(
+            self.obs_shape, self.action_shape[0], len(self.action_shape),
+            distill_memory_budget_per_task, device, storage_device=distill_memory_device,
+            obs_dtype=distill_memory_dtype)
 
     def _setup_agent(self):
         if hasattr(self, 'actor') and hasattr(self, 'critic') \
@@ -90,31 +101,30 @@ class DistilledActorMultiHeadSacMlpAgent(SacMlpAgent):
         # save initial parameters
         self._critic_init_state = copy.deepcopy(self.critic.state_dict())
 
-    def _train_distilled_actor(self, dataset, step, logger):
-        losses = []
-        for subset in dataset:
-            random_idxs = np.random.randint(0, self.distill_memory_budget_per_task,
-                                            size=self.distill_batch_size)
-            batch_obses = torch.Tensor(subset['obses'][random_idxs]).to(self.device)
-            batch_mus = torch.Tensor(subset['mus'][random_idxs]).to(self.device)
-            batch_log_stds = torch.Tensor(subset['log_stds'][random_idxs]).to(self.device)
-            task_id = subset['task_id']
+    def _sample_distill_task_ids(self):
+        # one batch of the current task and one batch for each uniformly sampled previous task
+        task_ids = np.full(self.distill_batch_size, self.task_count)
+        if self.task_count > 0:
+            prev_task_ids = np.random.randint(0, self.task_count, size=self.distill_prev_task_batch_num)
+            task_ids = np.concatenate([task_ids, np.repeat(prev_task_ids, self.distill_batch_size)])
 
-            mus, _, _, log_stds = self.distilled_actor(
-                batch_obses, task_id,
-                compute_pi=True, compute_log_pi=True)
+        return task_ids
 
-            actor_dists = Independent(Normal(loc=batch_mus, scale=batch_log_stds.exp()), 1)
-            distilled_actor_dists = Independent(Normal(loc=mus, scale=log_stds.exp()), 1)
-            losses.append(torch.mean(kl_divergence(actor_dists, distilled_actor_dists)))
-        loss = torch.mean(torch.stack(losses))
+    def _train_distilled_actor(self, batch):
+        obses, batch_mus, batch_log_stds, task_ids = batch
+        mus, log_stds = self.distilled_actor.forward_heads(obses, task_ids)
 
-        logger.log('train/distillation_loss', loss, step)
+        actor_dists = Independent(Normal(loc=batch_mus, scale=batch_log_stds.exp()), 1)
+        distilled_actor_dists = Independent(Normal(loc=mus, scale=log_stds.exp()), 1)
+        # every task contributes the same number of rows, i.e. this is the mean of per-task losses
+        loss = torch.mean(kl_divergence(actor_dists, distilled_actor_dists))
 
         self.distilled_actor_optimizer.zero_grad()
         loss.backward()
         self.distilled_actor_optimizer.step()
 
+        return loss.detach()
+
     def act(self, obs, sample=False, use_distilled_actor=False, **kwargs):
         if not isinstance(obs, torch.Tensor):
             obs = torch.Tensor(obs).to(self.device)
@@ -131,6 +141,37 @@ class DistilledActorMultiHeadSacMlpAgent(SacMlpAgent):
 
         return utils.to_np(action)
 
+    def _distill_policy(self, obs, **kwargs):
+        mu, action, _, log_std = self.actor(obs, compute_pi=True, compute_log_pi=True, **kwargs)
+        if 'head_idx' in kwargs:
+            action = action.clamp(*self.action_range[kwargs['head_idx']])
+        else:
+            action = action.clamp(*self.action_range)
+
+        return {'actions': action, 'mus': mu, 'log_stds': log_std}
+
+    def _collect_distill_data(self, collector, rollout_size, replay_buffer, **kwargs):
+        storage_device = self.distill_memory.storage_device
+        obses, mus, log_stds = [], [], []
+        if rollout_size > 0:
+            with utils.eval_mode(self):
+                rollouts = collector.collect(
+                    lambda obs: self._distill_policy(obs, **kwargs), rollout_size * collector.num_envs)
+            obses.append(rollouts['obses'])
+            mus.append(rollouts['mus'])
+            log_stds.append(rollouts['log_stds'])
+
+        if rollout_size < self.distill_memory_budget_per_task:
+            replay_obses, _, _, _, _ = replay_buffer.sample(
+                self.distill_memory_budget_per_task - rollout_size)
+            with utils.eval_mode(self), torch.no_grad():
+                outputs = self._distill_policy(replay_obses, **kwargs)
+            obses.append(replay_obses.to(storage_device))
+            mus.append(outputs['mus'].to(storage_device))
+            log_stds.append(outputs['log_stds'].to(storage_device))
+
+        self.distill_memory.add(self.task_count, torch.cat(obses), torch.cat(mus), torch.cat(log_stds))
+
     def distill(self, **kwargs):
         sample_src = kwargs.pop('sample_src', 'rollout')
         env = kwargs.pop('env')
@@ -138,110 +179,36 @@ class DistilledActorMultiHeadSacMlpAgent(SacMlpAgent):
         total_steps = kwargs.pop('total_steps')
         logger = kwargs.pop('logger')
 
+        if sample_src == 'rollout':
+            rollout_size = self.distill_memory_budget_per_task
+        elif sample_src == 'replay_buffer':
+            rollout_size = 0
+        elif sample_src == 'hybrid':
+            rollout_size = self.distill_memory_budget_per_task // 2
+        else:
+            raise ValueError("Unknown sample source!")
+        # the budget counts environment steps, each step of a rollout stores one transition per environment
+        collector = RolloutCollector(env, self.device, storage_device=self.distill_memory.storage_device)
+        self.distill_memory.reserve(
+            rollout_size * collector.num_envs + self.distill_memory_budget_per_task - rollout_size)
+
         for epoch in range(self.distill_epochs):
-            # collect samples
-            dataset = {
-                'obses': [],
-                'actions': [],
-                'mus': [],
-                'log_stds': [],
-                'task_id': self.task_count,
-            }
-            obs = env.reset()
-            if sample_src == 'rollout':
-                for _ in range(self.distill_memory_budget_per_task):
-                    with utils.eval_mode(self):
-                        # compute log_pi and Q for later gradient projection
-                        mu, action, _, log_std = self.actor(
-                            torch.Tensor(obs).to(device=self.device),
-                            compute_pi=True, compute_log_pi=True, **kwargs)
-
-                        if 'head_idx' in kwargs:
-                            action = utils.to_np(
-                                action.clamp(*self.action_range[kwargs['head_idx']]))
-                        else:
-                            action = utils.to_np(action.clamp(*self.action_range))
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    # TODO (cyzheng): note we save numpy array instead of tensor to save GPU memory
-                    dataset['obses'].append(obs)
-                    dataset['actions'].append(action)
-                    dataset['mus'].append(utils.to_np(mu))
-                    dataset['log_stds'].append(utils.to_np(log_std))
-
-                    obs = next_obs
-
-                dataset['obses'] = np.stack(dataset['obses'])
-                dataset['actions'] = np.stack(dataset['actions'])
-                dataset['mus'] = np.stack(dataset['mus'])
-                dataset['log_stds'] = np.stack(dataset['log_stds'])
-            elif sample_src == 'replay_buffer':
-                obses, _, _, _, _ = replay_buffer.sample(self.distill_memory_budget_per_task)
-                with utils.eval_mode(self):
-                    mus, actions, _, log_stds = self.actor(
-                        obses, compute_pi=True, compute_log_pi=True, **kwargs)
-
-                dataset['obses'] = utils.to_np(obses)
-                dataset['actions'] = utils.to_np(actions)
-                dataset['mus'] = utils.to_np(mus)
-                dataset['log_stds'] = utils.to_np(log_stds)
-            elif sample_src == 'hybrid':
-                for _ in range(self.distill_memory_budget_per_task // 2):
-                    with utils.eval_mode(self):
-                        # compute log_pi and Q for later gradient projection
-                        mu, action, _, log_std = self.actor(
-                            torch.Tensor(obs).to(device=self.device),
-                            compute_pi=True, compute_log_pi=True, **kwargs)
-
-                        if 'head_idx' in kwargs:
-                            action = utils.to_np(
-                                action.clamp(*self.action_range[kwargs['head_idx']]))
-                        else:
-                            action = utils.to_np(action.clamp(*self.action_range))
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    # TODO (cyzheng): note we save numpy array instead of tensor to save GPU memory
-                    dataset['obses'].append(obs)
-                    dataset['actions'].append(action)
-                    dataset['mus'].append(utils.to_np(mu))
-                    dataset['log_stds'].append(utils.to_np(log_std))
-
-                    obs = next_obs
-
-                rollout_obses = np.stack(dataset['obses'])
-                rollout_actions = np.stack(dataset['actions'])
-                rollout_mus = np.stack(dataset['mus'])
-                rollout_log_stds = np.stack(dataset['log_stds'])
-
-                obses, _, _, _, _ = replay_buffer.sample(
-                    self.distill_memory_budget_per_task - self.distill_memory_budget_per_task // 2)
-                with utils.eval_mode(self):
-                    mus, actions, _, log_stds = self.actor(
-                        obses, compute_pi=True, compute_log_pi=True, **kwargs)
-
-                dataset['obses'] = np.concatenate([rollout_obses, utils.to_np(obses)])
-                dataset['actions'] = np.concatenate([rollout_actions, utils.to_np(actions)])
-                dataset['mus'] = np.concatenate([rollout_mus, utils.to_np(mus)])
-                dataset['log_stds'] = np.concatenate([rollout_log_stds, utils.to_np(log_stds)])
-            else:
-                raise ValueError("Unknown sample source!")
+            # (cyzheng): refresh data of the current task every 'distill_refresh_interval' epochs,
+            # a non-positive interval collects data once and reuses it for all epochs
+            if epoch == 0 or (self.distill_refresh_interval > 0 and epoch % self.distill_refresh_interval == 0):
+                self._collect_distill_data(collector, rollout_size, replay_buffer, **kwargs)
 
+            batch = self.distill_memory.sample(self._sample_distill_task_ids())
             for iter in range(self.distill_iters_per_epoch):
-                # TODO (cyzheng): convert previous task memory batch size to an argument
-                if self.task_count > 0:
-                    prev_task_dataset = np.random.choice(self.memories, 3).tolist()
-                else:
-                    prev_task_dataset = []
-                self._train_distilled_actor([dataset] + prev_task_dataset,
-                                            total_steps + epoch * self.distill_iters_per_epoch + iter,
-                                            logger)
+                loss = self._train_distilled_actor(batch)
+                # prefetch the next batch while the current update runs on the device
+                if iter < self.distill_iters_per_epoch - 1:
+                    batch = self.distill_memory.sample(self._sample_distill_task_ids())
+                logger.log('train/distillation_loss', loss,
+                           total_steps + epoch * self.distill_iters_per_epoch + iter)
 
             # TODO (cyzheng): log loss for every epoch
             logger.dump(total_steps + epoch * self.distill_iters_per_epoch,
                         ty='train', save=True)
 
-        self.memories.append(dataset)
         self.task_count += 1
-
@@ -91,14 +91,15 @@ class EwcMultiHeadSacMlpAgent(MultiHeadSacMlpAgent, EwcSacMlpAgent):
         self.ewc_task_count += 1
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         critic_ewc_loss = self._compute_ewc_loss(self.critic.named_common_parameters())
         critic_loss = critic_loss + self.ewc_lambda * critic_ewc_loss
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
@@ -1,10 +1,9 @@
 import numpy as np
-from collections import Iterable
+from collections.abc import Iterable
 import torch
 from torch.distributions import Independent, Normal
 from torch.distributions.kl import kl_divergence
 
-import utils
 from agent.sac import TaskEmbeddingDistilledActorSacMlpAgent
 
 
@@ -65,90 +64,15 @@ class EwcTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacMl
 
         fishers = {}
         for _ in range(self.ewc_estimate_fisher_iters):
-            obs = env.reset()
-            samples = {
-                'obses': [],
-                'mus': [],
-                'log_stds': [],
-            }
-            if sample_src == 'rollout':
-                for _ in range(self.ewc_estimate_fisher_sample_num):
-                    with utils.eval_mode(self):
-                        mu, action, _, log_std = self.actor(
-                            torch.Tensor(obs).to(device=self.device),
-                            compute_pi=True, compute_log_pi=True, **kwargs)
-
-                        action = utils.to_np(
-                            action.clamp(*self.action_range[task_idx]))
-                        mu = utils.to_np(mu)
-                        log_std = utils.to_np(log_std)
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    samples['obses'].append(obs)
-                    samples['mus'].append(mu)
-                    samples['log_stds'].append(log_std)
-
-                    obs = next_obs
-                samples['obses'] = torch.Tensor(samples['obses']).to(device=self.device)
-                samples['mus'] = torch.Tensor(samples['mus']).to(device=self.device)
-                samples['log_stds'] = torch.Tensor(samples['log_stds']).to(device=self.device)
-            elif sample_src == 'replay_buffer':
-                obses, _, _, _, _ = replay_buffer.sample(
-                    self.ewc_estimate_fisher_sample_num)
-
-                with utils.eval_mode(self):
-                    mus, _, _, log_stds = self.actor(
-                        obses, compute_pi=True, compute_log_pi=True, **kwargs)
-
-                samples['obses'] = obses
-                samples['mus'] = mus
-                samples['log_stds'] = log_stds
-            elif sample_src == 'hybrid':
-                for _ in range(self.ewc_estimate_fisher_sample_num // 2):
-                    with utils.eval_mode(self):
-                        mu, action, _, log_std = self.actor(
-                            torch.Tensor(obs).to(device=self.device),
-                            compute_pi=True, compute_log_pi=True, **kwargs)
-
-                        action = utils.to_np(
-                            action.clamp(*self.action_range[task_idx]))
-                        mu = utils.to_np(mu)
-                        log_std = utils.to_np(log_std)
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    samples['obses'].append(obs)
-                    samples['mus'].append(mu)
-                    samples['log_stds'].append(log_std)
-
-                    obs = next_obs
-
-                rollout_obses = torch.Tensor(samples['obses']).to(device=self.device)
-                rollout_mus = torch.Tensor(samples['mus']).to(device=self.device)
-                rollout_log_stds = torch.Tensor(samples['log_stds']).to(device=self.device)
-
-                obses, _, _, _, _ = replay_buffer.sample(
-                    self.ewc_estimate_fisher_sample_num -
-                    self.ewc_estimate_fisher_sample_num // 2)
-
-                with utils.eval_mode(self):
-                    mus, _, _, log_stds = self.actor(
-                        obses, compute_pi=True, compute_log_pi=True, **kwargs)
-
-                samples['obses'] = torch.cat([rollout_obses, obses], dim=0)
-                samples['mus'] = torch.cat([rollout_mus, mus], dim=0)
-                samples['log_stds'] = torch.cat([rollout_log_stds, log_stds], dim=0)
-            else:
-                raise ValueError("Unknown sample source!")
+            samples = self._collect_actor_samples(env, replay_buffer, sample_src, self.ewc_estimate_fisher_sample_num,
+                                                  head_idx=task_idx, **kwargs)
 
             # compute distillation loss
             mus, _, _, log_stds = self.distilled_actor(
-                samples['obses'].squeeze(), task_idx,
+                samples['obses'], task_idx,
                 compute_pi=True, compute_log_pi=True)
 
-            actor_dists = Independent(Normal(loc=samples['mus'].squeeze(),
-                                             scale=samples['log_stds'].squeeze().exp()), 1)
+            actor_dists = Independent(Normal(loc=samples['mus'], scale=samples['log_stds'].exp()), 1)
             distilled_actor_dists = Independent(Normal(loc=mus, scale=log_stds.exp()), 1)
             loss = torch.mean(kl_divergence(actor_dists, distilled_actor_dists))
 
@@ -213,11 +137,11 @@ class EwcTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacMl
 
     def _train_distilled_actor(self, dataset, total_steps, epoch, logger):
         for iter in range(self.distillation_iters_per_epoch):
-            random_idxs = np.random.randint(0, self.distillation_memory_budget_per_task,
+            random_idxs = np.random.randint(0, len(dataset['obses']),
                                             size=self.distillation_batch_size)
-            batch_obses = torch.Tensor(dataset['obses'][random_idxs]).to(self.device).squeeze()
-            batch_mus = torch.Tensor(dataset['mus'][random_idxs]).to(self.device).squeeze()
-            batch_log_stds = torch.Tensor(dataset['log_stds'][random_idxs]).to(self.device).squeeze()
+            batch_obses = dataset['obses'][random_idxs].to(self.device)
+            batch_mus = dataset['mus'][random_idxs].to(self.device)
+            batch_log_stds = dataset['log_stds'][random_idxs].to(self.device)
             task_id = dataset['task_id']
 
             mus, _, _, log_stds = self.distilled_actor(
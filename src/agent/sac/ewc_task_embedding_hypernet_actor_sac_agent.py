@@ -1,8 +1,9 @@
-from collections import Iterable
+from collections.abc import Iterable
 import torch
 
 import utils
 from agent.sac import TaskEmbeddingHyperNetActorSacMlpAgent
+from collectors import RolloutCollector
 
 
 class EwcTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlpAgent):
@@ -53,89 +54,42 @@ class EwcTaskEmbeddingHyperNetActorSacMlpAgent(TaskEmbeddingHyperNetActorSacMlpA
         self.prev_task_params = {}
         self.prev_task_fishers = {}
 
+    def _sample_policy(self, obs, task_idx):
+        weights = self.weights if self.weights is not None else self.hypernet(task_idx)
+        _, pi, _, _ = self.actor(obs, compute_log_pi=False, weights=weights)
+
+        return {'actions': pi.clamp(*self.action_range[task_idx])}
+
     def estimate_fisher(self, **kwargs):
         sample_src = kwargs.pop('sample_src', 'rollout')
         env = kwargs.pop('env')
         replay_buffer = kwargs.pop('replay_buffer')
         task_idx = kwargs.pop('head_idx')
 
+        if sample_src == 'rollout':
+            rollout_size = self.ewc_estimate_fisher_sample_num
+        elif sample_src == 'replay_buffer':
+            rollout_size = 0
+        elif sample_src == 'hybrid':
+            rollout_size = self.ewc_estimate_fisher_sample_num // 2
+        else:
+            raise ValueError("Unknown sample source!")
+
         fishers = {}
         # TODO (chongyi zheng): save trajectory for KL divergence
         for _ in range(self.ewc_estimate_fisher_iters):
-            obs = env.reset()
-            samples = {
-                'obs': [],
-                'action': [],
-                'reward': [],
-                'next_obs': [],
-                'not_done': [],
-            }
-            if sample_src == 'rollout':
-                for _ in range(self.ewc_estimate_fisher_sample_num):
-                    with utils.eval_mode(self):
-                        action = self.act(obs, sample=True, head_idx=task_idx)
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    samples['obs'].append(obs)
-                    samples['action'].append(action)
-                    samples['reward'].append(reward)
-                    samples['next_obs'].append(next_obs)
-                    not_done = [not done_ for done_ in done]
-                    samples['not_done'].append(not_done)
-
-                    obs = next_obs
-                samples['obs'] = torch.Tensor(samples['obs']).to(device=self.device)
-                samples['action'] = torch.Tensor(samples['action']).to(device=self.device)
-                samples['reward'] = torch.Tensor(
-                    samples['reward']).to(device=self.device).unsqueeze(-1)
-                samples['next_obs'] = torch.Tensor(samples['next_obs']).to(device=self.device)
-                samples['not_dones'] = torch.Tensor(
-                    samples['not_done']).to(device=self.device).unsqueeze(-1)
-            elif sample_src == 'replay_buffer':
-                obs, action, reward, next_obs, not_done = replay_buffer.sample(
-                    self.ewc_estimate_fisher_sample_num)
-                samples['obs'] = obs
-                samples['action'] = action
-                samples['reward'] = reward
-                samples['next_obs'] = next_obs
-                samples['not_done'] = not_done
-            elif sample_src == 'hybrid':
-                for _ in range(self.ewc_estimate_fisher_sample_num // 2):
-                    with utils.eval_mode(self):
-                        action = self.act(obs, sample=True, head_idx=task_idx)
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    samples['obs'].append(obs)
-                    samples['action'].append(action)
-                    samples['reward'].append(reward)
-                    samples['next_obs'].append(next_obs)
-                    not_done = [not done_ for done_ in done]
-                    samples['not_done'].append(not_done)
-
-                    obs = next_obs
-
-                rollout_obs = torch.Tensor(samples['obs']).to(device=self.device)
-                rollout_action = torch.Tensor(samples['action']).to(device=self.device)
-                rollout_reward = torch.Tensor(
-                    samples['reward']).to(device=self.device).unsqueeze(-1)
-                rollout_next_obs = torch.Tensor(samples['next_obs']).to(device=self.device)
-                rollout_not_done = torch.Tensor(
-                    samples['not_done']).to(device=self.device).unsqueeze(-1)
-
-                obs, action, reward, next_obs, not_done = replay_buffer.sample(
-                    self.ewc_estimate_fisher_sample_num - self.ewc_estimate_fisher_sample_num // 2)
-                samples['obs'] = torch.cat([rollout_obs, obs], dim=0)
-                samples['action'] = torch.cat([rollout_action, action], dim=0)
-                samples['reward'] = torch.cat([rollout_reward, reward], dim=0)
-                samples['next_obs'] = torch.cat([rollout_next_obs, next_obs], dim=0)
-                samples['not_done'] = torch.cat([rollout_not_done, not_done], dim=0)
-            else:
-                raise ValueError("Unknown sample source!")
+            obses = []
+            if rollout_size > 0:
+                with utils.eval_mode(self):
+                    # 'ewc_estimate_fisher_sample_num' counts environment steps, one transition per environment
+                    collector = RolloutCollector(env, self.device)
+                    obses.append(collector.collect(
+                        lambda obs: self._sample_policy(obs, task_idx), rollout_size * collector.num_envs)['obses'])
+            if rollout_size < self.ewc_estimate_fisher_sample_num:
+                obses.append(replay_buffer.sample(self.ewc_estimate_fisher_sample_num - rollout_size)[0])
 
             _, actor_loss, _ = self.compute_actor_and_alpha_loss(
-                samples['obs'],
+                torch.cat(obses, dim=0),
                 compute_alpha_loss=False, task_idx=task_idx
             )
             self.hypernet_weight_optimizer.zero_grad()
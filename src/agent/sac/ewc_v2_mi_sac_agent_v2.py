@@ -2,6 +2,7 @@ import torch
 from torch.distributions import Normal, Independent
 
 import utils
+from collectors import RolloutCollector
 from agent.sac import MultiInputSacMlpAgentV2, EwcV2SacMlpAgentV2
 
 
@@ -47,81 +48,32 @@ class EwcV2MultiInputSacMlpAgentV2(MultiInputSacMlpAgentV2, EwcV2SacMlpAgentV2):
         env = kwargs.pop('env')
         replay_buffer = kwargs.pop('replay_buffer')
 
+        # 'ewc_estimate_fisher_sample_num' counts environment steps of a rollout, one transition per environment
+        collector = RolloutCollector(env, self.device)
         fishers = {}
         # TODO (chongyi zheng): save trajectory for KL divergence
         for _ in range(self.ewc_estimate_fisher_iters):
-            obs = env.reset()
-            samples = {
-                'obs': [],
-                'action': [],
-                'reward': [],
-                'next_obs': [],
-                'not_done': [],
-            }
             if sample_src == 'rollout':
-                for _ in range(self.ewc_estimate_fisher_sample_num):
-                    with utils.eval_mode(self):
-                        action = self.act(obs, sample=True, **kwargs)
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    samples['obs'].append(obs)
-                    samples['action'].append(action)
-                    samples['reward'].append(reward)
-                    samples['next_obs'].append(next_obs)
-                    not_done = [not done_ for done_ in done]
-                    samples['not_done'].append(not_done)
-
-                    obs = next_obs
-                samples['obs'] = torch.Tensor(samples['obs']).to(device=self.device)
-                samples['action'] = torch.Tensor(samples['action']).to(device=self.device)
-                samples['reward'] = torch.Tensor(
-                    samples['reward']).to(device=self.device).unsqueeze(-1)
-                samples['next_obs'] = torch.Tensor(samples['next_obs']).to(device=self.device)
-                samples['not_dones'] = torch.Tensor(
-                    samples['not_done']).to(device=self.device).unsqueeze(-1)
+                rollout_size = self.ewc_estimate_fisher_sample_num
             elif sample_src == 'replay_buffer':
-                obs, action, reward, next_obs, not_done = replay_buffer.sample(
-                    self.ewc_estimate_fisher_sample_num)
-                samples['obs'] = obs
-                samples['action'] = action
-                samples['reward'] = reward
-                samples['next_obs'] = next_obs
-                samples['not_done'] = not_done
+                rollout_size = 0
             elif sample_src == 'hybrid':
-                for _ in range(self.ewc_estimate_fisher_sample_num // 2):
-                    with utils.eval_mode(self):
-                        action = self.act(obs, sample=True, **kwargs)
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    samples['obs'].append(obs)
-                    samples['action'].append(action)
-                    samples['reward'].append(reward)
-                    samples['next_obs'].append(next_obs)
-                    not_done = [not done_ for done_ in done]
-                    samples['not_done'].append(not_done)
-
-                    obs = next_obs
-
-                rollout_obs = torch.Tensor(samples['obs']).to(device=self.device)
-                rollout_action = torch.Tensor(samples['action']).to(device=self.device)
-                rollout_reward = torch.Tensor(
-                    samples['reward']).to(device=self.device).unsqueeze(-1)
-                rollout_next_obs = torch.Tensor(samples['next_obs']).to(device=self.device)
-                rollout_not_done = torch.Tensor(
-                    samples['not_done']).to(device=self.device).unsqueeze(-1)
-
-                obs, action, reward, next_obs, not_done = replay_buffer.sample(
-                    self.ewc_estimate_fisher_sample_num - self.ewc_estimate_fisher_sample_num // 2)
-                samples['obs'] = torch.cat([rollout_obs, obs], dim=0)
-                samples['action'] = torch.cat([rollout_action, action], dim=0)
-                samples['reward'] = torch.cat([rollout_reward, reward], dim=0)
-                samples['next_obs'] = torch.cat([rollout_next_obs, next_obs], dim=0)
-                samples['not_done'] = torch.cat([rollout_not_done, not_done], dim=0)
+                rollout_size = self.ewc_estimate_fisher_sample_num // 2
             else:
                 raise ValueError("Unknown sample source!")
 
+            obses = []
+            if rollout_size > 0:
+                with utils.eval_mode(self):
+                    rollouts = collector.collect(
+                        lambda obs: self._fisher_policy(obs, **kwargs), rollout_size * collector.num_envs)
+                obses.append(rollouts['obses'])
+            if rollout_size < self.ewc_estimate_fisher_sample_num:
+                obs, _, _, _, _ = replay_buffer.sample(
+                    self.ewc_estimate_fisher_sample_num - rollout_size)
+                obses.append(obs)
+            samples = {'obs': torch.cat(obses, dim=0)}
+
             _, actor_loss, _ = self.compute_actor_and_alpha_loss(
                 samples['obs'],
                 compute_alpha_loss=False, **kwargs
@@ -157,12 +109,13 @@ class EwcV2MultiInputSacMlpAgentV2(MultiInputSacMlpAgentV2, EwcV2SacMlpAgentV2):
         self.ewc_task_count += 1
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
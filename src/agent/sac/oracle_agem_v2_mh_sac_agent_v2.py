@@ -26,6 +26,7 @@ class OracleAgemV2MultiHeadSacMlpAgentV2(MultiHeadSacMlpAgentV2, OracleAgemV2Sac
                  batch_size=128,
                  agem_memory_budget=4500,
                  agem_ref_grad_batch_size=500,
+                 agem_memory_dtype='float32',
                  ):
         MultiHeadSacMlpAgentV2.__init__(self, obs_shape, action_shape, action_range, device, actor_hidden_dim,
                                         critic_hidden_dim, discount, init_temperature, alpha_lr, actor_lr,
@@ -36,7 +37,7 @@ class OracleAgemV2MultiHeadSacMlpAgentV2(MultiHeadSacMlpAgentV2, OracleAgemV2Sac
                                            critic_hidden_dim, discount, init_temperature, alpha_lr, actor_lr,
                                            actor_log_std_min, actor_log_std_max, actor_update_freq, critic_lr,
                                            critic_tau, critic_target_update_freq, batch_size, agem_memory_budget,
-                                           agem_ref_grad_batch_size)
+                                           agem_ref_grad_batch_size, agem_memory_dtype)
 
     def _compute_ref_grad(self):
         if not self.agem_memories:
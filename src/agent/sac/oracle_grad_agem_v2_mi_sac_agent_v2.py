@@ -3,7 +3,9 @@ import torch
 import numpy as np
 
 import utils
+from collectors import RolloutCollector
 from agent.sac import MultiInputSacMlpAgentV2, OracleGradAgemV2SacMlpAgentV2
+from buffers import compress_memory
 
 
 class OracleGradAgemV2MultiInputSacMlpAgentV2(MultiInputSacMlpAgentV2, OracleGradAgemV2SacMlpAgentV2):
@@ -28,6 +30,7 @@ class OracleGradAgemV2MultiInputSacMlpAgentV2(MultiInputSacMlpAgentV2, OracleGra
                  batch_size=128,
                  agem_memory_budget=4500,
                  agem_ref_grad_batch_size=500,
+                 agem_memory_dtype='float32',
                  ):
         MultiInputSacMlpAgentV2.__init__(self, obs_shape, action_shape, action_range, device, actor_hidden_dim,
                                          critic_hidden_dim, discount, init_temperature, alpha_lr, actor_lr,
@@ -38,54 +41,20 @@ class OracleGradAgemV2MultiInputSacMlpAgentV2(MultiInputSacMlpAgentV2, OracleGra
                                                critic_hidden_dim, discount, init_temperature, alpha_lr, actor_lr,
                                                actor_log_std_min, actor_log_std_max, actor_update_freq, critic_lr,
                                                critic_tau, critic_target_update_freq, batch_size, agem_memory_budget,
-                                               agem_ref_grad_batch_size)
+                                               agem_ref_grad_batch_size, agem_memory_dtype)
 
     def construct_memory(self, env, **kwargs):
+        # the budget counts environment steps, each step stores one transition per environment
+        collector = RolloutCollector(env, self.device)
         memory_size_per_task = self.agem_memory_budget // (self.agem_task_count + 1)
-        self._adjust_memory_size(memory_size_per_task)
+        self._adjust_memory_size(memory_size_per_task * collector.num_envs)
 
-        obs = env.reset()
+        with utils.eval_mode(self):
+            rollouts = collector.collect(
+                lambda obs: self._memory_policy(obs, **kwargs), memory_size_per_task * collector.num_envs)
         self.agem_memories[self.agem_task_count] = {
-            'obses': [],
-            'actions': [],
-            'rewards': [],
-            'next_obses': [],
-            'not_dones': [],
+            key: rollouts[key] for key in ['obses', 'actions', 'rewards', 'next_obses', 'not_dones']
         }
-        for _ in range(memory_size_per_task):
-            with utils.eval_mode(self):
-                # compute log_pi and Q for later gradient projection
-                _, action, log_pi, _ = self.actor(
-                    torch.Tensor(obs).to(device=self.device),
-                    compute_pi=True, compute_log_pi=True, **kwargs)
-
-                if 'head_idx' in kwargs:
-                    action = utils.to_np(
-                        action.clamp(*self.action_range[kwargs['head_idx']]))
-                else:
-                    action = utils.to_np(action.clamp(*self.action_range))
-
-            next_obs, reward, done, _ = env.step(action)
-
-            self.agem_memories[self.agem_task_count]['obses'].append(obs)
-            self.agem_memories[self.agem_task_count]['actions'].append(action)
-            self.agem_memories[self.agem_task_count]['rewards'].append(reward)
-            self.agem_memories[self.agem_task_count]['next_obses'].append(next_obs)
-            not_done = np.array([not done_ for done_ in done], dtype=np.float32)
-            self.agem_memories[self.agem_task_count]['not_dones'].append(not_done)
-
-            obs = next_obs
-
-        self.agem_memories[self.agem_task_count]['obses'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['obses']).to(device=self.device)
-        self.agem_memories[self.agem_task_count]['actions'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['actions']).to(device=self.device)
-        self.agem_memories[self.agem_task_count]['rewards'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['rewards']).to(device=self.device).unsqueeze(-1)
-        self.agem_memories[self.agem_task_count]['next_obses'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['next_obses']).to(device=self.device)
-        self.agem_memories[self.agem_task_count]['not_dones'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['not_dones']).to(device=self.device).unsqueeze(-1)
         self.agem_memories[self.agem_task_count]['critic'] = copy.deepcopy(self.critic)
 
         # save oracle gradient in memory
@@ -103,6 +72,7 @@ class OracleGradAgemV2MultiInputSacMlpAgentV2(MultiInputSacMlpAgentV2, OracleGra
 
         self.agem_memories[self.agem_task_count]['ref_grad'] = single_ref_actor_grad
 
+        compress_memory(self.agem_memories[self.agem_task_count], self.agem_memory_dtype)
         self.agem_task_count += 1
 
     def update_actor_and_alpha(self, log_pi, actor_loss, logger, step, alpha_loss=None, ref_actor_grad=None):
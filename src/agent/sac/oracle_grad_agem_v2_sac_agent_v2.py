@@ -4,7 +4,9 @@ import copy
 from collections.abc import Iterable
 
 import utils
+from collectors import RolloutCollector
 from agent.sac.base_sac_agent import SacMlpAgent
+from buffers import compress_memory
 
 
 class OracleGradAgemV2SacMlpAgentV2(SacMlpAgent):
@@ -29,6 +31,7 @@ class OracleGradAgemV2SacMlpAgentV2(SacMlpAgent):
                  batch_size=128,
                  agem_memory_budget=4500,
                  agem_ref_grad_batch_size=500,
+                 agem_memory_dtype='float32',
                  ):
         super().__init__(obs_shape, action_shape, action_range, device, actor_hidden_dim, critic_hidden_dim,
                          discount, init_temperature, alpha_lr, actor_lr, actor_log_std_min, actor_log_std_max,
@@ -36,6 +39,7 @@ class OracleGradAgemV2SacMlpAgentV2(SacMlpAgent):
 
         self.agem_memory_budget = agem_memory_budget
         self.agem_ref_grad_batch_size = agem_ref_grad_batch_size
+        self.agem_memory_dtype = agem_memory_dtype
 
         self.agem_task_count = 0
         self.agem_memories = {}
@@ -110,52 +114,28 @@ class OracleGradAgemV2SacMlpAgentV2(SacMlpAgent):
                     param.grad.copy_(proj_grad[idx:idx + num_param].reshape(param.shape))
                     idx += num_param
 
+    def _memory_policy(self, obs, **kwargs):
+        _, action, _, _ = self.actor(obs, compute_pi=True, compute_log_pi=False, **kwargs)
+
+        if 'head_idx' in kwargs:
+            action = action.clamp(*self.action_range[kwargs['head_idx']])
+        else:
+            action = action.clamp(*self.action_range)
+
+        return {'actions': action}
+
     def construct_memory(self, env, **kwargs):
+        # the budget counts environment steps, each step stores one transition per environment
+        collector = RolloutCollector(env, self.device)
         memory_size_per_task = self.agem_memory_budget // (self.agem_task_count + 1)
-        self._adjust_memory_size(memory_size_per_task)
+        self._adjust_memory_size(memory_size_per_task * collector.num_envs)
 
-        obs = env.reset()
+        with utils.eval_mode(self):
+            rollouts = collector.collect(
+                lambda obs: self._memory_policy(obs, **kwargs), memory_size_per_task * collector.num_envs)
         self.agem_memories[self.agem_task_count] = {
-            'obses': [],
-            'actions': [],
-            'rewards': [],
-            'next_obses': [],
-            'not_dones': [],
+            key: rollouts[key] for key in ['obses', 'actions', 'rewards', 'next_obses', 'not_dones']
         }
-        for _ in range(memory_size_per_task):
-            with utils.eval_mode(self):
-                # compute log_pi and Q for later gradient projection
-                _, action, log_pi, _ = self.actor(
-                    torch.Tensor(obs).to(device=self.device),
-                    compute_pi=True, compute_log_pi=True, **kwargs)
-
-                if 'head_idx' in kwargs:
-                    action = utils.to_np(
-                        action.clamp(*self.action_range[kwargs['head_idx']]))
-                else:
-                    action = utils.to_np(action.clamp(*self.action_range))
-
-            next_obs, reward, done, _ = env.step(action)
-
-            self.agem_memories[self.agem_task_count]['obses'].append(obs)
-            self.agem_memories[self.agem_task_count]['actions'].append(action)
-            self.agem_memories[self.agem_task_count]['rewards'].append(reward)
-            self.agem_memories[self.agem_task_count]['next_obses'].append(next_obs)
-            not_done = np.array([not done_ for done_ in done], dtype=np.float32)
-            self.agem_memories[self.agem_task_count]['not_dones'].append(not_done)
-
-            obs = next_obs
-
-        self.agem_memories[self.agem_task_count]['obses'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['obses']).to(device=self.device)
-        self.agem_memories[self.agem_task_count]['actions'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['actions']).to(device=self.device)
-        self.agem_memories[self.agem_task_count]['rewards'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['rewards']).to(device=self.device).unsqueeze(-1)
-        self.agem_memories[self.agem_task_count]['next_obses'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['next_obses']).to(device=self.device)
-        self.agem_memories[self.agem_task_count]['not_dones'] = torch.Tensor(
-            self.agem_memories[self.agem_task_count]['not_dones']).to(device=self.device).unsqueeze(-1)
 
         # save oracle gradient in memory
         _, actor_loss, _ = self.compute_actor_and_alpha_loss(
@@ -172,6 +152,7 @@ class OracleGradAgemV2SacMlpAgentV2(SacMlpAgent):
 
         self.agem_memories[self.agem_task_count]['ref_grad'] = single_ref_actor_grad
 
+        compress_memory(self.agem_memories[self.agem_task_count], self.agem_memory_dtype)
         self.agem_task_count += 1
 
     def update_actor_and_alpha(self, log_pi, actor_loss, logger, step, alpha_loss=None, ref_actor_grad=None):
@@ -196,12 +177,13 @@ class OracleGradAgemV2SacMlpAgentV2(SacMlpAgent):
             self.log_alpha_optimizer.step()
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             ref_actor_grad = self._compute_ref_grad()
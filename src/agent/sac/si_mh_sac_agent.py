@@ -1,8 +1,6 @@
-import torch
-from itertools import chain
-
 import utils
 from agent.sac import MultiHeadSacMlpAgent, SiSacMlpAgent
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiMultiHeadSacMlpAgent(MultiHeadSacMlpAgent, SiSacMlpAgent):
@@ -40,55 +38,25 @@ class SiMultiHeadSacMlpAgent(MultiHeadSacMlpAgent, SiSacMlpAgent):
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in chain(self.critic.named_common_parameters(),
-                                 self.actor.named_common_parameters(),
-                                 iter([('log_alpha', self.log_alpha)])):
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().clone()
-                self.prev_params[name] = param.detach().clone()
-
-    def update_omegas(self):
-        for name, param in chain(self.critic.named_common_parameters(),
-                                 self.actor.named_common_parameters(),
-                                 iter([('log_alpha', self.log_alpha)])):
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(name, torch.zeros_like(param))
-
-        # clear importance buffers for the next task
-        self.params_w = {}
-
-    def _estimate_importance(self):
-        for name, param in chain(self.critic.named_common_parameters(),
-                                 self.actor.named_common_parameters(),
-                                 iter([('log_alpha', self.log_alpha)])):
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach() * (param.detach() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param))
-                self.prev_params[name] = param.detach().clone()
+        self.critic_si = SynapticIntelligence(self.critic.named_common_parameters(), self.si_epsilon)
+        self.actor_si = SynapticIntelligence(self.actor.named_common_parameters(), self.si_epsilon)
+        self.alpha_si = SynapticIntelligence(iter([('log_alpha', self.log_alpha)]), self.si_epsilon)
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
-        critic_si_surrogate_loss = self._compute_surrogate_loss(
-            self.critic.named_common_parameters())
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
+        critic_si_surrogate_loss = self.critic_si.compute_surrogate_loss()
         critic_loss = critic_loss + self.si_c * critic_si_surrogate_loss
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
-            actor_si_surrogate_loss = self._compute_surrogate_loss(
-                self.actor.named_common_parameters())
-            alpha_si_surrogate_loss = self._compute_surrogate_loss(iter([('log_alpha', self.log_alpha)]))
+            actor_si_surrogate_loss = self.actor_si.compute_surrogate_loss()
+            alpha_si_surrogate_loss = self.alpha_si.compute_surrogate_loss()
             actor_loss = actor_loss + self.si_c * actor_si_surrogate_loss
             alpha_loss = alpha_loss + self.si_c * alpha_si_surrogate_loss
 
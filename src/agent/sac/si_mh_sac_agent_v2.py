@@ -1,7 +1,6 @@
-import torch
-
 import utils
 from agent.sac import MultiHeadSacMlpAgentV2, SiSacMlpAgentV2
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiMultiHeadSacMlpAgentV2(MultiHeadSacMlpAgentV2, SiSacMlpAgentV2):
@@ -39,49 +38,24 @@ class SiMultiHeadSacMlpAgentV2(MultiHeadSacMlpAgentV2, SiSacMlpAgentV2):
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in self.actor.named_common_parameters():
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().clone()
-                self.prev_params[name] = param.detach().clone()
-
-    def update_omegas(self):
-        for name, param in self.actor.named_common_parameters():
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(name, torch.zeros_like(param))
-
-        # clear importance buffers for the next task
-        self.params_w = {}
-
-    def _estimate_importance(self):
-        for name, param in self.actor.named_common_parameters():
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach() * (param.detach() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param))
-                self.prev_params[name] = param.detach().clone()
+        self.si = SynapticIntelligence(self.actor.named_common_parameters(), self.si_epsilon)
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         # TODO (chongyi zheng): delete this block
         # critic_si_surrogate_loss = self._compute_surrogate_loss(
         #     self.critic.named_common_parameters())
         # critic_loss = critic_loss + self.si_c * critic_si_surrogate_loss
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
-            actor_si_surrogate_loss = self._compute_surrogate_loss(
-                self.actor.named_common_parameters())
+            actor_si_surrogate_loss = self._compute_surrogate_loss()
             actor_loss = actor_loss + self.si_c * actor_si_surrogate_loss
             # TODO (chongyi zheng): delete this block
             # alpha_si_surrogate_loss = self._compute_surrogate_loss(iter([('log_alpha', self.log_alpha)]))
@@ -1,8 +1,8 @@
 import torch
-from collections.abc import Iterable
 
 import utils
 from agent.sac.base_sac_agent import SacMlpAgent
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiSacMlpAgentV2(SacMlpAgent):
@@ -35,69 +35,36 @@ class SiSacMlpAgentV2(SacMlpAgent):
         self.si_c = si_c
         self.si_epsilon = si_epsilon
 
-        self.params_w = {}
-        self.omegas = {}
-        self.prev_params = {}
-        self.prev_task_params = {}
-
         self._save_init_params()
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in self.actor.named_parameters():
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().clone()
-                self.prev_params[name] = param.detach().clone()
+        self.si = SynapticIntelligence(self.actor.named_parameters(), self.si_epsilon)
 
     def update_omegas(self):
-        for name, param in self.actor.named_parameters():
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(name, torch.zeros_like(param))
-
-        # clear importance buffers for the next task
-        self.params_w = {}
+        self.si.update_omegas()
 
     def _estimate_importance(self):
-        for name, param in self.actor.named_parameters():
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach() * (param.detach() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param))
-                self.prev_params[name] = param.detach().clone()
-
-    def _compute_surrogate_loss(self, named_parameters):
-        assert isinstance(named_parameters, Iterable), "'named_parameters' must be a iterator"
-
-        si_losses = []
-        for name, param in named_parameters:
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                omega = self.omegas.get(name, torch.zeros_like(param))
-                si_loss = torch.sum(omega * (param - prev_param) ** 2)
-                si_losses.append(si_loss)
-
-        return torch.sum(torch.stack(si_losses))
+        self.si.estimate_importance()
+
+    def _compute_surrogate_loss(self):
+        return self.si.compute_surrogate_loss()
 
     def update(self, replay_buffer, logger, step, **kwargs):
-        obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
+        obs, action, reward, next_obs, not_done, weights = self.sample_transitions(replay_buffer)
 
         logger.log('train/batch_reward', reward.mean(), step)
 
-        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, **kwargs)
+        critic_loss = self.compute_critic_loss(obs, action, reward, next_obs, not_done, weights=weights, **kwargs)
         # TODO (chongyi zheng): delete this block
         # critic_si_surrogate_loss = self._compute_surrogate_loss(self.critic.named_parameters())
         # critic_loss = critic_loss + self.si_c * critic_si_surrogate_loss
         self.update_critic(critic_loss, logger, step)
+        self.update_priorities(replay_buffer)
 
         if step % self.actor_update_freq == 0:
             log_pi, actor_loss, alpha_loss = self.compute_actor_and_alpha_loss(obs, **kwargs)
-            actor_si_surrogate_loss = self._compute_surrogate_loss(self.actor.named_parameters())
+            actor_si_surrogate_loss = self._compute_surrogate_loss()
             actor_loss = actor_loss + self.si_c * actor_si_surrogate_loss
             # TODO (chongyi zheng): delete this block
             # alpha_si_surrogate_loss = self._compute_surrogate_loss(iter([('log_alpha', self.log_alpha)]))
@@ -115,29 +82,11 @@ class SiSacMlpAgentV2(SacMlpAgent):
     def save(self, model_dir, step):
         super().save(model_dir, step)
         torch.save(
-            self.prev_params, '%s/prev_params_%s.pt' % (model_dir, step)
-        )
-        torch.save(
-            self.params_w, '%s/params_w_%s.pt' % (model_dir, step)
-        )
-        torch.save(
-            self.omegas, '%s/omegas_%s.pt' % (model_dir, step)
-        )
-        torch.save(
-            self.prev_task_params, '%s/prev_task_params_%s.pt' % (model_dir, step)
+            self.si.state_dict(), '%s/si_%s.pt' % (model_dir, step)
         )
 
     def load(self, model_dir, step):
         super().load(model_dir, step)
-        self.prev_params = torch.load(
-            '%s/prev_params_%s.pt' % (model_dir, step)
-        )
-        self.params_w = torch.load(
-            '%s/params_w_%s.pt' % (model_dir, step)
-        )
-        self.omegas = torch.load(
-            '%s/omegas_%s.pt' % (model_dir, step)
-        )
-        self.prev_task_params = torch.load(
-            '%s/prev_task_params_%s.pt' % (model_dir, step)
-        )
+        self.si.load_state_dict(torch.load(
+            '%s/si_%s.pt' % (model_dir, step)
+        ))
@@ -1,10 +1,10 @@
-from collections import Iterable
 import numpy as np
 import torch
 from torch.distributions import Independent, Normal
 from torch.distributions.kl import kl_divergence
 
 from agent.sac import TaskEmbeddingDistilledActorSacMlpAgent
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacMlpAgent):
@@ -46,63 +46,28 @@ class SiTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacMlp
         self.si_c = si_c
         self.si_epsilon = si_epsilon
 
-        self.params_w = {}
-        self.omegas = {}
-        self.prev_params = {}
-        self.prev_task_params = {}
-
         self._save_init_params()
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in self.distilled_actor.weights.items():
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().cpu().clone()
-                self.prev_params[name] = param.detach().cpu().clone()
+        self.si = SynapticIntelligence(self.distilled_actor.weights.items(), self.si_epsilon)
 
     def update_omegas(self):
-        for name, param in self.distilled_actor.weights.items():
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().cpu().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(
-                    name, torch.zeros_like(param).cpu())
-
-        # clear importance buffers for the next task
-        self.params_w = {}
+        self.si.update_omegas()
 
     def _estimate_importance(self):
-        for name, param in self.distilled_actor.weights.items():
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach().cpu() * (param.detach().cpu() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param).cpu())
-                self.prev_params[name] = param.detach().cpu().clone()
-
-    def _compute_surrogate_loss(self, named_parameters):
-        assert isinstance(named_parameters, Iterable), "'named_parameters' must be a iterator"
-
-        si_losses = []
-        for name, param in named_parameters:
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name].to(self.device)
-                omega = self.omegas.get(name, torch.zeros_like(param)).to(self.device)
-                si_loss = torch.sum(omega * (param - prev_param) ** 2)
-                si_losses.append(si_loss)
+        self.si.estimate_importance()
 
-        return torch.sum(torch.stack(si_losses))
+    def _compute_surrogate_loss(self):
+        return self.si.compute_surrogate_loss()
 
     def _train_distilled_actor(self, dataset, total_steps, epoch, logger):
         for iter in range(self.distillation_iters_per_epoch):
-            random_idxs = np.random.randint(0, self.distillation_memory_budget_per_task,
+            random_idxs = np.random.randint(0, len(dataset['obses']),
                                             size=self.distillation_batch_size)
-            batch_obses = torch.Tensor(dataset['obses'][random_idxs]).to(self.device).squeeze()
-            batch_mus = torch.Tensor(dataset['mus'][random_idxs]).to(self.device).squeeze()
-            batch_log_stds = torch.Tensor(dataset['log_stds'][random_idxs]).to(self.device).squeeze()
+            batch_obses = dataset['obses'][random_idxs].to(self.device)
+            batch_mus = dataset['mus'][random_idxs].to(self.device)
+            batch_log_stds = dataset['log_stds'][random_idxs].to(self.device)
             task_id = dataset['task_id']
 
             mus, _, _, log_stds = self.distilled_actor(
@@ -113,7 +78,7 @@ class SiTaskEmbeddingDistilledActorSacMlpAgent(TaskEmbeddingDistilledActorSacMlp
             distilled_actor_dists = Independent(Normal(loc=mus, scale=log_stds.exp()), 1)
             distillation_loss = torch.mean(kl_divergence(actor_dists, distilled_actor_dists))
             # regularize with SI
-            si_surrogate_loss = self._compute_surrogate_loss(self.distilled_actor.weights.items())
+            si_surrogate_loss = self._compute_surrogate_loss()
             distillation_loss = distillation_loss + self.si_c * si_surrogate_loss
 
             logger.log('train/distillation_loss', distillation_loss,
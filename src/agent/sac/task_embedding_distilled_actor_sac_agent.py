@@ -5,6 +5,7 @@ from torch.distributions import Independent, Normal
 from torch.distributions.kl import kl_divergence
 
 import utils
+from collectors import RolloutCollector
 
 from agent.sac.base_sac_agent import SacMlpAgent
 from agent.network import SacActorMlp, SacCriticMlp
@@ -126,11 +127,11 @@ class TaskEmbeddingDistilledActorSacMlpAgent(SacMlpAgent):
 
             losses = []
             for subset in [dataset] + prev_task_dataset:
-                random_idxs = np.random.randint(0, self.distillation_memory_budget_per_task,
+                random_idxs = np.random.randint(0, len(subset['obses']),
                                                 size=self.distillation_batch_size)
-                batch_obses = torch.Tensor(subset['obses'][random_idxs]).to(self.device).squeeze()
-                batch_mus = torch.Tensor(subset['mus'][random_idxs]).to(self.device).squeeze()
-                batch_log_stds = torch.Tensor(subset['log_stds'][random_idxs]).to(self.device).squeeze()
+                batch_obses = subset['obses'][random_idxs].to(self.device)
+                batch_mus = subset['mus'][random_idxs].to(self.device)
+                batch_log_stds = subset['log_stds'][random_idxs].to(self.device)
                 task_id = subset['task_id']
 
                 mus, _, _, log_stds = self.distilled_actor(
@@ -171,6 +172,52 @@ class TaskEmbeddingDistilledActorSacMlpAgent(SacMlpAgent):
 
         return utils.to_np(action)
 
+    def _actor_policy(self, obs, **kwargs):
+        mu, action, _, log_std = self.actor(obs, compute_pi=True, compute_log_pi=True, **kwargs)
+        if 'head_idx' in kwargs:
+            action = action.clamp(*self.action_range[kwargs['head_idx']])
+        else:
+            action = action.clamp(*self.action_range)
+
+        return {'actions': action, 'mus': mu, 'log_stds': log_std}
+
+    def _collect_actor_samples(self, env, replay_buffer, sample_src, num_samples, storage_device=None, **kwargs):
+        """Observations with the actions and the action distributions of the actor on them
+
+        'rollout' runs the actor for 'num_samples' environment steps (one transition per environment each),
+        'replay_buffer' samples 'num_samples' observations from the replay buffer and 'hybrid' does both for one half
+        each. The tensors are kept on 'storage_device', the device of the agent by default.
+        """
+        if sample_src == 'rollout':
+            rollout_size = num_samples
+        elif sample_src == 'replay_buffer':
+            rollout_size = 0
+        elif sample_src == 'hybrid':
+            rollout_size = num_samples // 2
+        else:
+            raise ValueError("Unknown sample source!")
+        storage_device = self.device if storage_device is None else storage_device
+
+        samples = []
+        if rollout_size > 0:
+            with utils.eval_mode(self):
+                collector = RolloutCollector(env, self.device, storage_device=storage_device)
+                rollouts = collector.collect(
+                    lambda obs: self._actor_policy(obs, **kwargs), rollout_size * collector.num_envs)
+            samples.append(rollouts)
+
+        if rollout_size < num_samples:
+            obses, _, _, _, _ = replay_buffer.sample(num_samples - rollout_size)
+            with utils.eval_mode(self), torch.no_grad():
+                mus, actions, _, log_stds = self.actor(
+                    obses, compute_pi=True, compute_log_pi=True, **kwargs)
+            samples.append({'obses': obses, 'actions': actions, 'mus': mus, 'log_stds': log_stds})
+
+        return {
+            key: torch.cat([part[key].to(storage_device) for part in samples], dim=0)
+            for key in ['obses', 'actions', 'mus', 'log_stds']
+        }
+
     def distill(self, **kwargs):
         sample_src = kwargs.pop('sample_src', 'rollout')
         env = kwargs.pop('env')
@@ -180,96 +227,11 @@ class TaskEmbeddingDistilledActorSacMlpAgent(SacMlpAgent):
 
         # (cyzheng): refresh data every epoch
         for epoch in range(self.distillation_epochs):
-            # collect samples
-            dataset = {
-                'obses': [],
-                'actions': [],
-                'mus': [],
-                'log_stds': [],
-                'task_id': self.task_count,
-            }
-            obs = env.reset()
-            if sample_src == 'rollout':
-                for _ in range(self.distillation_memory_budget_per_task):
-                    with utils.eval_mode(self):
-                        # compute log_pi and Q for later gradient projection
-                        mu, action, _, log_std = self.actor(
-                            torch.Tensor(obs).to(device=self.device),
-                            compute_pi=True, compute_log_pi=True, **kwargs)
-
-                        if 'head_idx' in kwargs:
-                            action = utils.to_np(
-                                action.clamp(*self.action_range[kwargs['head_idx']]))
-                        else:
-                            action = utils.to_np(action.clamp(*self.action_range))
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    # TODO (cyzheng): note we save numpy array instead of tensor to save GPU memory
-                    dataset['obses'].append(obs)
-                    dataset['actions'].append(action)
-                    dataset['mus'].append(utils.to_np(mu))
-                    dataset['log_stds'].append(utils.to_np(log_std))
-
-                    obs = next_obs
-
-                dataset['obses'] = np.stack(dataset['obses'])
-                dataset['actions'] = np.stack(dataset['actions'])
-                dataset['mus'] = np.stack(dataset['mus'])
-                dataset['log_stds'] = np.stack(dataset['log_stds'])
-            elif sample_src == 'replay_buffer':
-                obses, _, _, _, _ = replay_buffer.sample(
-                    self.distillation_memory_budget_per_task)
-                with utils.eval_mode(self):
-                    mus, actions, _, log_stds = self.actor(
-                        obses, compute_pi=True, compute_log_pi=True, **kwargs)
-
-                dataset['obses'] = utils.to_np(obses)
-                dataset['actions'] = utils.to_np(actions)
-                dataset['mus'] = utils.to_np(mus)
-                dataset['log_stds'] = utils.to_np(log_stds)
-            elif sample_src == 'hybrid':
-                for _ in range(self.distillation_memory_budget_per_task // 2):
-                    with utils.eval_mode(self):
-                        # compute log_pi and Q for later gradient projection
-                        mu, action, _, log_std = self.actor(
-                            torch.Tensor(obs).to(device=self.device),
-                            compute_pi=True, compute_log_pi=True, **kwargs)
-
-                        if 'head_idx' in kwargs:
-                            action = utils.to_np(
-                                action.clamp(*self.action_range[kwargs['head_idx']]))
-                        else:
-                            action = utils.to_np(action.clamp(*self.action_range))
-
-                    next_obs, reward, done, _ = env.step(action)
-
-                    # TODO (cyzheng): note we save numpy array instead of tensor to save GPU memory
-                    dataset['obses'].append(obs)
-                    dataset['actions'].append(action)
-                    dataset['mus'].append(utils.to_np(mu))
-                    dataset['log_stds'].append(utils.to_np(log_std))
-
-                    obs = next_obs
-
-                rollout_obses = np.stack(dataset['obses'])
-                rollout_actions = np.stack(dataset['actions'])
-                rollout_mus = np.stack(dataset['mus'])
-                rollout_log_stds = np.stack(dataset['log_stds'])
-
-                obses, _, _, _, _ = replay_buffer.sample(
-                    self.distillation_memory_budget_per_task -
-                    self.distillation_memory_budget_per_task // 2)
-                with utils.eval_mode(self):
-                    mus, actions, _, log_stds = self.actor(
-                        obses, compute_pi=True, compute_log_pi=True, **kwargs)
-
-                dataset['obses'] = np.concatenate([rollout_obses, utils.to_np(obses)])
-                dataset['actions'] = np.concatenate([rollout_actions, utils.to_np(actions)])
-                dataset['mus'] = np.concatenate([rollout_mus, utils.to_np(mus)])
-                dataset['log_stds'] = np.concatenate([rollout_log_stds, utils.to_np(log_stds)])
-            else:
-                raise ValueError("Unknown sample source!")
+            # the samples stay on the CPU to save GPU memory
+            dataset = self._collect_actor_samples(
+                env, replay_buffer, sample_src, self.distillation_memory_budget_per_task,
+                storage_device=torch.device('cpu'), **kwargs)
+            dataset['task_id'] = self.task_count
 
             self._train_distilled_actor(dataset, total_steps, epoch, logger)
 
@@ -0,0 +1,144 @@
+import torch
+
+
+class _FlatSurrogateLoss(torch.autograd.Function):
+    """sum(omegas * (params - prev_task_params) ** 2) read from the flat parameter view, the gradients of the
+    parameters are returned as views of one flat gradient
+    """
+    @staticmethod
+    def forward(ctx, si, *params):
+        delta_params = torch.sub(si.flat_params, si.prev_task_params)
+        weighted_delta_params = si.omegas * delta_params
+        ctx.shapes = [param.shape for param in params]
+        ctx.save_for_backward(weighted_delta_params)
+
+        return torch.dot(weighted_delta_params, delta_params)
+
+    @staticmethod
+    @torch.autograd.function.once_differentiable
+    def backward(ctx, grad_output):
+        weighted_delta_params, = ctx.saved_tensors
+        flat_grad = weighted_delta_params.mul(2.0 * grad_output)
+        numels = [shape.numel() for shape in ctx.shapes]
+
+        return (None, *[grad.view(shape) for grad, shape in zip(flat_grad.split(numels), ctx.shapes)])
+
+
+class SynapticIntelligence:
+    """Synaptic Intelligence bookkeeping over flat, preallocated buffers.
+
+    Adapt from https://github.com/GMvandeVen/continual-learning
+
+    The path integral 'params_w', the previous step parameters 'prev_params', the importance 'omegas' and
+    the anchors 'prev_task_params' are each kept in one flat tensor covering all tracked parameters, and are
+    updated in place after every optimizer step. The tracked parameters themselves are views of one flat tensor
+    'flat_params', so the surrogate loss is a single weighted dot product without concatenating them.
+    """
+    def __init__(self, named_parameters, si_epsilon=0.1):
+        self.si_epsilon = si_epsilon
+
+        self.names = []
+        self.params = []
+        for name, param in named_parameters:
+            if param.requires_grad:
+                self.names.append(name)
+                self.params.append(param)
+        assert len(self.params) > 0, "No trainable parameters to track"
+
+        self.numels = [param.numel() for param in self.params]
+        numel = sum(self.numels)
+        factory_kwargs = dict(device=self.params[0].device, dtype=self.params[0].dtype)
+
+        self.flat_params = torch.empty(numel, **factory_kwargs)
+        self._bind_flat_params()
+
+        self.params_w = torch.zeros(numel, **factory_kwargs)
+        self.omegas = torch.zeros(numel, **factory_kwargs)
+        self.prev_params = torch.empty(numel, **factory_kwargs)
+        self.prev_task_params = torch.empty(numel, **factory_kwargs)
+        # scratch buffers, swapped with 'prev_params' instead of copied
+        self._curr_params = torch.empty(numel, **factory_kwargs)
+        self._grads = torch.empty(numel, **factory_kwargs)
+
+        # whether any task has been consolidated, the surrogate loss is zero otherwise
+        self.consolidated = False
+
+        self._flatten_params(self.prev_params)
+        self.prev_task_params.copy_(self.prev_params)
+
+    def _bind_flat_params(self):
+        """Make the tracked parameters views of 'flat_params', keeping their values"""
+        with torch.no_grad():
+            for param, flat_param in zip(self.params, self.flat_params.split(self.numels)):
+                assert param.device == flat_param.device and param.dtype == flat_param.dtype, \
+                    "Tracked parameters must share the device and dtype of the flat buffers"
+                flat_param.copy_(param.reshape(-1))
+                param.data = flat_param.view_as(param)
+        self._data_ptrs = [param.data_ptr() for param in self.params]
+
+    def _check_flat_params(self):
+        # assigning new data to a parameter unbinds it from 'flat_params', bind it again
+        if any(param.data_ptr() != data_ptr for param, data_ptr in zip(self.params, self._data_ptrs)):
+            self._bind_flat_params()
+
+    def _flatten_params(self, out):
+        self._check_flat_params()
+        out.copy_(self.flat_params)
+
+    def _flatten_grads(self, out):
+        grads = []
+        for param in self.params:
+            if param.grad is None:
+                grads.append(torch.zeros_like(param).reshape(-1))
+            else:
+                grads.append(param.grad.detach().reshape(-1))
+        torch.cat(grads, out=out)
+
+    def estimate_importance(self):
+        """Accumulate -grad * delta_param into the path integral, call after every optimizer step."""
+        self._flatten_params(self._curr_params)
+        self._flatten_grads(self._grads)
+
+        # params_w += -grad * (curr_params - prev_params) = grad * (prev_params - curr_params)
+        self.prev_params.sub_(self._curr_params)
+        self.params_w.addcmul_(self._grads, self.prev_params)
+        self.prev_params, self._curr_params = self._curr_params, self.prev_params
+
+    def update_omegas(self):
+        """Consolidate the path integral of the finished task into omegas and move the anchors."""
+        self._flatten_params(self._curr_params)
+
+        # reuse the gradient buffer for delta_param ** 2 + epsilon
+        torch.sub(self._curr_params, self.prev_task_params, out=self._grads)
+        self._grads.pow_(2).add_(self.si_epsilon)
+        self.omegas.addcdiv_(self.params_w, self._grads)
+
+        self.prev_task_params.copy_(self._curr_params)
+        self.consolidated = True
+
+        # clear importance buffers for the next task
+        self.params_w.zero_()
+
+    def compute_surrogate_loss(self):
+        if not self.consolidated:
+            return torch.zeros((), device=self.omegas.device, dtype=self.omegas.dtype)
+
+        self._check_flat_params()
+
+        return _FlatSurrogateLoss.apply(self, *self.params)
+
+    def state_dict(self):
+        return {
+            'params_w': self.params_w,
+            'omegas': self.omegas,
+            'prev_params': self.prev_params,
+            'prev_task_params': self.prev_task_params,
+            'consolidated': self.consolidated,
+        }
+
+    def load_state_dict(self, state_dict):
+        self.params_w.copy_(state_dict['params_w'])
+        self.omegas.copy_(state_dict['omegas'])
+        self.prev_params.copy_(state_dict['prev_params'])
+        self.prev_task_params.copy_(state_dict['prev_task_params'])
+        self.consolidated = state_dict['consolidated']
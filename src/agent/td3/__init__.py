@@ -1,21 +1,41 @@
-from agent.td3.base_td3_agent import Td3MlpAgent
-from agent.td3.ewc_td3_agent import EwcTd3MlpAgent
-from agent.td3.si_td3_agent import SiTd3MlpAgent
-from agent.td3.agem_both_td3_agent import AgemBothTd3MlpAgent
-from agent.td3.oracle_critic_agem_td3_agent import OracleCriticAgemTd3MlpAgent
-from agent.td3.oracle_actor_critic_agem_td3_agent import OracleActorCriticAgemTd3MlpAgent
-from agent.td3.oracle_grad_agem_td3_agent import OracleGradAgemTd3MlpAgent
-from agent.td3.mh_td3_agent import MultiHeadTd3MlpAgent
-from agent.td3.mi_td3_agent import MultiInputTd3MlpAgent
-from agent.td3.ewc_mh_td3_agent import EwcMultiHeadTd3MlpAgent
-from agent.td3.ewc_mi_td3_agent import EwcMultiInputTd3MlpAgent
-from agent.td3.si_mh_td3_agent import SiMultiHeadTd3MlpAgent
-from agent.td3.si_mi_td3_agent import SiMultiInputTd3MlpAgent
-from agent.td3.agem_both_mh_td3_agent import AgemBothMultiHeadTd3MlpAgent
-from agent.td3.agem_both_mi_td3_agent import AgemBothMultiInputTd3MlpAgent
-from agent.td3.oracle_critic_agem_mh_td3_agent import OracleCriticAgemMultiHeadTd3MlpAgent
-from agent.td3.oracle_critic_agem_mi_td3_agent import OracleCriticAgemMultiInputTd3MlpAgent
-from agent.td3.oracle_actor_critic_agem_mh_td3_agent import OracleActorCriticAgemMultiHeadTd3MlpAgent
-from agent.td3.oracle_actor_critic_agem_mi_td3_agent import OracleActorCriticAgemMultiInputTd3MlpAgent
-from agent.td3.oracle_grad_agem_mh_td3_agent import OracleGradAgemMultiHeadTd3MlpAgent
-from agent.td3.oracle_grad_agem_mi_td3_agent import OracleGradAgemMultiInputTd3MlpAgent
+"""TD3 agents, imported on first access so that using one of them does not import all of them"""
+
+import importlib
+
+
+_AGENT_MODULES = {
+    'Td3MlpAgent': 'agent.td3.base_td3_agent',
+    'EwcTd3MlpAgent': 'agent.td3.ewc_td3_agent',
+    'SiTd3MlpAgent': 'agent.td3.si_td3_agent',
+    'AgemBothTd3MlpAgent': 'agent.td3.agem_both_td3_agent',
+    'OracleCriticAgemTd3MlpAgent': 'agent.td3.oracle_critic_agem_td3_agent',
+    'OracleActorCriticAgemTd3MlpAgent': 'agent.td3.oracle_actor_critic_agem_td3_agent',
+    'OracleGradAgemTd3MlpAgent': 'agent.td3.oracle_grad_agem_td3_agent',
+    'MultiHeadTd3MlpAgent': 'agent.td3.mh_td3_agent',
+    'MultiInputTd3MlpAgent': 'agent.td3.mi_td3_agent',
+    'EwcMultiHeadTd3MlpAgent': 'agent.td3.ewc_mh_td3_agent',
+    'EwcMultiInputTd3MlpAgent': 'agent.td3.ewc_mi_td3_agent',
+    'SiMultiHeadTd3MlpAgent': 'agent.td3.si_mh_td3_agent',
+    'SiMultiInputTd3MlpAgent': 'agent.td3.si_mi_td3_agent',
+    'AgemBothMultiHeadTd3MlpAgent': 'agent.td3.agem_both_mh_td3_agent',
+    'AgemBothMultiInputTd3MlpAgent': 'agent.td3.agem_both_mi_td3_agent',
+    'OracleCriticAgemMultiHeadTd3MlpAgent': 'agent.td3.oracle_critic_agem_mh_td3_agent',
+    'OracleCriticAgemMultiInputTd3MlpAgent': 'agent.td3.oracle_critic_agem_mi_td3_agent',
+    'OracleActorCriticAgemMultiHeadTd3MlpAgent': 'agent.td3.oracle_actor_critic_agem_mh_td3_agent',
+    'OracleActorCriticAgemMultiInputTd3MlpAgent': 'agent.td3.oracle_actor_critic_agem_mi_td3_agent',
+    'OracleGradAgemMultiHeadTd3MlpAgent': 'agent.td3.oracle_grad_agem_mh_td3_agent',
+    'OracleGradAgemMultiInputTd3MlpAgent': 'agent.td3.oracle_grad_agem_mi_td3_agent',
+}
+
+
+def __getattr__(name):
+    if name not in _AGENT_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_AGENT_MODULES[name]), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_AGENT_MODULES))
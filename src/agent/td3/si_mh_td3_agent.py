@@ -1,7 +1,6 @@
-import torch
-
 import utils
 from agent.td3 import MultiHeadTd3MlpAgent, SiTd3MlpAgent
+from agent.synaptic_intelligence import SynapticIntelligence
 
 
 class SiMultiHeadTd3MlpAgent(MultiHeadTd3MlpAgent, SiTd3MlpAgent):
@@ -37,32 +36,7 @@ class SiMultiHeadTd3MlpAgent(MultiHeadTd3MlpAgent, SiTd3MlpAgent):
 
     def _save_init_params(self):
         # set prev_task_params as weight initializations
-        for name, param in self.actor.named_common_parameters():
-            if param.requires_grad:
-                self.prev_task_params[name] = param.detach().clone()
-                self.prev_params[name] = param.detach().clone()
-
-    def update_omegas(self):
-        for name, param in self.actor.named_common_parameters():
-            if param.requires_grad:
-                prev_param = self.prev_task_params[name]
-                current_param = param.detach().clone()
-                delta_param = current_param - prev_param
-                current_omega = self.params_w[name] / (delta_param ** 2 + self.si_epsilon)
-
-                self.prev_task_params[name] = current_param
-                self.omegas[name] = current_omega + self.omegas.get(name, torch.zeros_like(param))
-
-        # clear importance buffers for the next task
-        self.params_w = {}
-
-    def _estimate_importance(self):
-        for name, param in self.actor.named_common_parameters():
-            if param.requires_grad:
-                self.params_w[name] = \
-                    -param.grad.detach() * (param.detach() - self.prev_params[name]) + \
-                    self.params_w.get(name, torch.zeros_like(param))
-                self.prev_params[name] = param.detach().clone()
+        self.si = SynapticIntelligence(self.actor.named_common_parameters(), self.si_epsilon)
 
     def update(self, replay_buffer, logger, step, **kwargs):
         obs, action, reward, next_obs, not_done = replay_buffer.sample(self.batch_size)
@@ -74,8 +48,7 @@ class SiMultiHeadTd3MlpAgent(MultiHeadTd3MlpAgent, SiTd3MlpAgent):
 
         if step % self.actor_and_target_update_freq == 0:
             actor_loss = self.compute_actor_loss(obs, **kwargs)
-            actor_si_surrogate_loss = self._compute_surrogate_loss(
-                list(self.actor.named_common_parameters()))
+            actor_si_surrogate_loss = self._compute_surrogate_loss()
             actor_loss = actor_loss + self.si_c * actor_si_surrogate_loss
             self.update_actor(actor_loss, logger, step)
 
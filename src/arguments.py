@@ -11,8 +11,11 @@ ENV_TYPES = [
 	'mujoco'
 ]
 
+# storage dtypes of the replay buffer and the episodic memories, see 'buffers.STORAGE_CODECS'
+STORAGE_DTYPES = ['float32', 'float16', 'bfloat16', 'uint8']
 
-def parse_args():
+
+def parse_args(argv=None):
 	def str2bool(v):
 		if isinstance(v, bool):
 			return v
@@ -90,6 +93,12 @@ def parse_args():
 	parser.add_argument('--sac_num_expl_steps_per_process', default=1000, type=int)
 	parser.add_argument('--sac_num_processes', default=1, type=int)
 	parser.add_argument('--sac_num_train_iters', default=1000, type=int)
+	parser.add_argument('--actor_learner', default=False, type=str2bool)  # collector processes step the envs
+	parser.add_argument('--actor_learner_num_collectors', default=2, type=int)  # each with sac_num_processes envs
+	parser.add_argument('--actor_learner_max_policy_lag', default=1, type=int)  # epochs collectors may run ahead
+	parser.add_argument('--actor_learner_chunk_steps', default=100, type=int)  # steps per message of a collector
+	parser.add_argument('--actor_learner_start_method', default='spawn', type=str,
+						choices=['spawn', 'forkserver', 'fork'])
 	parser.add_argument('--sac_actor_hidden_dim', default=400, type=int)  # 1024
 	parser.add_argument('--sac_critic_hidden_dim', default=256, type=int)
 	parser.add_argument('--init_temperature', default=1.0, type=float)  # 0.1
@@ -102,6 +111,12 @@ def parse_args():
 	parser.add_argument('--critic_lr', default=3e-4, type=float)  # 1e-3
 	parser.add_argument('--critic_tau', default=0.005, type=float)  # 0.01
 	parser.add_argument('--critic_target_update_freq', default=1, type=int)  # 1
+	# prioritized replay of the SAC agents, beta is annealed to 1 over every task
+	parser.add_argument('--sac_prioritized_replay', default=False, type=str2bool)
+	parser.add_argument('--sac_prioritized_replay_alpha', default=0.6, type=float)
+	parser.add_argument('--sac_prioritized_replay_beta', default=0.4, type=float)
+	# n-step returns of the SAC agents, computed by the replay buffer at sample time
+	parser.add_argument('--sac_n_step', default=1, type=int)
 
 	# sac ewc
 	parser.add_argument('--sac_ewc_lambda', default=5000, type=float)
@@ -120,6 +135,7 @@ def parse_args():
 	parser.add_argument('--sac_agem_critic_grad_norm_reg_coeff', default=1.0, type=float)
 	parser.add_argument('--sac_agem_memory_budget', default=5000, type=int)
 	parser.add_argument('--sac_agem_ref_grad_batch_size', default=500, type=int)
+	parser.add_argument('--sac_agem_memory_dtype', default='float32', type=str, choices=STORAGE_DTYPES)
 	parser.add_argument('--sac_agem_clip_param', default=0.2, type=float)
 
 	# sac si
@@ -142,6 +158,10 @@ def parse_args():
 	parser.add_argument('--sac_distillation_iters_per_epoch', default=50, type=int)
 	parser.add_argument('--sac_distillation_batch_size', default=1000, type=int)
 	parser.add_argument('--sac_distillation_memory_budget_per_task', default=50000, type=int)
+	parser.add_argument('--sac_distillation_refresh_interval', default=1, type=int)
+	parser.add_argument('--sac_distillation_prev_task_batch_num', default=3, type=int)
+	parser.add_argument('--sac_distillation_memory_device', default='cpu', type=str)
+	parser.add_argument('--sac_distillation_memory_dtype', default='float32', type=str, choices=STORAGE_DTYPES)
 
 	# sac hypernet
 	parser.add_argument('--sac_hypernet_hidden_dim', default=128, type=int)
@@ -220,6 +240,7 @@ def parse_args():
 	parser.add_argument('--ppo_gae_lambda', default=0.95, type=float)
 	parser.add_argument('--ppo_use_proper_time_limits', default=False, action='store_true')
 	parser.add_argument('--ppo_num_batch', default=32, type=int)
+	parser.add_argument('--ppo_rollout_host_staging', default=False, action='store_true')
 
 	# ppo ewc
 	parser.add_argument('--ppo_ewc_lambda', default=5000, type=float)
@@ -249,18 +270,25 @@ def parse_args():
 	parser.add_argument('--load_checkpoint', default=None, type=str)
 	parser.add_argument('--load_dir', default=None, type=str)
 	parser.add_argument('--replay_buffer_capacity', default=1000000, type=int)  # (chongyi zheng), 100000
+	parser.add_argument('--replay_buffer_obs_dtype', default='float32', type=str, choices=STORAGE_DTYPES)
+	parser.add_argument('--replay_buffer_action_dtype', default='float32', type=str, choices=STORAGE_DTYPES)
 	parser.add_argument('--save_model', default=False, type=str2bool)
 	parser.add_argument('--save_task_model', default=False, type=str2bool)
+	parser.add_argument('--checkpoint_freq', default=0, type=int)  # epochs between checkpoints, 0 disables
+	parser.add_argument('--resume', default=False, type=str2bool)
 	parser.add_argument('--save_video', default=False, type=str2bool)
+	parser.add_argument('--video_frame_skip', default=1, type=int)
 	parser.add_argument('--log_freq', default=5, type=int)
 	parser.add_argument('--save_tb', default=False, type=str2bool)  # (chongyi zheng)
+	parser.add_argument('--profile', default=False, type=str2bool)  # time the phases of the training loop
+	parser.add_argument('--profile_sync', default=True, type=str2bool)  # synchronize cuda at phase boundaries
 
 	# pad
 	# parser.add_argument('--pad_checkpoint', default=None, type=str)
 	# parser.add_argument('--pad_batch_size', default=32, type=int)
 	# parser.add_argument('--pad_num_episodes', default=100, type=int)
 
-	args = parser.parse_args()
+	args = parser.parse_args(argv)
 
 	assert args.mode in {'train', 'eval', 'eval_color_easy', 'eval_color_hard'} or 'eval_video' in args.mode, \
 		f'unrecognized mode "{args.mode}"'
@@ -271,6 +299,15 @@ def parse_args():
 	assert np.sum([args.use_inv, args.use_rot, args.use_curl]) <= 1, \
 		'can use at most one self-supervised task'
 
+	# the collectors act with the actor only, the hypernet agents infer the actor weights of every task
+	hypernet_algos = ['task_embedding_hypernet', 'sparse_gp_hypernet', 'gp_lvm_hypernet']
+	assert not args.actor_learner or not any(x in args.algo for x in hypernet_algos), \
+		f'actor-learner mode does not support {args.algo}'
+	# these agents sample their own uniform batches, they never read the priorities or the importance weights
+	uniform_update_algos = hypernet_algos + ['fisher_brc']
+	assert not args.sac_prioritized_replay or not any(x in args.algo for x in uniform_update_algos), \
+		f'prioritized replay does not support {args.algo}'
+
 	if args.load_checkpoint is not None:
 		try:
 			args.load_checkpoint = args.load_checkpoint.replace('k', '000')
@@ -0,0 +1,54 @@
+"""Benchmarks of the training code, run from 'src' as 'python -m benchmarks <benchmark> [arguments]'
+
+Every benchmark is a module of this package with an 'add_arguments(parser)' and a 'main(args)' function. The
+modules are only imported when their benchmark runs, so a benchmark whose optional dependencies are missing (e.g.
+dm_control or d4rl) does not break the others.
+"""
+
+import json
+import time
+
+import torch
+
+
+# benchmark name: (module, one line description)
+BENCHMARKS = {
+    'action_grads': ('benchmarks.action_grads', 'gradient norm penalties of the critics, explicit action gradients '
+                                                'against double backward'),
+    'dataset': ('benchmarks.dataset', 'batches per second of the Fisher-BRC datasets against a DataLoader'),
+    'dmc_wrapper': ('benchmarks.dmc_wrapper', 'observation flattening and steps per second of the dmc2gym wrapper'),
+    'imports': ('benchmarks.imports', 'import time of the CLI entry points and of the agent classes'),
+    'inference': ('benchmarks.inference', 'throughput and tail latency of the batched inference server'),
+    'replay': ('benchmarks.replay', 'sampling the uniform and prioritized replay buffers as their capacity grows'),
+    'resets': ('benchmarks.resets', 'resets per second of the locomotion environments'),
+    'returns': ('benchmarks.returns', "'RolloutStorage.compute_returns' against the step by step GAE loop"),
+    'storage': ('benchmarks.storage', 'memory, sampling time and reconstruction error of the storage dtypes'),
+    'throughput': ('benchmarks.throughput', 'env steps, updates and task switches per second on the synthetic '
+                                            'environments'),
+}
+
+
+def is_multi_head(algo):
+    # same test as 'train_sac'
+    return any(x in algo for x in ['mh', 'mi', 'individual', 'hypernet', 'distilled'])
+
+
+def time_per_call(fn, num_calls, num_warmup_calls=10, device=None):
+    """Mean seconds per call of 'fn' after 'num_warmup_calls' calls, waiting for the kernels on a CUDA 'device'"""
+    for _ in range(min(num_warmup_calls, num_calls)):
+        fn()
+    if device is not None and device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(num_calls):
+        fn()
+    if device is not None and device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / num_calls
+
+
+def save_results(path, args, results):
+    """Write the arguments and the results of a benchmark to the json file 'path', if any"""
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
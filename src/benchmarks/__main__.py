@@ -0,0 +1,26 @@
+import argparse
+import importlib
+import sys
+
+from benchmarks import BENCHMARKS
+
+
+def main(argv):
+    description = 'benchmarks:\n' + '\n'.join(f'  {name:<14}{help}' for name, (_, help) in BENCHMARKS.items())
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=description,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=list(BENCHMARKS), metavar='benchmark',
+                        help="one of the benchmarks above, 'python -m benchmarks <benchmark> -h' for its arguments")
+    args = parser.parse_args(argv[:1])
+
+    # only the module of the selected benchmark is imported, with its dependencies
+    module = importlib.import_module(BENCHMARKS[args.benchmark][0])
+    benchmark_parser = argparse.ArgumentParser(prog=f'python -m benchmarks {args.benchmark}',
+                                               description=module.__doc__,
+                                               formatter_class=argparse.RawDescriptionHelpFormatter)
+    module.add_arguments(benchmark_parser)
+    module.main(benchmark_parser.parse_args(argv[1:]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,130 @@
+"""Time of the gradient norm penalties of the critics, explicit action gradients against double backward
+
+For every critic of 'critic_cases', the time of one update step of the penalty mean(|dQ1/da|^2 + |dQ2/da|^2) plus
+a TD-like loss on the Q estimates is measured, from the actions of a tanh actor to the parameter gradients of the
+critic and the actor, with:
+- 'autograd': the action gradients of 'torch.autograd.grad(..., create_graph=True)', backpropagated twice,
+- 'explicit': the action gradients built in the forward pass by 'utils.mlp_action_grad', backpropagated once.
+The equality of the two is tested in 'tests/test_checks.py', on the critics of this module.
+
+Example:
+    python -m benchmarks action_grads --batch_size 512 --hidden_dim 256 --output action_grads.json
+"""
+
+import torch
+from torch import nn
+
+from agent.network import SacCriticMlp, MultiHeadSacCriticMlp, MultiInputSacCriticMlp
+from benchmarks import time_per_call, save_results
+from fisher_brc.networks import OffsetCritic
+import utils
+
+
+class _TrunkCritic(nn.Module):
+    """Two plain ReLU trunks called through 'utils.mlp_action_grad'"""
+    def __init__(self, obs_dim, action_dim, hidden_dims):
+        super().__init__()
+        self.trunks = nn.ModuleList()
+        for _ in range(2):
+            layers, input_dim = [], obs_dim + action_dim
+            for hidden_dim in hidden_dims:
+                layers += [nn.Linear(input_dim, hidden_dim), nn.ReLU()]
+                input_dim = hidden_dim
+            self.trunks.append(nn.Sequential(*layers, nn.Linear(input_dim, 1)))
+
+    def forward(self, obs, action):
+        obs_action = torch.cat([obs, action], dim=-1)
+        return tuple(trunk(obs_action) for trunk in self.trunks)
+
+    def forward_with_action_grads(self, obs, action):
+        obs_action = torch.cat([obs, action], dim=-1)
+        (q1, q1_grad), (q2, q2_grad) = [utils.mlp_action_grad(trunk, obs_action, action.size(-1))
+                                        for trunk in self.trunks]
+        return q1, q2, q1_grad, q2_grad
+
+
+def critic_cases(obs_dim, action_dim, hidden_dim):
+    """(name, critic, Q estimates function, explicit Q estimates and action gradients function)"""
+    num_heads = 3
+    cases = []
+    for hidden_dims in [(), (hidden_dim,), (hidden_dim, hidden_dim, hidden_dim)]:
+        critic = _TrunkCritic(obs_dim, action_dim, hidden_dims)
+        cases.append((f'mlp_action_grad {len(hidden_dims)} hidden', critic, critic, critic.forward_with_action_grads))
+
+    critic = SacCriticMlp((obs_dim,), (action_dim,), hidden_dim)
+    cases.append(('SacCriticMlp', critic, critic, critic.forward_with_action_grads))
+    for critic_cls in [MultiHeadSacCriticMlp, MultiInputSacCriticMlp]:
+        critic = critic_cls((obs_dim,), [(action_dim,)] * num_heads, hidden_dim)
+        head_idx = num_heads - 1
+        cases.append((critic_cls.__name__, critic,
+                      lambda obs, action, critic=critic: critic(obs, action, head_idx),
+                      lambda obs, action, critic=critic: critic.forward_with_action_grads(obs, action, head_idx)))
+
+    # the behavioral cloner only enters the Q estimates, not the penalty on the offsets
+    critic = OffsetCritic(None, obs_dim, action_dim, hidden_dims=(hidden_dim, hidden_dim, hidden_dim))
+    cases.append(('fisher_brc OffsetCritic', critic,
+                  lambda obs, action, critic=critic: (critic.offset1(obs, action), critic.offset2(obs, action)),
+                  critic.offset_action_grads))
+    return cases
+
+
+def autograd_outputs(q_fn, obs, action):
+    """Q estimates and action gradients by double backward, as before the explicit gradients"""
+    q1, q2 = q_fn(obs, action)
+    q1_grad = torch.autograd.grad(q1.sum(), action, create_graph=True)[0]
+    q2_grad = torch.autograd.grad(q2.sum(), action, create_graph=True)[0]
+    return q1, q2, q1_grad, q2_grad
+
+
+def penalty_loss(q1, q2, q1_grad, q2_grad):
+    penalty = torch.mean(torch.sum(torch.square(q1_grad), dim=-1) + torch.sum(torch.square(q2_grad), dim=-1))
+    return penalty, penalty + torch.mean(torch.square(q1.reshape(-1) - 1.0) + torch.square(q2.reshape(-1) - 1.0))
+
+
+def benchmark_critic(critic, q_fn, explicit_fn, args):
+    device = torch.device(args.device)
+    critic.to(device)
+    actor = nn.Linear(args.obs_dim, args.action_dim).to(device)
+    obs = torch.randn(args.batch_size, args.obs_dim, device=device)
+    params = list(critic.parameters()) + list(actor.parameters())
+
+    def step(outputs_fn):
+        for param in params:
+            param.grad = None
+        action = torch.tanh(actor(obs))
+        penalty_loss(*outputs_fn(obs, action))[1].backward()
+
+    return {
+        'autograd_ms': time_per_call(lambda: step(lambda obs, action: autograd_outputs(q_fn, obs, action)),
+                                     args.num_calls, device=device) * 1e3,
+        'explicit_ms': time_per_call(lambda: step(explicit_fn), args.num_calls, device=device) * 1e3,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--obs_dim', type=int, default=39)
+    parser.add_argument('--action_dim', type=int, default=4)
+    parser.add_argument('--hidden_dim', type=int, default=256)
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--num_calls', type=int, default=100)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    torch.manual_seed(args.seed)
+
+    results = {}
+    print(f"{'critic':<28}  {'autograd':>10}  {'explicit':>10}  {'speedup':>7}")
+    for name, critic, q_fn, explicit_fn in critic_cases(args.obs_dim, args.action_dim, args.hidden_dim):
+        result = benchmark_critic(critic, q_fn, explicit_fn, args)
+        result['speedup'] = result['autograd_ms'] / result['explicit_ms']
+        results[name] = result
+        print(f"{name:<28}  {result['autograd_ms']:8.3f}ms  {result['explicit_ms']:8.3f}ms  "
+              f"{result['speedup']:6.2f}x")
+
+    save_results(args.output, args, results)
@@ -0,0 +1,134 @@
+"""Batches per second of the Fisher-BRC datasets against the DataLoader they replaced
+
+A synthetic D4RL dataset of '--num_transitions' transitions ('--state_dim' dimensional states, '--action_dim'
+dimensional actions) is written as a directory of '.npy' files, then the batches per second of one shuffled epoch
+(at most '--num_batches' batches) on '--device' are measured for:
+- 'dataloader': the per-item dataset with a shuffled 'DataLoader' and 'default_collate', as before
+  'D4RLTensorDataset',
+- 'tensor': 'D4RLTensorDataset' of the arrays loaded into memory,
+- 'memmap': 'D4RLTensorDataset' of the memory mapped '.npy' files, kept lazy on the CPU,
+- 'memmap_device' (with a CUDA '--device'): the memory mapped files converted onto the device in chunks of rows.
+Also reported are the bytes of the dataset converted into tensors at construction, zero for the lazy memory maps,
+and the rows of the same indices gathered by every dataset are compared.
+
+Example:
+    python -m benchmarks dataset --num_transitions 1000000 --batch_size 256 --output dataset.json
+"""
+
+import os.path as osp
+import tempfile
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+from torch.utils.data.dataloader import default_collate
+
+from benchmarks import save_results
+from fisher_brc.d4rl_utils import DATASET_KEYS, D4RLTensorDataset, load_local_dataset
+
+
+class _ItemDataset(Dataset):
+    """Per-item dataset of the DataLoader path"""
+    def __init__(self, states, actions, rewards, not_dones, next_states):
+        self.fields = [states, actions, rewards, not_dones, next_states]
+
+    def __len__(self):
+        return len(self.fields[0])
+
+    def __getitem__(self, idx):
+        return tuple(field[idx] for field in self.fields)
+
+
+def make_dataloader(dataset, batch_size, device):
+    fields = [np.array(dataset['observations'], dtype=np.float32),
+              np.array(dataset['actions'], dtype=np.float32),
+              np.array(dataset['rewards'], dtype=np.float32),
+              np.array(np.logical_not(dataset['terminals']), dtype=np.float32),
+              np.array(dataset['next_observations'], dtype=np.float32)]
+    return DataLoader(_ItemDataset(*fields), batch_size=batch_size, shuffle=True, drop_last=True,
+                      collate_fn=lambda x: [elem.to(device) for elem in default_collate(x)])
+
+
+def write_dataset(dataset_dir, args):
+    rng = np.random.RandomState(args.seed)
+    arrays = {
+        'observations': rng.randn(args.num_transitions, args.state_dim).astype(np.float32),
+        'actions': rng.uniform(-1.0, 1.0, (args.num_transitions, args.action_dim)).astype(np.float32),
+        'rewards': rng.randn(args.num_transitions).astype(np.float32),
+        'terminals': rng.uniform(size=args.num_transitions) < 1e-3,
+    }
+    arrays['next_observations'] = np.roll(arrays['observations'], -1, axis=0)
+    for key in DATASET_KEYS:
+        np.save(osp.join(dataset_dir, key + '.npy'), arrays[key])
+
+
+def _tensor_dataset(dataset, args, storage_device=None):
+    return D4RLTensorDataset(dataset['observations'], dataset['actions'], dataset['rewards'], dataset['terminals'],
+                             dataset['next_observations'], args.batch_size, args.device,
+                             storage_device=storage_device)
+
+
+def batches_per_second(batches, num_batches, device):
+    start = time.perf_counter()
+    count = 0
+    for batch in batches:
+        count += 1
+        if count == num_batches:
+            break
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return count / (time.perf_counter() - start)
+
+
+def add_arguments(parser):
+    parser.add_argument('--num_transitions', type=int, default=1000000)
+    parser.add_argument('--state_dim', type=int, default=17)
+    parser.add_argument('--action_dim', type=int, default=6)
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--num_batches', type=int, default=1000, help='most batches measured per dataset')
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    device = torch.device(args.device)
+    torch.manual_seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as dataset_dir:
+        write_dataset(dataset_dir, args)
+        memmaps = load_local_dataset(dataset_dir)
+        in_memory = {key: np.array(value) for key, value in memmaps.items()}
+
+        datasets = {
+            'dataloader': make_dataloader(in_memory, args.batch_size, device),
+            'tensor': _tensor_dataset(in_memory, args),
+            'memmap': _tensor_dataset(memmaps, args, storage_device='cpu'),
+        }
+        if device.type == 'cuda':
+            datasets['memmap_device'] = _tensor_dataset(memmaps, args)
+
+        # the same rows from every D4RLTensorDataset
+        idxs = torch.sort(torch.randint(0, args.num_transitions, (args.batch_size,))).values
+        expected = [torch.as_tensor(value[idxs.numpy()], dtype=torch.float32, device=device)
+                    for value in [in_memory['observations'], in_memory['actions'], in_memory['rewards'],
+                                  np.logical_not(in_memory['terminals']), in_memory['next_observations']]]
+        for name, dataset in datasets.items():
+            if isinstance(dataset, D4RLTensorDataset):
+                batch = dataset._gather(idxs.to(dataset.storage_device))
+                if not all(torch.equal(x, y) for x, y in zip(batch, expected)):
+                    raise SystemExit(f'{name}: gathered rows differ from the dataset')
+
+        results = {}
+        print(f"{'dataset':<14}  {'batches/s':>10}  {'converted bytes':>15}")
+        for name, dataset in datasets.items():
+            converted = 0
+            if isinstance(dataset, D4RLTensorDataset):
+                converted = sum(field.element_size() * field.nelement() for field in dataset.fields
+                                if isinstance(field, torch.Tensor))
+            rate = batches_per_second(dataset, args.num_batches, device)
+            results[name] = {'batches_per_second': rate, 'converted_bytes': converted}
+            print(f'{name:<14}  {rate:10.1f}  {converted:15d}')
+
+    save_results(args.output, args, results)
@@ -0,0 +1,56 @@
+"""Micro-benchmark of the dmc2gym wrapper on vector (pixel-free) observations
+
+Reports the time of flattening one observation of the environment, by concatenating raveled pieces and with the
+precomputed layout of the wrapper, and the steps per second of the wrapper with and without snapshotting the
+physics state into info['internal_state'].
+
+Example:
+    python -m benchmarks dmc_wrapper --domain_name walker --task_name run --num_steps 5000
+"""
+
+import time
+
+import numpy as np
+
+from benchmarks import time_per_call
+from dmc2gym.wrappers import DMCSuiteWrapper, _ObsFlattener
+
+
+def _concat_flatten(obs):
+    return np.concatenate([np.array([v]) if np.isscalar(v) else v.ravel() for v in obs.values()], axis=0)
+
+
+def steps_per_second(env, num_steps):
+    env.reset()
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        _, _, done, _ = env.step(env.action_space.sample())
+        if done:
+            env.reset()
+    return num_steps / (time.perf_counter() - start)
+
+
+def add_arguments(parser):
+    parser.add_argument('--domain_name', type=str, default='walker')
+    parser.add_argument('--task_name', type=str, default='run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--num_steps', type=int, default=5000)
+    parser.add_argument('--num_calls', type=int, default=100000)
+
+
+def main(args):
+    results = {}
+    for internal_state in [True, False]:
+        env = DMCSuiteWrapper(args.domain_name, args.task_name, task_kwargs={'random': args.seed},
+                              internal_state=internal_state)
+        results[internal_state] = steps_per_second(env, args.num_steps)
+
+    time_step = env._env.reset()
+    flattener = _ObsFlattener(env._env.observation_spec())
+    assert np.array_equal(flattener(time_step.observation), _concat_flatten(time_step.observation))
+    concat_time = time_per_call(lambda: _concat_flatten(time_step.observation), args.num_calls, num_warmup_calls=0)
+    layout_time = time_per_call(lambda: flattener(time_step.observation), args.num_calls, num_warmup_calls=0)
+
+    print(f"flatten: concatenate {concat_time * 1e6:.2f} us, layout {layout_time * 1e6:.2f} us")
+    print(f"step: with internal_state {results[True]:.1f} steps/s, without {results[False]:.1f} steps/s "
+          f"({results[False] / results[True]:.2f}x)")
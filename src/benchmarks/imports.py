@@ -0,0 +1,90 @@
+"""Measure the import (startup) time of the CLI entry points
+
+Every entry point is imported in a fresh interpreter, without running its '__main__' block, 'repeats' times and
+the fastest import is reported, together with the time of resolving the agent class of every algorithm in
+'--algos' (what 'make_agent' imports on top of 'agent'). Entry points that fail to import, e.g. because an optional
+dependency is not installed, are reported with the last line of the error.
+
+Example:
+    python -m benchmarks imports --algos sac_mlp td3_mlp ppo_mlp --repeats 5
+"""
+
+import glob
+import json
+import os
+import os.path as osp
+import subprocess
+import sys
+
+
+SRC_DIR = osp.dirname(osp.dirname(osp.abspath(__file__)))
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'time': time.perf_counter() - start, 'num_modules': len(sys.modules)}}))
+"""
+
+_AGENT_SNIPPET = """
+import json, sys, time
+import agent
+start = time.perf_counter()
+agent.agent_class({algo!r})
+print(json.dumps({{'time': time.perf_counter() - start, 'num_modules': len(sys.modules)}}))
+"""
+
+
+def entry_points():
+    """Modules of the scripts in 'src' that can be run from the command line"""
+    modules = []
+    for path in sorted(glob.glob(osp.join(SRC_DIR, '*.py'))):
+        with open(path, 'r') as f:
+            if "__name__ == '__main__'" in f.read():
+                modules.append(osp.splitext(osp.basename(path))[0])
+
+    return modules
+
+
+def _time(code, repeats):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([SRC_DIR, osp.dirname(SRC_DIR), env.get('PYTHONPATH', '')])
+
+    results = []
+    for _ in range(repeats):
+        proc = subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'error': lines[-1] if len(lines) > 0 else f'exit code {proc.returncode}'}
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    return min(results, key=lambda result: result['time'])
+
+
+def add_arguments(parser):
+    parser.add_argument('--entry_points', type=str, nargs='*', default=None,
+                        help='modules to import, all scripts in src with a __main__ block by default')
+    parser.add_argument('--algos', type=str, nargs='*', default=['sac_mlp', 'td3_mlp', 'ppo_mlp'])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    modules = args.entry_points if args.entry_points else entry_points()
+
+    rows = []
+    for module in modules:
+        rows.append(('import ' + module, _time(_IMPORT_SNIPPET.format(module=module), args.repeats)))
+    for algo in args.algos:
+        rows.append(('agent_class ' + algo, _time(_AGENT_SNIPPET.format(algo=algo), args.repeats)))
+
+    width = max(len(name) for name, _ in rows)
+    for name, result in rows:
+        if 'error' in result:
+            print(f"{name:<{width}}  failed: {result['error']}")
+        else:
+            print(f"{name:<{width}}  {result['time'] * 1e3:9.1f} ms  {result['num_modules']:5d} modules")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(dict(rows), f, indent=2)
@@ -0,0 +1,138 @@
+"""Throughput and tail latency of the batched inference server as the number of environment workers grows
+
+For every worker count in '--num_workers', that many workers (threads or local processes, '--backend') each step
+'--envs_per_worker' synthetic environments for '--steps_per_worker' steps, with the actions of one agent served by
+an 'inference_server.InferenceServer'. Reported per worker count:
+- the env steps and the action requests per second of all workers together,
+- the mean number of requests and observations of the batches of the server,
+- the percentiles of the latency of the action requests, from sending the observations to receiving the actions.
+
+Run with '--max_batch_size 1' for the baseline of one forward pass per request.
+
+Example:
+    python -m benchmarks inference --num_workers 1 2 4 8 16 --backend process --output inference.json
+"""
+
+import queue
+import shlex
+import tempfile
+import threading
+import time
+
+import numpy as np
+import torch
+
+from arguments import parse_args
+from agent import make_agent
+from benchmarks import is_multi_head, save_results
+from environment.synthetic_envs import make_synthetic_env
+from inference_server import InferenceServer, latency_summary
+import utils
+
+
+def run_worker(client, env_name, num_envs, num_steps, seed, act_kwargs, barrier, results):
+    envs = [make_synthetic_env(env_name) for _ in range(num_envs)]
+    for idx, env in enumerate(envs):
+        env.seed(seed + idx)
+    obs = np.stack([env.reset() for env in envs])
+    barrier.wait()
+
+    for _ in range(num_steps):
+        action = client.act(obs, **act_kwargs)
+        if isinstance(action, tuple):
+            # the PPO agents also return the log probabilities
+            action = action[0]
+        for idx, env in enumerate(envs):
+            next_obs, _, done, _ = env.step(action[idx])
+            obs[idx] = env.reset() if done else next_obs
+
+    results.put((client.client_id, list(client.latencies)))
+
+
+def benchmark_workers(agent, num_workers, args):
+    ctx = torch.multiprocessing.get_context(args.start_method) if args.backend == 'process' else None
+    server = InferenceServer(agent, max_batch_size=args.max_batch_size, max_latency=args.max_latency_ms * 1e-3,
+                             ctx=ctx)
+    clients = [server.client() for _ in range(num_workers)]
+    act_kwargs = {'sample': True}
+    if is_multi_head(args.algo):
+        act_kwargs['head_idx'] = 0
+
+    if ctx is None:
+        barrier, results, worker_cls = threading.Barrier(num_workers + 1), queue.Queue(), threading.Thread
+    else:
+        barrier, results, worker_cls = ctx.Barrier(num_workers + 1), ctx.Queue(), ctx.Process
+    workers = [worker_cls(target=run_worker,
+                          args=(client, args.env_name, args.envs_per_worker, args.steps_per_worker,
+                                args.seed + client.client_id * args.envs_per_worker, act_kwargs, barrier, results))
+               for client in clients]
+
+    server.start()
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    latencies = [results.get() for _ in range(num_workers)]
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+    server.stop()
+
+    stats = server.stats()
+    num_requests = num_workers * args.steps_per_worker
+    return {
+        'env_steps_per_second': num_requests * args.envs_per_worker / elapsed,
+        'requests_per_second': num_requests / elapsed,
+        'mean_batch_requests': stats['mean_batch_requests'],
+        'mean_batch_rows': stats['mean_batch_rows'],
+        'latency': latency_summary([latency for _, worker_latencies in latencies for latency in worker_latencies]),
+        'forward': stats['forward'],
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--algo', type=str, default='sac_mlp')
+    parser.add_argument('--agent_args', type=str, default='', help='extra arguments of the agent, as on the '
+                                                                   'command line of the training scripts')
+    parser.add_argument('--env_name', type=str, default='synthetic-mt1-reach-v2')
+    parser.add_argument('--num_workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--envs_per_worker', type=int, default=1)
+    parser.add_argument('--steps_per_worker', type=int, default=500)
+    parser.add_argument('--backend', type=str, default='process', choices=['thread', 'process'])
+    parser.add_argument('--start_method', type=str, default='spawn', choices=['spawn', 'forkserver', 'fork'])
+    parser.add_argument('--max_batch_size', type=int, default=256, help='observations per forward pass')
+    parser.add_argument('--max_latency_ms', type=float, default=2.0, help='longest wait of a request for a batch')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch intra-op threads of the server')
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        agent_args = parse_args(['--algo', args.algo, '--env_type', 'metaworld', '--seed', str(args.seed),
+                                 '--work_dir', work_dir, '--device', args.device] + shlex.split(args.agent_args))
+    utils.set_seed_everywhere(args.seed)
+    env = make_synthetic_env(args.env_name)
+    agent = make_agent(
+        obs_space=env.observation_space,
+        action_space=[env.action_space] if is_multi_head(args.algo) else env.action_space,
+        device=torch.device(args.device),
+        args=agent_args
+    )
+
+    results = {}
+    print(f"{'workers':>7}  {'env steps/s':>11}  {'requests/s':>10}  {'batch':>6}  {'p50':>8}  {'p90':>8}  "
+          f"{'p99':>8}  {'max':>8}")
+    for num_workers in args.num_workers:
+        result = benchmark_workers(agent, num_workers, args)
+        results[num_workers] = result
+        latency = result['latency']
+        print(f"{num_workers:>7}  {result['env_steps_per_second']:11.1f}  {result['requests_per_second']:10.1f}  "
+              f"{result['mean_batch_requests']:6.2f}  {latency['p50_ms']:6.2f}ms  {latency['p90_ms']:6.2f}ms  "
+              f"{latency['p99_ms']:6.2f}ms  {latency['max_ms']:6.2f}ms")
+
+    save_results(args.output, args, results)
@@ -0,0 +1,88 @@
+"""Micro-benchmark of sampling the replay buffers as their capacity grows
+
+For every capacity in '--capacities' a full buffer of synthetic MT1 sized transitions (39 dimensional observations,
+4 dimensional actions) is built with random priorities, then the time per call is measured for:
+- 'sample' of the uniform replay buffer,
+- 'sample_prioritized' of the prioritized replay buffer,
+- 'update_priorities' of the prioritized replay buffer with the TD errors of a batch.
+
+The cost of the prioritized buffer should grow with the depth of its sum tree only, i.e. stay flat from thousands
+to millions of transitions. The last column is the time per prioritized sample and update relative to the smallest
+capacity.
+
+Example:
+    python -m benchmarks replay --capacities 10000 100000 1000000 --output replay.json
+"""
+
+import numpy as np
+import torch
+
+from benchmarks import time_per_call, save_results
+import buffers
+from environment.synthetic_envs import SyntheticMT1Env
+
+
+def _fill(replay_buffer, rng):
+    # write the storage at once instead of adding transitions one by one, only the sampled values matter here
+    for name in replay_buffer._storage_names():
+        storage = getattr(replay_buffer, name)
+        storage[:] = rng.uniform(size=storage.shape)
+    replay_buffer.idx = 0
+    replay_buffer.full = True
+
+    if isinstance(replay_buffer, buffers.PrioritizedReplayBuffer):
+        priorities = rng.uniform(1e-3, 1.0, size=replay_buffer.capacity * replay_buffer.n_envs)
+        # the row that holds the next observations of the newest transitions is never sampled
+        priorities[replay_buffer._row_leaves(replay_buffer.idx)] = 0.0
+        replay_buffer.sum_tree.update(np.arange(len(priorities)), priorities)
+
+
+def benchmark_capacity(capacity, args):
+    rng = np.random.RandomState(args.seed)
+    np.random.seed(args.seed)
+    env = SyntheticMT1Env('reach-v2')
+    device = torch.device(args.device)
+
+    uniform_buffer = buffers.ReplayBuffer(env.observation_space, env.action_space, capacity, device,
+                                          n_envs=args.num_processes, optimize_memory_usage=True)
+    _fill(uniform_buffer, rng)
+    uniform_time = time_per_call(lambda: uniform_buffer.sample(args.batch_size), args.num_calls)
+    del uniform_buffer
+
+    prioritized_buffer = buffers.PrioritizedReplayBuffer(env.observation_space, env.action_space, capacity, device,
+                                                         n_envs=args.num_processes, optimize_memory_usage=True)
+    _fill(prioritized_buffer, rng)
+    idxs = prioritized_buffer.sample_prioritized(args.batch_size)[-1]
+    td_errors = torch.as_tensor(rng.standard_normal((args.batch_size, 1)), dtype=torch.float32)
+
+    sample_time = time_per_call(lambda: prioritized_buffer.sample_prioritized(args.batch_size), args.num_calls)
+    update_time = time_per_call(lambda: prioritized_buffer.update_priorities(idxs, td_errors), args.num_calls)
+
+    return {'uniform_sample_us': uniform_time * 1e6, 'prioritized_sample_us': sample_time * 1e6,
+            'update_priorities_us': update_time * 1e6}
+
+
+def add_arguments(parser):
+    parser.add_argument('--capacities', type=int, nargs='+', default=[10000, 100000, 1000000, 2000000])
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--num_processes', type=int, default=1)
+    parser.add_argument('--num_calls', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    results = {}
+    for capacity in args.capacities:
+        results[capacity] = benchmark_capacity(capacity, args)
+
+    base = results[args.capacities[0]]
+    base_time = base['prioritized_sample_us'] + base['update_priorities_us']
+    print(f"{'capacity':>10}  {'uniform':>10}  {'prioritized':>12}  {'update':>10}  {'ratio':>6}")
+    for capacity, result in results.items():
+        result['ratio'] = (result['prioritized_sample_us'] + result['update_priorities_us']) / base_time
+        print(f"{capacity:>10}  {result['uniform_sample_us']:8.1f}us  {result['prioritized_sample_us']:10.1f}us  "
+              f"{result['update_priorities_us']:8.1f}us  {result['ratio']:6.2f}")
+
+    save_results(args.output, args, results)
@@ -0,0 +1,49 @@
+"""Measure the resets per second of the locomotion environments
+
+Every environment is reset 'num_resets' times with and without reusing the compiled physics (see
+'reuse_compiled_physics' of composer.Environment), a few control steps are taken after every reset, like an
+episode that terminates early would.
+
+Example:
+    python -m benchmarks resets --env_names walker_run ant_run_long --num_resets 50
+"""
+
+import time
+
+import numpy as np
+
+from environment import locomotion_envs
+
+
+def resets_per_second(env, num_resets, num_steps):
+    action_spec = env.action_spec()
+    action = np.zeros(action_spec.shape, dtype=action_spec.dtype)
+
+    env.reset()
+    start = time.perf_counter()
+    for _ in range(num_resets):
+        env.reset()
+        for _ in range(num_steps):
+            env.step(action)
+
+    return num_resets / (time.perf_counter() - start)
+
+
+def add_arguments(parser):
+    parser.add_argument('--env_names', type=str, nargs='+',
+                        default=['walker_run', 'walker_run_long', 'ant_run_long', 'jumping_ball_run_long'])
+    parser.add_argument('--num_resets', type=int, default=50)
+    parser.add_argument('--num_steps', type=int, default=1)
+
+
+def main(args):
+    for env_name in args.env_names:
+        results = {}
+        for reuse_compiled_physics in [False, True]:
+            env = getattr(locomotion_envs, env_name)()
+            env.reuse_compiled_physics = reuse_compiled_physics
+            results[reuse_compiled_physics] = resets_per_second(env, args.num_resets, args.num_steps)
+            env.close()
+
+        print(f"{env_name:<24}  recompile: {results[False]:8.1f} resets/s  "
+              f"reuse: {results[True]:8.1f} resets/s  ({results[True] / results[False]:.2f}x)")
@@ -0,0 +1,99 @@
+"""Time of 'RolloutStorage.compute_returns' against the step by step GAE loop as the rollouts grow
+
+For every rollout length in '--num_steps' a rollout of '--num_processes' environments with random rewards, value
+predictions and episode ends is built on '--device', then the time per call is measured for:
+- 'loop': the GAE loop over the steps that 'compute_returns' ran before the chunked solve,
+- 'chunked': 'compute_returns', solving the recurrence with '_discounted_reverse_cumsum'.
+The equality of the two is tested in 'tests/test_checks.py', with the reference loops of this module.
+
+Example:
+    python -m benchmarks returns --num_steps 128 512 2048 --num_processes 16 --output returns.json
+"""
+
+import torch
+from gym.spaces import Box
+
+from benchmarks import time_per_call, save_results
+from storages import RolloutStorage
+
+
+def reference_gae_returns(rollouts, next_value, gamma, gae_lambda, use_proper_time_limits):
+    """Returns of the GAE loops of 'compute_returns' before the chunked solve"""
+    rollouts.value_preds[-1] = next_value
+    returns = torch.zeros_like(rollouts.returns)
+    gae = 0
+    for step in reversed(range(rollouts.rewards.size(0))):
+        delta = rollouts.rewards[step] + gamma * rollouts.value_preds[step + 1] \
+                * rollouts.masks[step + 1] - rollouts.value_preds[step]
+        gae = delta + gamma * gae_lambda * rollouts.masks[step + 1] * gae
+        if use_proper_time_limits:
+            gae = gae * rollouts.bad_masks[step + 1]
+        returns[step] = gae + rollouts.value_preds[step]
+    return returns
+
+
+def reference_discounted_returns(rollouts, next_value, gamma):
+    """Returns of the loop without GAE and without proper time limits"""
+    returns = torch.zeros_like(rollouts.returns)
+    returns[-1] = next_value
+    for step in reversed(range(rollouts.rewards.size(0))):
+        returns[step] = returns[step + 1] * gamma * rollouts.masks[step + 1] + rollouts.rewards[step]
+    return returns
+
+
+def random_rollouts(num_steps, num_processes, generator, done_prob=0.05, time_limit_prob=0.05):
+    rollouts = RolloutStorage(num_steps, num_processes, (3,), Box(-1.0, 1.0, (2,)), 'cpu')
+    dtype = rollouts.rewards.dtype
+    rollouts.rewards.copy_(torch.randn(rollouts.rewards.shape, generator=generator, dtype=dtype))
+    rollouts.value_preds.copy_(torch.randn(rollouts.value_preds.shape, generator=generator, dtype=dtype))
+    # masks are 0 after an episode end, bad masks are 0 after a time limit, which also ends the episode
+    bad = torch.rand(rollouts.masks.shape, generator=generator) < time_limit_prob
+    done = bad | (torch.rand(rollouts.masks.shape, generator=generator) < done_prob)
+    rollouts.masks.copy_((~done).to(dtype))
+    rollouts.bad_masks.copy_((~bad).to(dtype))
+    next_value = torch.randn(num_processes, 1, generator=generator, dtype=dtype)
+    return rollouts, next_value
+
+
+def benchmark_num_steps(num_steps, args, generator):
+    device = torch.device(args.device)
+    rollouts, next_value = random_rollouts(num_steps, args.num_processes, generator)
+    for name in ['rewards', 'value_preds', 'returns', 'masks', 'bad_masks']:
+        setattr(rollouts, name, getattr(rollouts, name).to(device))
+    rollouts.device = device
+    next_value = next_value.to(device)
+
+    kwargs = dict(gamma=args.gamma, gae_lambda=args.gae_lambda, use_proper_time_limits=args.use_proper_time_limits)
+    loop = time_per_call(lambda: reference_gae_returns(rollouts, next_value, **kwargs), args.num_calls,
+                         num_warmup_calls=3, device=device)
+    chunked = time_per_call(lambda: rollouts.compute_returns(next_value, **kwargs), args.num_calls,
+                            num_warmup_calls=3, device=device)
+    return {'loop_ms': loop * 1e3, 'chunked_ms': chunked * 1e3, 'speedup': loop / chunked}
+
+
+def add_arguments(parser):
+    parser.add_argument('--num_steps', type=int, nargs='+', default=[128, 512, 1024, 2048, 4096])
+    parser.add_argument('--num_processes', type=int, default=16)
+    parser.add_argument('--gamma', type=float, default=0.99)
+    parser.add_argument('--gae_lambda', type=float, default=0.95)
+    parser.add_argument('--use_proper_time_limits', type=int, default=1, choices=[0, 1])
+    parser.add_argument('--num_calls', type=int, default=20)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    generator = torch.Generator().manual_seed(args.seed)
+
+    results = {}
+    print(f"{'steps':>6}  {'loop':>10}  {'chunked':>10}  {'speedup':>7}")
+    for num_steps in args.num_steps:
+        result = benchmark_num_steps(num_steps, args, generator)
+        results[num_steps] = result
+        print(f"{num_steps:>6}  {result['loop_ms']:8.3f}ms  {result['chunked_ms']:8.3f}ms  {result['speedup']:6.2f}x")
+
+    save_results(args.output, args, results)
@@ -0,0 +1,139 @@
+"""Memory per transition, sampling throughput and reconstruction error of the replay buffer storage dtypes
+
+For every storage dtype in '--dtypes' a replay buffer storing observations and actions in that dtype is filled with
+the transitions of a synthetic environment (random actions), alongside a float32 buffer fed the same transitions.
+Reported per dtype:
+- the bytes per transition of the buffer and the ratio to float32,
+- the time of sampling a batch (decoded to float32 on '--device') and the sampled transitions per second,
+- the largest absolute error of the decoded observations and actions against the float32 buffer, and the largest
+  ratio of the error to the bound of the codec: |x| * 2^-11 for float16, |x| * 2^-8 for bfloat16 (relative
+  rounding error) and 0.5 (fixed range) or 1.5 (adaptive range) quantization steps for uint8. A ratio above 1,
+  up to the float32 rounding of the codec arithmetic, fails the run.
+- the bytes per observation of an A-GEM memory of '--memory_size' observations kept in the dtype and the time of
+  indexing a reference gradient batch of it.
+
+Example:
+    python -m benchmarks storage --env_name synthetic-mt1-reach-v2 --dtypes float32 float16 bfloat16 uint8
+"""
+
+import numpy as np
+import torch
+
+from benchmarks import time_per_call, save_results
+import buffers
+from environment.synthetic_envs import make_synthetic_env
+
+
+def _fill(env, replay_buffers, num_steps, rng):
+    obs = env.reset()
+    for _ in range(num_steps):
+        action = rng.uniform(env.action_space.low, env.action_space.high).astype(np.float32)
+        next_obs, reward, done, info = env.step(action)
+        for replay_buffer in replay_buffers:
+            replay_buffer.add(obs[None], action[None], np.array([reward]), next_obs[None], [done], [info])
+        obs = env.reset() if done else next_obs
+
+
+def _bytes_per_transition(replay_buffer):
+    num_bytes = sum(getattr(replay_buffer, name).nbytes for name in replay_buffer._storage_names())
+    return num_bytes / (replay_buffer.capacity * replay_buffer.n_envs)
+
+
+def _error_bound(codec, values):
+    if isinstance(codec, buffers.AffineUInt8Codec):
+        return (1.5 if codec.adaptive else 0.5) * codec.scale
+    if isinstance(codec, buffers.Float16Codec):
+        # plus half of the smallest subnormal step
+        return np.abs(values) * 2.0 ** -11 + 2.0 ** -25
+    if isinstance(codec, buffers.BFloat16Codec):
+        return np.abs(values) * 2.0 ** -8 + np.finfo(np.float32).tiny
+
+    return np.zeros_like(values)
+
+
+def _reconstruction_error(codec, storage, reference):
+    decoded = codec.decode(storage)
+    error = np.abs(decoded - reference)
+    bound = _error_bound(codec, reference)
+
+    return float(error.max()), float(np.max(np.where(error > 0.0, error / np.maximum(bound, 1e-30), 0.0)))
+
+
+def benchmark_dtypes(args):
+    env = make_synthetic_env(args.env_name)
+    env.seed(args.seed)
+    device = torch.device(args.device)
+    rng = np.random.RandomState(args.seed)
+    np.random.seed(args.seed)
+
+    def make_buffer(dtype):
+        return buffers.ReplayBuffer(env.observation_space, env.action_space, args.capacity, device,
+                                    optimize_memory_usage=True, obs_dtype=dtype, action_dtype=dtype)
+
+    reference = make_buffer('float32')
+    replay_buffers = {dtype: make_buffer(dtype) for dtype in args.dtypes}
+    _fill(env, [reference] + list(replay_buffers.values()), args.capacity, rng)
+
+    memory_obses = torch.as_tensor(reference.obses[:args.memory_size, 0], device=device)
+    memory_idxs = np.random.randint(0, len(memory_obses), size=args.batch_size)
+
+    results = {}
+    for dtype, replay_buffer in replay_buffers.items():
+        obs_error, obs_bound_ratio = _reconstruction_error(replay_buffer.obs_codec, replay_buffer.obses,
+                                                           reference.obses)
+        action_error, action_bound_ratio = _reconstruction_error(replay_buffer.action_codec, replay_buffer.actions,
+                                                                 reference.actions)
+        sample_time = time_per_call(lambda: replay_buffer.sample(args.batch_size), args.num_calls)
+
+        memory = buffers.compress_memory({'obses': memory_obses}, dtype)['obses']
+        memory_index_time = time_per_call(lambda: memory[memory_idxs], args.num_calls)
+
+        results[dtype] = {
+            'bytes_per_transition': _bytes_per_transition(replay_buffer),
+            'sample_us': sample_time * 1e6,
+            'transitions_per_second': args.batch_size / sample_time,
+            'obs_max_error': obs_error,
+            'obs_bound_ratio': obs_bound_ratio,
+            'action_max_error': action_error,
+            'action_bound_ratio': action_bound_ratio,
+            'memory_bytes_per_obs': memory.nbytes / len(memory),
+            'memory_index_us': memory_index_time * 1e6,
+        }
+        del replay_buffer
+
+    return results
+
+
+def add_arguments(parser):
+    parser.add_argument('--env_name', type=str, default='synthetic-mt1-reach-v2')
+    parser.add_argument('--dtypes', type=str, nargs='+', default=list(buffers.STORAGE_CODECS),
+                        choices=list(buffers.STORAGE_CODECS), help='the first one is the base of the ratios')
+    parser.add_argument('--capacity', type=int, default=100000)
+    parser.add_argument('--memory_size', type=int, default=5000, help='observations of the A-GEM memory')
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--num_calls', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    results = benchmark_dtypes(args)
+
+    base_bytes = results[args.dtypes[0]]['bytes_per_transition']
+    print(f"{'dtype':>9}  {'bytes':>7}  {'ratio':>5}  {'sample':>9}  {'trans/s':>10}  {'obs err':>9}  "
+          f"{'/bound':>6}  {'act err':>9}  {'/bound':>6}  {'mem bytes':>9}  {'mem index':>9}")
+    for dtype, result in results.items():
+        print(f"{dtype:>9}  {result['bytes_per_transition']:7.1f}  "
+              f"{result['bytes_per_transition'] / base_bytes:5.2f}  {result['sample_us']:7.1f}us  "
+              f"{result['transitions_per_second']:10.0f}  {result['obs_max_error']:9.2e}  "
+              f"{result['obs_bound_ratio']:6.3f}  {result['action_max_error']:9.2e}  "
+              f"{result['action_bound_ratio']:6.3f}  {result['memory_bytes_per_obs']:9.1f}  "
+              f"{result['memory_index_us']:7.1f}us")
+
+    save_results(args.output, args, results)
+
+    exceeded = [dtype for dtype, result in results.items()
+                if max(result['obs_bound_ratio'], result['action_bound_ratio']) > 1.0 + 1e-4]
+    if len(exceeded) > 0:
+        raise SystemExit(f"Reconstruction error above the bound of the codec: {exceeded}")
@@ -0,0 +1,276 @@
+"""Reproducible throughput suite on the synthetic environments
+
+Measures, on a machine without Meta-World, MuJoCo or Atari (see 'environment.synthetic_envs'):
+- the env steps per second of 'make_continual_vec_envs' on 'num_tasks' synthetic tasks of every family in
+  '--families', stepped with random actions, and the latency of switching them to the next task,
+- the updates per second of every algorithm in '--algos' on the synthetic MT1 tasks. SAC and TD3 agents are
+  updated from a replay buffer of 'init_steps' random transitions per process, PPO agents from a full rollout of
+  their own actions (one PPO update runs all epochs over the rollout),
+- the task switch latency of every algorithm: switching the environments to the next task and resetting them,
+  plus the task boundary hooks of the agent (EWC fisher estimation, SI omegas, A-GEM memory) as 'train_sac' runs
+  them.
+
+Everything runs on fixed seeds and the results are written as json, together with the versions of the libraries
+and the arguments, so that the throughput of different commits can be compared. An algorithm that fails is reported
+with its error instead of stopping the suite. Arguments of the agents other than the algorithm can be overridden
+with '--agent_args', e.g. --agent_args "--batch_size 256 --sac_ewc_estimate_fisher_iters 10", or
+--agent_args "--sac_prioritized_replay true" to update the SAC agents from a prioritized replay buffer.
+
+Example:
+    python -m benchmarks throughput --algos sac_mlp ewc_v2_mh_sac_mlp_v2 ppo_mlp --output throughput.json
+"""
+
+import json
+import os
+import platform
+import shlex
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from arguments import parse_args
+from environment import make_continual_vec_envs
+from agent import make_agent
+from benchmarks import is_multi_head
+import buffers
+import storages
+import utils
+from logger import Logger
+
+
+FAMILY_TASKS = {
+    'mt1': ['reach-v2', 'window-close-v2', 'button-press-topdown-v2', 'door-open-v2', 'drawer-close-v2'],
+    'dmc_pixels': ['walker_walk', 'walker_run', 'cheetah_run', 'finger_spin', 'cartpole_swingup'],
+    'mnist': ['task1', 'task2', 'task3', 'task4', 'task5'],
+}
+
+
+def synthetic_env_names(family, num_tasks):
+    return ['synthetic-%s-%s' % (family, task) for task in FAMILY_TASKS[family][:num_tasks]]
+
+
+def make_envs(env_names, seed, num_processes):
+    env = make_continual_vec_envs(env_names, seed, num_processes, None, None,
+                                  allow_early_resets=True, normalize=False)
+    env.action_space.seed(seed)
+
+    return env
+
+
+def _random_actions(env):
+    return np.array([env.action_space.sample() for _ in range(env.num_envs)])
+
+
+def switch_task(env):
+    env.env_method('sample_task')
+    return env.reset()
+
+
+def env_steps_per_second(env, num_steps, num_warmup_steps=100):
+    switch_task(env)
+    for _ in range(num_warmup_steps):
+        env.step(_random_actions(env))
+
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        env.step(_random_actions(env))
+
+    return num_steps * env.num_envs / (time.perf_counter() - start)
+
+
+def _latency_summary(latencies):
+    return {'median_ms': statistics.median(latencies) * 1e3, 'mean_ms': statistics.mean(latencies) * 1e3,
+            'count': len(latencies)}
+
+
+def env_task_switch_latency(env, num_switches):
+    latencies = []
+    for _ in range(num_switches):
+        start = time.perf_counter()
+        switch_task(env)
+        latencies.append(time.perf_counter() - start)
+
+    return _latency_summary(latencies)
+
+
+def _task_boundary(agent, env, replay_buffer, task_id, args):
+    # the task boundary hooks of 'train_sac', without distillation and hypernet targets
+    head_kwargs = {'head_idx': task_id} if is_multi_head(args.algo) else {}
+    if 'ewc' in args.algo:
+        agent.estimate_fisher(env=env, replay_buffer=replay_buffer,
+                              sample_src=args.sac_ewc_estimate_fisher_sample_src, **head_kwargs)
+    elif 'si' in args.algo:
+        agent.update_omegas()
+    elif 'agem' in args.algo:
+        agent.construct_memory(env=env, replay_buffer=replay_buffer,
+                               sample_src=args.sac_agem_memory_sample_src, **head_kwargs)
+
+    agent.reset(reset_critic=args.reset_agent)
+
+
+def _fill_replay_buffer(env, replay_buffer, num_steps):
+    obs = switch_task(env)
+    for _ in range(num_steps):
+        action = _random_actions(env)
+        next_obs, reward, done, infos = env.step(action)
+        replay_buffer.add(obs, action, reward, next_obs, done, infos)
+        obs = next_obs
+
+
+def _fill_rollouts(env, agent, rollouts, head_kwargs):
+    obs = switch_task(env)
+    rollouts.reset_obs(obs)
+    for _ in range(rollouts.num_steps):
+        with utils.eval_mode(agent):
+            action, log_pi = agent.act(obs, sample=True, compute_log_pi=True, **head_kwargs)
+            value = agent.predict_value(obs, **head_kwargs)
+        obs, reward, done, infos = env.step(action)
+        masks = np.array([[0.0] if done_ else [1.0] for done_ in done])
+        bad_masks = np.array([[0.0] if 'bad_transition' in info.keys() else [1.0] for info in infos])
+        rollouts.insert(obs, action, log_pi, value, reward, masks, bad_masks)
+
+
+def benchmark_agent(algo, bench_args, work_dir):
+    args = parse_args(['--algo', algo, '--env_type', 'metaworld', '--seed', str(bench_args.seed),
+                       '--work_dir', work_dir, '--device', bench_args.device,
+                       '--replay_buffer_capacity', str(bench_args.init_steps * bench_args.num_processes)] +
+                      shlex.split(bench_args.agent_args))
+    utils.set_seed_everywhere(args.seed)
+    device = torch.device(args.device)
+
+    env = make_envs(synthetic_env_names('mt1', bench_args.num_tasks), args.seed, bench_args.num_processes)
+    num_tasks = env.get_attr('num_tasks')[0]
+    agent = make_agent(
+        obs_space=env.observation_space,
+        action_space=[env.action_space for _ in range(num_tasks)] if is_multi_head(algo) else env.action_space,
+        device=device,
+        args=args
+    )
+    logger = Logger(utils.make_dir(os.path.join(work_dir, algo)), log_frequency=args.log_freq,
+                    action_repeat=args.action_repeat, save_tb=False)
+    head_kwargs = {'head_idx': 0} if is_multi_head(algo) else {}
+
+    if 'ppo' in algo:
+        rollouts = storages.RolloutStorage(args.ppo_num_rollout_steps_per_process, bench_args.num_processes,
+                                           env.observation_space.shape, env.action_space, device)
+        _fill_rollouts(env, agent, rollouts, head_kwargs)
+        next_value = agent.predict_value(rollouts.obs[-1], **head_kwargs)
+        rollouts.compute_returns(next_value, args.discount, args.ppo_gae_lambda, args.ppo_use_proper_time_limits)
+
+        def update(step):
+            agent.update(rollouts, logger, step, **head_kwargs)
+    else:
+        buffer_kwargs = dict(n_step=args.sac_n_step, discount=args.discount, obs_dtype=args.replay_buffer_obs_dtype,
+                             action_dtype=args.replay_buffer_action_dtype)
+        if args.sac_prioritized_replay:
+            buffer_kwargs.update(alpha=args.sac_prioritized_replay_alpha, beta=args.sac_prioritized_replay_beta)
+        replay_buffer = (buffers.PrioritizedReplayBuffer if args.sac_prioritized_replay else buffers.ReplayBuffer)(
+            obs_space=env.observation_space,
+            action_space=env.action_space,
+            transition_num=args.replay_buffer_capacity,
+            device=device,
+            n_envs=bench_args.num_processes,
+            optimize_memory_usage=True,
+            **buffer_kwargs
+        )
+        _fill_replay_buffer(env, replay_buffer, bench_args.init_steps)
+
+        def update(step):
+            agent.update(replay_buffer, logger, step, **head_kwargs)
+
+    num_warmup_updates = min(10, bench_args.num_updates)
+    for step in range(num_warmup_updates):
+        update(step)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for step in range(num_warmup_updates, num_warmup_updates + bench_args.num_updates):
+        update(step)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    updates_per_second = bench_args.num_updates / (time.perf_counter() - start)
+
+    latencies = []
+    for task_id in range(num_tasks - 1):
+        start = time.perf_counter()
+        if 'ppo' in algo:
+            if args.reset_agent:
+                agent.reset()
+        else:
+            _task_boundary(agent, env, replay_buffer, task_id, args)
+        switch_task(env)
+        latencies.append(time.perf_counter() - start)
+
+    env.close()
+
+    return {'updates_per_second': updates_per_second, 'task_switch': _latency_summary(latencies)}
+
+
+def _metadata(args):
+    return {
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'torch_num_threads': torch.get_num_threads(),
+        'argv': sys.argv[1:],
+        'args': vars(args),
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--families', type=str, nargs='*', default=list(FAMILY_TASKS))
+    parser.add_argument('--algos', type=str, nargs='*',
+                        default=['sac_mlp', 'mh_sac_mlp_v2', 'ewc_v2_mh_sac_mlp_v2', 'si_mh_sac_mlp_v2',
+                                 'agem_v2_mh_sac_mlp_v2', 'td3_mlp', 'ppo_mlp'])
+    parser.add_argument('--agent_args', type=str, default='', help='extra arguments of the agents, as on the '
+                                                                   'command line of the training scripts')
+    parser.add_argument('--num_tasks', type=int, default=3)
+    parser.add_argument('--num_processes', type=int, default=1)
+    parser.add_argument('--num_env_steps', type=int, default=2000, help='vectorized steps per family')
+    parser.add_argument('--num_task_switches', type=int, default=20)
+    parser.add_argument('--init_steps', type=int, default=1000, help='random transitions per process in the '
+                                                                     'replay buffer of the off-policy agents')
+    parser.add_argument('--num_updates', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch intra-op threads, fix it to compare '
+                                                                      'runs on machines with different cores')
+    parser.add_argument('--output', type=str, default=None, help='optional json file with the results')
+
+
+def main(args):
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+
+    results = {'metadata': _metadata(args), 'envs': {}, 'agents': {}}
+    for family in args.families:
+        env = make_envs(synthetic_env_names(family, args.num_tasks), args.seed, args.num_processes)
+        results['envs'][family] = {
+            'steps_per_second': env_steps_per_second(env, args.num_env_steps),
+            'task_switch': env_task_switch_latency(env, args.num_task_switches),
+        }
+        env.close()
+        print(f"{family:<12}  {results['envs'][family]['steps_per_second']:10.1f} env steps/s  "
+              f"task switch {results['envs'][family]['task_switch']['median_ms']:8.2f} ms")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for algo in args.algos:
+            try:
+                result = benchmark_agent(algo, args, work_dir)
+                print(f"{algo:<32}  {result['updates_per_second']:10.1f} updates/s  "
+                      f"task switch {result['task_switch']['median_ms']:8.2f} ms")
+            except Exception as e:
+                result = {'error': f'{type(e).__name__}: {e}'}
+                print(f"{algo:<32}  failed: {result['error']}")
+            results['agents'][algo] = result
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
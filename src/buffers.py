@@ -9,17 +9,308 @@ import psutil
 # from utils import random_crop
 
 
+class StorageCodec:
+    """Keep float32 values as they are, base class of the reduced precision storage codecs
+
+    A codec encodes float32 values (numpy arrays or torch tensors) into its storage dtype and decodes them back to
+    float32 of the same kind, e.g. on the device of the sampled minibatch. Codecs with parameters keep one set per
+    feature, the trailing 'feature_shape' dimensions of the values. Adaptive codecs ('adaptive' is True) must see
+    the values with 'fit' before encoding them.
+    """
+    np_dtype = np.float32
+    torch_dtype = torch.float32
+    adaptive = False
+
+    def __init__(self, feature_shape=()):
+        self.feature_shape = tuple(feature_shape)
+
+    def fit(self, values, storages=()):
+        """Adapt the codec to 'values', re-encoding the values already encoded in 'storages' (arrays or tensors,
+        updated in place)
+        """
+
+    def encode(self, values):
+        return values
+
+    def decode(self, values):
+        return values
+
+    def state_dict(self):
+        return {}
+
+    def load_state_dict(self, state_dict):
+        pass
+
+
+class Float16Codec(StorageCodec):
+    """IEEE half precision: 10 bit mantissa, relative error below 2^-11, values up to 65504
+
+    Values beyond +-65504 are clipped to it instead of overflowing to infinity.
+    """
+    np_dtype = np.float16
+    torch_dtype = torch.float16
+    max_value = 65504.0
+
+    def encode(self, values):
+        if isinstance(values, torch.Tensor):
+            return values.clamp(-self.max_value, self.max_value).half()
+        return np.clip(values, -self.max_value, self.max_value).astype(np.float16)
+
+    def decode(self, values):
+        if isinstance(values, torch.Tensor):
+            return values.float()
+        return values.astype(np.float32)
+
+
+class BFloat16Codec(StorageCodec):
+    """bfloat16: 7 bit mantissa, relative error below 2^-8, the exponent range of float32
+
+    Numpy has no bfloat16, numpy storage holds the upper 16 bits of the float32 values (rounded to nearest even) as
+    int16, which torch reinterprets as bfloat16 on the device of the decoded tensor.
+    """
+    np_dtype = np.int16
+    torch_dtype = torch.bfloat16
+
+    def encode(self, values):
+        if isinstance(values, torch.Tensor):
+            return values.bfloat16()
+        bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+        bits = (bits + (0x7FFF + ((bits >> 16) & 1))) >> 16
+        return bits.astype(np.uint16).view(np.int16)
+
+    def decode(self, values):
+        if isinstance(values, torch.Tensor):
+            if values.dtype == torch.int16:
+                values = values.view(torch.bfloat16)
+            return values.float()
+        return (values.view(np.uint16).astype(np.uint32) << 16).view(np.float32)
+
+
+class AffineUInt8Codec(StorageCodec):
+    """Per-feature affine quantization to 256 levels: value = low + scale * q with q in [0, 255]
+
+    With 'low' and 'high' (e.g. the bounds of a space) the range is fixed and the reconstruction error is at most
+    scale / 2 = (high - low) / 510 within the range. Otherwise the codec is adaptive: the range of every feature is
+    fit to the values it sees, with a margin of 'margin' times its width on both sides, and grows when new values
+    fall outside of it. Values encoded before the range grew are re-encoded in the new range. A feature that grows
+    grows at least 1.5 times, so the rounding errors of a value re-encoded k times add up to at most
+    scale / 2 * (1 + 1 / 1.5 + ... + 1 / 1.5^k) < 1.5 * scale of the current range.
+    """
+    np_dtype = np.uint8
+    torch_dtype = torch.uint8
+    num_levels = 255
+    # rows re-encoded at once, bounds the temporary float32 copies
+    recode_chunk_size = 65536
+
+    def __init__(self, feature_shape=(), low=None, high=None, margin=0.25):
+        super().__init__(feature_shape)
+        self.margin = margin
+        self.adaptive = low is None
+        self.low = self.scale = None
+        self._device_params = {}
+        if not self.adaptive:
+            self._set_range(np.broadcast_to(low, self.feature_shape), np.broadcast_to(high, self.feature_shape))
+
+    @property
+    def high(self):
+        return self.low + self.num_levels * self.scale
+
+    def _set_range(self, low, high):
+        self.low = np.array(low, dtype=np.float32)
+        self.scale = (np.maximum(high - low, 1e-6) / self.num_levels).astype(np.float32)
+        self._device_params = {}
+
+    def _params(self, device):
+        if device not in self._device_params:
+            self._device_params[device] = (torch.as_tensor(self.low, device=device),
+                                           torch.as_tensor(self.scale, device=device))
+        return self._device_params[device]
+
+    def fit(self, values, storages=()):
+        if not self.adaptive or len(values) == 0:
+            return
+
+        values = values.reshape(-1, *self.feature_shape)
+        if isinstance(values, torch.Tensor):
+            values_min, values_max = values.amin(dim=0).cpu().numpy(), values.amax(dim=0).cpu().numpy()
+        else:
+            values_min, values_max = values.min(axis=0), values.max(axis=0)
+
+        if self.low is None:
+            width = values_max - values_min
+            self._set_range(values_min - self.margin * width, values_max + self.margin * width)
+            return
+
+        below, above = values_min < self.low, values_max > self.high
+        grow = below | above
+        if not np.any(grow):
+            return
+
+        low = np.where(below, values_min, self.low)
+        high = np.where(above, values_max, self.high)
+        margin = np.where(grow, self.margin * (high - low), 0.0)
+        prev_low, prev_scale = self.low, self.scale
+        # features that do not grow keep their range exactly and re-encode to the same levels
+        self._set_range(np.where(grow, low - margin, self.low), np.where(grow, high + margin, self.high))
+        self.scale = np.where(grow, self.scale, prev_scale).astype(np.float32)
+
+        ratio = prev_scale / self.scale
+        offset = (prev_low - self.low) / self.scale
+        for storage in storages:
+            self._recode(storage, ratio, offset)
+
+    def _recode(self, storage, ratio, offset):
+        if isinstance(storage, torch.Tensor):
+            ratio = torch.as_tensor(ratio, device=storage.device)
+            offset = torch.as_tensor(offset, device=storage.device)
+            for start in range(0, len(storage), self.recode_chunk_size):
+                chunk = storage[start:start + self.recode_chunk_size]
+                chunk.copy_((chunk.float() * ratio + offset).round_().clamp_(0, self.num_levels))
+        else:
+            for start in range(0, len(storage), self.recode_chunk_size):
+                chunk = storage[start:start + self.recode_chunk_size]
+                chunk[...] = np.clip(np.rint(chunk * ratio + offset), 0, self.num_levels)
+
+    def encode(self, values):
+        if isinstance(values, torch.Tensor):
+            low, scale = self._params(values.device)
+            return ((values - low) / scale).round_().clamp_(0, self.num_levels).to(torch.uint8)
+        return np.clip(np.rint((values - self.low) / self.scale), 0, self.num_levels).astype(np.uint8)
+
+    def decode(self, values):
+        if isinstance(values, torch.Tensor):
+            low, scale = self._params(values.device)
+            return values.float() * scale + low
+        return values.astype(np.float32) * self.scale + self.low
+
+    def state_dict(self):
+        return {'low': self.low, 'scale': self.scale}
+
+    def load_state_dict(self, state_dict):
+        self.low, self.scale = state_dict['low'], state_dict['scale']
+        self._device_params = {}
+
+
+STORAGE_CODECS = {
+    'float32': StorageCodec,
+    'float16': Float16Codec,
+    'bfloat16': BFloat16Codec,
+    'uint8': AffineUInt8Codec,
+}
+
+
+def make_codec(dtype, feature_shape=(), low=None, high=None):
+    """Codec of the storage dtype 'dtype', 'low' and 'high' fix the range of the 'uint8' codec"""
+    if dtype not in STORAGE_CODECS:
+        raise ValueError(f"Unknown storage dtype: {dtype}, expected one of {list(STORAGE_CODECS)}")
+    if dtype == 'uint8':
+        return AffineUInt8Codec(feature_shape, low=low, high=high)
+
+    return STORAGE_CODECS[dtype](feature_shape)
+
+
+def make_space_codec(dtype, space):
+    """Codec of the values of a Box space, the 'uint8' codec quantizes within the bounds of the space when they are
+    all finite (e.g. actions or pixels) and adapts its range to the values otherwise
+    """
+    if np.all(np.isfinite(space.low)) and np.all(np.isfinite(space.high)):
+        return make_codec(dtype, space.shape, low=space.low, high=space.high)
+
+    return make_codec(dtype, space.shape)
+
+
+class CompressedArray:
+    """Array or tensor of float32 values kept in the storage dtype of 'codec'
+
+    Behaves like the values for the episodic memories: 'len', slices (e.g. to shrink a memory) keep the values
+    encoded, any other index (e.g. the indices of a minibatch) decodes them to float32 arrays or tensors.
+    """
+    def __init__(self, data, codec):
+        self.data = data
+        self.codec = codec
+
+    @classmethod
+    def compress(cls, values, dtype):
+        codec = make_codec(dtype, values.shape[1:])
+        codec.fit(values)
+        return cls(codec.encode(values), codec)
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        array = cls(None, None)
+        array.load_state_dict(state_dict)
+        return array
+
+    def state_dict(self):
+        dtype = next(name for name, codec_cls in STORAGE_CODECS.items() if type(self.codec) is codec_cls)
+        return {'data': self.data, 'dtype': dtype, 'feature_shape': self.codec.feature_shape,
+                'adaptive': self.codec.adaptive, 'codec': self.codec.state_dict()}
+
+    def load_state_dict(self, state_dict):
+        self.data = state_dict['data']
+        self.codec = make_codec(state_dict['dtype'], state_dict['feature_shape'])
+        self.codec.adaptive = state_dict['adaptive']
+        self.codec.load_state_dict(state_dict['codec'])
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self):
+        if isinstance(self.data, torch.Tensor):
+            return self.data.numel() * self.data.element_size()
+        return self.data.nbytes
+
+    def __getitem__(self, idxs):
+        if isinstance(idxs, slice):
+            return CompressedArray(self.data[idxs], self.codec)
+        return self.codec.decode(self.data[idxs])
+
+
+def compress_memory(memory, dtype, keys=('obses', 'next_obses')):
+    """Keep the fields 'keys' of an episodic memory (a dict of arrays or tensors) in the storage dtype 'dtype', in
+    place
+    """
+    if dtype == 'float32':
+        return memory
+
+    for key in keys:
+        if isinstance(memory.get(key), (np.ndarray, torch.Tensor)):
+            memory[key] = CompressedArray.compress(memory[key], dtype)
+
+    return memory
+
+
 class ReplayBuffer:
     """Buffer to store environment transitions
 
     (Chongyi Zheng): update replay buffer to stable_baselines style to save memory
 
+    With 'n_step' > 1 the sampled transitions are n-step transitions, computed from the stored one-step transitions
+    at sample time: the reward is the discounted sum of the rewards of the next n steps, the next observation is the
+    observation n steps ahead and 'not_done' is the discount of the bootstrap value relative to a one-step
+    transition, discount^(n - 1) or 0 at a terminal state. The one-step target reward + not_done * discount * V(s')
+    is then the n-step target, the agents do not need to know about it. A transition is cut short, and bootstraps
+    from where it was cut, at the end of an episode (a timeout bootstraps if 'handle_timeout_termination' is set,
+    like a one-step transition) and at the newest transition in the buffer. 'discount' must be the discount of the
+    agent.
+
+    'obs_dtype' and 'action_dtype' ('float32', 'float16', 'bfloat16' or 'uint8', see 'STORAGE_CODECS') store the
+    observations and the actions of a Box action space in reduced precision, sampled batches are decoded to float32
+    on 'device'. 'uint8' quantizes every feature in the bounds of the space if they are finite and in a range fit
+    to the stored values otherwise.
+
     Reference:
     - https://github.com/hill-a/stable-baselines/blob/master/stable_baselines/common/buffers.py
 
     """
     def __init__(self, obs_space, action_space, transition_num, device, n_envs=1,
-                 optimize_memory_usage=False, handle_timeout_termination=False):
+                 optimize_memory_usage=False, handle_timeout_termination=False, n_step=1, discount=0.99,
+                 obs_dtype='float32', action_dtype='float32'):
 
         # assert n_envs == 1, "Replay buffer only support single environment for now"
 
@@ -30,6 +321,10 @@ class ReplayBuffer:
         self.device = device
         self.optimize_memory_usage = optimize_memory_usage
         self.handle_timeout_termination = handle_timeout_termination
+        self.n_step = n_step
+        self.discount = discount
+        # discount^k of the k-th reward of an n-step transition
+        self._n_step_discounts = discount ** np.arange(n_step, dtype=np.float32)
 
         # Check that the replay buffer can fit into the memory
         if psutil is not None:
@@ -39,16 +334,19 @@ class ReplayBuffer:
         obs_shape = obs_space.shape
         action_shape = action_space.shape
 
-        self.obses = np.empty((self.capacity, n_envs, *obs_shape), dtype=np.float32)
+        self.obs_codec = make_space_codec(obs_dtype, obs_space)
+        self.obses = np.empty((self.capacity, n_envs, *obs_shape), dtype=self.obs_codec.np_dtype)
         if self.optimize_memory_usage:
             # `observations` contains also the next observation
             self.next_obses = None
         else:
-            self.next_obses = np.empty((self.capacity, n_envs, *obs_shape), dtype=np.float32)
+            self.next_obses = np.empty((self.capacity, n_envs, *obs_shape), dtype=self.obs_codec.np_dtype)
         if isinstance(action_space, gym.spaces.Discrete):
+            self.action_codec = StorageCodec()
             self.actions = np.empty((self.capacity, n_envs, 1), dtype=np.int32)
         elif isinstance(action_space, gym.spaces.Box):
-            self.actions = np.empty((self.capacity, n_envs, *action_shape), dtype=np.float32)
+            self.action_codec = make_space_codec(action_dtype, action_space)
+            self.actions = np.empty((self.capacity, n_envs, *action_shape), dtype=self.action_codec.np_dtype)
         else:
             raise TypeError(f"Unknown action space type: {type(action_space)}")
         self.rewards = np.empty((self.capacity, n_envs, 1), dtype=np.float32)
@@ -79,32 +377,118 @@ class ReplayBuffer:
         self.idx = 0
         self.full = False
 
+    def _storage_names(self):
+        names = ['obses', 'actions', 'rewards', 'not_dones', 'timeouts']
+        if self.next_obses is not None:
+            names.append('next_obses')
+
+        return names
+
+    def _filled(self, name):
+        """Filled rows of the storage 'name' (a view)"""
+        size = self.capacity if self.full else self.idx
+        # the next observation of the latest transition is one row ahead
+        num_rows = min(size + 1, self.capacity) if name == 'obses' and self.optimize_memory_usage else size
+
+        return getattr(self, name)[:num_rows]
+
+    def state_dict(self):
+        """Filled part of the storage (views, copy them before the buffer changes), the write position and the
+        state of the storage codecs
+        """
+        state = {'idx': self.idx, 'full': self.full, 'obs_codec': self.obs_codec.state_dict(),
+                 'action_codec': self.action_codec.state_dict()}
+        for name in self._storage_names():
+            state[name] = self._filled(name)
+
+        return state
+
+    def load_state_dict(self, state_dict):
+        for name in self._storage_names():
+            value = state_dict[name]
+            getattr(self, name)[:len(value)] = value
+        self.idx = state_dict['idx']
+        self.full = state_dict['full']
+        # checkpoints from before the storage codecs hold float32 values
+        if 'obs_codec' in state_dict:
+            self.obs_codec.load_state_dict(state_dict['obs_codec'])
+            self.action_codec.load_state_dict(state_dict['action_codec'])
+
+    def _fit_codecs(self, obs, action, next_obs):
+        # adaptive codecs see the new values before they are encoded and re-encode the stored ones if they change
+        if self.obs_codec.adaptive:
+            storages = [self._filled(name) for name in ['obses', 'next_obses'] if getattr(self, name) is not None]
+            self.obs_codec.fit(np.concatenate([obs, next_obs]), storages)
+        if self.action_codec.adaptive:
+            self.action_codec.fit(np.asarray(action), [self._filled('actions')])
+
     def add(self, obs, action, reward, next_obs, done, infos):
-        np.copyto(self.obses[self.idx], obs)
-        np.copyto(self.actions[self.idx], action)
+        self._fit_codecs(obs, action, next_obs)
+        np.copyto(self.obses[self.idx], self.obs_codec.encode(obs))
+        np.copyto(self.actions[self.idx], self.action_codec.encode(action))
         np.copyto(self.rewards[self.idx], reward.reshape([-1, 1]))
         if self.optimize_memory_usage:
-            np.copyto(self.obses[(self.idx + 1) % self.capacity], next_obs)
+            np.copyto(self.obses[(self.idx + 1) % self.capacity], self.obs_codec.encode(next_obs))
         else:
-            np.copyto(self.next_obses[self.idx], next_obs)
+            np.copyto(self.next_obses[self.idx], self.obs_codec.encode(next_obs))
         not_done = np.array([not done_ for done_ in done])
         np.copyto(self.not_dones[self.idx], not_done.reshape([-1, 1]))
 
         if self.handle_timeout_termination:
-            self.timeouts[self.idx] = np.array([info.get("TimeLimit.truncated", False) for info in infos])
+            self.timeouts[self.idx] = np.array(
+                [info.get("TimeLimit.truncated", False) for info in infos]).reshape([-1, 1])
 
         self.idx = (self.idx + 1) % self.capacity
         self.full = self.full or self.idx == 0
 
+    def _n_step_transitions(self, rows, envs):
+        """Rewards, next observations and bootstrap discounts (see the class) of the n-step transitions starting at
+        'rows' of the environments 'envs', arrays of the same shape
+        """
+        offsets = np.arange(self.n_step)
+        # the newest transition is the last one that can be part of an n-step transition
+        if self.full:
+            num_newer = (self.idx - rows - 1) % self.capacity + 1
+        else:
+            num_newer = self.idx - rows
+        step_rows = (rows[..., None] + offsets) % self.capacity
+        step_envs = envs[..., None]
+
+        # rows past the newest transition may not have been written yet, mask them with where instead of zeros
+        valid = offsets < num_newer[..., None]
+        step_not_dones = np.where(valid, self.not_dones[step_rows, step_envs, 0], 0.0)
+        # an episode that ends at step k does not continue into step k + 1
+        continues = np.cumprod(step_not_dones[..., :-1], axis=-1)
+        in_transition = valid & (np.concatenate([np.ones_like(continues[..., :1]), continues], axis=-1) > 0.0)
+        num_steps = in_transition.sum(axis=-1)
+
+        rewards = np.sum(np.where(in_transition, self.rewards[step_rows, step_envs, 0], 0.0) *
+                         self._n_step_discounts, axis=-1)
+
+        last_rows = (rows + num_steps - 1) % self.capacity
+        not_dones = self.not_dones[last_rows, envs]
+        if self.handle_timeout_termination:
+            not_dones = np.logical_or(not_dones, self.timeouts[last_rows, envs]).astype(self.not_dones.dtype)
+        not_dones = not_dones * self._n_step_discounts[num_steps - 1][..., None]
+
+        if self.optimize_memory_usage:
+            next_obses = self.obses[(last_rows + 1) % self.capacity, envs]
+        else:
+            next_obses = self.next_obses[last_rows, envs]
+
+        return rewards[..., None].astype(np.float32), next_obses, not_dones.astype(np.float32)
+
     def sample(self, batch_size):
+        if self.n_step > 1:
+            return self._sample_n_step(batch_size)
+
         if not self.optimize_memory_usage:
             idxs = np.random.randint(
                 0, self.capacity if self.full else self.idx, size=batch_size // self.n_envs
             )
 
-            next_obses = torch.as_tensor(
-                self.next_obses[idxs].reshape([-1, *self.obs_space.shape]),
-                device=self.device).float()
+            next_obses = self.obs_codec.decode(torch.as_tensor(
+                self.next_obses[idxs].reshape([-1, *self.obs_space.shape]), device=self.device))
         else:
             if self.full:
                 idxs = (np.random.randint(1, self.capacity, size=batch_size // self.n_envs)
@@ -112,14 +496,13 @@ class ReplayBuffer:
             else:
                 idxs = np.random.randint(0, self.idx, size=batch_size // self.n_envs)
 
-            next_obses = torch.as_tensor(
-                self.obses[(idxs + 1) % self.capacity].reshape([-1, *self.obs_space.shape]),
-                device=self.device).float()
+            next_obses = self.obs_codec.decode(torch.as_tensor(
+                self.obses[(idxs + 1) % self.capacity].reshape([-1, *self.obs_space.shape]), device=self.device))
 
-        obses = torch.as_tensor(self.obses[idxs].reshape([-1, *self.obs_space.shape]),
-                                device=self.device)
-        actions = torch.as_tensor(self.actions[idxs].reshape([-1, *self.action_space.shape]),
-                                  device=self.device)
+        obses = self.obs_codec.decode(torch.as_tensor(self.obses[idxs].reshape([-1, *self.obs_space.shape]),
+                                                      device=self.device))
+        actions = self.action_codec.decode(torch.as_tensor(
+            self.actions[idxs].reshape([-1, *self.action_space.shape]), device=self.device))
         rewards = torch.as_tensor(self.rewards[idxs].reshape([-1, 1]), device=self.device)
         if self.handle_timeout_termination:
             # Only use dones that are not due to timeouts
@@ -135,6 +518,28 @@ class ReplayBuffer:
 
         return obses, actions, rewards, next_obses, not_dones
 
+    def _sample_n_step(self, batch_size):
+        if self.full:
+            # the oldest row holds the next observations of the newest transitions if memory is optimized
+            low = 1 if self.optimize_memory_usage else 0
+            rows = (np.random.randint(low, self.capacity, size=batch_size // self.n_envs) + self.idx) % self.capacity
+        else:
+            rows = np.random.randint(0, self.idx, size=batch_size // self.n_envs)
+        rows, envs = np.broadcast_arrays(rows[:, None], np.arange(self.n_envs)[None])
+
+        rewards, next_obses, not_dones = self._n_step_transitions(rows, envs)
+
+        obses = self.obs_codec.decode(torch.as_tensor(self.obses[rows, envs].reshape([-1, *self.obs_space.shape]),
+                                                      device=self.device))
+        actions = self.action_codec.decode(torch.as_tensor(
+            self.actions[rows, envs].reshape([-1, *self.action_space.shape]), device=self.device))
+        rewards = torch.as_tensor(rewards.reshape([-1, 1]), device=self.device)
+        next_obses = self.obs_codec.decode(torch.as_tensor(next_obses.reshape([-1, *self.obs_space.shape]),
+                                                           device=self.device))
+        not_dones = torch.as_tensor(not_dones.reshape([-1, 1]), device=self.device)
+
+        return obses, actions, rewards, next_obses, not_dones
+
     # def sample_curl(self, batch_size):
     #     # TODO (chongyi zheng): update this function to drq style
     #     # idxs = np.random.randint(
@@ -177,6 +582,175 @@ class ReplayBuffer:
     #     return obses, actions, rewards, next_obses, not_dones, ensem_kwargs
 
 
+class SumTree:
+    """Binary tree over 'capacity' non-negative priorities whose inner nodes hold the sum and the minimum of their
+    children
+
+    The nodes are stored heap-style in flat arrays, node i has the children 2i and 2i + 1, the root is node 1 and the
+    leaves are the last 'size' nodes. Updates and prefix sum searches take a batch of leaves and walk the levels of
+    the tree with array ops, so both cost O(batch_size * log(capacity)).
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self._sums = np.zeros(2 * self.size, dtype=np.float64)
+        self._mins = np.full(2 * self.size, np.inf, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self._sums[1]
+
+    @property
+    def min(self):
+        return self._mins[1]
+
+    def __getitem__(self, idxs):
+        return self._sums[np.asarray(idxs) + self.size]
+
+    def reset(self):
+        self._sums.fill(0.0)
+        self._mins.fill(np.inf)
+
+    def update(self, idxs, priorities):
+        """Set the priorities of the leaves 'idxs', the last one wins for repeated leaves"""
+        nodes = np.asarray(idxs, dtype=np.int64) + self.size
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self._sums[nodes] = priorities
+        # zero priorities mark empty leaves, they must not become the minimum
+        self._mins[nodes] = np.where(priorities > 0.0, priorities, np.inf)
+
+        # all leaves are on the same level, so are their ancestors. Shared ancestors are recomputed once per
+        # descendant, which writes the same values and is cheaper than deduplicating the nodes
+        while nodes[0] > 1:
+            nodes //= 2
+            self._sums[nodes] = self._sums[2 * nodes] + self._sums[2 * nodes + 1]
+            self._mins[nodes] = np.minimum(self._mins[2 * nodes], self._mins[2 * nodes + 1])
+
+    def find_prefix_sum(self, values):
+        """Leaves whose range of the cumulative sum of the priorities contains 'values', never an empty leaf"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.size:
+            left = 2 * nodes
+            left_sums = self._sums[left]
+            # rounding errors must not lead into an empty subtree
+            go_right = ((values > left_sums) | (left_sums <= 0.0)) & (self._sums[left + 1] > 0.0)
+            values -= left_sums * go_right
+            nodes = left + go_right
+
+        return nodes - self.size
+
+    def state_dict(self):
+        return {'priorities': self._sums[self.size:self.size + self.capacity]}
+
+    def load_state_dict(self, state_dict):
+        self.reset()
+        self.update(np.arange(self.capacity), state_dict['priorities'])
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Replay buffer sampling transitions by priority (Schaul et al., https://arxiv.org/abs/1511.05952)
+
+    Transition i is sampled with probability p_i^alpha / sum_j p_j^alpha, the sampled batch comes with the importance
+    sampling weights (N * P(i))^-beta, normalized by the largest weight in the buffer, that correct the critic loss
+    for the non-uniform sampling. New transitions get the largest priority seen so far, the agent sets the
+    priorities of a sampled batch to its TD errors with 'update_priorities'. Priorities live in a sum tree with a leaf
+    per transition of every environment, sampling and updating priorities cost O(batch_size * log(capacity)).
+
+    'sample' still draws uniformly, e.g. for the EWC fishers or the A-GEM memories, prioritized batches are drawn by
+    'sample_prioritized'.
+    """
+    def __init__(self, obs_space, action_space, transition_num, device, n_envs=1,
+                 optimize_memory_usage=False, handle_timeout_termination=False, n_step=1, discount=0.99,
+                 obs_dtype='float32', action_dtype='float32', alpha=0.6, beta=0.4, eps=1e-6):
+        super().__init__(obs_space, action_space, transition_num, device, n_envs=n_envs,
+                         optimize_memory_usage=optimize_memory_usage,
+                         handle_timeout_termination=handle_timeout_termination, n_step=n_step, discount=discount,
+                         obs_dtype=obs_dtype, action_dtype=action_dtype)
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+
+        self.sum_tree = SumTree(self.capacity * n_envs)
+        self.max_priority = 1.0
+
+    def _row_leaves(self, row):
+        return row * self.n_envs + np.arange(self.n_envs)
+
+    def reset(self):
+        super().reset()
+        self.sum_tree.reset()
+        self.max_priority = 1.0
+
+    def state_dict(self):
+        state = super().state_dict()
+        state['sum_tree'] = self.sum_tree.state_dict()
+        state['max_priority'] = self.max_priority
+
+        return state
+
+    def load_state_dict(self, state_dict):
+        super().load_state_dict(state_dict)
+        self.sum_tree.load_state_dict(state_dict['sum_tree'])
+        self.max_priority = state_dict['max_priority']
+
+    def add(self, obs, action, reward, next_obs, done, infos):
+        row = self.idx
+        super().add(obs, action, reward, next_obs, done, infos)
+
+        self.sum_tree.update(self._row_leaves(row), np.full(self.n_envs, self.max_priority ** self.alpha))
+        if self.optimize_memory_usage:
+            # the observations of the oldest transition now hold the next observations of the newest one
+            self.sum_tree.update(self._row_leaves(self.idx), np.zeros(self.n_envs))
+
+    def sample_prioritized(self, batch_size):
+        """Sample transitions by priority, stratified over 'batch_size' equal ranges of the priority mass
+
+        Returns:
+        The transitions as 'sample' does, their importance sampling weights of shape (batch_size, 1) and their
+        indices for 'update_priorities'.
+        """
+        total = self.sum_tree.total
+        values = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * (total / batch_size)
+        idxs = self.sum_tree.find_prefix_sum(values)
+        rows, envs = np.divmod(idxs, self.n_envs)
+
+        # P(i) / min_j P(j), the normalizer N and the sum of the priorities cancel out
+        weights = (self.sum_tree[idxs] / self.sum_tree.min) ** -self.beta
+
+        if self.n_step > 1:
+            rewards, next_obses, not_dones = self._n_step_transitions(rows, envs)
+        else:
+            rewards = self.rewards[rows, envs]
+            if self.optimize_memory_usage:
+                next_obses = self.obses[(rows + 1) % self.capacity, envs]
+            else:
+                next_obses = self.next_obses[rows, envs]
+            not_dones = self.not_dones[rows, envs]
+            if self.handle_timeout_termination:
+                not_dones = np.logical_or(not_dones, self.timeouts[rows, envs]).astype(self.not_dones.dtype)
+
+        obses = self.obs_codec.decode(torch.as_tensor(self.obses[rows, envs], device=self.device))
+        actions = self.action_codec.decode(torch.as_tensor(self.actions[rows, envs], device=self.device))
+        rewards = torch.as_tensor(rewards, device=self.device)
+        next_obses = self.obs_codec.decode(torch.as_tensor(next_obses, device=self.device))
+        not_dones = torch.as_tensor(not_dones, device=self.device)
+        weights = torch.as_tensor(weights.reshape([-1, 1]), dtype=torch.float32, device=self.device)
+
+        return obses, actions, rewards, next_obses, not_dones, weights, idxs
+
+    def update_priorities(self, idxs, td_errors):
+        """Set the priorities of the transitions 'idxs' (from 'sample_prioritized') to their absolute TD errors"""
+        if isinstance(td_errors, torch.Tensor):
+            td_errors = td_errors.detach().cpu().numpy()
+        priorities = np.abs(td_errors).reshape(-1) + self.eps
+
+        self.sum_tree.update(idxs, priorities ** self.alpha)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+
 # class AugmentReplayBuffer(ReplayBuffer):
 #     def __init__(self, obs_shape, action_shape, capacity, image_pad, device):
 #         super().__init__(obs_shape, action_shape, capacity, device)
@@ -343,3 +917,101 @@ class FrameStackReplayBuffer(ReplayBuffer):
 #     def sample_ensembles(self, batch_size, num_ensembles=1):
 #         # TODO (chongyi zheng)
 #         pass
+
+
+class DistillationMemory:
+    """Teacher targets of all tasks in one contiguous store for policy distillation
+
+    Task 'task_id' owns the rows [task_id * memory_budget_per_task, (task_id + 1) * memory_budget_per_task) of
+    every field. The store lives on 'storage_device' (e.g. 'cpu' to save GPU memory) and sampled minibatches are
+    moved to 'device', through pinned memory and an asynchronous copy when the two differ. Observations are kept in
+    the storage dtype 'obs_dtype' (see 'STORAGE_CODECS') and decoded on 'device'.
+    """
+    def __init__(self, obs_shape, action_shape, num_tasks, memory_budget_per_task, device, storage_device='cpu',
+                 obs_dtype='float32'):
+        self.num_tasks = num_tasks
+        self.memory_budget_per_task = memory_budget_per_task
+        self.device = torch.device(device)
+        self.storage_device = torch.device(storage_device)
+        self.pin_memory = self.storage_device.type == 'cpu' and self.device.type == 'cuda'
+
+        capacity = num_tasks * memory_budget_per_task
+        self.obs_codec = make_codec(obs_dtype, obs_shape)
+        self.obses = torch.empty((capacity, *obs_shape), dtype=self.obs_codec.torch_dtype, device=self.storage_device)
+        self.mus = torch.empty((capacity, *action_shape), dtype=torch.float32, device=self.storage_device)
+        self.log_stds = torch.empty((capacity, *action_shape), dtype=torch.float32, device=self.storage_device)
+        self.task_sizes = np.zeros(num_tasks, dtype=np.int64)
+
+    @property
+    def task_ids(self):
+        """Tasks that have data in the store"""
+        return np.nonzero(self.task_sizes)[0]
+
+    def add(self, task_id, obses, mus, log_stds):
+        """Replace the data of 'task_id', keeping at most 'memory_budget_per_task' rows"""
+        size = min(len(obses), self.memory_budget_per_task)
+        rows = slice(task_id * self.memory_budget_per_task, task_id * self.memory_budget_per_task + size)
+        obses = torch.as_tensor(obses[:size], device=self.storage_device)
+        if self.obs_codec.adaptive:
+            self.obs_codec.fit(obses, [self.obses[task * self.memory_budget_per_task:
+                                                  task * self.memory_budget_per_task + self.task_sizes[task]]
+                                       for task in self.task_ids if task != task_id])
+        self.obses[rows] = self.obs_codec.encode(obses)
+        self.mus[rows] = torch.as_tensor(mus[:size])
+        self.log_stds[rows] = torch.as_tensor(log_stds[:size])
+        self.task_sizes[task_id] = size
+
+    def reserve(self, memory_budget_per_task):
+        """Grow the rows of every task to at least 'memory_budget_per_task', keeping the stored data"""
+        if memory_budget_per_task <= self.memory_budget_per_task:
+            return
+
+        for name in ['obses', 'mus', 'log_stds']:
+            field = getattr(self, name)
+            grown = torch.empty((self.num_tasks * memory_budget_per_task, *field.shape[1:]), dtype=field.dtype,
+                                device=field.device)
+            grown.view(self.num_tasks, memory_budget_per_task, *field.shape[1:])[:, :self.memory_budget_per_task] = \
+                field.view(self.num_tasks, self.memory_budget_per_task, *field.shape[1:])
+            setattr(self, name, grown)
+        self.memory_budget_per_task = memory_budget_per_task
+
+    def sample(self, task_ids):
+        """Sample one row of the given task for every entry of 'task_ids'
+
+        :param task_ids: integer array of shape (batch_size,).
+        :return: obses, mus, log_stds and task_ids tensors on 'device'.
+        """
+        task_ids = np.asarray(task_ids, dtype=np.int64)
+        sizes = self.task_sizes[task_ids]
+        assert np.all(sizes > 0), "Sampling from a task without data"
+        idxs = task_ids * self.memory_budget_per_task + (np.random.random_sample(len(task_ids)) * sizes).astype(
+            np.int64)
+        idxs = torch.as_tensor(idxs, device=self.storage_device)
+
+        batch = [self.obses[idxs], self.mus[idxs], self.log_stds[idxs],
+                 torch.as_tensor(task_ids, device=self.storage_device)]
+        if self.pin_memory:
+            batch = [value.pin_memory() for value in batch]
+        batch = [value.to(self.device, non_blocking=True) for value in batch]
+        batch[0] = self.obs_codec.decode(batch[0])
+
+        return batch
+
+    def state_dict(self):
+        return {
+            'obses': self.obses,
+            'mus': self.mus,
+            'log_stds': self.log_stds,
+            'task_sizes': self.task_sizes,
+            'obs_codec': self.obs_codec.state_dict(),
+        }
+
+    def load_state_dict(self, state_dict):
+        self.reserve(len(state_dict['obses']) // self.num_tasks)
+        self.obses.copy_(state_dict['obses'])
+        # checkpoints from before the storage codecs hold float32 observations
+        if 'obs_codec' in state_dict:
+            self.obs_codec.load_state_dict(state_dict['obs_codec'])
+        self.mus.copy_(state_dict['mus'])
+        self.log_stds.copy_(state_dict['log_stds'])
+        self.task_sizes[:] = state_dict['task_sizes']
@@ -0,0 +1,286 @@
+"""Asynchronous, resumable checkpoints of a continual learning run
+
+A checkpoint holds everything needed to continue a run where it stopped: the full agent (networks, optimizers,
+temperature, regularizer state and episodic memories), the replay buffer, the loop counters and the states of the
+random number generators. 'Checkpointer.save' only copies the state to host memory; serializing and writing it
+happens in a background thread, into a temporary file that is atomically renamed, so a run killed at any time
+leaves the previous checkpoint intact.
+"""
+
+import copy
+import functools
+import importlib
+import os
+import os.path as osp
+import random
+import threading
+import types
+from collections import OrderedDict, deque
+
+import gym
+import numpy as np
+import torch
+
+
+CHECKPOINT_FILE_NAME = 'checkpoint.pt'
+
+
+def to_host(value):
+    """Copy the tensors and arrays in (nested containers of) 'value' to host memory
+
+    Device tensors are copied into pinned memory asynchronously, the caller has to synchronize (see 'snapshot')
+    before reading them. Host tensors and arrays are copied as well, so training can go on while they are written.
+    """
+    if isinstance(value, torch.Tensor):
+        value = value.detach()
+        if value.is_cuda:
+            host_value = torch.empty(value.shape, dtype=value.dtype, pin_memory=True)
+            return host_value.copy_(value, non_blocking=True)
+        return value.clone()
+    elif isinstance(value, np.ndarray):
+        return value.copy()
+    elif isinstance(value, OrderedDict):
+        return OrderedDict((key, to_host(item)) for key, item in value.items())
+    elif isinstance(value, dict):
+        return {key: to_host(item) for key, item in value.items()}
+    elif isinstance(value, deque):
+        return deque((to_host(item) for item in value), maxlen=value.maxlen)
+    elif isinstance(value, (list, tuple)):
+        return type(value)(to_host(item) for item in value)
+
+    return value
+
+
+def snapshot(value):
+    """Host copy of 'value' that is safe to write while the originals keep changing"""
+    value = to_host(value)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+    return value
+
+
+# tags the saved state of an object with a 'state_dict' (modules, optimizers, memories, ...) and of an agent
+# component, with the class to restore it as
+_OBJECT_KEY = '__object__'
+_COMPONENT_KEY = '__component__'
+
+# attributes of these types carry no state, e.g. the device of an agent
+_STATELESS_TYPES = (torch.device, torch.dtype, gym.spaces.Space, types.FunctionType, types.MethodType, type)
+
+
+def _class_of(value):
+    return type(value).__module__, type(value).__qualname__
+
+
+def _resolve_class(class_path):
+    module_name, qualname = class_path
+    return functools.reduce(getattr, qualname.split('.'), importlib.import_module(module_name))
+
+
+def _is_component(value):
+    # helper objects of the agents, e.g. the behavioral cloning policy of the distilled agents
+    return hasattr(value, '__dict__') and type(value).__module__.startswith(('agent.', 'src.agent.'))
+
+
+def _state_of(value, path):
+    if hasattr(value, 'state_dict') and hasattr(value, 'load_state_dict'):
+        return {_OBJECT_KEY: _class_of(value), 'state_dict': value.state_dict()}
+    elif value is None or isinstance(value, (bool, int, float, str, np.generic, np.ndarray, torch.Tensor)) or \
+            isinstance(value, _STATELESS_TYPES):
+        return value
+    elif isinstance(value, dict):
+        return type(value)((key, _state_of(item, f'{path}[{key!r}]')) for key, item in value.items())
+    elif isinstance(value, deque):
+        return deque((_state_of(item, f'{path}[{idx}]') for idx, item in enumerate(value)), maxlen=value.maxlen)
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_state_of(item, f'{path}[{idx}]') for idx, item in enumerate(value))
+    elif _is_component(value):
+        return {_COMPONENT_KEY: _class_of(value), 'state': agent_state_dict(value, path)}
+
+    raise TypeError(f"Cannot checkpoint '{path}' of type {type(value).__name__}")
+
+
+def agent_state_dict(agent, path='agent'):
+    """State of every attribute of 'agent' that holds any
+
+    Modules, optimizers and objects with a 'state_dict' (e.g. the synaptic intelligence bookkeeping, the
+    distillation memory or the compressed fields of the A-GEM memories) contribute their state dicts, also inside
+    dicts, lists and tuples (e.g. the critic copies in the memories of the oracle A-GEM agents). Tensors, arrays,
+    numbers and containers of them are taken as they are. Attributes of the types in '_STATELESS_TYPES' (devices,
+    spaces, ...) are skipped, any other attribute raises a TypeError instead of being left out silently.
+    """
+    state = {}
+    for name, value in vars(agent).items():
+        if not isinstance(value, _STATELESS_TYPES):
+            state[name] = _state_of(value, f'{path}.{name}')
+
+    return state
+
+
+def _to_device(value, device):
+    if isinstance(value, torch.Tensor):
+        return value.to(device)
+    elif isinstance(value, OrderedDict):
+        return OrderedDict((key, _to_device(item, device)) for key, item in value.items())
+    elif isinstance(value, dict):
+        return {key: _to_device(item, device) for key, item in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return type(value)(_to_device(item, device) for item in value)
+
+    return value
+
+
+def _module_of_type(agent, cls, path):
+    for value in vars(agent).values():
+        if type(value) is cls:
+            return value
+
+    raise TypeError(f"Cannot restore '{path}': the agent has no {cls.__name__} to copy")
+
+
+def _load_state(state, live, path, agent):
+    """Restore 'state' from '_state_of' into the live value 'live' (None if there is none), return the value"""
+    device = getattr(agent, 'device', 'cpu')
+    if isinstance(state, dict) and _OBJECT_KEY in state:
+        cls = _resolve_class(state[_OBJECT_KEY])
+        if type(live) is cls:
+            live.load_state_dict(state['state_dict'])
+            return live
+        elif issubclass(cls, torch.nn.Module):
+            # e.g. the critic copies of the oracle A-GEM memories, which do not exist before the restore
+            module = copy.deepcopy(_module_of_type(agent, cls, path))
+            module.load_state_dict(state['state_dict'])
+            return module
+        elif hasattr(cls, 'from_state_dict'):
+            return cls.from_state_dict(_to_device(state['state_dict'], device))
+
+        raise TypeError(f"Cannot restore '{path}': no {cls.__name__} to load the state into")
+    elif isinstance(state, dict) and _COMPONENT_KEY in state:
+        if type(live) is not _resolve_class(state[_COMPONENT_KEY]):
+            raise TypeError(f"Cannot restore '{path}': the agent has no component to load the state into")
+        load_agent_state_dict(live, state['state'], path, agent)
+        return live
+    elif isinstance(state, dict):
+        live_items = live if isinstance(live, dict) else {}
+        return type(state)((key, _load_state(item, live_items.get(key), f'{path}[{key!r}]', agent))
+                           for key, item in state.items())
+    elif isinstance(state, (list, tuple, deque)):
+        live_items = list(live) if isinstance(live, (list, tuple, deque)) and len(live) == len(state) else \
+            [None] * len(state)
+        items = [_load_state(item, live_item, f'{path}[{idx}]', agent)
+                 for idx, (item, live_item) in enumerate(zip(state, live_items))]
+        return deque(items, maxlen=state.maxlen) if isinstance(state, deque) else type(state)(items)
+    elif isinstance(state, torch.Tensor):
+        if isinstance(live, torch.Tensor) and live.shape == state.shape and live.dtype == state.dtype:
+            with torch.no_grad():
+                live.copy_(state)
+            return live
+        return state.to(device)
+
+    return state
+
+
+def load_agent_state_dict(agent, state, path='agent', root=None):
+    """Restore the state from 'agent_state_dict' into 'agent'
+
+    Objects with a 'state_dict' and tensors of the same shape are restored in place, since optimizers keep
+    references to them (e.g. 'log_alpha'). Modules saved in containers without a live counterpart (e.g. the critic
+    copies of the oracle A-GEM memories of a fresh agent) are restored into deep copies of the module of the same
+    type of the agent, other objects with the 'from_state_dict' of their class.
+    """
+    root = agent if root is None else root
+    for name, value in state.items():
+        setattr(agent, name, _load_state(value, getattr(agent, name, None), f'{path}.{name}', root))
+
+
+def rng_state():
+    state = {
+        'random': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['random'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+class Checkpointer(object):
+    """Write checkpoints of a run to '<checkpoint_dir>/checkpoint.pt' in a background thread
+
+    At most one checkpoint is written at a time, 'save' waits for the previous one. Errors of the writer are
+    raised by the next 'save' or 'wait'.
+    """
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        self.path = osp.join(checkpoint_dir, CHECKPOINT_FILE_NAME)
+        self._thread = None
+        self._error = None
+
+    def exists(self):
+        return osp.exists(self.path)
+
+    def _write(self, state):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                torch.save(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            self._error = e
+
+    def save(self, agent, replay_buffer=None, **counters):
+        """Snapshot the agent, the replay buffer, the RNGs and the loop counters and write them asynchronously
+
+        The counters (and any other picklable values) are returned as they are by 'load'.
+        """
+        self.wait()
+
+        state = {
+            'agent': agent_state_dict(agent),
+            'replay_buffer': replay_buffer.state_dict() if replay_buffer is not None else None,
+            'counters': counters,
+        }
+        state = snapshot(state)
+        state['rng'] = rng_state()
+
+        # not a daemon, the interpreter waits for the last checkpoint before exiting
+        self._thread = threading.Thread(target=self._write, args=(state,))
+        self._thread.start()
+
+    def wait(self):
+        """Block until the checkpoint being written is on disk"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Writing checkpoint {self.path} failed") from error
+
+    def load(self, agent):
+        """Restore the agent and the RNGs from the latest checkpoint
+
+        Returns:
+        The saved loop counters and the replay buffer state (None if no buffer was saved), or None if there is no
+        checkpoint.
+        """
+        self.wait()
+        if not self.exists():
+            return None
+
+        state = torch.load(self.path, map_location='cpu', weights_only=False)
+        load_agent_state_dict(agent, state['agent'])
+        set_rng_state(state['rng'])
+
+        return state['counters'], state['replay_buffer']
@@ -0,0 +1,72 @@
+import numpy as np
+import torch
+
+
+class RolloutCollector:
+    """Collect on-policy transitions from a vectorized environment into preallocated tensors
+
+    Every environment step advances all workers of the vectorized environment with one batched policy forward,
+    and the transitions are written in place into tensors allocated once per collection. The policy is a
+    callable mapping a batch of observations to a dict that contains 'actions' and, optionally, extra per-step
+    quantities (e.g. 'log_pis', 'qs', 'grad_norms') which are stored along with the transitions.
+
+    Returned tensors are flattened over (step, worker) with 'num_samples' rows each. They live on
+    'storage_device', which defaults to the inference device, e.g. set it to 'cpu' to keep large datasets off the GPU.
+    """
+    def __init__(self, env, device, storage_device=None):
+        self.env = env
+        self.device = device
+        self.storage_device = device if storage_device is None else storage_device
+        self.num_envs = getattr(env, 'num_envs', 1)
+
+    def _allocate(self, num_rows, obs, outputs):
+        device = self.storage_device
+        rollouts = {
+            'obses': torch.empty((num_rows, *obs.shape[1:]), dtype=torch.float32, device=device),
+            'rewards': torch.empty((num_rows, 1), dtype=torch.float32, device=device),
+            'next_obses': torch.empty((num_rows, *obs.shape[1:]), dtype=torch.float32, device=device),
+            'not_dones': torch.empty((num_rows, 1), dtype=torch.float32, device=device),
+        }
+        for key, value in outputs.items():
+            rollouts[key] = torch.empty((num_rows, *value.shape[1:]), dtype=value.dtype, device=device)
+
+        return rollouts
+
+    def collect(self, policy, num_samples, grad_enabled=False):
+        """Roll out 'policy' for at least 'num_samples' transitions starting from a fresh reset
+
+        :param policy: callable taking an observation tensor of shape (num_envs, *obs_shape) and returning a dict
+            of tensors with leading dimension num_envs, which must contain 'actions'.
+        :param num_samples: number of transitions to return.
+        :param grad_enabled: run the policy with autograd enabled, e.g. to compute action gradients of critics.
+        """
+        num_steps = int(np.ceil(num_samples / self.num_envs))
+        num_rows = num_steps * self.num_envs
+
+        rollouts = None
+        obs = torch.as_tensor(self.env.reset(), dtype=torch.float32, device=self.device)
+        for step in range(num_steps):
+            with torch.set_grad_enabled(grad_enabled):
+                outputs = policy(obs)
+            assert 'actions' in outputs, "Policy outputs must contain 'actions'"
+            outputs = {key: value.detach() for key, value in outputs.items()}
+
+            next_obs, reward, done, _ = self.env.step(outputs['actions'].cpu().numpy())
+            next_obs = torch.as_tensor(next_obs, dtype=torch.float32, device=self.device)
+
+            if rollouts is None:
+                rollouts = self._allocate(num_rows, obs, outputs)
+
+            rows = slice(step * self.num_envs, (step + 1) * self.num_envs)
+            rollouts['obses'][rows] = obs
+            rollouts['next_obses'][rows] = next_obs
+            rollouts['rewards'][rows] = torch.as_tensor(
+                np.asarray(reward, dtype=np.float32).reshape(-1, 1))
+            rollouts['not_dones'][rows] = torch.as_tensor(
+                1.0 - np.asarray(done, dtype=np.float32).reshape(-1, 1))
+            for key, value in outputs.items():
+                rollouts[key][rows] = value.reshape(rollouts[key][rows].shape)
+
+            obs = next_obs
+
+        return {key: value[:num_samples] for key, value in rollouts.items()}
@@ -1,15 +1,8 @@
-import metaworld
 import gym
 import os
 
 from gym.wrappers import TimeLimit
 
-from stable_baselines3.common.atari_wrappers import (ClipRewardEnv,
-                                                     EpisodicLifeEnv,
-                                                     FireResetEnv,
-                                                     MaxAndSkipEnv,
-                                                     NoopResetEnv, WarpFrame)
-from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.vec_env import (DummyVecEnv, SubprocVecEnv)
 
 from src.environment import atari_wrappers
@@ -17,6 +10,7 @@ from src.environment.gym_wrapper import TransposeImage, TimeLimitMask, VecNormal
 from src.environment.metaworld_utils import MetaWorldTaskSampler, SingleMT1Wrapper, MultiEnvWrapper, NormalizedEnv
 from src.environment.metaworld_utils import uniform_random_strategy, round_robin_strategy
 from src.environment.metaworld_utils.wrappers import TaskNameWrapper
+from src.environment.synthetic_envs import SYNTHETIC_ENV_PREFIX, make_synthetic_env
 
 import src.utils as utils
 
@@ -30,7 +24,13 @@ def make_atari_env(env_name, seed=None, action_repeat=4, frame_stack=4):
     )
 
 
+# metaworld (and mujoco with it) and the atari wrappers of stable-baselines3 are imported by the functions that
+# use them, importing this package only pulls in gym and the vectorized environments of stable-baselines3
+
+
 def make_single_metaworld_env(env_name, seed=None):
+    import metaworld
+
     mt1 = metaworld.MT1(env_name, seed=seed)
     env = mt1.train_classes[env_name]()
     # task = random.choice(mt1.train_tasks)
@@ -42,6 +42,8 @@ def make_single_metaworld_env(env_name, seed=None):
 
 
 def make_continual_metaworld_env(env_names, seed=None):
+    import metaworld
+
     envs = []
     for env_name in env_names:
         mt1 = metaworld.MT1(env_name)
@@ -61,9 +63,12 @@ def make_continual_metaworld_env(env_names, seed=None):
 
 def make_env(env_id, seed, rank, log_dir, allow_early_resets, **kwargs):
     def _thunk(env_id):
+        is_synthetic = env_id.startswith(SYNTHETIC_ENV_PREFIX)
         try:
-            env = gym.make(env_id)
+            env = make_synthetic_env(env_id) if is_synthetic else gym.make(env_id)
         except gym.error.UnregisteredEnv:
+            import metaworld
+
             mt1 = metaworld.MT1(env_id, seed=seed + rank)
             # train_task_sampler = MetaWorldTaskSampler(
             #     mt1, 'train',
@@ -80,6 +85,12 @@ def make_env(env_id, seed, rank, log_dir, allow_early_resets, **kwargs):
         is_atari = hasattr(gym.envs, 'atari') and isinstance(
             env.unwrapped, gym.envs.atari.atari_env.AtariEnv)
         if is_atari:
+            from stable_baselines3.common.atari_wrappers import (ClipRewardEnv,
+                                                                 EpisodicLifeEnv,
+                                                                 FireResetEnv,
+                                                                 MaxAndSkipEnv,
+                                                                 NoopResetEnv, WarpFrame)
+
             env = NoopResetEnv(env, noop_max=30)
             env = MaxAndSkipEnv(env, skip=4)
 
@@ -89,6 +100,8 @@ def make_env(env_id, seed, rank, log_dir, allow_early_resets, **kwargs):
             env = TimeLimitMask(env)
 
         if log_dir is not None:
+            from stable_baselines3.common.monitor import Monitor
+
             env = Monitor(env,
                           os.path.join(log_dir, str(rank)),
                           allow_early_resets=allow_early_resets)
@@ -101,7 +114,8 @@ def make_env(env_id, seed, rank, log_dir, allow_early_resets, **kwargs):
                 env = WarpFrame(env, width=84, height=84)
                 env = ClipRewardEnv(env)
 
-        elif len(env.observation_space.shape) == 3:
+        # synthetic pixel observations are channels first already
+        elif len(env.observation_space.shape) == 3 and not is_synthetic:
             raise NotImplementedError(
                 "CNN models work only for atari,\n"
                 "please use a custom wrapper for a custom pixel input environment.\n"
@@ -19,15 +19,18 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import hashlib
 import warnings
 import weakref
 
 from absl import logging
 from dm_control import mjcf
 from dm_control.composer import observation
+from dm_control.mujoco.wrapper.mjbindings import mjlib
 from dm_control.rl import control
 import dm_env
 import numpy as np
+import six
 from six.moves import range
 
 warnings.simplefilter('always', DeprecationWarning)
@@ -167,7 +170,8 @@ class _CommonEnvironment(object):
   def __init__(self, task, time_limit=float('inf'), random_state=None,
                n_sub_steps=None,
                raise_exception_on_physics_error=True,
-               strip_singleton_obs_buffer_dim=False):
+               strip_singleton_obs_buffer_dim=False,
+               reuse_compiled_physics=True):
     """Initializes an instance of `_CommonEnvironment`.
 
     Args:
@@ -187,6 +191,9 @@ class _CommonEnvironment(object):
       strip_singleton_obs_buffer_dim: (optional) A boolean, if `True`,
         the array shape of observations with `buffer_size == 1` will not have a
         leading buffer dimension.
+      reuse_compiled_physics: (optional) A boolean, if `True`, resets after
+        which the MJCF model and the observables are unchanged reuse the
+        compiled `Physics` and the observation updater instead of recompiling.
     """
     self._task = task
     if not isinstance(random_state, np.random.RandomState):
@@ -205,12 +212,44 @@ class _CommonEnvironment(object):
                     DeprecationWarning)
     self._overridden_n_sub_steps = n_sub_steps
 
+    self._reuse_compiled_physics = reuse_compiled_physics
+    self._compiled_model = None
+    self._compiled_key = None
     self._recompile_physics_and_update_observables()
 
   def add_extra_hook(self, hook_name, hook_callable):
     self._hooks.add_extra_hook(hook_name, hook_callable)
 
-  def _recompile_physics_and_update_observables(self):
+  @property
+  def reuse_compiled_physics(self):
+    return self._reuse_compiled_physics
+
+  @reuse_compiled_physics.setter
+  def reuse_compiled_physics(self, value):
+    self._reuse_compiled_physics = value
+    # the next reset recompiles, which keeps a copy of the compiled model
+    self._compiled_key = None
+
+  def _compilation_key(self):
+    """Returns a key that changes whenever a reset has to recompile.
+
+    The key hashes the XML of the MJCF model (asset file names in it contain a
+    hash of their contents) and holds the identities of the observables, which
+    are all the observation updater depends on besides the number of physics
+    steps per control step.
+    """
+    xml_string = self._task.root_entity.mjcf_model.to_xml_string()
+    observables = self._task.observables
+    if isinstance(observables, dict):
+      observables = (observables,)
+    observables_key = tuple(
+        tuple((name, id(observable))
+              for name, observable in six.iteritems(obs_dict))
+        for obs_dict in observables)
+    return (hashlib.sha1(xml_string.encode('utf-8')).hexdigest(),
+            observables_key, self._task.physics_steps_per_control_step)
+
+  def _recompile_physics_and_update_observables(self, compiled_key=None):
     """Sets up the environment for latest MJCF model from the task."""
     self._physics_proxy = None
     self._recompile_physics()
@@ -229,12 +268,32 @@ class _CommonEnvironment(object):
     self._observation_updater = self._make_observation_updater()
     self._observation_updater.reset(self._physics_proxy, self._random_state)
 
+    if self._reuse_compiled_physics:
+      self._compiled_key = compiled_key or self._compilation_key()
+
+  def _reset_compiled_physics(self):
+    """Sets up the environment for an MJCF model that is already compiled.
+
+    The model parameters are restored to the compiled ones, since hooks may
+    have modified them, so that the `after_compile` hooks see the same
+    `Physics` as after recompiling. The data is reset by `reset_context`.
+    """
+    mjlib.mj_copyModel(self._physics.model.ptr, self._compiled_model.ptr)
+    self._hooks.refresh_entity_hooks()
+    self._hooks.after_compile(self._physics_proxy, self._random_state)
+    self._observation_updater.reset(self._physics_proxy, self._random_state)
+
   def _recompile_physics(self):
     """Creates a new Physics using the latest MJCF model from the task."""
     if getattr(self, '_physics', None):
       self._physics.free()
+    if self._compiled_model is not None:
+      self._compiled_model.free()
+      self._compiled_model = None
     self._physics = mjcf.Physics.from_mjcf_model(
         self._task.root_entity.mjcf_model)
+    if self._reuse_compiled_physics:
+      self._compiled_model = self._physics.model.copy()
 
   def _make_observation_updater(self):
     return observation.Updater(
@@ -275,7 +334,8 @@ class Environment(_CommonEnvironment, dm_env.Environment):
                n_sub_steps=None,
                raise_exception_on_physics_error=True,
                strip_singleton_obs_buffer_dim=False,
-               max_reset_attempts=1):
+               max_reset_attempts=1,
+               reuse_compiled_physics=True):
     """Initializes an instance of `Environment`.
 
     Args:
@@ -299,6 +359,9 @@ class Environment(_CommonEnvironment, dm_env.Environment):
         number of times. If this count is exceeded then the most recent
         exception will be allowed to propagate. Defaults to 1, i.e. no failure
         is allowed.
+      reuse_compiled_physics: (optional) A boolean, if `True`, resets after
+        which the MJCF model and the observables are unchanged reuse the
+        compiled `Physics` and the observation updater instead of recompiling.
     """
     super(Environment, self).__init__(
         task=task,
@@ -306,7 +369,8 @@ class Environment(_CommonEnvironment, dm_env.Environment):
         random_state=random_state,
         n_sub_steps=n_sub_steps,
         raise_exception_on_physics_error=raise_exception_on_physics_error,
-        strip_singleton_obs_buffer_dim=strip_singleton_obs_buffer_dim)
+        strip_singleton_obs_buffer_dim=strip_singleton_obs_buffer_dim,
+        reuse_compiled_physics=reuse_compiled_physics)
     self._max_reset_attempts = max_reset_attempts
     self._reset_next_step = True
 
@@ -324,7 +388,13 @@ class Environment(_CommonEnvironment, dm_env.Environment):
 
   def _reset_attempt(self):
     self._hooks.initialize_episode_mjcf(self._random_state)
-    self._recompile_physics_and_update_observables()
+    compiled_key = None
+    if self._reuse_compiled_physics:
+      compiled_key = self._compilation_key()
+    if compiled_key is not None and compiled_key == self._compiled_key:
+      self._reset_compiled_physics()
+    else:
+      self._recompile_physics_and_update_observables(compiled_key)
     with self._physics.reset_context():
       self._hooks.initialize_episode(self._physics_proxy, self._random_state)
     self._observation_updater.reset(self._physics_proxy, self._random_state)
@@ -17,7 +17,8 @@ def make(
         environment_kwargs=None,
         setting_kwargs=None,
         time_limit=1e6,
-        channels_first=True
+        channels_first=True,
+        internal_state=False
 ):
     env_id = 'dmc_%s_%s-v1' % (domain_name, task_name)
 
@@ -49,6 +50,7 @@ def make(
                 camera_id=camera_id,
                 frame_skip=frame_skip,
                 channels_first=channels_first,
+                internal_state=internal_state,
             ),
             max_episode_steps=max_episode_steps,
         )
@@ -65,7 +67,8 @@ def make_locomotion(
     frame_skip=1,
     episode_length=1000,
     time_limit=1e6,
-    channels_first=True
+    channels_first=True,
+    internal_state=False
 ):
     assert hasattr(locomotion_envs, env_name), "please use valid locomotion environments"
     env_id = 'dmc_loco_%s-v1' % (env_name)
@@ -91,6 +94,7 @@ def make_locomotion(
                 camera_id=camera_id,
                 frame_skip=frame_skip,
                 channels_first=channels_first,
+                internal_state=internal_state,
             ),
             max_episode_steps=max_episode_steps,
         )
@@ -4,14 +4,14 @@ from dm_control import composer
 from dm_env import specs
 import numpy as np
 import copy
-from src.env import locomotion_envs
+from environment import locomotion_envs
 
 
 def _spec_to_box(spec):
     def extract_min_max(s):
         # (chongyi zheng) add uint8 data type
         assert s.dtype == np.float64 or s.dtype == np.float32 or s.dtype == np.uint8
-        dim = np.int(np.prod(s.shape))
+        dim = int(np.prod(s.shape))
         if type(s) == specs.Array:
             bound = np.inf * np.ones(dim, dtype=np.float32)
             return -bound, bound
@@ -30,13 +30,33 @@ def _spec_to_box(spec):
     return spaces.Box(low, high, dtype=np.float32)
 
 
-def _flatten_obs(obs, exclude_keys):
-    obs_pieces = []
-    for k, v in obs.items():
-        if k not in exclude_keys:
-            flat = np.array([v]) if np.isscalar(v) else v.ravel()
-            obs_pieces.append(flat)
-    return np.concatenate(obs_pieces, axis=0)
+class _ObsFlattener(object):
+    """Flatten observation dicts into vectors, with the layout computed once from the observation spec
+
+    Every observation is written into a single array allocated up front, instead of raveling every piece and
+    concatenating them. A new array is returned for every observation, since callers keep them across steps.
+    """
+    def __init__(self, obs_spec, exclude_keys=None):
+        exclude_keys = exclude_keys or []
+        self._layout = []
+        offset = 0
+        dtypes = []
+        for key, spec in obs_spec.items():
+            if key in exclude_keys:
+                continue
+            size = int(np.prod(spec.shape))
+            # scalars and vectors are assigned as they are, only matrices have to be raveled
+            self._layout.append((key, offset, offset + size, len(spec.shape) > 1))
+            offset += size
+            dtypes.append(spec.dtype)
+        self.size = offset
+        self.dtype = np.result_type(*dtypes) if len(dtypes) > 0 else np.float64
+
+    def __call__(self, obs):
+        flat = np.empty(self.size, dtype=self.dtype)
+        for key, start, end, ravel in self._layout:
+            flat[start:end] = obs[key].ravel() if ravel else obs[key]
+        return flat
 
 
 class DMCWrapper(core.Env):
@@ -47,7 +67,8 @@ class DMCWrapper(core.Env):
         width=84,
         camera_id=0,
         frame_skip=1,
-        channels_first=True
+        channels_first=True,
+        internal_state=False
     ):
         self._from_pixels = from_pixels
         self._height = height  # ignore this if from_pixels = False
@@ -55,6 +76,8 @@ class DMCWrapper(core.Env):
         self._camera_id = camera_id  # ignore this if from_pixels = False
         self._frame_skip = frame_skip  # ignore this if from_pixels = False
         self._channels_first = channels_first  # ignore this if from_pixels = False
+        # snapshot the physics state into info['internal_state'] on every step
+        self._internal_state = internal_state
 
         self._env = None
 
@@ -64,12 +87,26 @@ class DMCWrapper(core.Env):
         self._state_space = None
 
         self._exclude_obs_keys = None  # used for vector observation
+        self._flattener = None
 
-        self.current_state = None
+        self._time_step = None
+        self._current_state = None
 
     def __getattr__(self, name):
         return getattr(self._env, name)
 
+    def _flatten(self, time_step):
+        if self._flattener is None:
+            self._flattener = _ObsFlattener(self._env.observation_spec(), exclude_keys=self._exclude_obs_keys)
+        return self._flattener(time_step.observation)
+
+    @property
+    def current_state(self):
+        """Flattened vector observation of the last time step, computed on first access"""
+        if self._current_state is None and self._time_step is not None:
+            self._current_state = self._flatten(self._time_step)
+        return self._current_state
+
     def _get_obs(self, time_step):
         if self._from_pixels:
             obs = self.render(
@@ -80,7 +117,9 @@ class DMCWrapper(core.Env):
             if self._channels_first:
                 obs = obs.transpose(2, 0, 1).copy()
         else:
-            obs = _flatten_obs(time_step.observation, exclude_keys=self._exclude_obs_keys)
+            # the flattened observation is the current state as well
+            obs = self._flatten(time_step)
+            self._current_state = obs
         return obs
 
     def _convert_action(self, action):
@@ -126,7 +165,9 @@ class DMCWrapper(core.Env):
         action = self._convert_action(action)
         assert self._true_action_space.contains(action)
         reward = 0
-        extra = {'internal_state': self._env.physics.get_state().copy()}
+        extra = {}
+        if self._internal_state:
+            extra['internal_state'] = self._env.physics.get_state().copy()
 
         for _ in range(self._frame_skip):
             time_step = self._env.step(action)
@@ -134,16 +175,16 @@ class DMCWrapper(core.Env):
             done = time_step.last()
             if done:
                 break
+        self._time_step = time_step
+        self._current_state = None
         obs = self._get_obs(time_step)
-        self.current_state = _flatten_obs(time_step.observation,
-                                          exclude_keys=self._exclude_obs_keys)
         extra['discount'] = time_step.discount
         return obs, reward, done, extra
 
     def reset(self):
         time_step = self._env.reset()
-        self.current_state = _flatten_obs(time_step.observation,
-                                          exclude_keys=self._exclude_obs_keys)
+        self._time_step = time_step
+        self._current_state = None
         obs = self._get_obs(time_step)
         return obs
 
@@ -173,7 +214,8 @@ class DMCSuiteWrapper(DMCWrapper):
         frame_skip=1,
         environment_kwargs=None,
         setting_kwargs=None,
-        channels_first=True
+        channels_first=True,
+        internal_state=False
     ):
         super(DMCSuiteWrapper, self).__init__(
             from_pixels,
@@ -181,7 +223,8 @@ class DMCSuiteWrapper(DMCWrapper):
             width,
             camera_id,
             frame_skip,
-            channels_first
+            channels_first,
+            internal_state
         )
 
         assert 'random' in task_kwargs, 'please specify a seed, for deterministic behaviour'
@@ -225,8 +268,6 @@ class DMCSuiteWrapper(DMCWrapper):
         self._state_space = _spec_to_box(
                 self._env.observation_spec().values()
         )
-        
-        self.current_state = None
 
         # set seed
         self.seed(seed=task_kwargs.get('random', 1))
@@ -242,7 +283,8 @@ class DMCLocomotionWrapper(DMCWrapper):
         width=84,
         camera_id=0,
         frame_skip=1,
-        channels_first=True
+        channels_first=True,
+        internal_state=False
     ):
         super(DMCLocomotionWrapper, self).__init__(
             from_pixels,
@@ -250,7 +292,8 @@ class DMCLocomotionWrapper(DMCWrapper):
             width,
             camera_id,
             frame_skip,
-            channels_first
+            channels_first,
+            internal_state
         )
         assert 'random' in task_kwargs, 'please specify a seed, for deterministic behaviour'
         self._task_kwargs = task_kwargs
@@ -293,7 +336,5 @@ class DMCLocomotionWrapper(DMCWrapper):
                 obs_spec.values()
             )
 
-        self.current_state = None
-
         # set seed
         self.seed(seed=task_kwargs.get('random', 1))
@@ -16,13 +16,32 @@ _CONTROL_TIMESTEP = .02
 _PHYSICS_TIMESTEP = 0.005
 
 
+def _cache_root_body_id(task):
+    """Resolve the walker root body in the physics arrays once per compiled physics
+
+    The rewards index 'physics.data' with the cached id instead of binding the root body on every step. The
+    'after_compile' hook runs whenever the environment (re)compiles the physics, which refreshes the id.
+    """
+    after_compile = task.after_compile
+
+    def _after_compile(physics, random_state):
+        after_compile(physics, random_state)
+        task._root_body_id = physics.bind(task._walker.root_body).element_id
+
+    task.after_compile = _after_compile
+
+
 def _walker_get_reward(self, physics):
-    walker_height = physics.bind(self._walker.root_body).xpos[2]  # xpos['z']
+    # bindings run forward dynamics before reading derived quantities of modified physics, so do we
+    if physics.is_dirty:
+        physics.forward()
+
+    walker_height = physics.data.xpos[self._root_body_id, 2]  # xpos['z']
     stand_reward = rewards.tolerance(walker_height,
                                      bounds=(self._height, float('inf')),
                                      margin=self._height / 2)
 
-    walker_vel = physics.bind(self._walker.root_body).subtree_linvel[0]
+    walker_vel = physics.data.subtree_linvel[self._root_body_id, 0]
     move_reward = rewards.tolerance(walker_vel,
                                     bounds=(self._vel, float('inf')),
                                     margin=self._vel / 2,
@@ -32,16 +51,19 @@ def _walker_get_reward(self, physics):
 
 
 def _ant_get_reward(self, physics):
-    walker_height = physics.bind(self._walker.root_body).xpos[2]  # xpos['z']
+    if physics.is_dirty:
+        physics.forward()
+
+    walker_height = physics.data.xpos[self._root_body_id, 2]  # xpos['z']
     standing = rewards.tolerance(walker_height,
                                  bounds=(self._height, float('inf')),
                                  margin=self._height / 2)
-    walker_upright = physics.bind(self._walker.root_body).xmat[-1]  # xmat['zz']
+    walker_upright = physics.data.xmat[self._root_body_id, -1]  # xmat['zz']
 
     upright = (1 + walker_upright) / 2
     stand_reward = (3 * standing + upright) / 4
 
-    walker_vel = physics.bind(self._walker.root_body).subtree_linvel[0]
+    walker_vel = physics.data.subtree_linvel[self._root_body_id, 0]
     move_reward = rewards.tolerance(walker_vel,
                                     bounds=(self._vel, float('inf')),
                                     margin=self._vel / 2,
@@ -64,6 +86,7 @@ def walker_run():
     # (Chongyi Zheng): redefine reward function
     #   https://stackoverflow.com/questions/50599045/python-replacing-a-function-within-a-class-of-a-module
     task.get_reward = _walker_get_reward.__get__(task, task.get_reward)
+    _cache_root_body_id(task)
 
     return composer.Environment(
         time_limit=30,
@@ -88,6 +111,7 @@ def walker_run_long():
 
     # (Chongyi Zheng): redefine reward function
     task.get_reward = _walker_get_reward.__get__(task, task.get_reward)
+    _cache_root_body_id(task)
 
     return composer.Environment(
         time_limit=30,
@@ -119,6 +143,7 @@ def walker_run_gaps(random_state=None):
 
     # (Chongyi Zheng): redefine reward function
     task.get_reward = _walker_get_reward.__get__(task, task.get_reward)
+    _cache_root_body_id(task)
 
     return composer.Environment(time_limit=30,
                                 task=task,
@@ -143,6 +168,7 @@ def ant_run_long():
 
     # (Chongyi Zheng): redefine reward function
     # task.get_reward = _ant_get_reward.__get__(task, task.get_reward)
+    # _cache_root_body_id(task)
 
     return composer.Environment(
         time_limit=30,
@@ -173,6 +199,7 @@ def ant_run_walls():
 
     # (Chongyi Zheng): redefine reward function
     # task.get_reward = _ant_get_reward.__get__(task, task.get_reward)
+    # _cache_root_body_id(task)
 
     return composer.Environment(
         time_limit=30,
@@ -204,6 +231,7 @@ def ant_run_gaps():
 
     # (Chongyi Zheng): redefine reward function
     # task.get_reward = _ant_get_reward.__get__(task, task.get_reward)
+    # _cache_root_body_id(task)
 
     return composer.Environment(
         time_limit=30,
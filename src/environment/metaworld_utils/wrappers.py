@@ -6,11 +6,11 @@ from gym.spaces import Box
 from src.environment.metaworld_utils.sample_strategies import uniform_random_strategy
 # from garage import EnvSpec, EnvStep, Wrapper
 
-from metaworld.envs.mujoco.sawyer_xyz.sawyer_xyz_env import SawyerXYZEnv
-
 
 class SingleMT1Wrapper(gym.Wrapper):
     def __init__(self, env, tasks):
+        from metaworld.envs.mujoco.sawyer_xyz.sawyer_xyz_env import SawyerXYZEnv
+
         assert isinstance(env, SawyerXYZEnv), f"Invalid environment type: {type(env)}"
         super().__init__(env)
 
@@ -426,7 +426,8 @@ class MultiEnvWrapper(gym.Wrapper):
         max_observation_dim = np.prod(self.env.observation_space.shape)
         max_action_dim = np.prod(self.env.action_space.shape)
         for i, env in enumerate(envs):
-            if self._aug_obs:
+            # only vector observations are zero-padded, image observations must have the same shape
+            if self._aug_obs and len(self.env.observation_space.shape) == 1:
                 assert len(env.observation_space.shape) == 1
                 if np.prod(env.observation_space.shape) > max_observation_dim:
                     self._observation_space_index = i
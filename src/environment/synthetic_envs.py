@@ -0,0 +1,239 @@
+"""Deterministic, dependency-free environments with the spaces of the benchmark environments
+
+The environments stand in for Meta-World, MuJoCo and Atari when measuring throughput on a machine without them,
+they are not meant to learn anything interesting. Every family mimics the spaces and the episodes of a benchmark:
+
+- 'mt1': Meta-World MT1 tasks, 39 dimensional observations laid out like the v2 environments (hand, gripper and
+  object poses of the current and the previous step, goal), 4 dimensional actions in [-1, 1], episodes of 500 steps
+  and 'success' in the infos.
+- 'dmc_pixels': DeepMind control suite tasks with pixel observations as returned by dmc2gym, 'frame_stack' stacked
+  84 x 84 RGB frames (channels first, uint8) and 6 dimensional actions in [-1, 1], episodes of 1000 steps.
+- 'mnist': a permuted MNIST stream, every step shows a 784 dimensional image in [0, 1] and the action scores the
+  10 classes, the reward is 1 if the highest score is the label of the image. Episodes are 100 images long.
+
+Environment ids are 'synthetic-<family>-<task>', e.g. 'synthetic-mt1-reach-v2' or 'synthetic-mnist-task1'. The
+task (goal, frames, pixel permutation) is derived from the task name alone and the seed drives the resets, so
+environments with the same id and seed produce the same trajectories for the same actions, in every process.
+'make_env' (and with it 'make_continual_vec_envs') builds environments with the 'synthetic-' prefix through
+'make_synthetic_env'.
+"""
+
+import zlib
+from collections import deque
+
+import gym
+import numpy as np
+from gym.spaces import Box
+from gym.wrappers import TimeLimit
+
+from src.environment.metaworld_utils.wrappers import TaskNameWrapper
+
+
+SYNTHETIC_ENV_PREFIX = 'synthetic-'
+
+
+def _task_random_state(family, task_name):
+    # crc32 instead of hash, which is salted differently in every process
+    return np.random.RandomState(zlib.crc32(f'{family}-{task_name}'.encode()))
+
+
+class SyntheticEnv(gym.Env):
+    """Episode bookkeeping and seeding of the synthetic environments
+
+    Episodes do not terminate by themselves, like the Meta-World environments they are cut after
+    'max_path_length' steps by a time limit (see 'make_synthetic_env').
+    """
+    metadata = {'render.modes': ['rgb_array']}
+    family = None
+
+    def __init__(self, task_name, max_path_length):
+        self.task_name = task_name
+        self.max_path_length = max_path_length
+        self.curr_path_length = 0
+        self.np_random = np.random.RandomState()
+
+    def seed(self, seed=None):
+        self.np_random = np.random.RandomState(seed)
+        return [seed]
+
+    def reset(self):
+        self.curr_path_length = 0
+        return self._reset()
+
+    def step(self, action):
+        self.curr_path_length += 1
+        obs, reward, info = self._step(np.asarray(action, dtype=np.float32))
+
+        return obs, reward, False, info
+
+    def render(self, mode='rgb_array', height=84, width=84, **kwargs):
+        # nothing is simulated to render, the pixel environments override this with their latest frame
+        return np.zeros((height, width, 3), dtype=np.uint8)
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _step(self, action):
+        raise NotImplementedError
+
+
+class SyntheticMT1Env(SyntheticEnv):
+    """Reaching task in the observation and action spaces of the Meta-World v2 environments
+
+    The hand moves by the first three action dimensions, the fourth one is the gripper. The task name fixes the
+    goal and the object poses, a reset perturbs the initial hand position.
+    """
+    family = 'mt1'
+
+    def __init__(self, task_name, max_path_length=500, action_scale=0.01, success_threshold=0.05):
+        super().__init__(task_name, max_path_length)
+        self.action_scale = action_scale
+        self.success_threshold = success_threshold
+
+        self._hand_low = np.array([-0.525, 0.348, -0.0525], dtype=np.float32)
+        self._hand_high = np.array([0.525, 1.025, 0.7], dtype=np.float32)
+        task_random_state = _task_random_state(self.family, task_name)
+        self._goal = task_random_state.uniform(self._hand_low, self._hand_high).astype(np.float32)
+        self._hand_init = task_random_state.uniform(self._hand_low, self._hand_high).astype(np.float32)
+        self._objects = task_random_state.uniform(-0.5, 0.5, size=14).astype(np.float32)
+
+        self.observation_space = Box(-np.inf, np.inf, shape=(39,), dtype=np.float32)
+        self.action_space = Box(-1.0, 1.0, shape=(4,), dtype=np.float32)
+
+        # hand (3), gripper (1) and the poses of two objects (2 x 7) of the current step
+        self._frame = np.zeros(18, dtype=np.float32)
+        self._prev_frame = np.zeros(18, dtype=np.float32)
+        self._hand = self._hand_init.copy()
+
+    def _obs(self):
+        return np.concatenate([self._frame, self._prev_frame, self._goal])
+
+    def _update_frame(self, gripper):
+        self._prev_frame[:] = self._frame
+        self._frame[:3] = self._hand
+        self._frame[3] = gripper
+        self._frame[4:] = self._objects
+
+    def _reset(self):
+        self._hand = np.clip(self._hand_init + self.np_random.uniform(-0.05, 0.05, size=3),
+                             self._hand_low, self._hand_high).astype(np.float32)
+        self._update_frame(0.0)
+        self._prev_frame[:] = self._frame
+
+        return self._obs()
+
+    def _step(self, action):
+        action = np.clip(action, -1.0, 1.0)
+        self._hand = np.clip(self._hand + self.action_scale * action[:3], self._hand_low, self._hand_high)
+        self._update_frame(action[3])
+
+        distance = float(np.linalg.norm(self._hand - self._goal))
+        reward = 10.0 * float(np.exp(-distance ** 2 / 0.05))
+        info = {'success': float(distance < self.success_threshold), 'near_object': 0.0, 'grasp_success': 0.0,
+                'grasp_reward': 0.0, 'in_place_reward': reward, 'obj_to_target': distance,
+                'unscaled_reward': reward}
+
+        return self._obs(), reward, info
+
+
+class SyntheticDMCPixelEnv(SyntheticEnv):
+    """Pixel observations in the layout of dmc2gym: 'frame_stack' stacked RGB frames, channels first
+
+    The state is a vector of joint positions moved by the actions, the reward is high when the joints are close to
+    the target joints of the task. Frames are drawn from a bank of frames of the task, indexed by the state, so
+    stepping costs about as much copying as a rendering environment does.
+    """
+    family = 'dmc_pixels'
+
+    def __init__(self, task_name, max_path_length=1000, action_dim=6, height=84, width=84, frame_stack=3,
+                 num_frames=32):
+        super().__init__(task_name, max_path_length)
+
+        task_random_state = _task_random_state(self.family, task_name)
+        self._target = task_random_state.uniform(-1.0, 1.0, size=action_dim).astype(np.float32)
+        self._frames = task_random_state.randint(0, 256, size=(num_frames, 3, height, width), dtype=np.uint8)
+        self._qpos = np.zeros(action_dim, dtype=np.float32)
+        self._stack = deque(maxlen=frame_stack)
+
+        self.observation_space = Box(0, 255, shape=(3 * frame_stack, height, width), dtype=np.uint8)
+        self.action_space = Box(-1.0, 1.0, shape=(action_dim,), dtype=np.float32)
+
+    def _frame(self):
+        index = int(np.abs(self._qpos).sum() * 100.0) % len(self._frames)
+        return self._frames[index]
+
+    def _reset(self):
+        self._qpos = self.np_random.uniform(-0.1, 0.1, size=self._qpos.shape).astype(np.float32)
+        frame = self._frame()
+        for _ in range(self._stack.maxlen):
+            self._stack.append(frame)
+
+        return np.concatenate(self._stack, axis=0)
+
+    def _step(self, action):
+        self._qpos = np.clip(self._qpos + 0.05 * np.clip(action, -1.0, 1.0), -1.0, 1.0)
+        self._stack.append(self._frame())
+        reward = float(np.exp(-np.sum((self._qpos - self._target) ** 2)))
+
+        return np.concatenate(self._stack, axis=0), reward, {}
+
+    def render(self, mode='rgb_array', height=84, width=84, **kwargs):
+        return np.ascontiguousarray(self._stack[-1].transpose(1, 2, 0))
+
+
+class SyntheticMNISTEnv(SyntheticEnv):
+    """Stream of permuted MNIST-like images, the action scores the classes
+
+    Images are noisy copies of one prototype per class, shared by all tasks, with the pixels permuted by the
+    permutation of the task.
+    """
+    family = 'mnist'
+
+    def __init__(self, task_name, max_path_length=100, image_size=28, num_classes=10, noise=0.1):
+        super().__init__(task_name, max_path_length)
+        self.noise = noise
+
+        num_pixels = image_size * image_size
+        self._prototypes = _task_random_state(self.family, 'prototypes').uniform(
+            size=(num_classes, num_pixels)).astype(np.float32)
+        self._permutation = _task_random_state(self.family, task_name).permutation(num_pixels)
+        self._label = 0
+
+        self.observation_space = Box(0.0, 1.0, shape=(num_pixels,), dtype=np.float32)
+        self.action_space = Box(-1.0, 1.0, shape=(num_classes,), dtype=np.float32)
+
+    def _image(self):
+        self._label = self.np_random.randint(len(self._prototypes))
+        image = self._prototypes[self._label] + self.noise * self.np_random.standard_normal(
+            self._prototypes.shape[1])
+
+        return np.clip(image, 0.0, 1.0).astype(np.float32)[self._permutation]
+
+    def _reset(self):
+        return self._image()
+
+    def _step(self, action):
+        correct = float(int(np.argmax(action)) == self._label)
+        return self._image(), correct, {'success': correct, 'label': self._label}
+
+
+SYNTHETIC_ENVS = {env_class.family: env_class
+                  for env_class in [SyntheticMT1Env, SyntheticDMCPixelEnv, SyntheticMNISTEnv]}
+
+
+def make_synthetic_env(env_id, **kwargs):
+    """Build the synthetic environment 'synthetic-<family>-<task>', cut after its 'max_path_length' steps
+
+    Like the Meta-World environments of 'make_env', the id is added to the infos as 'task_name'.
+
+    Keyword arguments are passed to the environment, e.g. 'frame_stack' of the pixel environments.
+    """
+    family, _, task_name = env_id[len(SYNTHETIC_ENV_PREFIX):].partition('-')
+    if not env_id.startswith(SYNTHETIC_ENV_PREFIX) or family not in SYNTHETIC_ENVS or task_name == '':
+        raise ValueError(f"Invalid synthetic environment id: {env_id}, expected "
+                         f"'{SYNTHETIC_ENV_PREFIX}<family>-<task>' with a family in {list(SYNTHETIC_ENVS)}")
+
+    env = SYNTHETIC_ENVS[family](task_name, **kwargs)
+    env = TaskNameWrapper(env, task_name=env_id)
+
+    return TimeLimit(env, max_episode_steps=env.max_path_length)
@@ -78,7 +78,8 @@ def main(args):
 	model_dir = utils.make_dir(os.path.join(args.work_dir, 'model'))
 	video_dir = utils.make_dir(os.path.join(args.work_dir, 'video'))
 	video = VideoRecorder(video_dir if args.save_video else None,
-						  height=448, width=448, camera_id=args.video_camera_id)
+						  height=448, width=448, camera_id=args.video_camera_id,
+						  frame_skip=args.video_frame_skip)
 
 	# Prepare agent
 	assert torch.cuda.is_available(), 'must have cuda enabled'
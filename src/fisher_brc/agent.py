@@ -165,12 +165,8 @@ class FBRC:
         # TODO (cyzheng): delete this line
         # if not policy_actions.requires_grad:
         #     policy_actions.requires_grad = True
-        o1, o2, _, _ = self.critic(states, policy_actions)
-        # (cyzheng): create graph for second order derivatives
-        o1_grads = torch.autograd.grad(
-            o1.sum(), policy_actions, create_graph=True)[0]
-        o2_grads = torch.autograd.grad(
-            o2.sum(), policy_actions, create_graph=True)[0]
+        # (cyzheng): gradients w.r.t. actions are computed explicitly, i.e. no second order derivatives
+        _, _, o1_grads, o2_grads = self.critic.offset_action_grads(states, policy_actions)
         o1_grad_norm = torch.sum(torch.square(o1_grads), dim=-1)
         o2_grad_norm = torch.sum(torch.square(o2_grads), dim=-1)
         o_reg = torch.mean(o1_grad_norm + o2_grad_norm)
@@ -1,56 +1,146 @@
 """Loads D4RL dataset from pickle files."""
 
+import os.path as osp
+
 import d4rl
 import gym
 import numpy as np
-from torch.utils.data import Dataset, DataLoader
-from torch.utils.data.dataloader import default_collate
+import torch
+
+
+DATASET_KEYS = ['observations', 'actions', 'rewards', 'terminals', 'next_observations']
+
 
+class D4RLTensorDataset:
+    """D4RL transitions held in contiguous tensors and sampled by index batches
+
+    The arrays are converted once into float32 tensors on 'storage_device', which is the training device by
+    default, reading memory mapped arrays in chunks of rows. On the CPU, memory mapped arrays are not converted but
+    stay lazy: every batch only reads and converts its own rows (in sorted order). Keeping the dataset on the CPU
+    saves device memory, in which case every batch is gathered into pinned memory and copied asynchronously, one
+    batch ahead of the consumer.
+
+    Iterating yields shuffled batches of one epoch (dropping the last incomplete batch) like a DataLoader would,
+    'sample' draws a batch with replacement. Batches are (states, actions, rewards, not_dones, next_states).
+    """
+    def __init__(self, states, actions, rewards, terminals, next_states, batch_size, device,
+                 storage_device=None, chunk_rows=65536):
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.storage_device = self.device if storage_device is None else torch.device(storage_device)
+        self.pin_memory = self.storage_device.type == 'cpu' and self.device.type == 'cuda'
+        self.chunk_rows = chunk_rows
 
-class D4RLDataset(Dataset):
-    def __init__(self, states, actions, rewards, not_dones, next_states):
-        self.states = states
-        self.actions = actions
-        self.rewards = rewards
-        self.not_dones = not_dones
-        self.next_states = next_states
+        self.fields = [self._storage(field) for field in [states, actions, rewards, terminals, next_states]]
+        self.lazy = any(isinstance(field, np.ndarray) for field in self.fields)
+        # not_dones are stored as such when converted, computed per batch when lazy
+        if isinstance(self.fields[3], torch.Tensor):
+            self.fields[3] = 1.0 - self.fields[3]
+
+    def _storage(self, array):
+        if isinstance(array, np.memmap) and self.storage_device.type == 'cpu':
+            return array
+        elif not isinstance(array, np.memmap):
+            return torch.as_tensor(np.asarray(array, dtype=np.float32), device=self.storage_device)
+
+        tensor = torch.empty(array.shape, dtype=torch.float32, device=self.storage_device)
+        for start in range(0, len(array), self.chunk_rows):
+            chunk = np.asarray(array[start:start + self.chunk_rows], dtype=np.float32)
+            tensor[start:start + len(chunk)] = torch.from_numpy(chunk)
+        return tensor
 
     def __len__(self):
-        return len(self.states)
+        return self.fields[0].shape[0]
+
+    def _gather(self, idxs):
+        if self.lazy:
+            # reading the rows of the memory maps in file order, a batch is a set anyway
+            idxs = torch.sort(idxs).values
+            np_idxs = idxs.numpy()
+        batch = [torch.from_numpy(np.asarray(field[np_idxs], dtype=np.float32))
+                 if isinstance(field, np.ndarray) else field[idxs]
+                 for field in self.fields]
+        if isinstance(self.fields[3], np.ndarray):
+            batch[3] = 1.0 - batch[3]
+        if self.pin_memory:
+            batch = [elem.pin_memory() for elem in batch]
+
+        return [elem.to(self.device, non_blocking=True) for elem in batch]
+
+    def sample(self, batch_size=None):
+        batch_size = self.batch_size if batch_size is None else batch_size
+        idxs = torch.randint(0, len(self), (batch_size,), device=self.storage_device)
+
+        return self._gather(idxs)
 
-    def __getitem__(self, idx):
-        return self.states[idx], self.actions[idx], self.rewards[idx], \
-               self.not_dones[idx], self.next_states[idx]
+    def __iter__(self):
+        num_batches = len(self) // self.batch_size
+        perm = torch.randperm(len(self), device=self.storage_device)
 
+        next_batch = self._gather(perm[:self.batch_size]) if num_batches > 0 else None
+        for batch_idx in range(num_batches):
+            batch = next_batch
+            # prefetch the next batch before handing out the current one
+            if batch_idx + 1 < num_batches:
+                next_batch = self._gather(perm[(batch_idx + 1) * self.batch_size:(batch_idx + 2) * self.batch_size])
+            yield batch
 
-def create_d4rl_env_and_dataset(task_name, batch_size, device):
+
+def load_local_dataset(dataset_path, env=None):
+    """Load D4RL arrays from a local file
+
+    Args:
+        dataset_path: A '.npz' or '.hdf5' file, or a directory of '.npy' files (one per key) that are memory mapped.
+        env: D4RL environment, used to build 'next_observations' for raw '.hdf5' datasets that do not have them.
+
+    Returns:
+    Dict with the keys in DATASET_KEYS.
+    """
+    if osp.isdir(dataset_path):
+        dataset = {key: np.load(osp.join(dataset_path, key + '.npy'), mmap_mode='r') for key in DATASET_KEYS}
+    elif dataset_path.endswith('.npz'):
+        with np.load(dataset_path) as data:
+            dataset = {key: data[key] for key in DATASET_KEYS}
+    elif dataset_path.endswith('.hdf5') or dataset_path.endswith('.h5'):
+        import h5py
+
+        with h5py.File(dataset_path, 'r') as data:
+            dataset = {key: data[key][:] for key in data.keys() if isinstance(data[key], h5py.Dataset)}
+        if 'next_observations' not in dataset:
+            assert env is not None, "Need the environment to build transitions from a raw D4RL dataset"
+            dataset = d4rl.qlearning_dataset(env, dataset=dataset)
+    else:
+        raise ValueError("Unknown dataset format: {}".format(dataset_path))
+
+    return dataset
+
+
+def create_d4rl_env_and_dataset(task_name, batch_size, device, dataset_path=None, storage_device=None):
     """Create gym environment and dataset for d4rl.
 
     Args:
         task_name: Name of d4rl task.
         batch_size: Mini batch size.
         device: Torch device.
+        dataset_path: Optional local dataset, see load_local_dataset. The dataset is downloaded by d4rl otherwise.
+        storage_device: Torch device to keep the dataset on, defaults to 'device'.
 
     Returns:
     Gym env and dataset.
     """
     env = gym.make(task_name)
-    dataset = d4rl.qlearning_dataset(env)
-
-    states = np.array(dataset['observations'], dtype=np.float32)
-    actions = np.array(dataset['actions'], dtype=np.float32)
-    rewards = np.array(dataset['rewards'], dtype=np.float32)
-    not_dones = np.array(np.logical_not(dataset['terminals']), dtype=np.float32)
-    next_states = np.array(dataset['next_observations'], dtype=np.float32)
-
-    # TODO (chongyi zheng): Implement dataloader
-    # dataset = tf.data.Dataset.from_tensor_slices(
-    #     (states, actions, rewards, discounts, next_states)).cache().shuffle(
-    #     states.shape[0], reshuffle_each_iteration=True).repeat().batch(
-    #     batch_size,
-    #     drop_remainder=True).prefetch(tf.data.experimental.AUTOTUNE)
-    dataset = D4RLDataset(states, actions, rewards, not_dones, next_states)
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True, drop_last=True,
-                            collate_fn=lambda x: [elem.to(device) for elem in default_collate(x)])
-
-    return env, dataloader
+    if dataset_path is None:
+        dataset = d4rl.qlearning_dataset(env)
+    else:
+        dataset = load_local_dataset(dataset_path, env)
+
+    states = dataset['observations']
+    actions = dataset['actions']
+    rewards = dataset['rewards']
+    terminals = dataset['terminals']
+    next_states = dataset['next_observations']
+
+    dataset = D4RLTensorDataset(states, actions, rewards, terminals, next_states, batch_size, device,
+                                storage_device=storage_device)
+
+    return env, dataset
@@ -44,13 +44,14 @@ def evaluate(env, agent, num_episodes=10):
 def main(args):
     device = torch.device(args.device)
 
-    env, dataloader = d4rl_utils.create_d4rl_env_and_dataset(
-        args.task_name, args.batch_size, device)
+    env, dataset = d4rl_utils.create_d4rl_env_and_dataset(
+        args.task_name, args.batch_size, device,
+        dataset_path=args.dataset_path, storage_device=args.dataset_device)
 
     # env = gym_wrapper.GymWrapper(gym_env)
     # env = tf_py_environment.TFPyEnvironment(env)
 
-    dataset_iter = iter(dataloader)
+    dataset_iter = iter(dataset)
 
     # tf.random.set_seed(FLAGS.seed)
     utils.set_seed_everywhere(args.seed)
@@ -92,7 +93,7 @@ def main(args):
             states, actions, _, _, _ = next(dataset_iter)
         except StopIteration:
             # restart the generator if the previous generator is exhausted.
-            dataset_iter = iter(dataloader)
+            dataset_iter = iter(dataset)
             states, actions, _, _, _ = next(dataset_iter)
 
         info_dict = agent.bc.update(states, actions)
@@ -111,7 +112,7 @@ def main(args):
             states, actions, rewards, not_dones, next_states = next(dataset_iter)
         except StopIteration:
             # restart the generator if the previous generator is exhausted.
-            dataset_iter = iter(dataloader)
+            dataset_iter = iter(dataset)
             states, actions, rewards, not_dones, next_states = next(dataset_iter)
 
         info_dict = agent.update(states, actions, rewards, not_dones, next_states)
@@ -147,6 +148,8 @@ if __name__ == '__main__':
     parser.add_argument('--fisher_coeff', type=float, default=0.1)
     parser.add_argument('--reward_bonus', type=float, default=5.0)
     parser.add_argument('--device', default='cuda', type=str)
+    parser.add_argument('--dataset_path', default=None, type=str)
+    parser.add_argument('--dataset_device', default=None, type=str)
     parser.add_argument('--seed', type=int, default=42)
     args = parser.parse_args()
 
@@ -10,7 +10,7 @@ from torch.distributions import Normal, Independent, MixtureSameFamily, Categori
     TransformedDistribution, AffineTransform, TanhTransform
 
 from utils import weight_init
-from utils import gaussian_logprob, squash
+from utils import gaussian_logprob, squash, mlp_action_grad
 
 LOG_STD_MIN = -20
 LOG_STD_MAX = 2
@@ -395,6 +395,20 @@ class OffsetNet(nn.Module):
         x = torch.cat([states, actions], dim=-1)
         return torch.squeeze(self.trunk(x), dim=-1)
 
+    def forward_with_action_grad(self, states, actions):
+        """Returns offsets and their gradients w.r.t. the actions, see utils.mlp_action_grad.
+
+        Args:
+          states: A batch of states.
+          actions: A batch of actions.
+
+        Returns:
+          Offsets and gradients w.r.t. the actions.
+        """
+        x = torch.cat([states, actions], dim=-1)
+        offsets, grads = mlp_action_grad(self.trunk, x, actions.size(-1))
+        return torch.squeeze(offsets, dim=-1), grads
+
 
 class OffsetCritic(nn.Module):
     """A critic network that estimates a dual Q-function."""
@@ -439,3 +453,18 @@ class OffsetCritic(nn.Module):
 
         return o1, o2, o1 + log_probs, o2 + log_probs
 
+    def offset_action_grads(self, states, actions):
+        """Returns offsets of both nets and their gradients w.r.t. the actions.
+
+        Args:
+          states: A batch of states.
+          actions: A batch of actions.
+
+        Returns:
+          Two offsets and their gradients w.r.t. the actions.
+        """
+        o1, o1_grads = self.offset1.forward_with_action_grad(states, actions)
+        o2, o2_grads = self.offset2.forward_with_action_grad(states, actions)
+
+        return o1, o2, o1_grads, o2_grads
+
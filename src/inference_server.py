@@ -0,0 +1,243 @@
+"""Batched inference of one policy for many environment workers
+
+An 'InferenceServer' owns an agent and answers the action requests of many workers, threads of the same process or
+local processes. Requests are collected into a batch until it holds 'max_batch_size' observations, every client
+has a request in it (a client waits for its action, so it has at most one) or the oldest request has waited
+'max_latency' seconds. The batch is then run through a single call of the agent (its 'act' by default, e.g.
+'predict_value' works as well) and the outputs are sent back to the clients row by row.
+
+    ctx = torch.multiprocessing.get_context('spawn')
+    server = InferenceServer(agent, max_batch_size=256, max_latency=2e-3, ctx=ctx)
+    clients = [server.client() for _ in range(num_workers)]  # before starting the workers
+    server.start()
+    ... in worker i: action = clients[i].act(obs, sample=True)
+    server.stop()
+
+Without 'ctx' the requests go through thread queues and the clients can only be used by threads of the process of
+the server. With a multiprocessing context they go through its queues, so the clients can be passed to the worker
+processes; the forward passes always run in the process of the server, on the device of the agent.
+
+A request may hold the observations of several environments, they are scattered back with the same number of rows.
+Requests with different keyword arguments (e.g. the 'head_idx' of the multi-head agents) are batched with each
+other only. Every client records the latency of its requests, from sending the observations to receiving the
+outputs, and the server records the sizes of its batches, see 'latency_summary' and 'InferenceServer.stats'.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import utils
+
+
+# seconds between checks of the stop flag while the server has no requests
+_POLL_INTERVAL = 0.1
+
+
+def latency_summary(latencies):
+    """Percentiles of a sequence of latencies in seconds, in milliseconds"""
+    if len(latencies) == 0:
+        return {'count': 0}
+    latencies = np.asarray(latencies) * 1e3
+    return {'count': len(latencies), 'mean_ms': float(np.mean(latencies)),
+            'p50_ms': float(np.percentile(latencies, 50)), 'p90_ms': float(np.percentile(latencies, 90)),
+            'p99_ms': float(np.percentile(latencies, 99)), 'max_ms': float(np.max(latencies))}
+
+
+def _hashable(value):
+    if hasattr(value, 'detach'):
+        # torch tensors, possibly on a device
+        value = value.detach().cpu().numpy()
+    if isinstance(value, (np.ndarray, np.generic)):
+        value = np.asarray(value)
+        return 'array', value.dtype.str, value.shape, value.tobytes()
+    elif isinstance(value, (list, tuple)):
+        return type(value).__name__, tuple(_hashable(item) for item in value)
+    elif isinstance(value, dict):
+        return 'dict', _kwargs_key(value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return 'repr', repr(value)
+
+
+def _kwargs_key(kwargs):
+    """Hashable key of keyword arguments, equal for equal arguments, without comparing values of different types"""
+    return tuple((name, type(kwargs[name]).__qualname__, _hashable(kwargs[name])) for name in sorted(kwargs))
+
+
+class InferenceClient(object):
+    """Sends the requests of one worker to an 'InferenceServer', created by 'InferenceServer.client'
+
+    'latencies' keeps the latency of the last 'max_latencies' requests in seconds. A request that gets no reply
+    within 'timeout' seconds (None waits forever) raises a TimeoutError, its late reply is discarded.
+    """
+    def __init__(self, client_id, requests, replies, max_latencies=100000, timeout=None):
+        self.client_id = client_id
+        self.timeout = timeout
+        self._requests = requests
+        self._replies = replies
+        self._request_id = 0
+        self.latencies = deque(maxlen=max_latencies)
+
+    def request(self, obs, **kwargs):
+        """The outputs of the agent on the observations 'obs' (a batch), as returned by its method"""
+        self._request_id += 1
+        start = time.perf_counter()
+        self._requests.put((self.client_id, self._request_id, start, np.asarray(obs), kwargs))
+        request_id = None
+        while request_id != self._request_id:
+            timeout = None if self.timeout is None else start + self.timeout - time.perf_counter()
+            try:
+                request_id, outputs = self._replies.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f'request {self._request_id} of client {self.client_id} got no reply within '
+                                   f'{self.timeout} seconds') from None
+        self.latencies.append(time.perf_counter() - start)
+
+        if isinstance(outputs, Exception):
+            raise RuntimeError(f'inference of client {self.client_id} failed') from outputs
+        return outputs
+
+    act = request
+
+
+class InferenceServer(object):
+    """Serve the batched outputs of 'agent.<method>' to the clients of many workers, see the module documentation
+
+    'lock' is held during the forward passes: hold it while changing the weights of the agent, e.g. in
+    'load_actor', when the server is running.
+    """
+    def __init__(self, agent, max_batch_size=256, max_latency=2e-3, method='act', ctx=None):
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.method = method
+        self.lock = threading.Lock()
+        self._queue_cls = queue.Queue if ctx is None else ctx.Queue
+        self._requests = self._queue_cls()
+        self._replies = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.reset_stats()
+
+    def client(self, timeout=None):
+        """A new client, with its own reply queue, see 'InferenceClient' for 'timeout'"""
+        replies = self._queue_cls()
+        self._replies.append(replies)
+        return InferenceClient(len(self._replies) - 1, self._requests, replies, timeout=timeout)
+
+    @property
+    def num_clients(self):
+        return len(self._replies)
+
+    def start(self):
+        """Serve the requests in a background thread"""
+        assert self._thread is None, 'the inference server is already running'
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name='inference_server', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving, the requests still queued are answered with an error"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+        error = RuntimeError('the inference server was stopped')
+        while True:
+            try:
+                client_id, request_id = self._requests.get_nowait()[:2]
+            except queue.Empty:
+                break
+            self._replies[client_id].put((request_id, error))
+
+    def load_actor(self, actor):
+        """Copy the weights of 'actor' into the actor of the served agent, between two forward passes"""
+        with self.lock:
+            self.agent.actor.load_state_dict(actor.state_dict())
+
+    def reset_stats(self):
+        self._batch_rows = []
+        self._batch_requests = []
+        self._forward_times = []
+
+    def stats(self):
+        """Batch sizes in observations and requests and forward pass times since the last 'reset_stats'"""
+        num_batches = len(self._batch_rows)
+        return {'batches': num_batches,
+                'mean_batch_rows': float(np.mean(self._batch_rows)) if num_batches > 0 else 0.0,
+                'mean_batch_requests': float(np.mean(self._batch_requests)) if num_batches > 0 else 0.0,
+                'forward': latency_summary(self._forward_times)}
+
+    def _collect(self):
+        """Block for the next batch of requests, None if the server is stopped"""
+        while not self._stop.is_set():
+            try:
+                batch = [self._requests.get(timeout=_POLL_INTERVAL)]
+                break
+            except queue.Empty:
+                continue
+        else:
+            return None
+
+        num_rows = len(batch[0][3])
+        # the clients send their time of the request, 'perf_counter' is system-wide on Linux
+        deadline = batch[0][2] + self.max_latency
+        while num_rows < self.max_batch_size and len(batch) < self.num_clients:
+            try:
+                timeout = deadline - time.perf_counter()
+                request = self._requests.get(timeout=timeout) if timeout > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            num_rows += len(request[3])
+
+        return batch
+
+    def _forward(self, requests, kwargs):
+        obs = np.concatenate([request[3] for request in requests])
+        with self.lock, utils.eval_mode(self.agent):
+            outputs = getattr(self.agent, self.method)(obs, **kwargs)
+
+        splits = np.cumsum([len(request[3]) for request in requests])[:-1]
+        if isinstance(outputs, tuple):
+            return list(zip(*[np.split(output, splits) for output in outputs]))
+        return np.split(outputs, splits)
+
+    def _serve(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            start = time.perf_counter()
+            # (client_id, request_id) of the requests already answered, a client can have several in a batch
+            replied = set()
+            try:
+                # requests with the same keyword arguments share a forward pass
+                groups = {}
+                for request in batch:
+                    groups.setdefault(_kwargs_key(request[4]), []).append(request)
+                for requests in groups.values():
+                    try:
+                        outputs = self._forward(requests, requests[0][4])
+                    except Exception as e:
+                        outputs = [e] * len(requests)
+                    for (client_id, request_id, _, _, _), output in zip(requests, outputs):
+                        self._replies[client_id].put((request_id, output))
+                        replied.add((client_id, request_id))
+            except Exception as e:
+                # no client may wait forever for a batch that failed
+                for client_id, request_id, _, _, _ in batch:
+                    if (client_id, request_id) not in replied:
+                        self._replies[client_id].put((request_id, e))
+
+            self._forward_times.append(time.perf_counter() - start)
+            self._batch_rows.append(sum(len(request[3]) for request in batch))
+            self._batch_requests.append(len(batch))
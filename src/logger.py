@@ -9,6 +9,8 @@ import torchvision
 import numpy as np
 from termcolor import colored
 
+from metrics_table import ColumnarWriter
+
 FORMAT_CONFIG = {
     'rl': {
         'train': [
@@ -33,6 +35,14 @@ FORMAT_CONFIG = {
             # ('episode_ss_pred_var', 'ss_pred_var', 'float'),
             ('success_rate', 'success_rate', 'float'),
         ]
+    },
+    # summaries of profiler.Profiler, the phases are in the logged files
+    'profile': {
+        'train': [
+            ('step', 'step', 'int'),
+            ('wall_time', 'wall_time', 'time'),
+        ],
+        'eval': []
     }
 }
 
@@ -51,13 +61,19 @@ class AverageMeter(object):
 
 
 class MetersGroup(object):
-    def __init__(self, file_name, formating):
-        self._file_name = self._prepare_file(file_name, 'log')
-        self._csv_file_name = self._prepare_file(file_name, 'csv')
+    def __init__(self, file_name, formating, resume_step=None):
+        self._file_name = f'{file_name}.log'
+        self._csv_file_name = f'{file_name}.csv'
         self._formating = formating
         self._meters = defaultdict(AverageMeter)
-        self._csv_file = open(self._csv_file_name, 'w')
         self._csv_writer = None
+        if resume_step is None:
+            self._prepare_file(file_name, 'log')
+            self._prepare_file(file_name, 'csv')
+            self._csv_file = open(self._csv_file_name, 'w')
+        else:
+            self._csv_file = self._resume_files(resume_step)
+        self._columnar_writer = ColumnarWriter(file_name, resume_step=resume_step)
 
     def log(self, key, value, n=1):
         self._meters[key].update(value, n)
@@ -68,6 +84,29 @@ class MetersGroup(object):
             os.remove(file_name)
         return file_name
 
+    def _resume_files(self, resume_step):
+        # keep the rows of a resumed run up to 'resume_step', the later ones are logged again
+        if os.path.exists(self._file_name):
+            with open(self._file_name, 'r') as f:
+                lines = [line for line in f if json.loads(line)['step'] <= resume_step]
+            with open(self._file_name, 'w') as f:
+                f.writelines(lines)
+
+        rows = []
+        if os.path.exists(self._csv_file_name):
+            with open(self._csv_file_name, 'r', newline='') as f:
+                reader = csv.DictReader(f)
+                fieldnames = reader.fieldnames
+                rows = [row for row in reader if float(row['step']) <= resume_step]
+        csv_file = open(self._csv_file_name, 'w')
+        if len(rows) > 0:
+            self._csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames, restval=0.0)
+            self._csv_writer.writeheader()
+            self._csv_writer.writerows(rows)
+            csv_file.flush()
+
+        return csv_file
+
     def _prime_meters(self):
         data = dict()
         for key, meter in self._meters.items():
@@ -106,6 +145,10 @@ class MetersGroup(object):
         self._csv_writer.writerow(data)
         self._csv_file.flush()
 
+    def _dump_to_columns(self, data):
+        self._columnar_writer.append(data)
+        self._columnar_writer.flush()
+
     def _dump_to_console(self, data, prefix):
         # TODO (chongyi zheng): remove color
         # prefix = colored(prefix, 'yellow' if prefix == 'train' else 'green')
@@ -133,6 +176,7 @@ class MetersGroup(object):
                     data[key] = val
             self._dump_to_file(data)
             self._dump_to_csv(data)
+            self._dump_to_columns(data)
             self._dump_to_console(data, prefix)
         self._meters.clear()
 
@@ -143,16 +187,19 @@ class Logger(object):
                  log_frequency=10000,
                  action_repeat=1,
                  save_tb=True,
-                 config='rl'):
+                 config='rl',
+                 resume_step=None):
         """
             (chongyi zheng): update Logger to DrQ version
+
+            'resume_step' continues the logs of a resumed run, keeping the rows up to that step.
         """
         self._log_dir = log_dir
         self._log_frequency = log_frequency
         self._action_repeat = action_repeat
         if save_tb:
             tb_dir = os.path.join(log_dir, 'tb')
-            if os.path.exists(tb_dir):
+            if os.path.exists(tb_dir) and resume_step is None:
                 try:
                     shutil.rmtree(tb_dir)
                 except:
@@ -163,11 +210,13 @@ class Logger(object):
             self._sw = None
         self._train_mg = MetersGroup(
             os.path.join(log_dir, 'train'),
-            formating=FORMAT_CONFIG[config]['train']
+            formating=FORMAT_CONFIG[config]['train'],
+            resume_step=resume_step
         )
         self._eval_mg = MetersGroup(
             os.path.join(log_dir, 'eval'),
-            formating=FORMAT_CONFIG[config]['eval']
+            formating=FORMAT_CONFIG[config]['eval'],
+            resume_step=resume_step
         )
 
     def _should_log(self, step, log_frequency):
@@ -0,0 +1,340 @@
+"""Columnar store of logged metrics and vectorized queries over whole experiment trees."""
+
+import atexit
+import csv
+import glob
+import os
+import os.path as osp
+import shutil
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+COLUMNS_SUFFIX = 'columns'
+
+
+def _rows_to_columns(rows):
+    keys = []
+    for row in rows:
+        keys.extend(key for key in row if key not in keys)
+
+    columns = {}
+    for key in keys:
+        values = [row.get(key) for row in rows]
+        try:
+            if any(isinstance(value, str) for value in values):
+                raise ValueError
+            columns[key] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        except (TypeError, ValueError):
+            # -strings, or values that are not scalars (written as their string representation, like in the CSV)
+            columns[key] = np.array(['' if value is None else str(value) for value in values])
+
+    return columns
+
+
+def _concat_columns(chunks):
+    keys = []
+    for chunk in chunks:
+        keys.extend(key for key in chunk if key not in keys)
+
+    columns = {}
+    for key in keys:
+        parts = []
+        for chunk in chunks:
+            num_rows = len(next(iter(chunk.values()))) if len(chunk) > 0 else 0
+            if key in chunk:
+                parts.append(chunk[key])
+            else:
+                parts.append(np.full(num_rows, np.nan))
+        if any(part.dtype.kind == 'U' for part in parts):
+            parts = [part if part.dtype.kind == 'U' else np.full(len(part), '') for part in parts]
+        columns[key] = np.concatenate(parts)
+
+    return columns
+
+
+class ColumnarWriter(object):
+    """Append logged rows to a columnar store, a directory of immutable numbered '.npz' files
+
+    Every 'flush' (i.e. every dump of the logger, so nothing is lost if the run dies) writes the rows appended
+    since the previous one to a new tail file. Once the tail files hold 'chunk_size' rows they are merged into one
+    chunk file and removed, so every row is written at most twice and the number of files stays bounded. Every
+    file stores the index of its first row, which lets readers drop rows that are in a chunk and in the tail files
+    it replaced, if a run dies while merging. String values become unicode columns, numbers become float64
+    columns.
+
+    With 'resume_step', the rows of a resumed run up to that step are kept instead of starting over.
+    """
+    def __init__(self, prefix, chunk_size=1024, resume_step=None):
+        self._dir_name = f'{prefix}.{COLUMNS_SUFFIX}'
+        self._chunk_size = chunk_size
+        self._num_rows = 0
+        self._rows = []
+        # rows in the tail files and the paths of the files
+        self._tail_rows = []
+        self._tail_paths = []
+
+        # the kept rows are written to a sibling directory that is swapped in, so the old store stays intact
+        # until they are all on disk (a rename cannot replace a non-empty directory, so the old one is moved
+        # aside first and restored here if a run died in between)
+        tmp_dir_name, old_dir_name = f'{self._dir_name}.tmp', f'{self._dir_name}.old'
+        if not osp.exists(self._dir_name) and osp.exists(old_dir_name):
+            os.replace(old_dir_name, self._dir_name)
+
+        chunk_paths = source_files(prefix) if resume_step is not None else []
+        columns = {}
+        if len(chunk_paths) > 0 and chunk_paths[0].endswith('.npz'):
+            columns = load_columns(prefix)
+            if 'step' in columns:
+                columns = {key: column[columns['step'] <= resume_step] for key, column in columns.items()}
+
+        for dir_name in [tmp_dir_name, old_dir_name]:
+            if osp.exists(dir_name):
+                shutil.rmtree(dir_name)
+        os.makedirs(tmp_dir_name)
+
+        num_rows = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        for first_row in range(0, num_rows, chunk_size):
+            self._save('chunk', {key: column[first_row:first_row + chunk_size] for key, column in columns.items()},
+                       first_row, dir_name=tmp_dir_name)
+        self._num_rows = num_rows
+
+        if osp.exists(self._dir_name):
+            os.replace(self._dir_name, old_dir_name)
+        os.replace(tmp_dir_name, self._dir_name)
+        if osp.exists(old_dir_name):
+            shutil.rmtree(old_dir_name)
+
+        _WRITERS.add(self)
+
+    def _save(self, kind, columns, first_row, dir_name=None):
+        path = osp.join(dir_name or self._dir_name, f'{kind}_{first_row:09d}.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, _first_row=np.array(first_row), **columns)
+        os.replace(path + '.tmp', path)
+        return path
+
+    def append(self, row):
+        self._rows.append(dict(row))
+
+    def flush(self):
+        if len(self._rows) == 0:
+            return
+        self._tail_paths.append(self._save('tail', _rows_to_columns(self._rows), self._num_rows))
+        self._num_rows += len(self._rows)
+        self._tail_rows.extend(self._rows)
+        self._rows = []
+
+        if len(self._tail_rows) >= self._chunk_size:
+            self._save('chunk', _rows_to_columns(self._tail_rows), self._num_rows - len(self._tail_rows))
+            for path in self._tail_paths:
+                os.remove(path)
+            self._tail_rows = []
+            self._tail_paths = []
+
+
+# writers flushed at exit, registered once instead of once per writer
+_WRITERS = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_writers():
+    for writer in list(_WRITERS):
+        writer.flush()
+
+
+def _read_csv(path):
+    with open(path, 'r', newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    columns = {}
+    for key in (rows[0].keys() if len(rows) > 0 else []):
+        values = [row[key] for row in rows]
+        try:
+            columns[key] = np.array(values, dtype=np.float64)
+        except ValueError:
+            columns[key] = np.array(values)
+
+    return columns
+
+
+def source_files(prefix):
+    """Files that 'load_columns' reads for 'prefix', empty if nothing was logged"""
+    chunk_paths = sorted(glob.glob(osp.join(f'{prefix}.{COLUMNS_SUFFIX}', '*.npz')))
+    if len(chunk_paths) > 0:
+        return chunk_paths
+
+    return [f'{prefix}.csv'] if osp.exists(f'{prefix}.csv') else []
+
+
+def load_columns(prefix):
+    """Load the rows logged under 'prefix' (e.g. '<run_dir>/eval') as a dict of columns
+
+    The columnar store is used if it exists, the CSV file is parsed otherwise (e.g. for runs logged before the
+    columnar store was added). Raises FileNotFoundError if neither exists.
+    """
+    chunk_paths = source_files(prefix)
+    if len(chunk_paths) > 0 and chunk_paths[0].endswith('.npz'):
+        chunks = []
+        for chunk_path in chunk_paths:
+            with np.load(chunk_path) as chunk:
+                first_row = int(chunk['_first_row'])
+                chunks.append((first_row, {key: chunk[key] for key in chunk.files if key != '_first_row'}))
+        chunks.sort(key=lambda chunk: chunk[0])
+
+        # drop rows that are in more than one chunk
+        num_rows = 0
+        columns = []
+        for first_row, chunk in chunks:
+            skip = num_rows - first_row
+            chunk = {key: column[max(skip, 0):] for key, column in chunk.items()}
+            num_rows = first_row + max(skip, 0) + len(next(iter(chunk.values())))
+            columns.append(chunk)
+        return _concat_columns(columns)
+
+    return _read_csv(f'{prefix}.csv')
+
+
+def continual_run_dir(data_dir, exp_name, algo, seed):
+    """Directory of one continual learning run, as laid out by the training scripts"""
+    if 'distilled' in algo:
+        return osp.join(data_dir, exp_name, algo, str(seed), 'distill')
+    elif 'distillation' in algo:
+        return osp.join(data_dir, exp_name, algo, str(seed), 'distillation')
+    else:
+        return osp.join(data_dir, exp_name, algo, str(seed))
+
+
+def single_run_dir(data_dir, exp_name, algo, task_name, seed):
+    """Directory of one single task run"""
+    return osp.join(data_dir, exp_name, algo, task_name, str(seed))
+
+
+class MetricsTable(object):
+    """Rows of many runs held in one set of columns
+
+    Every row carries the 'algo', 'seed' and index 'run' of its run. String columns are encoded as integer codes
+    once, so that filtering by task name, algorithm or seed is a vectorized comparison over all rows.
+    """
+    def __init__(self, columns, runs):
+        self.columns = columns
+        self.runs = runs
+        self._codes = {}
+        for key, column in columns.items():
+            if column.dtype.kind == 'U':
+                uniques, codes = np.unique(column, return_inverse=True)
+                self._codes[key] = ({value: code for code, value in enumerate(uniques)}, codes)
+
+    def __len__(self):
+        return len(self.columns['run']) if 'run' in self.columns else 0
+
+    @classmethod
+    def load(cls, runs, name='eval', num_workers=16, verbose=True):
+        """Load the rows logged as 'name' by every run
+
+        Args:
+            runs: Iterable of (algo, seed, run_dir) or, for runs trained on a single task, (algo, seed, run_dir,
+                task_name).
+            name: Logged group, e.g. 'eval' or 'train'.
+            num_workers: Number of threads reading the runs.
+        """
+        runs = list(runs)
+
+        def _load(run):
+            run_dir = run[2]
+            prefix = osp.abspath(osp.join(run_dir, name))
+            try:
+                return load_columns(prefix)
+            except FileNotFoundError:
+                if verbose:
+                    print(f"Data path not found: {prefix}.csv!")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+            loaded = list(executor.map(_load, runs))
+
+        chunks = []
+        found_runs = []
+        for run, columns in zip(runs, loaded):
+            if columns is None:
+                continue
+            algo, seed = run[:2]
+            num_rows = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+            columns = dict(columns)
+            columns['algo'] = np.full(num_rows, algo)
+            columns['seed'] = np.full(num_rows, seed, dtype=np.int64)
+            columns['run'] = np.full(num_rows, len(found_runs), dtype=np.int64)
+            chunks.append(columns)
+            found_runs.append((algo, seed, run[3] if len(run) > 3 else None))
+
+        return cls(_concat_columns(chunks) if len(chunks) > 0 else {}, found_runs)
+
+    @classmethod
+    def load_continual(cls, data_dir, exp_name, algos, seeds, **kwargs):
+        runs = [(algo, seed, continual_run_dir(data_dir, exp_name, algo, seed)) for algo in algos for seed in seeds]
+        return cls.load(runs, **kwargs)
+
+    @classmethod
+    def load_single(cls, data_dir, exp_name, algos, task_names, seeds, **kwargs):
+        runs = [
+            (algo, seed, single_run_dir(data_dir, exp_name, algo, task_name, seed), task_name)
+            for task_name in task_names for algo in algos for seed in seeds
+        ]
+        return cls.load(runs, **kwargs)
+
+    def mask(self, max_step=None, **conditions):
+        """Boolean mask of the rows whose columns equal (or are in, for lists) the given values"""
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in conditions.items():
+            if key not in self.columns:
+                return np.zeros(len(self), dtype=bool)
+            multiple = isinstance(value, (list, tuple, set, np.ndarray))
+            if key in self._codes:
+                code_of, codes = self._codes[key]
+                value = [code_of.get(v, -1) for v in value] if multiple else code_of.get(value, -1)
+                column = codes
+            else:
+                column = self.columns[key]
+            mask &= np.isin(column, list(value)) if multiple else (column == value)
+        if max_step is not None:
+            mask &= self.columns['step'] <= max_step
+
+        return mask
+
+    def select(self, keys, max_step=None, **conditions):
+        """Columns 'keys' of the rows matching the conditions, see 'mask'"""
+        mask = self.mask(max_step=max_step, **conditions)
+        for key in keys:
+            if key not in self.columns:
+                raise RuntimeError(f"Statistics '{key}' doesn't exist in the logged data!")
+
+        return {key: self.columns[key][mask] for key in keys}
+
+    def curves(self, stat, algo, task_name=None, max_step=None, x_key='step'):
+        """Curves of 'stat' over 'x_key' for every loaded run (seed) of 'algo', in the format of the plotting scripts
+
+        Returns:
+        Dict with 'x' (from the last run) and 'y' (list with one array per run), or an empty dict if no run of
+        'algo' was loaded.
+        """
+        run_idxs = [
+            run_idx for run_idx, (run_algo, _, run_task_name) in enumerate(self.runs)
+            if run_algo == algo and (run_task_name is None or task_name is None or run_task_name == task_name)
+        ]
+        if len(run_idxs) == 0:
+            return {}
+
+        conditions = dict(algo=algo)
+        if task_name is not None:
+            conditions['task_name'] = task_name
+        rows = self.select([x_key, stat, 'run'], max_step=max_step, **conditions)
+
+        curves = {'y': []}
+        for run_idx in run_idxs:
+            run_mask = rows['run'] == run_idx
+            curves['x'] = rows[x_key][run_mask]
+            curves['y'].append(rows[stat][run_mask])
+
+        return curves
@@ -6,7 +6,7 @@ from torch import optim
 
 from collections import OrderedDict
 
-from src import utils
+from src.reservoir import ReservoirMemory
 
 
 class CmamlClassfier(nn.Module):
@@ -39,15 +39,11 @@ class CmamlClassfier(nn.Module):
 
         self.to(device)
 
-        self.memory = {
-            'x': np.empty((self.memory_budget, self.image_channels,
-                           self.image_size, self.image_size),
-                          dtype=np.float32),
-            'y': np.empty((self.memory_budget, 1), dtype=np.int64),
-            'class_entries': [],
-            'sample_num': 0
-        }
-        self.total_sample_num = 0
+        self.memory = ReservoirMemory(self.memory_budget, {
+            'x': ((self.image_channels, self.image_size, self.image_size), torch.float32),
+            'y': ((1,), torch.int64),
+        }, 'cpu')
+        self.memory_class_entries = [None] * self.memory_budget
 
     def _augment_prev_samples(self, x, y, active_classes=None):
         class_entries = None
@@ -57,16 +53,16 @@ class CmamlClassfier(nn.Module):
                 device=self.device()) \
                 if type(active_classes[0]) == list else active_classes
 
-        aug_size = min(x.size(0), self.memory['sample_num'])
+        aug_size = min(x.size(0), len(self.memory))
         aug_class_entries = None
         if aug_size > 0:
             sample_idxs = np.random.randint(
-                0, self.memory['sample_num'], size=aug_size)
+                0, len(self.memory), size=aug_size)
             mem_x = self.memory['x'][sample_idxs]
             mem_y = self.memory['y'][sample_idxs].squeeze()
             if class_entries is not None:
                 mem_class_entries = torch.as_tensor(
-                    [self.memory['class_entries'][idx] for idx in sample_idxs],
+                    [self.memory_class_entries[idx] for idx in sample_idxs],
                     dtype=torch.int64, device=self.device())
 
             # (chongyi zheng): clone original data to prevent erroneous backpropagation
@@ -86,28 +82,13 @@ class CmamlClassfier(nn.Module):
         return aug_x, aug_y, aug_class_entries
 
     def _reservoir_sampling(self, x, y, active_classes=None):
+        src_idxs, slots = self.memory.add(x=x.detach().cpu(), y=y.detach().cpu())
+
         if active_classes is not None:
             class_entries = [active_classes[-1]] * x.size(0) \
                 if type(active_classes[0]) == list else active_classes
-        else:
-            class_entries = [None] * x.size(0)
-
-        for single_x, single_y, single_class_entries in zip(x, y, class_entries):
-            self.total_sample_num += 1
-            sample_num = self.memory['sample_num']
-            if sample_num < self.memory_budget:
-                np.copyto(self.memory['x'][sample_num], utils.to_np(single_x))
-                np.copyto(self.memory['y'][sample_num], utils.to_np(single_y))
-                if single_class_entries is not None:
-                    self.memory['class_entries'].append(single_class_entries)
-                self.memory['sample_num'] += 1
-            else:
-                idx = np.random.randint(0, self.total_sample_num)
-                if idx < self.memory_budget:
-                    np.copyto(self.memory['x'][idx], utils.to_np(single_x))
-                    np.copyto(self.memory['y'][idx], utils.to_np(single_y))
-                    if single_class_entries is not None:
-                        self.memory['class_entries'][idx] = single_class_entries
+            for src_idx, slot in zip(src_idxs, slots):
+                self.memory_class_entries[slot] = class_entries[src_idx]
 
     def _inner_update(self, x, y, active_classes=None, params=None):
         if params is None:
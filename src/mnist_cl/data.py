@@ -1,8 +1,11 @@
 import copy
+import hashlib
+import os
 import numpy as np
 from torchvision import datasets, transforms
 from torch.utils.data import ConcatDataset, Dataset
 import torch
+import torch.nn.functional as F
 
 
 def _permutate_image_pixels(image, permutation):
@@ -137,6 +140,68 @@ class TransformedDataset(Dataset):
         return (input, target)
 
 
+class CachedDataset(Dataset):
+    '''Dataset of preprocessed images and labels held in two tensors, served by tensor indexing.
+
+    [images]    <uint8>-tensor (N, C, H, W) with raw pixel values, or <float>-tensor already scaled to [0, 1]
+    [targets]   <long>-tensor (N,) with the (already transformed) labels
+    [device]    device to keep the tensors on (e.g., "cuda" to gather batches without host-to-device copies)'''
+
+    def __init__(self, images, targets, device=None):
+        super().__init__()
+        self.images = images if device is None else images.to(device)
+        self.targets = targets if device is None else targets.to(device)
+
+    @property
+    def device(self):
+        return self.images.device
+
+    def __len__(self):
+        return self.targets.shape[0]
+
+    def get_batch(self, idxs):
+        '''Return images and labels at [idxs] (a <long>-tensor), images as <float> in [0, 1].'''
+        x = self.images[idxs]
+        if x.dtype == torch.uint8:
+            x = x.float().div_(255.)
+        return x, self.targets[idxs]
+
+    def __getitem__(self, index):
+        x, y = self.get_batch(index)
+        return x, int(y)
+
+    def loader(self, batch_size, shuffle=True, drop_last=False, pin_memory=False):
+        '''Return iterable over minibatches, a replacement of <DataLoader> without workers or collating.'''
+        return CachedBatchLoader(self, batch_size, shuffle=shuffle, drop_last=drop_last, pin_memory=pin_memory)
+
+
+class CachedBatchLoader(object):
+    '''Iterate over one epoch of (x, y)-minibatches of a <CachedDataset>, drawing one index permutation per epoch.'''
+
+    def __init__(self, dataset, batch_size, shuffle=True, drop_last=False, pin_memory=False):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        # -pinning only makes sense for batches gathered on the host
+        self.pin_memory = pin_memory and dataset.device.type == 'cpu' and torch.cuda.is_available()
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return int(np.ceil(len(self.dataset) / self.batch_size))
+
+    def __iter__(self):
+        n = len(self.dataset)
+        device = self.dataset.device
+        idxs = torch.randperm(n, device=device) if self.shuffle else torch.arange(n, device=device)
+        for batch_id in range(len(self)):
+            x, y = self.dataset.get_batch(idxs[batch_id * self.batch_size:(batch_id + 1) * self.batch_size])
+            if self.pin_memory:
+                x, y = x.pin_memory(), y.pin_memory()
+            yield x, y
+
+
 #----------------------------------------------------------------------------------------------------------#
 
 
@@ -167,11 +232,16 @@ DATASET_CONFIGS = {
 
 
 def get_multitask_experiment(name, scenario, num_tasks, data_dir="./datasets", verbose=False,
-                             exception=False):
+                             exception=False, cached=False, cache_dir=None, device=None):
     '''Load, organize and return train- and test-dataset for requested experiment.
 
     [exception]:    <bool>; if True, for visualization no permutation is applied to first task (permMNIST) or digits
-                            are not shuffled before being distributed over the tasks (splitMNIST)'''
+                            are not shuffled before being distributed over the tasks (splitMNIST)
+    [cached]:       <bool>; if True, return <CachedDataset>s (see get_cached_multitask_experiment)'''
+
+    if cached:
+        return get_cached_multitask_experiment(name, scenario, num_tasks, data_dir=data_dir, verbose=verbose,
+                                               exception=exception, cache_dir=cache_dir, device=device)
 
     # depending on experiment, get and organize the datasets
     if name == 'permMNIST':
@@ -242,3 +312,111 @@ def get_multitask_experiment(name, scenario, num_tasks, data_dir="./datasets", v
 
     # Return tuple of train-, validation- and test-dataset, config-dictionary and number of classes per task
     return train_datasets, test_datasets, config, classes_per_task
+
+
+#----------------------------------------------------------------------------------------------------------#
+
+
+def _load_raw_mnist(name, type='train', dir='./datasets', verbose=False):
+    '''Return <uint8>-tensor (N, 1, H, W) with the (padded) images and <long>-tensor (N,) with the labels.'''
+
+    data_name = 'mnist' if name=='mnist28' else name
+    dataset = AVAILABLE_DATASETS[data_name]('{dir}/{name}'.format(dir=dir, name=data_name),
+                                            train=False if type == 'test' else True, download=True)
+    images = torch.as_tensor(dataset.data, dtype=torch.uint8).unsqueeze(1)
+    targets = torch.as_tensor(dataset.targets, dtype=torch.long)
+    if name == 'mnist':
+        # -same as transforms.Pad(2)
+        images = F.pad(images, (2, 2, 2, 2))
+
+    if verbose:
+        print(" --> {}: '{}'-dataset consisting of {} samples".format(name, type, len(targets)))
+
+    return images, targets
+
+
+def _permutate_images(images, permutation):
+    '''Permutate the pixels of all [images] (N, C, H, W) at once according to [permutation].'''
+
+    if permutation is None:
+        return images
+    n, c, h, w = images.size()
+    permutation = torch.as_tensor(permutation, dtype=torch.long)
+    return images.reshape(n, c, h * w)[:, :, permutation].reshape(n, c, h, w)
+
+
+def _cache_key(name, scenario, num_tasks, permutations):
+    digest = hashlib.sha1()
+    for perm in permutations:
+        digest.update(b'none' if perm is None else np.asarray(perm, dtype=np.int64).tobytes())
+    return '{}-{}-{}-{}'.format(name, scenario, num_tasks, digest.hexdigest()[:16])
+
+
+def get_cached_multitask_experiment(name, scenario, num_tasks, data_dir="./datasets", verbose=False,
+                                    exception=False, cache_dir=None, device=None):
+    '''Same experiments as [get_multitask_experiment], with every task materialized once into tensors.
+
+    Images of each task are stored as <uint8>-tensors with the permutation already applied and labels are
+    transformed and split with vectorized masks, so that batches are gathered by tensor indexing (see
+    <CachedDataset>). The random numbers drawn for the permutations are the same as those of the uncached
+    experiment, so both give the same tasks for the same seed.
+
+    [cache_dir]:    None or <str>; if given, the tensors of all tasks are saved to / loaded from a file in it
+    [device]:       None or device to keep the tensors of all tasks on'''
+
+    if name == 'permMNIST':
+        config = DATASET_CONFIGS['mnist']
+        classes_per_task = 10
+        if exception:
+            permutations = [None] + [np.random.permutation(config['size']**2) for _ in range(num_tasks - 1)]
+        else:
+            permutations = [np.random.permutation(config['size']**2) for _ in range(num_tasks)]
+        key_permutations = permutations
+    elif name == 'splitMNIST':
+        if num_tasks > 10:
+            raise ValueError("Experiment 'splitMNIST' cannot have more than 10 tasks!")
+        config = DATASET_CONFIGS['mnist28']
+        classes_per_task = int(np.floor(10 / num_tasks))
+        permutation = np.array(list(range(10))) if exception else np.random.permutation(list(range(10)))
+        key_permutations = [permutation]
+    else:
+        raise RuntimeError('Given undefined experiment: {}'.format(name))
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, _cache_key(name, scenario, num_tasks, key_permutations) + '.pt')
+
+    if cache_file is not None and os.path.exists(cache_file):
+        tensors = torch.load(cache_file)
+        if verbose:
+            print(" --> loaded cached '{}'-experiment from '{}'".format(name, cache_file))
+    elif name == 'permMNIST':
+        tensors = {'train': [], 'test': []}
+        for type in ('train', 'test'):
+            images, targets = _load_raw_mnist('mnist', type=type, dir=data_dir, verbose=verbose)
+            for task_id, perm in enumerate(permutations):
+                task_targets = targets + task_id * classes_per_task if scenario in ('task', 'class') else targets
+                tensors[type].append((_permutate_images(images, perm), task_targets))
+    else:
+        label_permutation = torch.as_tensor(permutation, dtype=torch.long)
+        tensors = {'train': [], 'test': []}
+        for type in ('train', 'test'):
+            images, targets = _load_raw_mnist('mnist28', type=type, dir=data_dir, verbose=verbose)
+            targets = label_permutation[targets]
+            for task_id in range(num_tasks):
+                first_label = classes_per_task * task_id
+                mask = (targets >= first_label) & (targets < first_label + classes_per_task)
+                task_targets = targets[mask] - first_label if scenario == 'domain' else targets[mask]
+                tensors[type].append((images[mask], task_targets))
+
+    if cache_file is not None and not os.path.exists(cache_file):
+        os.makedirs(cache_dir, exist_ok=True)
+        torch.save(tensors, cache_file)
+
+    train_datasets = [CachedDataset(images, targets, device=device) for images, targets in tensors['train']]
+    test_datasets = [CachedDataset(images, targets, device=device) for images, targets in tensors['test']]
+
+    config = dict(config)
+    config['classes'] = classes_per_task if scenario == 'domain' else classes_per_task * num_tasks
+
+    return train_datasets, test_datasets, config, classes_per_task
@@ -1,5 +1,6 @@
 import numpy as np
 import torch
+from src.mnist_cl import data
 from src.mnist_cl import utils
 
 
@@ -30,7 +31,8 @@ def validate(model, dataset, batch_size=128, test_size=1024, verbose=True, allow
 
     # Loop over batches in [dataset]
     data_loader = utils.get_data_loader(dataset, batch_size, cuda=model.is_on_cuda())
-    total_tested = total_correct = 0
+    total_tested = 0
+    total_correct = torch.zeros((), dtype=torch.long, device=model.device())
     for data, labels in data_loader:
         # -break on [test_size] (if "None", full dataset is used)
         if test_size:
@@ -49,9 +51,9 @@ def validate(model, dataset, batch_size=128, test_size=1024, verbose=True, allow
                 scores = model(data) if (allowed_classes is None) else model(data)[:, allowed_classes]
                 _, predicted = torch.max(scores, 1)
         # -update statistics
-        total_correct += (predicted == labels).sum().item()
+        total_correct += (predicted == labels).sum()
         total_tested += len(data)
-    precision = total_correct / total_tested
+    precision = total_correct.item() / total_tested
 
     # Set model back to its initial mode, print result on screen (if requested) and return it
     model.train(mode=mode)
@@ -60,31 +62,142 @@ def validate(model, dataset, batch_size=128, test_size=1024, verbose=True, allow
     return precision
 
 
+def _allowed_classes(scenario, classes_per_task, task_id, current_task):
+    '''Return the "active classes" of task [task_id] (starting at 0) after training on [current_task] tasks.'''
+    if scenario=='domain':
+        return None
+    elif scenario=='task':
+        return list(range(classes_per_task*task_id, classes_per_task*(task_id+1)))
+    elif scenario=='class':
+        return list(range(classes_per_task*current_task))
+
+
+class MultiTaskEvaluator(object):
+    '''Evaluate precision of a classifier on the test-sets of all tasks in large batches.
+
+    The test-sets are concatenated once into tensors on [device] (for <CachedDataset>s the cached tensors are used).
+    Each evaluation runs the model once per batch of samples from all tasks, masks the scores of every sample with
+    the "active classes" of its task and counts correct predictions per task on the device, with a single
+    synchronisation at the end. Several ways of choosing the active classes can be evaluated with the same forward.
+
+    [batch_size]    <int> number of samples per forward pass
+    [test_size]     None or <int>; if given, a fixed random subset of [test_size] samples of each task is used'''
+
+    def __init__(self, datasets, device, batch_size=1024, test_size=None):
+        self.n_tasks = len(datasets)
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+
+        images = []
+        targets = []
+        for dataset in datasets:
+            if isinstance(dataset, data.CachedDataset):
+                x, y = dataset.images, dataset.targets
+            else:
+                # -materialize the dataset once (order does not matter)
+                x, y = [torch.cat(field) for field in zip(*utils.get_data_loader(dataset, batch_size))]
+            if test_size is not None and test_size < len(y):
+                idxs = torch.randperm(len(y), device=y.device)[:test_size]
+                x, y = x[idxs], y[idxs]
+            images.append(x.to(self.device))
+            targets.append(y.to(self.device).long())
+        self.images = torch.cat(images)
+        self.targets = torch.cat(targets)
+        self.task_sizes = [len(y) for y in targets]
+        self.task_offsets = np.cumsum([0] + self.task_sizes).tolist()
+        self.task_ids = torch.cat([
+            torch.full((size,), task_id, dtype=torch.long, device=self.device)
+            for task_id, size in enumerate(self.task_sizes)
+        ])
+
+    def _class_masks(self, allowed_classes_sets, classes):
+        '''Return <bool>-tensor (K, n_tasks, [classes]) marking the allowed classes of each set and task.'''
+        masks = torch.zeros((len(allowed_classes_sets), self.n_tasks, classes), dtype=torch.bool)
+        for k, allowed_classes in enumerate(allowed_classes_sets):
+            for task_id, classes_of_task in enumerate(allowed_classes):
+                masks[k, task_id, slice(None) if classes_of_task is None else classes_of_task] = True
+        return masks.to(self.device)
+
+    def _count_correct(self, model, start, end, allowed_classes_sets, correct):
+        masks = None
+        for batch_start in range(start, end, self.batch_size):
+            rows = slice(batch_start, min(batch_start + self.batch_size, end))
+            x = self.images[rows]
+            x = x.float().div_(255.) if x.dtype == torch.uint8 else x
+            scores = model(x)
+            if masks is None:
+                masks = self._class_masks(allowed_classes_sets, scores.shape[1])
+            task_ids = self.task_ids[rows]
+            for k in range(len(allowed_classes_sets)):
+                # -same as taking the max over the (contiguous) allowed classes only
+                predicted = scores.masked_fill(~masks[k][task_ids], float('-inf')).argmax(dim=1)
+                correct[k].index_add_(0, task_ids, (predicted == self.targets[rows]).long())
+
+    def precisions(self, model, allowed_classes_sets, num_tasks=None, no_task_mask=False):
+        '''Return <np.ndarray> (K, n_tasks) with the precision on every task for each of K sets of active classes.
+
+        [allowed_classes_sets]  <list> of K <lists> with for every task None (all classes) or its "active classes"
+        [num_tasks]             None or <int>; only evaluate the first [num_tasks] tasks (others are reported as 0)'''
+
+        num_tasks = self.n_tasks if num_tasks is None else num_tasks
+
+        mode = model.training
+        model.eval()
+
+        correct = torch.zeros((len(allowed_classes_sets), self.n_tasks), dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            if hasattr(model, "mask_dict") and model.mask_dict is not None:
+                # -task-specific "gating-masks" require one pass per task
+                for task_id in range(num_tasks):
+                    if no_task_mask:
+                        model.reset_XdGmask()
+                    else:
+                        model.apply_XdGmask(task=task_id+1)
+                    self._count_correct(model, self.task_offsets[task_id], self.task_offsets[task_id+1],
+                                        allowed_classes_sets, correct)
+            else:
+                self._count_correct(model, 0, self.task_offsets[num_tasks], allowed_classes_sets, correct)
+
+        model.train(mode=mode)
+
+        precs = correct.cpu().numpy() / np.maximum(self.task_sizes, 1)
+        precs[:, num_tasks:] = 0.
+        return precs
+
+
+def accuracy_matrix(metrics_dict, key="acc per task"):
+    '''Return <np.ndarray> (n_tasks, n_evaluations) with the accuracies per task stored in [metrics_dict][key].'''
+    accs = metrics_dict[key]
+    return np.array([accs["task {}".format(i + 1)] for i in range(len(accs))])
+
+
 def precision(model, datasets, current_task, iteration, classes_per_task=None, scenario="domain",
-              test_size=None, visdom=None, verbose=False, summary_graph=True, with_exemplars=False, no_task_mask=False):
+              test_size=None, visdom=None, verbose=False, summary_graph=True, with_exemplars=False, no_task_mask=False,
+              evaluator=None):
     '''Evaluate precision of a classifier (=[model]) on all tasks so far (= up to [current_task]) using [datasets].
 
     [classes_per_task]  <int> number of active classes er task
     [scenario]          <str> how to decide which classes to include during evaluating precision
-    [visdom]            None or <dict> with name of "graph" and "environment" (if None, no visdom-plots are made)'''
+    [visdom]            None or <dict> with name of "graph" and "environment" (if None, no visdom-plots are made)
+    [evaluator]         None or <MultiTaskEvaluator> of [datasets], to evaluate all tasks in one batched pass'''
 
     n_tasks = len(datasets)
 
     # Evaluate accuracy of model predictions for all tasks so far (reporting "0" for future tasks)
-    precs = []
-    for i in range(n_tasks):
-        if i+1 <= current_task:
-            if scenario=='domain':
-                allowed_classes = None
-            elif scenario=='task':
-                allowed_classes = list(range(classes_per_task*i, classes_per_task*(i+1)))
-            elif scenario=='class':
-                allowed_classes = list(range(classes_per_task*current_task))
-            precs.append(validate(model, datasets[i], test_size=test_size, verbose=verbose,
-                                  allowed_classes=allowed_classes, with_exemplars=with_exemplars,
-                                  no_task_mask=no_task_mask, task=i+1))
-        else:
-            precs.append(0)
+    if evaluator is not None and not with_exemplars:
+        allowed_classes = [_allowed_classes(scenario, classes_per_task, i, current_task) for i in range(n_tasks)]
+        precs = evaluator.precisions(model, [allowed_classes], num_tasks=current_task,
+                                     no_task_mask=no_task_mask)[0].tolist()
+    else:
+        precs = []
+        for i in range(n_tasks):
+            if i+1 <= current_task:
+                allowed_classes = _allowed_classes(scenario, classes_per_task, i, current_task)
+                precs.append(validate(model, datasets[i], test_size=test_size, verbose=verbose,
+                                      allowed_classes=allowed_classes, with_exemplars=with_exemplars,
+                                      no_task_mask=no_task_mask, task=i+1))
+            else:
+                precs.append(0)
     average_precs = sum([precs[task_id] for task_id in range(current_task)]) / current_task
 
     # Print results on screen
@@ -130,8 +243,10 @@ def initiate_metrics_dict(n_tasks, scenario):
 
 
 def intial_accuracy(model, datasets, metrics_dict, classes_per_task=None, scenario="domain", test_size=None,
-                    verbose=False, no_task_mask=False):
-    '''Evaluate precision of a classifier (=[model]) on all tasks using [datasets] before any learning.'''
+                    verbose=False, no_task_mask=False, evaluator=None):
+    '''Evaluate precision of a classifier (=[model]) on all tasks using [datasets] before any learning.
+
+    [evaluator]         None or <MultiTaskEvaluator> of [datasets], to evaluate all tasks in one batched pass'''
 
     n_tasks = len(datasets)
 
@@ -142,29 +257,41 @@ def intial_accuracy(model, datasets, metrics_dict, classes_per_task=None, scenar
         precs_only_classes_in_task = []
         precs_all_classes_upto_task = []
 
-    for i in range(n_tasks):
+    if evaluator is not None:
+        in_task = [list(range(classes_per_task * i, classes_per_task * (i + 1))) for i in range(n_tasks)]
         if not scenario=="class":
-            precision = validate(
-                model, datasets[i], test_size=test_size, verbose=verbose,
-                allowed_classes=None if scenario=="domain" else list(range(classes_per_task*i, classes_per_task*(i+1))),
-                no_task_mask=no_task_mask, task=i+1
-            )
-            precs.append(precision)
+            precs = evaluator.precisions(
+                model, [[None] * n_tasks if scenario=="domain" else in_task], no_task_mask=no_task_mask
+            )[0].tolist()
         else:
-            # -all classes
-            precision = validate(model, datasets[i], test_size=test_size, verbose=verbose, allowed_classes=None,
-                                 no_task_mask=no_task_mask, task=i + 1)
-            precs_all_classes.append(precision)
-            # -only classes in task
-            allowed_classes = list(range(classes_per_task * i, classes_per_task * (i + 1)))
-            precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
-                                 allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1)
-            precs_only_classes_in_task.append(precision)
-            # -classes up to evaluated task
-            allowed_classes = list(range(classes_per_task * (i + 1)))
-            precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
-                                 allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1)
-            precs_all_classes_upto_task.append(precision)
+            upto_task = [list(range(classes_per_task * (i + 1))) for i in range(n_tasks)]
+            precs_all_classes, precs_only_classes_in_task, precs_all_classes_upto_task = evaluator.precisions(
+                model, [[None] * n_tasks, in_task, upto_task], no_task_mask=no_task_mask
+            ).tolist()
+    else:
+        for i in range(n_tasks):
+            if not scenario=="class":
+                precision = validate(
+                    model, datasets[i], test_size=test_size, verbose=verbose,
+                    allowed_classes=None if scenario=="domain" else list(range(classes_per_task*i, classes_per_task*(i+1))),
+                    no_task_mask=no_task_mask, task=i+1
+                )
+                precs.append(precision)
+            else:
+                # -all classes
+                precision = validate(model, datasets[i], test_size=test_size, verbose=verbose, allowed_classes=None,
+                                     no_task_mask=no_task_mask, task=i + 1)
+                precs_all_classes.append(precision)
+                # -only classes in task
+                allowed_classes = list(range(classes_per_task * i, classes_per_task * (i + 1)))
+                precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
+                                     allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1)
+                precs_only_classes_in_task.append(precision)
+                # -classes up to evaluated task
+                allowed_classes = list(range(classes_per_task * (i + 1)))
+                precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
+                                     allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1)
+                precs_all_classes_upto_task.append(precision)
 
     if not scenario=="class":
         metrics_dict["initial acc per task"] = precs
@@ -176,12 +303,14 @@ def intial_accuracy(model, datasets, metrics_dict, classes_per_task=None, scenar
 
 
 def metric_statistics(model, datasets, current_task, iteration, classes_per_task=None, scenario="domain",
-                      metrics_dict=None, test_size=None, verbose=False, with_exemplars=False, no_task_mask=False):
+                      metrics_dict=None, test_size=None, verbose=False, with_exemplars=False, no_task_mask=False,
+                      evaluator=None):
     '''Evaluate precision of a classifier (=[model]) on all tasks so far (= up to [current_task]) using [datasets].
 
     [metrics_dict]      None or <dict> of all measures to keep track of, to which results will be appended to
     [classes_per_task]  <int> number of active classes er task
-    [scenario]          <str> how to decide which classes to include during evaluating precision'''
+    [scenario]          <str> how to decide which classes to include during evaluating precision
+    [evaluator]         None or <MultiTaskEvaluator> of [datasets], to evaluate all tasks in one batched pass'''
 
     n_tasks = len(datasets)
 
@@ -190,35 +319,57 @@ def metric_statistics(model, datasets, current_task, iteration, classes_per_task
     precs_all_classes_so_far = []
     precs_only_classes_in_task = []
     precs_all_classes_upto_task = []
-    for i in range(n_tasks):
-        # -all classes
+    if evaluator is not None and not with_exemplars:
+        # -all ways of choosing the active classes are evaluated with the same forward passes
+        allowed_classes_sets = {}
         if scenario in ('domain', 'class'):
-            precision = validate(
-                model, datasets[i], test_size=test_size, verbose=verbose, allowed_classes=None,
-                no_task_mask=no_task_mask, task=i + 1, with_exemplars=with_exemplars
-            ) if (not with_exemplars) or (i<current_task) else 0.
-            precs_all_classes.append(precision)
-        # -all classes up to trained task
+            allowed_classes_sets['all'] = [None] * n_tasks
         if scenario in ('class'):
-            allowed_classes = list(range(classes_per_task * current_task))
-            precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
-                                 allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1,
-                                 with_exemplars=with_exemplars) if (i<current_task) else 0.
-            precs_all_classes_so_far.append(precision)
-        # -all classes up to evaluated task
-        if scenario in ('class'):
-            allowed_classes = list(range(classes_per_task * (i+1)))
-            precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
-                                 allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1,
-                                 with_exemplars=with_exemplars) if (not with_exemplars) or (i<current_task) else 0.
-            precs_all_classes_upto_task.append(precision)
-        # -only classes in that task
+            allowed_classes_sets['so far'] = [list(range(classes_per_task * current_task))] * n_tasks
+            allowed_classes_sets['upto'] = [list(range(classes_per_task * (i+1))) for i in range(n_tasks)]
         if scenario in ('task', 'class'):
-            allowed_classes = list(range(classes_per_task * i, classes_per_task * (i + 1)))
-            precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
-                                 allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1,
-                                 with_exemplars=with_exemplars) if (not with_exemplars) or (i<current_task) else 0.
-            precs_only_classes_in_task.append(precision)
+            allowed_classes_sets['in task'] = [
+                list(range(classes_per_task * i, classes_per_task * (i + 1))) for i in range(n_tasks)
+            ]
+        precs = dict(zip(allowed_classes_sets, evaluator.precisions(
+            model, list(allowed_classes_sets.values()), no_task_mask=no_task_mask
+        ).tolist()))
+        precs_all_classes = precs.get('all', [])
+        precs_all_classes_so_far = [
+            prec if (i<current_task) else 0. for i, prec in enumerate(precs.get('so far', []))
+        ]
+        precs_all_classes_upto_task = precs.get('upto', [])
+        precs_only_classes_in_task = precs.get('in task', [])
+    else:
+        for i in range(n_tasks):
+            # -all classes
+            if scenario in ('domain', 'class'):
+                precision = validate(
+                    model, datasets[i], test_size=test_size, verbose=verbose, allowed_classes=None,
+                    no_task_mask=no_task_mask, task=i + 1, with_exemplars=with_exemplars
+                ) if (not with_exemplars) or (i<current_task) else 0.
+                precs_all_classes.append(precision)
+            # -all classes up to trained task
+            if scenario in ('class'):
+                allowed_classes = list(range(classes_per_task * current_task))
+                precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
+                                     allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1,
+                                     with_exemplars=with_exemplars) if (i<current_task) else 0.
+                precs_all_classes_so_far.append(precision)
+            # -all classes up to evaluated task
+            if scenario in ('class'):
+                allowed_classes = list(range(classes_per_task * (i+1)))
+                precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
+                                     allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1,
+                                     with_exemplars=with_exemplars) if (not with_exemplars) or (i<current_task) else 0.
+                precs_all_classes_upto_task.append(precision)
+            # -only classes in that task
+            if scenario in ('task', 'class'):
+                allowed_classes = list(range(classes_per_task * i, classes_per_task * (i + 1)))
+                precision = validate(model, datasets[i], test_size=test_size, verbose=verbose,
+                                     allowed_classes=allowed_classes, no_task_mask=no_task_mask, task=i + 1,
+                                     with_exemplars=with_exemplars) if (not with_exemplars) or (i<current_task) else 0.
+                precs_only_classes_in_task.append(precision)
 
     # Calcualte average accuracy over all tasks thus far
     if scenario=='task':
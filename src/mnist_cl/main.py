@@ -28,7 +28,8 @@ def main(args):
 
     train_datasets, test_datasets, config, classes_per_task = get_multitask_experiment(
         name=args.dataset, scenario=args.scenario, num_tasks=args.num_tasks, data_dir=args.data_dir,
-        verbose=True, exception=True)
+        verbose=True, exception=True, cached=args.cache_data, cache_dir=args.cache_dir,
+        device=device if args.data_on_device else None)
 
     if args.ewc:
         model = EwcClassifier(
@@ -84,11 +85,11 @@ def main(args):
         model, train_datasets, replay_mode=args.replay, scenario=args.scenario, classes_per_task=classes_per_task,
         iters=args.iters, batch_size=args.batch_size, loss_cbs=solver_loss_cbs)
 
-    precs = [evaluate.validate(
-        model, test_datasets[i], verbose=False, test_size=None, task=i + 1, with_exemplars=False,
-        allowed_classes=list(range(classes_per_task * i, classes_per_task * (i + 1)))
-        if args.scenario == "task" else None
-    ) for i in range(args.num_tasks)]
+    evaluator = evaluate.MultiTaskEvaluator(test_datasets, device, batch_size=args.eval_batch_size)
+    precs = evaluator.precisions(model, [[
+        list(range(classes_per_task * i, classes_per_task * (i + 1))) if args.scenario == "task" else None
+        for i in range(args.num_tasks)
+    ]])[0].tolist()
     average_precs = sum(precs) / args.num_tasks
 
     # -print on screen
@@ -121,12 +122,18 @@ if __name__ == "__main__":
     parser.add_argument('--scenario', type=str, default='class', choices=['task', 'domain', 'class'])
     parser.add_argument('--num_tasks', type=int, default=5, help='number of tasks')  # splitMNIST = 5, permMNIST = 10
     parser.add_argument('--data_dir', type=str, default='./datasets', help="default: %(default)s")
+    parser.add_argument('--cache_data', type=str2bool, default=False,
+                        help="materialize the tasks into tensors and sample them without data loaders")
+    parser.add_argument('--cache_dir', type=str, default=None, help="directory to save the cached tasks in")
+    parser.add_argument('--data_on_device', type=str2bool, default=False,
+                        help="keep the cached tasks on the training device")
     parser.add_argument('--result_dir', type=str, default='./results', help="default: %(default)s")
     parser.add_argument('--seed', type=int, default=0, help='random seed (for each random-module used)')
 
     parser.add_argument('--iters', type=int, default=500, help="# batches to optimize solver")  # splitMNIST = 2000, permMNIST = 5000
     parser.add_argument('--lr', type=float, default=0.001, help="learning rate")  # splitMNIST = 0.001, permMNIST = 0.0001
     parser.add_argument('--batch_size', type=int, default=128, help="batch size")
+    parser.add_argument('--eval_batch_size', type=int, default=1024, help="batch size of the evaluation")
     parser.add_argument('--hidden_units', type=int, default=400, help="fully connected layer hidden units")  # splitMNIST = 400, permMNIST = 1000
     parser.add_argument('--loss_log_intervals', type=int, default=200, metavar="N", help="# iters after which to plot loss")
 
@@ -81,7 +81,12 @@ def loss_fn_kd_binary(scores, target_scores, T=2.):
 #############################
 
 def get_data_loader(dataset, batch_size, cuda=False, collate_fn=None, drop_last=False, augment=False):
-    '''Return <DataLoader>-object for the provided <DataSet>-object [dataset].'''
+    '''Return <DataLoader>-object for the provided <DataSet>-object [dataset].
+
+    For a <CachedDataset>, batches are gathered directly by tensor indexing (unless [collate_fn] or [augment])'''
+
+    if isinstance(dataset, data.CachedDataset) and collate_fn is None and not augment:
+        return dataset.loader(batch_size, shuffle=True, drop_last=drop_last, pin_memory=cuda)
 
     # If requested, make copy of original dataset to add augmenting transform (without altering original dataset)
     if augment:
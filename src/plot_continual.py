@@ -1,10 +1,12 @@
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 import argparse
 import os
 import os.path as osp
 
+import plot_utils
+from metrics_table import MetricsTable
+
 
 WINDOW_LENGTH = 10
 SMOOTH_COEF = 0.20
@@ -434,22 +436,7 @@ CURVE_FORMAT = {
 
 
 def window_smooth(y):
-    window_size = int(WINDOW_LENGTH / 2)
-    y_padding = np.concatenate([y[:1] for _ in range(window_size)], axis=0).flatten()
-    y = np.concatenate([y_padding, y], axis=0)
-    y_padding = np.concatenate([y[-1:] for _ in range(window_size)], axis=0).flatten()
-    y = np.concatenate([y, y_padding], axis=0)
-
-    coef = list()
-    for i in range(WINDOW_LENGTH + 1):
-        coef.append(np.exp(- SMOOTH_COEF * abs(i - window_size)))
-    coef = np.array(coef)
-
-    yw = list()
-    for t in range(len(y)-WINDOW_LENGTH):
-        yw.append(np.sum(y[t:t+WINDOW_LENGTH+1] * coef) / np.sum(coef))
-
-    return np.array(yw).flatten()
+    return plot_utils.window_smooth(y, WINDOW_LENGTH, SMOOTH_COEF)
 
 
 def plot(ax, data, algos, curve_format=CURVE_FORMAT):
@@ -511,6 +498,9 @@ def main(args):
         print("The directory to load data doesn't exit")
     os.makedirs(save_dir, exist_ok=True)
 
+    # load the logged data of all runs once, the figures below only query it
+    table = MetricsTable.load_continual(data_dir, exp_name, algos, seeds)
+
     fig, _ = plt.subplots(len(task_names), len(stats))
     fig.set_size_inches(16 * len(stats), 8 * len(task_names))
     for task_idx, task_name in enumerate(task_names):
@@ -522,38 +512,7 @@ def main(args):
             data = {}
 
             for algo in algos:
-                data[algo] = {}
-
-                for seed in seeds:
-                    if 'distilled' in algo:
-                        data_path = osp.join(data_dir, exp_name, algo, str(seed), 'distill', 'eval.csv')
-                    elif 'distillation' in algo:
-                        data_path = osp.join(data_dir, exp_name, algo, str(seed), 'distillation', 'eval.csv')
-                    else:
-                        data_path = osp.join(data_dir, exp_name, algo, str(seed), 'eval.csv')
-                    data_path = os.path.abspath(data_path)
-
-                    try:
-                        df = pd.read_csv(data_path)
-                    except:
-                        print(f"Data path not found: {data_path}!")
-                        continue
-
-                    # file = file[file['step'] <= args.timesteps]
-                    # x = file['exploration/all num steps total'].values
-
-                    task_df = df[df['task_name'] == task_name]
-                    task_df = task_df[task_df['step'] <= max_timesteps]
-                    data[algo].update(x=task_df['step'].values)
-
-                    try:
-                        y = task_df[stat].values
-                        if 'y' not in data[algo]:
-                            data[algo].update(y=[y])
-                        else:
-                            data[algo]['y'].append(y)
-                    except:
-                        raise RuntimeError(f"Statistics '{stat}' doesn't exist in '{data_path}'!")
+                data[algo] = table.curves(stat, algo, task_name=task_name, max_step=max_timesteps)
 
             plot(ax, data, algos)
             ax.legend(framealpha=0.)
@@ -0,0 +1,204 @@
+"""Plot the results of sweeps over experiments, tasks, algorithms and seeds
+
+For every experiment the logged data of all runs is loaded once (see metrics_table.MetricsTable), the seeds of
+every curve are reduced to a smoothed mean and std with array ops, and the aggregates are cached on disk, keyed
+by the arguments and the modification times of the logs, so unchanged experiments are neither reloaded nor
+redrawn. Figures are independent of each other and rendered in a pool of processes.
+
+Modes:
+    task: one figure per task with one subplot per statistic (like plot_continual.py / plot_single.py).
+    avg: one figure per experiment with the statistics normalized by the oracle return of every task and
+        averaged over tasks (like plot_avg.py).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import os.path as osp
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import plot_utils
+from metrics_table import MetricsTable, continual_run_dir, single_run_dir, source_files
+
+
+def _runs(args, exp_name, task_names):
+    if args.layout == 'continual':
+        return [(algo, seed, continual_run_dir(args.data_dir, exp_name, algo, seed))
+                for algo in args.algos for seed in args.seeds]
+    else:
+        return [(algo, seed, single_run_dir(args.data_dir, exp_name, algo, task_name, seed), task_name)
+                for task_name in task_names for algo in args.algos for seed in args.seeds]
+
+
+def _cache_path(args, exp_name, runs):
+    digest = hashlib.sha1()
+    params = dict(exp_name=exp_name, mode=args.mode, layout=args.layout, task_names=args.task_names,
+                  algos=args.algos, seeds=args.seeds, statistics=args.statistics,
+                  max_timesteps=args.max_timesteps, window_length=args.window_length,
+                  smooth_coef=args.smooth_coef, save_dir=osp.abspath(args.save_dir))
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    for run in runs:
+        for path in source_files(osp.abspath(osp.join(run[2], 'eval'))):
+            stat = os.stat(path)
+            digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode())
+
+    return osp.join(args.cache_dir, f'{exp_name}-{args.mode}-{digest.hexdigest()[:16]}.pkl')
+
+
+def _aggregate_curve(table, args, stat, algo, task_name):
+    curves = table.curves(stat, algo, task_name=task_name, max_step=args.max_timesteps)
+    if 'y' not in curves or min(len(y) for y in curves['y']) == 0:
+        return None
+
+    ys = plot_utils.stack_curves(curves['y'])
+    return curves['x'][:ys.shape[1]], ys
+
+
+def _task_figures(table, args, exp_name, task_names):
+    figures = []
+    for task_name, _ in task_names:
+        axes = []
+        for stat in args.statistics:
+            curves = []
+            for algo in args.algos:
+                curve = _aggregate_curve(table, args, stat, algo, task_name)
+                if curve is None:
+                    continue
+                x, ys = curve
+                y_mean, y_std = plot_utils.mean_std(ys, args.window_length, args.smooth_coef)
+                curves.append((algo, x[:len(y_mean)], y_mean, y_std))
+            axes.append(dict(title=task_name, ylabel=stat, curves=curves))
+        figures.append(dict(path=osp.abspath(osp.join(args.save_dir, exp_name, task_name + '.png')),
+                            title=exp_name + '/' + task_name, axes=axes))
+
+    return figures
+
+
+def _avg_figures(table, args, exp_name, task_names):
+    axes = []
+    for stat in args.statistics:
+        curves = []
+        for algo in args.algos:
+            task_curves = [_aggregate_curve(table, args, stat, algo, task_name) for task_name, _ in task_names]
+            if any(curve is None for curve in task_curves):
+                continue
+            num_seeds = min(ys.shape[0] for _, ys in task_curves)
+            length = min(ys.shape[1] for _, ys in task_curves)
+            # (task, seed, step) normalized by the oracle returns, averaged over tasks
+            norm_ys = np.stack([
+                ys[:num_seeds, :length] / float(oracle_return)
+                for (_, ys), (_, oracle_return) in zip(task_curves, task_names)
+            ]).mean(axis=0)
+            y_mean, y_std = plot_utils.mean_std(norm_ys, args.window_length, args.smooth_coef)
+            curves.append((algo, task_curves[0][0][:len(y_mean)], y_mean, y_std))
+        axes.append(dict(title=None, ylabel='normalized_' + stat, curves=curves))
+
+    return [dict(path=osp.abspath(osp.join(args.save_dir, exp_name + '.png')), title=exp_name, axes=axes)]
+
+
+def aggregate(args, exp_name):
+    """Return the figures of one experiment and whether they were loaded from the cache"""
+    task_names = [task_name.split(',') if ',' in task_name else (task_name, '1.0')
+                  for task_name in args.task_names]
+    runs = _runs(args, exp_name, [task_name for task_name, _ in task_names])
+    cache_path = _cache_path(args, exp_name, runs)
+    if osp.exists(cache_path) and not args.force:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f), True
+
+    table = MetricsTable.load(runs)
+    if args.mode == 'task':
+        figures = _task_figures(table, args, exp_name, task_names)
+    else:
+        figures = _avg_figures(table, args, exp_name, task_names)
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    with open(cache_path, 'wb') as f:
+        pickle.dump(figures, f)
+
+    return figures, False
+
+
+def render(figure):
+    """Draw one figure, runs in a worker process"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from plot_continual import CURVE_FORMAT
+
+    default_colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+
+    fig, axes = plt.subplots(1, len(figure['axes']), squeeze=False)
+    fig.set_size_inches(10 * len(figure['axes']), 8)
+    for ax, ax_data in zip(axes[0], figure['axes']):
+        if ax_data['title'] is not None:
+            ax.set_title(ax_data['title'], fontsize=15)
+        ax.set_xlabel('Total Timesteps', fontsize=15)
+        ax.set_ylabel(ax_data['ylabel'], fontsize=15)
+        for curve_idx, (algo, x, y_mean, y_std) in enumerate(ax_data['curves']):
+            curve_format = CURVE_FORMAT.get(algo, {})
+            color = np.array(curve_format['color']) / 255. if 'color' in curve_format else \
+                default_colors[curve_idx % len(default_colors)]
+            ax.plot(x, y_mean, color=color, label=curve_format.get('label', algo),
+                    linestyle=curve_format.get('style', '-'))
+            ax.fill_between(x, y_mean - 0.5 * y_std, y_mean + 0.5 * y_std, facecolor=color, alpha=0.1)
+        ax.legend(framealpha=0.)
+
+    fig.suptitle(figure['title'], fontsize=20).set_y(0.9875)
+    plt.tight_layout()
+    os.makedirs(osp.dirname(figure['path']), exist_ok=True)
+    fig.savefig(fname=figure['path'])
+    plt.close(fig)
+
+    return figure['path']
+
+
+def main(args):
+    if args.cache_dir is None:
+        args.cache_dir = osp.join(args.save_dir, '.cache')
+
+    figures = []
+    for exp_name in args.exp_names:
+        exp_figures, cached = aggregate(args, exp_name)
+        if cached:
+            # unchanged experiment, only draw the figures that do not exist
+            exp_figures = [figure for figure in exp_figures if not osp.exists(figure['path'])]
+        figures.extend(exp_figures)
+
+    if args.num_workers > 1 and len(figures) > 1:
+        with ProcessPoolExecutor(max_workers=args.num_workers) as executor:
+            fig_paths = list(executor.map(render, figures))
+    else:
+        fig_paths = [render(figure) for figure in figures]
+
+    for fig_path in fig_paths:
+        print(f"Save figure: {fig_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--exp_names', type=str, nargs='+', default=['reach_window-close_button-press-topdown'])
+    parser.add_argument('--data_dir', type=str, default='vec_logs')
+    parser.add_argument('--save_dir', type=str, default='figures_continual')
+    parser.add_argument('--cache_dir', type=str, default=None, help="defaults to '<save_dir>/.cache'")
+    parser.add_argument('--mode', type=str, default='task', choices=['task', 'avg'])
+    parser.add_argument('--layout', type=str, default='continual', choices=['continual', 'single'],
+                        help="'single' for runs trained on one task each ('<algo>/<task_name>/<seed>')")
+    parser.add_argument('--task_names', type=str, nargs='+',
+                        default=['reach-v2', 'window-close-v2', 'button-press-topdown-v2'],
+                        help="task names, or 'task_name,oracle_return' pairs for the 'avg' mode")
+    parser.add_argument('--algos', type=str, nargs='+', default=['sgd', 'ewc', 'si'])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2, 3, 4, 5, 6])
+    parser.add_argument('--max_timesteps', type=int, default=np.iinfo(np.int64).max)
+    parser.add_argument('--statistics', type=str, nargs='+', default=['episode_reward'])
+    parser.add_argument('--window_length', type=int, default=10)
+    parser.add_argument('--smooth_coef', type=float, default=0.20)
+    parser.add_argument('--num_workers', type=int, default=os.cpu_count())
+    parser.add_argument('--force', action='store_true', help="ignore the cache")
+    args = parser.parse_args()
+
+    main(args)
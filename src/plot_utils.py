@@ -0,0 +1,38 @@
+"""Numerics shared by the plotting scripts."""
+
+import numpy as np
+
+
+def window_smooth(y, window_length, smooth_coef):
+    """Smooth 'y' with the normalized kernel exp(-smooth_coef * |offset|) of 'window_length' + 1 taps
+
+    Both ends are padded with the edge values, so the result has the length of 'y' for even 'window_length'.
+    """
+    y = np.asarray(y, dtype=np.float64).flatten()
+    window_size = int(window_length / 2)
+    if len(y) == 0 or len(y) + 2 * window_size < window_length + 1:
+        return np.zeros(0)
+
+    coef = np.exp(- smooth_coef * np.abs(np.arange(window_length + 1) - window_size))
+    y = np.pad(y, window_size, mode='edge')
+
+    return np.correlate(y, coef / np.sum(coef), mode='valid')
+
+
+def stack_curves(ys):
+    """Stack curves of different lengths into one (num_curves, min_length) array, truncating longer curves"""
+    length = min(len(y) for y in ys)
+
+    return np.stack([np.asarray(y[:length], dtype=np.float64) for y in ys])
+
+
+def mean_std(ys, window_length=None, smooth_coef=None):
+    """Mean and std over the first axis of 'ys' (curves of the seeds), smoothed if 'window_length' is given"""
+    ys = stack_curves(ys) if isinstance(ys, (list, tuple)) else np.asarray(ys, dtype=np.float64)
+    y_mean = np.mean(ys, axis=0)
+    y_std = np.std(ys, axis=0)
+    if window_length is not None:
+        y_mean = window_smooth(y_mean, window_length, smooth_coef)
+        y_std = window_smooth(y_std, window_length, smooth_coef)
+
+    return y_mean, y_std
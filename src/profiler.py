@@ -0,0 +1,160 @@
+"""Opt-in wall time and call counts of the phases of a training loop
+
+Phases are timed either around a block ('with profiler.phase(name):') or around every call of a method
+('profiler.instrument(obj, method_name, name)'). Phases can be nested, e.g. sampling the replay buffer inside an
+agent update: the total time of a phase includes its nested phases, its self time does not. With a CUDA device
+the profiler synchronizes at the boundaries of every phase, so that kernels launched asynchronously in one phase
+are not attributed to the next phase that waits for them. This slows training down and is meant for profiling runs
+only; pass 'sync=False' to measure launch times instead.
+
+A disabled profiler does not instrument anything and 'phase' returns a shared no-op context manager.
+"""
+
+import time
+from collections import OrderedDict
+
+import torch
+
+
+# phases of the training scripts ('wait' is the learner waiting for the collectors in the actor-learner mode of
+# 'train_sac'), see 'instrument_training' and 'instrument_storage' for the instrumented methods
+TRAINING_PHASES = (
+    'act', 'env_step', 'store', 'sample', 'compute_returns', 'update', 'logger_log', 'logger_dump', 'evaluate',
+    'checkpoint', 'estimate_fisher', 'update_omegas', 'construct_memory', 'distill', 'train_bc', 'wait',
+)
+
+# task boundary hooks of the continual learning agents, timed under their own names
+_TASK_BOUNDARY_METHODS = ('estimate_fisher', 'update_omegas', 'construct_memory', 'distill', 'train_bc')
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _PhaseStats(object):
+    __slots__ = ('time', 'self_time', 'calls')
+
+    def __init__(self):
+        self.time = 0.0
+        self.self_time = 0.0
+        self.calls = 0
+
+
+class _Phase(object):
+    __slots__ = ('_profiler', '_stats', '_start', '_child_time')
+
+    def __init__(self, profiler, stats):
+        self._profiler = profiler
+        self._stats = stats
+
+    def __enter__(self):
+        self._profiler._synchronize()
+        self._child_time = 0.0
+        self._profiler._stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._profiler._synchronize()
+        elapsed = time.perf_counter() - self._start
+        stack = self._profiler._stack
+        stack.pop()
+        if len(stack) > 0:
+            stack[-1]._child_time += elapsed
+        self._stats.time += elapsed
+        self._stats.self_time += elapsed - self._child_time
+        self._stats.calls += 1
+        return False
+
+
+class Profiler(object):
+    """Record the wall time and the number of calls of the phases 'phases'
+
+    The phases are declared up front, so that every summary has the same columns. Timing an undeclared phase
+    raises a KeyError.
+    """
+    def __init__(self, phases, enabled=False, device=None, sync=True):
+        self.enabled = enabled
+        self._sync = enabled and sync and device is not None and torch.device(device).type == 'cuda'
+        self._stats = OrderedDict((name, _PhaseStats()) for name in phases)
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def _synchronize(self):
+        if self._sync:
+            torch.cuda.synchronize()
+
+    def phase(self, name):
+        """Context manager timing the block as phase 'name'"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, self._stats[name])
+
+    def instrument(self, obj, method_name, name):
+        """Time every call of 'obj.<method_name>' as phase 'name', by shadowing the method on the instance"""
+        if not self.enabled or not hasattr(obj, method_name):
+            return obj
+        stats = self._stats[name]
+        method = getattr(obj, method_name)
+
+        def _timed(*args, **kwargs):
+            with _Phase(self, stats):
+                return method(*args, **kwargs)
+
+        setattr(obj, method_name, _timed)
+        return obj
+
+    def summary(self):
+        """Per phase totals since the last reset, with the wall time of the whole interval"""
+        wall_time = time.perf_counter() - self._start
+        summary = OrderedDict(wall_time=wall_time)
+        for name, stats in self._stats.items():
+            summary[name] = dict(time=stats.time, self_time=stats.self_time, calls=stats.calls,
+                                 fraction=stats.self_time / wall_time if wall_time > 0 else 0.0)
+        return summary
+
+    def reset(self):
+        for stats in self._stats.values():
+            stats.time = stats.self_time = 0.0
+            stats.calls = 0
+        self._start = time.perf_counter()
+
+    def dump(self, logger, step):
+        """Log the summary since the last dump through 'logger' and start a new interval"""
+        if not self.enabled:
+            return
+        summary = self.summary()
+        logger.log('train/wall_time', summary.pop('wall_time'), step)
+        for name, stats in summary.items():
+            logger.log(f'train/{name}_time', stats['time'], step)
+            logger.log(f'train/{name}_self_time', stats['self_time'], step)
+            logger.log(f'train/{name}_calls', stats['calls'], step)
+            logger.log(f'train/{name}_fraction', stats['fraction'], step)
+        logger.dump(step, ty='train')
+        self.reset()
+
+
+def instrument_training(profiler, agent, logger):
+    """Time the updates and the task boundary hooks of 'agent' and the logging calls of 'logger'"""
+    profiler.instrument(agent, 'update', 'update')
+    for method_name in _TASK_BOUNDARY_METHODS:
+        profiler.instrument(agent, method_name, method_name)
+    profiler.instrument(logger, 'log', 'logger_log')
+    profiler.instrument(logger, 'dump', 'logger_dump')
+
+
+def instrument_storage(profiler, storage):
+    """Time storing and sampling transitions of a replay buffer or rollout storage"""
+    profiler.instrument(storage, 'add', 'store')
+    profiler.instrument(storage, 'insert', 'store')
+    profiler.instrument(storage, 'sample', 'sample')
+    profiler.instrument(storage, 'sample_prioritized', 'sample')
+    profiler.instrument(storage, 'compute_returns', 'compute_returns')
+    return storage
@@ -0,0 +1,81 @@
+"""Reservoir sampling memory, without the dependencies of 'buffers' so that the MNIST experiments can use it"""
+
+import numpy as np
+import torch
+
+
+class ReservoirMemory:
+    """Bounded memory filled by reservoir sampling (Algorithm R) over a stream of batches
+
+    Every item seen so far is kept with the same probability capacity / total_num. A whole incoming batch is
+    processed at once: the target slot of each item is drawn with array ops, and when several items of a batch hit
+    the same slot only the latest one is written, exactly as if the items were inserted one by one.
+
+    :param fields: dict mapping field names to (shape, dtype) of a single item.
+    """
+    def __init__(self, capacity, fields, device):
+        self.capacity = capacity
+        self.device = device
+        self.storage = {
+            name: torch.zeros((capacity, *shape), dtype=dtype, device=device)
+            for name, (shape, dtype) in fields.items()
+        }
+        self.size = 0
+        self.total_num = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.storage[name][:self.size]
+
+    def add(self, **batch):
+        """Offer a batch of items to the memory
+
+        :return: indices of the written items in the batch and the memory slots they were written to, e.g. to
+            mirror non-tensor metadata.
+        """
+        batch_size = len(next(iter(batch.values())))
+        # number of items seen before each item of the batch
+        positions = self.total_num + np.arange(batch_size)
+        slots = np.where(positions < self.capacity, positions,
+                         np.random.randint(0, positions + 1))
+        src_idxs = np.nonzero(slots < self.capacity)[0]
+        slots = slots[src_idxs]
+
+        # the latest item wins when several items are written to the same slot
+        _, last_idxs = np.unique(slots[::-1], return_index=True)
+        keep = len(slots) - 1 - last_idxs
+        src_idxs, slots = src_idxs[keep], slots[keep]
+
+        if len(slots) > 0:
+            slots_tensor = torch.as_tensor(slots, device=self.device)
+            src_idxs_tensor = torch.as_tensor(src_idxs, device=self.device)
+            for name, value in batch.items():
+                field = self.storage[name]
+                value = torch.as_tensor(value, dtype=field.dtype, device=self.device)
+                field.index_copy_(0, slots_tensor, value[src_idxs_tensor].reshape(len(slots), *field.shape[1:]))
+
+        self.total_num += batch_size
+        self.size = min(self.capacity, self.total_num)
+
+        return src_idxs, slots
+
+    def sample(self, batch_size):
+        """Sample a batch with replacement from the filled part of the memory"""
+        idxs = torch.randint(0, self.size, (batch_size,), device=self.device)
+
+        return {name: value[idxs] for name, value in self.storage.items()}
+
+    def state_dict(self):
+        return {
+            'storage': self.storage,
+            'size': self.size,
+            'total_num': self.total_num,
+        }
+
+    def load_state_dict(self, state_dict):
+        for name, value in state_dict['storage'].items():
+            self.storage[name].copy_(value)
+        self.size = state_dict['size']
+        self.total_num = state_dict['total_num']
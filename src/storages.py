@@ -2,15 +2,58 @@
 
 import numpy as np
 import torch
-from torch.utils.data.sampler import BatchSampler, SubsetRandomSampler
 
 
 def _flatten_helper(T, N, _tensor):
     return _tensor.view(T * N, *_tensor.size()[2:])
 
 
+def _discounted_reverse_cumsum(values, discounts, chunk_size=64):
+    """Solve x[t] = values[t] + discounts[t] * x[t + 1] backwards in time with x[T] = 0
+
+    The recurrence inside a chunk of 'chunk_size' steps is solved by one batched product with the matrix of
+    partial discount products, chunks are chained serially through the first element of the later chunk, i.e.
+    there are T / chunk_size sequential steps instead of T. Zero discounts (episode ends) are handled exactly
+    since the products are never divided.
+
+    :param values: tensor of shape (T, *batch_shape).
+    :param discounts: tensor with the same shape as 'values'.
+    """
+    num_steps = values.size(0)
+    batch_shape = values.shape[1:]
+    values = values.reshape(num_steps, -1)
+    discounts = discounts.reshape(num_steps, -1)
+
+    out = torch.empty_like(values)
+    carry = torch.zeros_like(values[0])
+    for end in range(num_steps, 0, -chunk_size):
+        start = max(end - chunk_size, 0)
+        size = end - start
+        idxs = torch.arange(size, device=values.device)
+        upper = (idxs.unsqueeze(-1) <= idxs.unsqueeze(0)).unsqueeze(-1)
+
+        # prods[i, j] = discounts[i] * ... * discounts[j] for i <= j
+        chunk_discounts = discounts[start:end].unsqueeze(0).expand(size, -1, -1)
+        prods = torch.where(upper, chunk_discounts, torch.ones_like(chunk_discounts)).cumprod(dim=1)
+        # decays[i, j] = discounts[i] * ... * discounts[j - 1] for i <= j, the empty product is one
+        decays = torch.cat([torch.ones_like(prods[:, :1]), prods[:, :-1]], dim=1)
+        decays = decays * upper
+
+        x = torch.einsum('ijb,jb->ib', decays, values[start:end]) + prods[:, -1] * carry
+        out[start:end] = x
+        carry = x[0]
+
+    return out.reshape(num_steps, *batch_shape)
+
+
 class RolloutStorage(object):
-    def __init__(self, num_steps, num_processes, obs_shape, action_space, device):
+    """On-policy rollout storage
+
+    (chongyi zheng): with 'host_staging' on a CUDA device, env steps are written into a single pinned host arena and
+    sent to the device with one bulk asynchronous copy when the rollout is full, instead of one small host-to-device
+    copy per field and step. Inputs of insert may also be device tensors, which are copied without a host round trip.
+    """
+    def __init__(self, num_steps, num_processes, obs_shape, action_space, device, host_staging=False):
         self.obs = torch.zeros(num_steps + 1, num_processes, *obs_shape).to(device)
         self.rewards = torch.zeros(num_steps, num_processes, 1).to(device)
         self.value_preds = torch.zeros(num_steps + 1, num_processes, 1).to(device)
@@ -34,6 +77,47 @@ class RolloutStorage(object):
         self.device = device
         self.step = 0
 
+        self.host_staging = host_staging and torch.device(device).type == 'cuda'
+        self._staged = {}
+        if self.host_staging:
+            self._setup_staging()
+
+    def _setup_staging(self):
+        names = ['obs', 'log_pis', 'value_preds', 'rewards', 'masks', 'bad_masks']
+        if self.actions.is_floating_point():
+            names.append('actions')
+        fields = [getattr(self, name) for name in names]
+
+        numel = sum(field.numel() for field in fields)
+        self._device_arena = torch.empty(numel, device=self.device)
+        self._host_arena = torch.empty(numel, pin_memory=True)
+        self._copy_done = None
+
+        offset = 0
+        for name, field in zip(names, fields):
+            device_view = self._device_arena[offset:offset + field.numel()].view(field.shape)
+            device_view.copy_(field)
+            host_view = self._host_arena[offset:offset + field.numel()].view(field.shape)
+            host_view.copy_(field)
+            setattr(self, name, device_view)
+            self._staged[name] = host_view
+            offset += field.numel()
+
+    def _field(self, name):
+        # env steps go to the host arena when staging, directly to the device otherwise
+        return self._staged.get(name, getattr(self, name))
+
+    def _flush(self):
+        self._device_arena.copy_(self._host_arena, non_blocking=True)
+        self._copy_done = torch.cuda.Event()
+        self._copy_done.record()
+
+    def _wait_for_flush(self):
+        # the host arena must not be overwritten while the previous bulk copy is in flight
+        if self._copy_done is not None:
+            self._copy_done.synchronize()
+            self._copy_done = None
+
     # def to(self, device):
     #     self.obs = self.obs.to(device)
     #     self.rewards = self.rewards.to(device)
@@ -47,6 +131,9 @@ class RolloutStorage(object):
     def update_num_steps(self, num_steps):
         # (chongyi zheng): used for memory resize
         self.num_steps = num_steps
+        for name, field in self._staged.items():
+            self._staged[name] = field[:num_steps + 1] if name in ['obs', 'value_preds', 'masks', 'bad_masks'] \
+                else field[:num_steps]
         self.obs = self.obs[:num_steps + 1]
         self.rewards = self.rewards[:num_steps]
         self.value_preds = self.value_preds[:num_steps + 1]
@@ -56,24 +143,38 @@ class RolloutStorage(object):
         self.masks = self.masks[:num_steps + 1]
         self.bad_masks = self.bad_masks[:num_steps + 1]
 
+    def reset_obs(self, obs):
+        """Set the first observation of the rollout, e.g. after env.reset()"""
+        if self.host_staging:
+            self._wait_for_flush()
+            self._staged['obs'][0].copy_(torch.as_tensor(obs).reshape(self.obs[0].shape))
+        self.obs[0].copy_(torch.as_tensor(obs).reshape(self.obs[0].shape))
+
     def insert(self, obs, actions, log_pis,
                value_preds, rewards, masks, bad_masks):
-        self.obs[self.step + 1].copy_(torch.Tensor(obs).to(self.device))
-        self.actions[self.step].copy_(torch.Tensor(actions).to(self.device))
-        self.log_pis[self.step].copy_(torch.Tensor(log_pis).to(self.device))
-        self.value_preds[self.step].copy_(torch.Tensor(value_preds).to(self.device))
-        self.rewards[self.step].copy_(torch.Tensor(
-            np.expand_dims(rewards, axis=-1)
-        ).to(self.device))
-        self.masks[self.step + 1].copy_(torch.Tensor(masks).to(self.device))
-        self.bad_masks[self.step + 1].copy_(torch.Tensor(bad_masks).to(self.device))
+        if self.host_staging:
+            self._wait_for_flush()
+
+        # torch.as_tensor shares memory with numpy inputs and copy_ casts and moves in one go
+        for name, idx, value in [('obs', self.step + 1, obs), ('actions', self.step, actions),
+                                 ('log_pis', self.step, log_pis), ('value_preds', self.step, value_preds),
+                                 ('rewards', self.step, rewards), ('masks', self.step + 1, masks),
+                                 ('bad_masks', self.step + 1, bad_masks)]:
+            field = self._field(name)[idx]
+            field.copy_(torch.as_tensor(value).reshape(field.shape))
 
         self.step = (self.step + 1) % self.num_steps
+        if self.host_staging and self.step == 0:
+            self._flush()
 
     def after_update(self):
         self.obs[0].copy_(self.obs[-1])
         self.masks[0].copy_(self.masks[-1])
         self.bad_masks[0].copy_(self.bad_masks[-1])
+        if self.host_staging:
+            self._wait_for_flush()
+            for name in ['obs', 'masks', 'bad_masks']:
+                self._staged[name][0].copy_(self._staged[name][-1])
 
     def compute_returns(self,
                         next_value,
@@ -84,37 +185,21 @@ class RolloutStorage(object):
             next_value = torch.Tensor(next_value).to(self.device)
 
         # (chongyi zheng): force use GAE
+        #   gae[t] = delta[t] + gamma * gae_lambda * masks[t + 1] * gae[t + 1]
+        # and with proper time limits gae[t] is further zeroed by bad_masks[t + 1]
+        self.value_preds[-1] = next_value
+        num_steps = self.rewards.size(0)
+        masks = self.masks[1:num_steps + 1]
+        deltas = self.rewards + gamma * self.value_preds[1:num_steps + 1] * masks \
+            - self.value_preds[:num_steps]
+        discounts = gamma * gae_lambda * masks
         if use_proper_time_limits:
-            # if use_gae:
-            self.value_preds[-1] = next_value
-            gae = 0
-            for step in reversed(range(self.rewards.size(0))):
-                delta = self.rewards[step] + gamma * self.value_preds[step + 1] \
-                        * self.masks[step + 1] - self.value_preds[step]
-                gae = delta + gamma * gae_lambda * self.masks[step + 1] * gae
-                gae = gae * self.bad_masks[step + 1]
-                self.returns[step] = gae + self.value_preds[step]
-            # else:
-            #     self.returns[-1] = next_value
-            #     for step in reversed(range(self.rewards.size(0))):
-            #         self.returns[step] = (self.returns[step + 1] * \
-            #                               gamma * self.masks[step + 1] + \
-            #                               self.rewards[step]) * self.bad_masks[step + 1] \
-            #                              + (1 - self.bad_masks[step + 1]) * self.value_preds[step]
-        else:
-            # if use_gae:
-            self.value_preds[-1] = next_value
-            gae = 0
-            for step in reversed(range(self.rewards.size(0))):
-                delta = self.rewards[step] + gamma * self.value_preds[step + 1] \
-                        * self.masks[step + 1] - self.value_preds[step]
-                gae = delta + gamma * gae_lambda * self.masks[step + 1] * gae
-                self.returns[step] = gae + self.value_preds[step]
-            # else:
-            #     self.returns[-1] = next_value
-            #     for step in reversed(range(self.rewards.size(0))):
-            #         self.returns[step] = self.returns[step + 1] * gamma \
-            #                              * self.masks[step + 1] + self.rewards[step]
+            bad_masks = self.bad_masks[1:num_steps + 1]
+            deltas = deltas * bad_masks
+            discounts = discounts * bad_masks
+
+        gae = _discounted_reverse_cumsum(deltas, discounts)
+        self.returns[:num_steps] = gae + self.value_preds[:num_steps]
 
     def feed_forward_generator(self,
                                advantages,
@@ -131,20 +216,27 @@ class RolloutStorage(object):
                 "".format(num_processes, num_steps, num_processes * num_steps,
                           num_mini_batch))
             mini_batch_size = batch_size // num_mini_batch
-        sampler = BatchSampler(
-            SubsetRandomSampler(range(batch_size)),
-            mini_batch_size,
-            drop_last=True)
-        for indices in sampler:
-            obs_batch = self.obs[:-1].view(-1, *self.obs.size()[2:])[indices]
-            actions_batch = self.actions.view(-1,
-                                              self.actions.size(-1))[indices]
-            value_preds_batch = self.value_preds[:-1].view(-1, 1)[indices]
-            return_batch = self.returns[:-1].view(-1, 1)[indices]
-            old_log_pis = self.log_pis.view(-1, 1)[indices]
+        # one permutation per epoch, every field is gathered once and minibatches are contiguous slices
+        num_mini_batch = batch_size // mini_batch_size
+        indices = torch.randperm(batch_size, device=self.device)[:num_mini_batch * mini_batch_size]
+        obs = self.obs[:-1].reshape(-1, *self.obs.size()[2:]).index_select(0, indices)
+        actions = self.actions.reshape(-1, self.actions.size(-1)).index_select(0, indices)
+        value_preds = self.value_preds[:-1].reshape(-1, 1).index_select(0, indices)
+        returns = self.returns[:-1].reshape(-1, 1).index_select(0, indices)
+        log_pis = self.log_pis.reshape(-1, 1).index_select(0, indices)
+        if advantages is not None:
+            advantages = advantages.reshape(-1, 1).index_select(0, indices)
+
+        for start in range(0, num_mini_batch * mini_batch_size, mini_batch_size):
+            batch = slice(start, start + mini_batch_size)
+            obs_batch = obs[batch]
+            actions_batch = actions[batch]
+            value_preds_batch = value_preds[batch]
+            return_batch = returns[batch]
+            old_log_pis = log_pis[batch]
             if advantages is None:
                 adv_targ = None
             else:
-                adv_targ = advantages.view(-1, 1)[indices]
+                adv_targ = advantages[batch]
 
             yield obs_batch, actions_batch, value_preds_batch, return_batch, old_log_pis, adv_targ
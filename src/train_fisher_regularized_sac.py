@@ -14,6 +14,7 @@ import buffers
 import time
 from logger import Logger
 from video import VideoRecorder
+from profiler import Profiler, TRAINING_PHASES, instrument_training, instrument_storage
 
 
 def evaluate(train_env, eval_env, agent, video, num_episodes, logger, step):
@@ -140,7 +141,8 @@ def main(args):
     video_dir = utils.make_dir(os.path.join(args.work_dir, 'video'))
     misc_dir = utils.make_dir(os.path.join(args.work_dir, 'misc'))
     video = VideoRecorder(video_dir if args.save_video else None, args.env_type,
-                          height=448, width=448, camera_id=args.video_camera_id)
+                          height=448, width=448, camera_id=args.video_camera_id,
+                          frame_skip=args.video_frame_skip)
 
     # Prepare agent
     # assert torch.cuda.is_available(), 'must have cuda enabled'
@@ -201,6 +203,16 @@ def main(args):
     args_dict = vars(args)
     logger.log_and_dump_arguments(args_dict)
 
+    profiler = Profiler(TRAINING_PHASES, enabled=args.profile, device=device, sync=args.profile_sync)
+    profile_logger = None
+    if args.profile:
+        profile_logger = Logger(utils.make_dir(os.path.join(args.work_dir, 'profile')),
+                                log_frequency=args.log_freq,
+                                action_repeat=args.action_repeat,
+                                save_tb=args.save_tb,
+                                config='profile')
+    instrument_training(profiler, agent, logger)
+
     episode = 0
     total_steps = 0
     recent_success = deque(maxlen=100)
@@ -224,6 +236,7 @@ def main(args):
                 device=device,
                 optimize_memory_usage=True,
             )
+            instrument_storage(profiler, replay_buffer)
 
             for task_epoch in range(total_epochs_per_task):
                 # Save agent periodically
@@ -235,7 +248,8 @@ def main(args):
                 if task_epoch % args.eval_freq == 0:
                     print('Evaluating:', args.work_dir)
                     logger.log('eval/episode', episode, total_steps)
-                    evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+                    with profiler.phase('evaluate'):
+                        evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
 
                 # # (chongyi zheng): force reset outside done = True when step reach train_steps_per_task
                 # if task_step >= train_steps_per_task:
@@ -252,17 +266,19 @@ def main(args):
                 #     replay_buffer.reset()
 
                 for step in range(args.sac_num_expl_steps_per_process):
-                    if task_steps < args.sac_init_steps:
-                        action = np.array([env.action_space.sample()
-                                           for _ in range(env.unwrapped.num_envs)])
-                    else:
-                        with utils.eval_mode(agent):
-                            if any(x in args.algo for x in ['mh', 'mi', 'individual']):
-                                action = agent.act(obs, sample=True, head_idx=task_id)
-                            else:
-                                action = agent.act(obs, sample=True)
+                    with profiler.phase('act'):
+                        if task_steps < args.sac_init_steps:
+                            action = np.array([env.action_space.sample()
+                                               for _ in range(env.unwrapped.num_envs)])
+                        else:
+                            with utils.eval_mode(agent):
+                                if any(x in args.algo for x in ['mh', 'mi', 'individual']):
+                                    action = agent.act(obs, sample=True, head_idx=task_id)
+                                else:
+                                    action = agent.act(obs, sample=True)
 
-                    next_obs, reward, done, infos = env.step(action)
+                    with profiler.phase('env_step'):
+                        next_obs, reward, done, infos = env.step(action)
 
                     for done_ in done:
                         if done_:
@@ -295,6 +311,8 @@ def main(args):
                 logger.log('train/episode', episode, total_steps)
                 log_info = {'train/task_name': infos[0]['task_name']}
                 logger.dump(total_steps, ty='train', save=(task_steps > args.sac_init_steps), info=log_info)
+                if task_epoch % args.log_freq == 0 and task_steps > args.sac_init_steps:
+                    profiler.dump(profile_logger, total_steps)
 
                 # if done:
                 #     success = np.any(episode_successes).astype(np.float)
@@ -397,7 +415,9 @@ def main(args):
             agent.reset(reset_critic=args.reset_agent)
 
     print('Final evaluating:', args.work_dir)
-    evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+    with profiler.phase('evaluate'):
+        evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+    profiler.dump(profile_logger, total_steps)
 
 
 if __name__ == '__main__':
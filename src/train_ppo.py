@@ -16,6 +16,8 @@ from environment.env_utils import get_vec_normalize
 import storages
 from logger import Logger
 from video import VideoRecorder
+from checkpoint import Checkpointer
+from profiler import Profiler, TRAINING_PHASES, instrument_training, instrument_storage
 
 
 def evaluate(train_env, eval_env, agent, video, num_episodes, logger, step):
@@ -72,7 +74,8 @@ def main(args):
     model_dir = utils.make_dir(os.path.join(args.work_dir, 'model'))
     video_dir = utils.make_dir(os.path.join(args.work_dir, 'video'))
     video = VideoRecorder(video_dir if args.save_video else None, args.env_type,
-                          height=448, width=448, camera_id=args.video_camera_id)
+                          height=448, width=448, camera_id=args.video_camera_id,
+                          frame_skip=args.video_frame_skip)
 
     # Prepare agent
     # assert torch.cuda.is_available(), 'must have cuda enabled'
@@ -222,14 +225,16 @@ def main(args):
                                            args.ppo_num_processes,
                                            env.observation_space.shape,
                                            env.action_space,
-                                           device)
+                                           device,
+                                           host_staging=args.ppo_rollout_host_staging)
 
         if 'ewc' in args.algo:
             est_fisher_rollouts = storages.RolloutStorage(args.ppo_ewc_rollout_steps_per_process,
                                                           args.ppo_num_processes,
                                                           env.observation_space.shape,
                                                           env.action_space,
-                                                          device)
+                                                          device,
+                                                          host_staging=args.ppo_rollout_host_staging)
 
     agent = make_agent(
         obs_space=env.observation_space,
@@ -239,57 +244,113 @@ def main(args):
         args=args
     )
 
+    checkpointer = Checkpointer(utils.make_dir(os.path.join(args.work_dir, 'checkpoint')))
+    counters = None
+    if args.resume and checkpointer.exists():
+        counters, _ = checkpointer.load(agent)
+        print(f"Resume from {checkpointer.path}: task {counters['task_id']}, epoch {counters['task_epoch']}")
+        # observation and return normalization of the environments
+        vec_norms = get_vec_normalize(env) if isinstance(env, MultiEnvWrapper) else []
+        for vec_norm, vec_norm_state in zip(vec_norms, counters['vec_normalize']):
+            if vec_norm is not None:
+                vec_norm.obs_rms, vec_norm.ret_rms = vec_norm_state
+
     logger = Logger(args.work_dir,
                     log_frequency=args.log_freq,
                     action_repeat=args.action_repeat,
-                    save_tb=args.save_tb)
+                    save_tb=args.save_tb,
+                    resume_step=counters['total_steps'] if counters is not None else None)
 
     # log arguments
     args_dict = vars(args)
     logger.log_and_dump_arguments(args_dict)
 
+    profiler = Profiler(TRAINING_PHASES, enabled=args.profile, device=device, sync=args.profile_sync)
+    profile_logger = None
+    if args.profile:
+        profile_logger = Logger(utils.make_dir(os.path.join(args.work_dir, 'profile')),
+                                log_frequency=args.log_freq,
+                                action_repeat=args.action_repeat,
+                                save_tb=args.save_tb,
+                                config='profile',
+                                resume_step=counters['total_steps'] if counters is not None else None)
+    instrument_training(profiler, agent, logger)
+    if 'mh' not in args.algo:
+        instrument_storage(profiler, rollouts)
+
+    start_task_id = 0
     episode = 0
     total_steps = 0
     recent_success = deque(maxlen=100)
     recent_episode_reward = deque(maxlen=100)
+    if counters is not None:
+        start_task_id = counters['task_id']
+        episode = counters['episode']
+        total_steps = counters['total_steps']
+        recent_success = counters['recent_success']
+        recent_episode_reward = counters['recent_episode_reward']
     if isinstance(env, MultiEnvWrapper):
         total_epochs_per_task = int(args.train_steps_per_task) // args.ppo_num_rollout_steps_per_process \
                                 // args.ppo_num_processes
 
-        for task_id in range(env.num_tasks):
-            task_steps = 0
+        for task_id in range(start_task_id, env.num_tasks):
+            resume_task = counters is not None and task_id == start_task_id
+            task_steps = counters['task_steps'] if resume_task else 0
+            start_epoch = counters['task_epoch'] if resume_task else 0
             start_time = time.time()
-            obs = env.reset(sample_task=True)
+            if resume_task:
+                env.set_task(task_id)
+                obs = env.reset()
+            else:
+                obs = env.reset(sample_task=True)
 
             if 'mh' in args.algo:
                 rollouts = storages.RolloutStorage(args.ppo_num_rollout_steps_per_process,
                                                    args.ppo_num_processes,
                                                    env.observation_space.shape,
                                                    env.all_action_spaces[task_id],
-                                                   device)
+                                                   device,
+                                                   host_staging=args.ppo_rollout_host_staging)
 
                 if 'ewc' in args.algo:
                     est_fisher_rollouts = storages.RolloutStorage(args.ppo_ewc_rollout_steps_per_process,
                                                                   args.ppo_num_processes,
                                                                   env.observation_space.shape,
                                                                   env.all_action_spaces[task_id],
-                                                                  device)
+                                                                  device,
+                                                                  host_staging=args.ppo_rollout_host_staging)
+                instrument_storage(profiler, rollouts)
+
+            rollouts.reset_obs(obs)
+            for task_epoch in range(start_epoch, total_epochs_per_task):
+                # the first epoch of a resumed run was saved and evaluated before the checkpoint was taken
+                resume_epoch = resume_task and task_epoch == start_epoch
 
-            rollouts.obs[0].copy_(torch.Tensor(obs).to(device))
-            for task_epoch in range(total_epochs_per_task):
                 agent.update_learning_rate(task_epoch, total_epochs_per_task)
 
-                if task_epoch % args.save_freq == 0:
+                if task_epoch % args.save_freq == 0 and not resume_epoch:
                     if args.save_model:
                         agent.save(model_dir, total_steps)
 
-                if task_epoch % args.eval_freq == 0:
+                if task_epoch % args.eval_freq == 0 and not resume_epoch:
                     print('Evaluating:', args.work_dir)
                     logger.log('eval/episode', episode, total_steps)
-                    evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+                    with profiler.phase('evaluate'):
+                        evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+
+                # Checkpoint the run periodically, the rollouts are collected from scratch every epoch
+                if args.checkpoint_freq > 0 and task_epoch % args.checkpoint_freq == 0 and not resume_epoch:
+                    vec_normalize = [(vec_norm.obs_rms, vec_norm.ret_rms) if vec_norm is not None else None
+                                     for vec_norm in get_vec_normalize(env)]
+                    with profiler.phase('checkpoint'):
+                        checkpointer.save(agent,
+                                          task_id=task_id, task_epoch=task_epoch, task_steps=task_steps,
+                                          total_steps=total_steps, episode=episode, recent_success=recent_success,
+                                          recent_episode_reward=recent_episode_reward,
+                                          vec_normalize=copy.deepcopy(vec_normalize))
 
                 for step in range(args.ppo_num_rollout_steps_per_process):
-                    with utils.eval_mode(agent):
+                    with profiler.phase('act'), utils.eval_mode(agent):
                         if 'mh' in args.algo:
                             action, log_pi = agent.act(obs, sample=True, compute_log_pi=True, head_idx=task_id)
                             value = agent.predict_value(obs, head_idx=task_id)
@@ -297,7 +358,8 @@ def main(args):
                             action, log_pi = agent.act(obs, sample=True, compute_log_pi=True)
                             value = agent.predict_value(obs)
 
-                    obs, reward, done, infos = env.step(action)
+                    with profiler.phase('env_step'):
+                        obs, reward, done, infos = env.step(action)
 
                     for done_ in done:
                         if done_:
@@ -340,6 +402,8 @@ def main(args):
                 logger.log('train/episode', episode, total_steps)
                 log_info = {'train/task_name': infos[0]['task_name']}
                 logger.dump(total_steps, ty='train', save=True, info=log_info)
+                if task_epoch % args.log_freq == 0:
+                    profiler.dump(profile_logger, total_steps)
 
             if 'ewc' in args.algo:
                 compute_returns_kwargs = {
@@ -370,8 +434,12 @@ def main(args):
             if args.reset_agent:
                 agent.reset()
 
+    checkpointer.wait()
+
     print('Final evaluating:', args.work_dir)
-    evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+    with profiler.phase('evaluate'):
+        evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+    profiler.dump(profile_logger, total_steps)
 
 
 if __name__ == '__main__':
@@ -14,6 +14,9 @@ import buffers
 import time
 from logger import Logger
 from video import VideoRecorder
+from checkpoint import Checkpointer
+from profiler import Profiler, TRAINING_PHASES, instrument_training, instrument_storage
+from actor_learner import CollectorPool
 
 
 def evaluate(env, agent, video, num_episodes, logger, step,
@@ -203,7 +206,8 @@ def main(args):
     model_dir = utils.make_dir(os.path.join(args.work_dir, 'model'))
     video_dir = utils.make_dir(os.path.join(args.work_dir, 'video'))
     video = VideoRecorder(video_dir if args.save_video else None, args.env_type,
-                          height=448, width=448, camera_id=args.video_camera_id)
+                          height=448, width=448, camera_id=args.video_camera_id,
+                          frame_skip=args.video_frame_skip)
 
     # Prepare agent
     # assert torch.cuda.is_available(), 'must have cuda enabled'
@@ -251,80 +255,158 @@ def main(args):
         args=args
     )
 
+    checkpointer = Checkpointer(utils.make_dir(os.path.join(args.work_dir, 'checkpoint')))
+    counters, replay_buffer_state = None, None
+    if args.resume and checkpointer.exists():
+        counters, replay_buffer_state = checkpointer.load(agent)
+        print(f"Resume from {checkpointer.path}: task {counters['task_id']}, epoch {counters['task_epoch']}")
+    resume_step = counters['total_steps'] if counters is not None else None
+
     logger = Logger(args.work_dir,
                     log_frequency=args.log_freq,
                     action_repeat=args.action_repeat,
-                    save_tb=args.save_tb)
+                    save_tb=args.save_tb,
+                    resume_step=resume_step)
 
     if 'distilled' in args.algo:
         distillation_dir = utils.make_dir(os.path.join(args.work_dir, 'distillation'))
         distillation_logger = Logger(distillation_dir,
                                      log_frequency=args.log_freq,
                                      action_repeat=args.action_repeat,
-                                     save_tb=args.save_tb)
+                                     save_tb=args.save_tb,
+                                     resume_step=resume_step)
     elif 'awp' in args.algo:
         awp_dir = utils.make_dir(os.path.join(args.work_dir, 'awp_robust'))
         awp_logger = Logger(awp_dir,
                             log_frequency=args.log_freq,
                             action_repeat=args.action_repeat,
-                            save_tb=args.save_tb)
+                            save_tb=args.save_tb,
+                            resume_step=resume_step)
 
     # log arguments
     args_dict = vars(args)
     logger.log_and_dump_arguments(args_dict)
 
+    profiler = Profiler(TRAINING_PHASES, enabled=args.profile, device=device, sync=args.profile_sync)
+    profile_logger = None
+    if args.profile:
+        profile_logger = Logger(utils.make_dir(os.path.join(args.work_dir, 'profile')),
+                                log_frequency=args.log_freq,
+                                action_repeat=args.action_repeat,
+                                save_tb=args.save_tb,
+                                config='profile',
+                                resume_step=resume_step)
+    instrument_training(profiler, agent, logger)
+
+    # environments stepped per epoch, by the collectors in actor-learner mode
+    num_envs = args.sac_num_processes
+    collectors = None
+    if args.actor_learner:
+        num_envs *= args.actor_learner_num_collectors
+        collectors = CollectorPool(args, agent, train_env_log_dir, profiler,
+                                   start_method=args.actor_learner_start_method)
+
     num_tasks = len(args.env_names)
+    start_task_id = 0
     episode = 0
     total_steps = 0
     recent_success = deque(maxlen=100)
     recent_episode_reward = deque(maxlen=100)
+    if counters is not None:
+        start_task_id = counters['task_id']
+        episode = counters['episode']
+        total_steps = counters['total_steps']
+        recent_success = counters['recent_success']
+        recent_episode_reward = counters['recent_episode_reward']
     # start_time = time.time()
     # train_steps_per_task = args.train_steps_per_task
     # if isinstance(env, MultiEnvWrapper):
     total_epochs_per_task = int(args.train_steps_per_task) // args.sac_num_expl_steps_per_process \
-                            // args.sac_num_processes
+                            // num_envs
 
-    for task_id in range(num_tasks):
-        task_steps = 0
+    for task_id in range(start_task_id, num_tasks):
+        resume_task = counters is not None and task_id == start_task_id
+        task_steps = counters['task_steps'] if resume_task else 0
+        start_epoch = counters['task_epoch'] if resume_task else 0
         start_time = time.time()
-        env.env_method('sample_task')
+        if resume_task:
+            env.env_method('set_task', task_id)
+        else:
+            env.env_method('sample_task')
         obs = env.reset()
 
         # reset replay buffer
         observation_space = env.get_attr('observation_space')[0]  # use first process
         action_space = env.get_attr('action_space')[0]
 
-        replay_buffer = buffers.ReplayBuffer(
-            obs_space=observation_space,
-            action_space=action_space,
-            transition_num=args.replay_buffer_capacity,  # FIXME (cyzheng): rename to replay_buffer_transition_num
-            device=device,
-            n_envs=args.sac_num_processes,
-            optimize_memory_usage=True,
-        )
+        if args.sac_prioritized_replay:
+            replay_buffer = buffers.PrioritizedReplayBuffer(
+                obs_space=observation_space,
+                action_space=action_space,
+                transition_num=args.replay_buffer_capacity,
+                device=device,
+                n_envs=num_envs,
+                optimize_memory_usage=True,
+                n_step=args.sac_n_step,
+                discount=args.discount,
+                obs_dtype=args.replay_buffer_obs_dtype,
+                action_dtype=args.replay_buffer_action_dtype,
+                alpha=args.sac_prioritized_replay_alpha,
+                beta=args.sac_prioritized_replay_beta,
+            )
+        else:
+            replay_buffer = buffers.ReplayBuffer(
+                obs_space=observation_space,
+                action_space=action_space,
+                transition_num=args.replay_buffer_capacity,  # FIXME (cyzheng): rename to replay_buffer_transition_num
+                device=device,
+                n_envs=num_envs,
+                optimize_memory_usage=True,
+                n_step=args.sac_n_step,
+                discount=args.discount,
+                obs_dtype=args.replay_buffer_obs_dtype,
+                action_dtype=args.replay_buffer_action_dtype,
+            )
+        if resume_task and replay_buffer_state is not None:
+            replay_buffer.load_state_dict(replay_buffer_state)
+        instrument_storage(profiler, replay_buffer)
+        if args.actor_learner:
+            collectors.start_task(task_id, agent, task_steps=task_steps, task_epoch=start_epoch)
+
+        for task_epoch in range(start_epoch, total_epochs_per_task):
+            # the first epoch of a resumed run was saved and evaluated before the checkpoint was taken
+            resume_epoch = resume_task and task_epoch == start_epoch
 
-        for task_epoch in range(total_epochs_per_task):
             # Save agent periodically
-            if task_epoch % args.save_freq == 0:
+            if task_epoch % args.save_freq == 0 and not resume_epoch:
                 if args.save_model:
                     agent.save(model_dir, total_steps)
 
             # Evaluate agent periodically
-            if task_epoch % args.eval_freq == 0:
+            if task_epoch % args.eval_freq == 0 and not resume_epoch:
                 print('Evaluating:', args.work_dir)
                 logger.log('eval/episode', episode, total_steps)
-                evaluate(eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
-
-                if 'distilled' in args.algo:
-                    evaluate(eval_env, agent, video, args.num_eval_episodes, distillation_logger,
-                             total_steps, use_distilled_actor=True)
-                elif 'awp' in args.algo:
-                    evaluate(eval_env, agent, video, args.num_eval_episodes, awp_logger,
-                             total_steps, perturb=True)
+                with profiler.phase('evaluate'):
+                    evaluate(eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+
+                    if 'distilled' in args.algo:
+                        evaluate(eval_env, agent, video, args.num_eval_episodes, distillation_logger,
+                                 total_steps, use_distilled_actor=True)
+                    elif 'awp' in args.algo:
+                        evaluate(eval_env, agent, video, args.num_eval_episodes, awp_logger,
+                                 total_steps, perturb=True)
                 # elif 'hypernet_actor' in args.algo:
                 #     evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger,
                 #              total_steps)
 
+            # Checkpoint the run periodically
+            if args.checkpoint_freq > 0 and task_epoch % args.checkpoint_freq == 0 and not resume_epoch:
+                with profiler.phase('checkpoint'):
+                    checkpointer.save(agent, replay_buffer,
+                                      task_id=task_id, task_epoch=task_epoch, task_steps=task_steps,
+                                      total_steps=total_steps, episode=episode, recent_success=recent_success,
+                                      recent_episode_reward=recent_episode_reward)
+
             # # (chongyi zheng): force reset outside done = True when step reach train_steps_per_task
             # if task_step >= train_steps_per_task:
             #     obs = env.reset(sample_task=True)
@@ -343,39 +425,61 @@ def main(args):
                     or 'gp_lvm_hypernet' in args.algo:
                 with utils.eval_mode(agent):
                     agent.infer_weights(task_id)
-            for step in range(args.sac_num_expl_steps_per_process):
-                if task_steps < args.sac_init_steps:
-                    action = np.array([env.action_space.sample()
-                                       for _ in range(env.unwrapped.num_envs)])
-                else:
-                    with utils.eval_mode(agent):
-                        if any(x in args.algo for x in ['mh', 'mi', 'individual', 'hypernet', 'distilled']):
-                            action = agent.act(obs, sample=True, head_idx=task_id)
+            if args.actor_learner:
+                # the transitions the collectors stepped while the agent was updated on the previous epoch
+                for obs, action, reward, next_obs, done, infos in \
+                        collectors.transitions(args.sac_num_expl_steps_per_process):
+                    for done_ in done:
+                        if done_:
+                            episode += 1
+
+                    for info in infos:
+                        if 'episode' in info.keys():
+                            recent_success.append(info.get('success', 0.0))
+                            recent_episode_reward.append(info['episode']['r'])
+
+                    replay_buffer.add(obs, action, reward, next_obs, done, infos)
+            else:
+                for step in range(args.sac_num_expl_steps_per_process):
+                    with profiler.phase('act'):
+                        if task_steps < args.sac_init_steps:
+                            action = np.array([env.action_space.sample()
+                                               for _ in range(env.unwrapped.num_envs)])
                         else:
-                            action = agent.act(obs, sample=True)
+                            with utils.eval_mode(agent):
+                                if any(x in args.algo for x in ['mh', 'mi', 'individual', 'hypernet', 'distilled']):
+                                    action = agent.act(obs, sample=True, head_idx=task_id)
+                                else:
+                                    action = agent.act(obs, sample=True)
 
-                next_obs, reward, done, infos = env.step(action)
+                    with profiler.phase('env_step'):
+                        next_obs, reward, done, infos = env.step(action)
 
-                for done_ in done:
-                    if done_:
-                        episode += 1
+                    for done_ in done:
+                        if done_:
+                            episode += 1
 
-                for info in infos:
-                    if 'episode' in info.keys():
-                        recent_success.append(info.get('success', 0.0))
-                        recent_episode_reward.append(info['episode']['r'])
+                    for info in infos:
+                        if 'episode' in info.keys():
+                            recent_success.append(info.get('success', 0.0))
+                            recent_episode_reward.append(info['episode']['r'])
 
-                replay_buffer.add(obs, action, reward, next_obs, done, infos)
+                    replay_buffer.add(obs, action, reward, next_obs, done, infos)
 
-                obs = next_obs
+                    obs = next_obs
 
             if 'task_embedding_hypernet' in args.algo or 'sparse_gp_hypernet' in args.algo \
                     or 'gp_lvm_hypernet' in args.algo:
                 with utils.eval_mode(agent):
                     agent.clear_weights()
 
-            task_steps += args.sac_num_expl_steps_per_process * args.sac_num_processes
-            total_steps += args.sac_num_expl_steps_per_process * args.sac_num_processes
+            task_steps += args.sac_num_expl_steps_per_process * num_envs
+            total_steps += args.sac_num_expl_steps_per_process * num_envs
+
+            if args.sac_prioritized_replay:
+                # anneal the importance sampling correction to full over the task
+                replay_buffer.beta = args.sac_prioritized_replay_beta + (1.0 - args.sac_prioritized_replay_beta) * \
+                    min(task_steps / args.train_steps_per_task, 1.0)
 
             if task_steps >= args.sac_init_steps:
                 for _ in range(args.sac_num_train_iters):
@@ -383,6 +487,8 @@ def main(args):
                         agent.update(replay_buffer, logger, total_steps, head_idx=task_id)
                     else:
                         agent.update(replay_buffer, logger, total_steps)
+            if args.actor_learner:
+                collectors.publish(agent, task_epoch + 1)
 
             end_time = time.time()
             if task_epoch % args.log_freq == 0 and \
@@ -398,8 +504,11 @@ def main(args):
                 logger.log('train/recent_success', avg_recent_success, total_steps)
                 logger.log('train/recent_episode_reward', avg_recent_episode_reward, total_steps)
                 logger.log('train/episode', episode, total_steps)
+                if args.actor_learner:
+                    logger.log('train/policy_lag', collectors.policy_lag(), total_steps)
                 log_info = {'train/task_name': infos[0]['task_name']}
                 logger.dump(total_steps, ty='train', info=log_info)
+                profiler.dump(profile_logger, total_steps)
 
             # if done:
             #     success = np.any(episode_successes).astype(np.float)
@@ -512,8 +621,14 @@ def main(args):
             utils.make_dir(task_model_dir)
             agent.save(task_model_dir)
 
+    if args.actor_learner:
+        collectors.close()
+    checkpointer.wait()
+
     print('Final evaluating:', args.work_dir)
-    evaluate(eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+    with profiler.phase('evaluate'):
+        evaluate(eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
+    profiler.dump(profile_logger, total_steps)
 
 
 if __name__ == '__main__':
@@ -14,6 +14,7 @@ import buffers
 import time
 from logger import Logger
 from video import VideoRecorder
+from checkpoint import Checkpointer
 
 
 def evaluate(train_env, eval_env, agent, video, num_episodes, logger, step):
@@ -140,7 +141,8 @@ def main(args):
     model_dir = utils.make_dir(os.path.join(args.work_dir, 'model'))
     video_dir = utils.make_dir(os.path.join(args.work_dir, 'video'))
     video = VideoRecorder(video_dir if args.save_video else None, args.env_type,
-                          height=448, width=448, camera_id=args.video_camera_id)
+                          height=448, width=448, camera_id=args.video_camera_id,
+                          frame_skip=args.video_frame_skip)
 
     # Prepare agent
     device = torch.device(args.device)
@@ -154,27 +156,47 @@ def main(args):
         args=args
     )
 
+    checkpointer = Checkpointer(utils.make_dir(os.path.join(args.work_dir, 'checkpoint')))
+    counters, replay_buffer_state = None, None
+    if args.resume and checkpointer.exists():
+        counters, replay_buffer_state = checkpointer.load(agent)
+        print(f"Resume from {checkpointer.path}: task {counters['task_id']}, epoch {counters['task_epoch']}")
+
     logger = Logger(args.work_dir,
                     log_frequency=args.log_freq,
                     action_repeat=args.action_repeat,
-                    save_tb=args.save_tb)
+                    save_tb=args.save_tb,
+                    resume_step=counters['total_steps'] if counters is not None else None)
 
     # log arguments
     args_dict = vars(args)
     logger.log_and_dump_arguments(args_dict)
 
+    start_task_id = 0
     episode = 0
     total_steps = 0
     recent_success = deque(maxlen=100)
     recent_episode_reward = deque(maxlen=100)
+    if counters is not None:
+        start_task_id = counters['task_id']
+        episode = counters['episode']
+        total_steps = counters['total_steps']
+        recent_success = counters['recent_success']
+        recent_episode_reward = counters['recent_episode_reward']
     if isinstance(env, MultiEnvWrapper):
         total_epochs_per_task = int(args.train_steps_per_task) // args.td3_num_expl_steps_per_process \
                                 // args.td3_num_processes
 
-        for task_id in range(env.num_tasks):
-            task_steps = 0
+        for task_id in range(start_task_id, env.num_tasks):
+            resume_task = counters is not None and task_id == start_task_id
+            task_steps = counters['task_steps'] if resume_task else 0
+            start_epoch = counters['task_epoch'] if resume_task else 0
             start_time = time.time()
-            obs = env.reset(sample_task=True)
+            if resume_task:
+                env.set_task(task_id)
+                obs = env.reset()
+            else:
+                obs = env.reset(sample_task=True)
 
             # reset replay buffer
             replay_buffer = buffers.ReplayBuffer(
@@ -184,19 +206,31 @@ def main(args):
                 device=device,
                 optimize_memory_usage=True,
             )
+            if resume_task and replay_buffer_state is not None:
+                replay_buffer.load_state_dict(replay_buffer_state)
+
+            for task_epoch in range(start_epoch, total_epochs_per_task):
+                # the first epoch of a resumed run was saved and evaluated before the checkpoint was taken
+                resume_epoch = resume_task and task_epoch == start_epoch
 
-            for task_epoch in range(total_epochs_per_task):
                 # Save agent periodically
-                if task_epoch % args.save_freq == 0:
+                if task_epoch % args.save_freq == 0 and not resume_epoch:
                     if args.save_model:
                         agent.save(model_dir, total_steps)
 
                 # Evaluate agent periodically
-                if task_epoch % args.eval_freq == 0:
+                if task_epoch % args.eval_freq == 0 and not resume_epoch:
                     print('Evaluating:', args.work_dir)
                     logger.log('eval/episode', episode, total_steps)
                     evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
 
+                # Checkpoint the run periodically
+                if args.checkpoint_freq > 0 and task_epoch % args.checkpoint_freq == 0 and not resume_epoch:
+                    checkpointer.save(agent, replay_buffer,
+                                      task_id=task_id, task_epoch=task_epoch, task_steps=task_steps,
+                                      total_steps=total_steps, episode=episode, recent_success=recent_success,
+                                      recent_episode_reward=recent_episode_reward)
+
                 for step in range(args.td3_num_expl_steps_per_process):
                     if task_steps < args.td3_init_steps:
                         action = np.array([env.action_space.sample()
@@ -269,6 +303,8 @@ def main(args):
 
             agent.reset(reset_critic=args.reset_agent)
 
+    checkpointer.wait()
+
     print('Final evaluating:', args.work_dir)
     evaluate(env, eval_env, agent, video, args.num_eval_episodes, logger, total_steps)
 
@@ -321,3 +321,38 @@ def weight_init(m):
         mid = m.weight.size(2) // 2
         gain = nn.init.calculate_gain('relu')
         nn.init.orthogonal_(m.weight.data[:, :, mid, mid], gain)
+
+
+def mlp_action_grad(trunk, obs_action, action_dim):
+    """Run a ReLU MLP with a scalar output and compute its gradient w.r.t. the last 'action_dim' inputs.
+
+    The gradient is accumulated explicitly through the saved ReLU masks, reusing the activations of the
+    forward pass. Since the ReLU derivative is piecewise constant, the result equals the double-backward
+    gradient and penalties on it only need a first-order backward.
+
+    :param trunk: sequence of nn.Linear and nn.ReLU layers ending with a nn.Linear of one output.
+    :param obs_action: inputs of shape (B, obs_dim + action_dim) with the action last.
+    :return: output of shape (B, 1) and gradient of shape (B, action_dim).
+    """
+    linears, masks = [], []
+    hidden = obs_action
+    for layer in trunk:
+        if isinstance(layer, nn.Linear):
+            linears.append(layer)
+            hidden = layer(hidden)
+        elif isinstance(layer, nn.ReLU):
+            masks.append((hidden > 0).to(hidden.dtype))
+            hidden = torch.relu(hidden)
+        else:
+            raise TypeError("Unsupported layer: {}".format(type(layer)))
+    assert len(masks) == len(linears) - 1 and linears[-1].out_features == 1
+
+    if len(masks) == 0:
+        return hidden, linears[0].weight[:, -action_dim:].expand(hidden.size(0), -1)
+
+    grad = linears[-1].weight.expand(hidden.size(0), -1)
+    for layer, mask in zip(reversed(linears[1:-1]), reversed(masks[1:])):
+        grad = (grad * mask) @ layer.weight
+    grad = (grad * masks[0]) @ linears[0].weight[:, -action_dim:]
+
+    return hidden, grad
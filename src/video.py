@@ -1,5 +1,9 @@
-import imageio
+import atexit
 import os
+import queue
+import threading
+
+import imageio
 from PIL import Image
 import numpy as np
 
@@ -7,39 +11,114 @@ from environment.gym_wrapper import VecNormalize
 
 
 class VideoRecorder(object):
-    def __init__(self, dir_name, env_type, height=100, width=100, camera_id=0, fps=25):
+    """Record rendered frames and encode them in a background thread
+
+    'record' only renders the frame, at the target resolution if the environment supports it, and puts it into
+    a bounded queue. Resizing and encoding run in a worker thread, so evaluation does not wait for them (unless
+    the queue is full). 'frame_skip' > 1 records only every 'frame_skip'-th frame.
+    """
+    def __init__(self, dir_name, env_type, height=100, width=100, camera_id=0, fps=25, frame_skip=1,
+                 max_queue_size=256):
         self.dir_name = dir_name
         self.env_type = env_type
         self.height = height
         self.width = width
         self.camera_id = camera_id
         self.fps = fps
-        self.frames = []
+        self.frame_skip = frame_skip
+        self.enabled = False
+        self._num_calls = 0
+        # whether env.render accepts the resolution and camera, found out by the first render
+        self._render_resolution = True
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._error = None
+        self._worker = None
+
+    def _start_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._encode_loop, daemon=True)
+            self._worker.start()
+            atexit.register(self.close)
+
+    def _encode_loop(self):
+        frames = []
+        while True:
+            command, value = self._queue.get()
+            try:
+                if command == 'frame':
+                    frames.append(self._postprocess(value))
+                elif command == 'reset':
+                    frames = []
+                elif command == 'save':
+                    # keep the playback speed when skipping frames
+                    imageio.mimsave(value, frames, fps=self.fps / self.frame_skip)
+                elif command == 'close':
+                    return
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _put(self, command, value=None):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Video encoding failed") from error
+        self._start_worker()
+        self._queue.put((command, value))
+
+    def _render(self, env):
+        if self._render_resolution:
+            try:
+                return env.render(mode='rgb_array', height=self.height, width=self.width,
+                                  camera_id=self.camera_id)
+            except TypeError:
+                self._render_resolution = False
+
+        return env.render(mode='rgb_array')
+
+    def _postprocess(self, frame):
+        if self.env_type == 'metaworld':
+            frame = frame[:, :, ::-1]
+        if frame.shape[:2] != (self.height, self.width):
+            frame = np.asarray(Image.fromarray(np.ascontiguousarray(frame)).resize([self.width, self.height]))
+
+        return frame
 
     def init(self, enabled=True):
-        self.frames = []
         self.enabled = self.dir_name is not None and enabled
+        self._num_calls = 0
+        if self.dir_name is not None:
+            self._put('reset')
 
     def record(self, env, losses=[]):
         if self.enabled:
-            if self.env_type == 'atari':
-                frame = env.render(mode='rgb_array')
-                frame = Image.fromarray(frame).resize([self.width, self.height])
-                frame = np.asarray(frame)
-            elif self.env_type == 'metaworld':
-                frame = env.render(mode='rgb_array')
-                frame = Image.fromarray(frame[:, :, ::-1]).resize([self.width, self.height])
-                frame = np.asarray(frame)
-            elif self.env_type == 'mujoco':
+            self._num_calls += 1
+            if (self._num_calls - 1) % self.frame_skip != 0:
+                return
+
+            if self.env_type == 'mujoco':
                 assert isinstance(env, VecNormalize)
-                frame = env.render(mode='rgb_array')
-                frame = Image.fromarray(frame).resize([self.width, self.height])
-                frame = np.asarray(frame)
-            else:
+            elif self.env_type not in ('atari', 'metaworld'):
                 raise ValueError(f"Unknown environment type {self.env_type}")
-            self.frames.append(frame)
+            # the renderer may reuse its buffer, keep a copy for the worker
+            self._put('frame', np.array(self._render(env)))
 
     def save(self, file_name):
         if self.enabled:
             path = os.path.join(self.dir_name, file_name)
-            imageio.mimsave(path, self.frames, fps=self.fps)
+            self._put('save', path)
+
+    def flush(self):
+        """Block until all recorded videos are written"""
+        if self._worker is not None:
+            self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Video encoding failed") from error
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(('close', None))
+            self._worker.join()
+            self._worker = None
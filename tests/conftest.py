@@ -0,0 +1,7 @@
+import os.path as osp
+import sys
+
+
+# the modules of 'src' import each other as top-level modules, and some of them through the 'src' package
+ROOT_DIR = osp.dirname(osp.dirname(osp.abspath(__file__)))
+sys.path[:0] = [osp.join(ROOT_DIR, 'src'), ROOT_DIR]
@@ -0,0 +1,375 @@
+"""Behaviour checks of the optimized code paths against their reference implementations
+
+- the chunked returns of 'storages.RolloutStorage' against the GAE and discounted return loops,
+- the explicit action gradients of the critics against double backward,
+- the batched reservoir sampling of 'reservoir.ReservoirMemory' against sequential Algorithm R,
+- the batching, scattering and error handling of 'inference_server.InferenceServer'.
+
+Run from the root of the repository with 'python -m pytest tests'. The timing of the same code paths is in the
+'benchmarks' package of 'src'.
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+from torch import nn
+
+from inference_server import InferenceServer
+from reservoir import ReservoirMemory
+
+
+# returns of 'RolloutStorage.compute_returns', for rollouts shorter than, equal to and longer than a chunk
+
+_RETURNS_NUM_STEPS = [1, 5, 63, 64, 65, 128, 1000]
+_NUM_PROCESSES = 8
+_GAMMA = 0.99
+_GAE_LAMBDA = 0.95
+_TOLERANCES = {torch.float64: dict(rtol=1e-9, atol=1e-9), torch.float32: dict(rtol=1e-4, atol=1e-4)}
+
+
+def _assert_close(x, y, message):
+    assert torch.allclose(x, y, **_TOLERANCES[x.dtype]), f'{message}: max error {(x - y).abs().max().item():.3e}'
+
+
+@pytest.fixture(params=[torch.float64, torch.float32], ids=['float64', 'float32'])
+def default_dtype(request):
+    # float32 is the dtype of the storage in training
+    torch.set_default_dtype(request.param)
+    yield request.param
+    torch.set_default_dtype(torch.float32)
+
+
+@pytest.mark.parametrize('num_steps', _RETURNS_NUM_STEPS)
+def test_compute_returns_matches_reference_loops(num_steps, default_dtype):
+    returns = pytest.importorskip('benchmarks.returns')
+    generator = torch.Generator().manual_seed(num_steps)
+    for use_proper_time_limits in [True, False]:
+        for gae_lambda in [_GAE_LAMBDA, 0.0, 1.0]:
+            rollouts, next_value = returns.random_rollouts(num_steps, _NUM_PROCESSES, generator)
+            rollouts.compute_returns(next_value, _GAMMA, gae_lambda, use_proper_time_limits)
+            expected = returns.reference_gae_returns(rollouts, next_value, _GAMMA, gae_lambda,
+                                                     use_proper_time_limits)
+            _assert_close(rollouts.returns[:-1], expected[:-1],
+                          f'gae_lambda {gae_lambda}, use_proper_time_limits {use_proper_time_limits}: '
+                          f'returns differ from the GAE loop')
+
+    # without GAE: discounted returns bootstrapped from the value of the last observation
+    rollouts, next_value = returns.random_rollouts(num_steps, _NUM_PROCESSES, generator)
+    rollouts.compute_returns(next_value, _GAMMA, 1.0, use_proper_time_limits=False)
+    _assert_close(rollouts.returns[:-1], returns.reference_discounted_returns(rollouts, next_value, _GAMMA)[:-1],
+                  'returns with gae_lambda 1 differ from the discounted returns')
+    # one-step TD targets
+    rollouts.compute_returns(next_value, _GAMMA, 0.0, use_proper_time_limits=False)
+    td_targets = rollouts.rewards + _GAMMA * rollouts.value_preds[1:] * rollouts.masks[1:]
+    _assert_close(rollouts.returns[:-1], td_targets, 'returns with gae_lambda 0 differ from the TD targets')
+
+
+@pytest.mark.parametrize('num_steps', _RETURNS_NUM_STEPS)
+def test_discounted_reverse_cumsum_matches_recurrence(num_steps, default_dtype):
+    storages = pytest.importorskip('storages')
+    generator = torch.Generator().manual_seed(num_steps)
+    for batch_shape in [(), (_NUM_PROCESSES,), (_NUM_PROCESSES, 2)]:
+        values = torch.randn((num_steps, *batch_shape), generator=generator, dtype=default_dtype)
+        discounts = torch.rand((num_steps, *batch_shape), generator=generator, dtype=default_dtype)
+        discounts[torch.rand(discounts.shape, generator=generator) < 0.1] = 0.0
+        expected = torch.zeros_like(values)
+        x = torch.zeros_like(values[0])
+        for step in reversed(range(num_steps)):
+            x = values[step] + discounts[step] * x
+            expected[step] = x
+        for chunk_size in [1, 7, 64, num_steps + 1]:
+            _assert_close(storages._discounted_reverse_cumsum(values, discounts, chunk_size=chunk_size), expected,
+                          f'batch shape {batch_shape}, chunk size {chunk_size}: '
+                          f'_discounted_reverse_cumsum differs from the recurrence')
+
+
+# explicit action gradients of the critics, in float64: Q estimates (offsets for Fisher-BRC), action gradients,
+# the penalty mean(|dQ1/da|^2 + |dQ2/da|^2) plus a TD-like loss and the parameter gradients of critic and actor
+
+_OBS_DIM = 39
+_ACTION_DIM = 4
+
+
+def _critic_cases():
+    action_grads = pytest.importorskip('benchmarks.action_grads')
+    return action_grads, action_grads.critic_cases(_OBS_DIM, _ACTION_DIM, hidden_dim=64)
+
+
+def _run_penalty(action_grads, outputs_fn, q_fn, critic, actor, obs):
+    params = list(critic.parameters()) + list(actor.parameters())
+    for param in params:
+        param.grad = None
+    action = torch.tanh(actor(obs))
+    outputs = outputs_fn(q_fn, obs, action)
+    penalty, loss = action_grads.penalty_loss(*outputs)
+    loss.backward()
+    grads = [torch.zeros_like(param) if param.grad is None else param.grad.clone() for param in params]
+    return [output.detach().reshape(len(obs), -1) for output in outputs], penalty.detach(), grads
+
+
+def test_explicit_action_grads_match_double_backward():
+    action_grads, cases = _critic_cases()
+    for name, critic, q_fn, explicit_fn in cases:
+        torch.manual_seed(1)
+        actor = nn.Linear(_OBS_DIM, _ACTION_DIM).double()
+        critic.double()
+        obs = torch.randn(128, _OBS_DIM, dtype=torch.float64)
+
+        reference = _run_penalty(action_grads, action_grads.autograd_outputs, q_fn, critic, actor, obs)
+        explicit = _run_penalty(action_grads, lambda _, obs, action: explicit_fn(obs, action), q_fn, critic, actor,
+                                obs)
+
+        def close(x, y):
+            return torch.allclose(x, y, rtol=1e-9, atol=1e-12)
+
+        for output_name, x, y in zip(['q1', 'q2', 'q1 action grad', 'q2 action grad'], explicit[0], reference[0]):
+            assert close(x, y), f'{name}: {output_name} differs from double backward by {(x - y).abs().max():.3e}'
+        assert close(explicit[1], reference[1]), \
+            f'{name}: penalty {explicit[1].item()} differs from double backward {reference[1].item()}'
+        assert any(grad.abs().max() > 0 for grad in reference[2][-2:]), f'{name}: no gradient reached the actor'
+        for idx, (x, y) in enumerate(zip(explicit[2], reference[2])):
+            assert close(x, y), f'{name}: gradient of parameter {idx} differs from double backward by ' \
+                                f'{(x - y).abs().max():.3e}'
+
+
+# reservoir sampling: the items 0 to num_items - 1 are streamed in batches of random sizes
+
+_NUM_ITEMS = 1000
+_CAPACITY = 100
+_MAX_BATCH_SIZE = 64
+
+
+def _batch_sizes(num_items, max_batch_size, rng):
+    sizes = []
+    while sum(sizes) < num_items:
+        sizes.append(min(int(rng.integers(1, max_batch_size + 1)), num_items - sum(sizes)))
+    return sizes
+
+
+def _stream(memory, batch_sizes):
+    """Add the items 0, 1, ... in batches, return the (item, slot) pairs written by every 'add'"""
+    written, start = [], 0
+    for batch_size in batch_sizes:
+        items = np.arange(start, start + batch_size)
+        src_idxs, slots = memory.add(item=items)
+        written.append((items[src_idxs], slots))
+        start += batch_size
+    return written
+
+
+def _algorithm_r(num_items, capacity):
+    """Reservoir of sequential Algorithm R, drawing from the global numpy generator like 'ReservoirMemory.add'
+
+    j is drawn uniformly from [0, p] for the item at stream position p, which is written to slot p while the memory
+    is not full and to slot j if j < capacity afterwards.
+    """
+    reservoir, written = [], []
+    for position in range(num_items):
+        j = np.random.randint(0, position + 1)
+        slot = position if position < capacity else j
+        if slot < capacity:
+            if slot == len(reservoir):
+                reservoir.append(position)
+            else:
+                reservoir[slot] = position
+            written.append((position, slot))
+    return np.array(reservoir), written
+
+
+def test_reservoir_inclusion_rates():
+    # every item is kept with probability capacity / num_items, within 'tolerance' binomial standard deviations
+    num_seeds, tolerance = 2000, 5.0
+    rng = np.random.default_rng(1)
+    counts = np.zeros(_NUM_ITEMS)
+    for seed in range(num_seeds):
+        np.random.seed(1 + seed)
+        memory = ReservoirMemory(_CAPACITY, {'item': ((), torch.int64)}, torch.device('cpu'))
+        _stream(memory, _batch_sizes(_NUM_ITEMS, _MAX_BATCH_SIZE, rng))
+        items = memory['item'].numpy()
+        assert len(items) == _CAPACITY and len(np.unique(items)) == _CAPACITY, 'the memory holds duplicated items'
+        counts[items] += 1
+
+    rates = counts / num_seeds
+    rate = _CAPACITY / _NUM_ITEMS
+    std = np.sqrt(rate * (1 - rate) / num_seeds)
+    worst = np.argmax(np.abs(rates - rate))
+    assert abs(rates[worst] - rate) < tolerance * std, \
+        f'item {worst} was kept in {rates[worst]:.4f} of the seeds instead of {rate:.4f}'
+
+    # a bias towards the start or the end of the stream is too small per item but shows in the mean of many items
+    num_items = _NUM_ITEMS // 10
+    for name, part in [('first', rates[:num_items]), ('last', rates[-num_items:])]:
+        assert abs(part.mean() - rate) < tolerance * std / np.sqrt(num_items), \
+            f'the {name} {num_items} items were kept in {part.mean():.4f} of the seeds instead of {rate:.4f}'
+
+
+@pytest.mark.parametrize('max_batch_size', [1, _MAX_BATCH_SIZE, _NUM_ITEMS])
+def test_reservoir_batched_adds_match_algorithm_r(max_batch_size):
+    batch_sizes = _batch_sizes(_NUM_ITEMS, max_batch_size, np.random.default_rng(1))
+
+    np.random.seed(1)
+    memory = ReservoirMemory(_CAPACITY, {'item': ((), torch.int64)}, torch.device('cpu'))
+    written = _stream(memory, batch_sizes)
+    np.random.seed(1)
+    reservoir, expected_written = _algorithm_r(_NUM_ITEMS, _CAPACITY)
+
+    assert memory.total_num == _NUM_ITEMS and len(memory) == len(reservoir)
+    assert np.array_equal(memory['item'].numpy(), reservoir), 'the memory differs from Algorithm R'
+    # within a batch only the last write to a slot is returned
+    expected, start = [], 0
+    for batch_size in batch_sizes:
+        batch_written = {slot: item for item, slot in expected_written if start <= item < start + batch_size}
+        expected.append(sorted(batch_written.items()))
+        start += batch_size
+    for (items, slots), batch_expected in zip(written, expected):
+        assert sorted(zip(slots.tolist(), items.tolist())) == batch_expected, \
+            'the written items returned by add differ from Algorithm R'
+
+
+# inference server, on a toy agent whose outputs identify the observations and keyword arguments they were
+# computed from
+
+class ToyAgent(object):
+    """Outputs the sum of every observation plus 'offset' and the number of rows of the forward pass"""
+    def __init__(self):
+        self.training = False
+
+    def train(self, training=True):
+        self.training = training
+
+    def act(self, obs, offset=0.0, fail=False):
+        if fail:
+            raise ValueError('failing forward pass')
+        offset = 0.0 if offset is None else np.sum(offset)
+        return obs.sum(axis=1, keepdims=True) + offset, np.full((len(obs), 1), len(obs))
+
+
+def _offset(client_id):
+    # values of different types in the same batch, None and ints cannot be sorted together
+    return [None, 1, np.arange(3), 2.5][client_id % 4]
+
+
+def run_client(client, num_requests, errors):
+    try:
+        for step in range(num_requests):
+            obs = np.full((1 + client.client_id % 3, 2), float(step + client.client_id))
+            offset = _offset(client.client_id)
+            action, batch_rows = client.act(obs, offset=offset)
+            expected = 2 * (step + client.client_id) + (0.0 if offset is None else np.sum(offset))
+            assert action.shape == (len(obs), 1) and np.allclose(action, expected), \
+                f'client {client.client_id} got {action.ravel()} instead of {expected}'
+            assert np.all(batch_rows >= len(obs))
+    except Exception as e:
+        errors.put(repr(e))
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_inference_server_batches_and_scatters(backend):
+    # requests of different sizes and with keyword arguments that cannot be compared are batched together
+    num_workers, num_requests = 8, 100
+    ctx = torch.multiprocessing.get_context('spawn') if backend == 'process' else None
+    server = InferenceServer(ToyAgent(), max_batch_size=64, max_latency=5e-3, ctx=ctx)
+    clients = [server.client(timeout=30.0) for _ in range(num_workers)]
+    if ctx is None:
+        errors, worker_cls = queue.Queue(), threading.Thread
+    else:
+        errors, worker_cls = ctx.Queue(), ctx.Process
+    workers = [worker_cls(target=run_client, args=(client, num_requests, errors)) for client in clients]
+
+    server.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    server.stop()
+
+    assert errors.empty(), errors.get()
+    assert server.stats()['mean_batch_requests'] > 1.0, 'the requests of the workers were never batched'
+
+
+def test_inference_server_errors_reach_clients():
+    server = InferenceServer(ToyAgent(), max_batch_size=64, max_latency=0.05)
+    failing, passing = server.client(timeout=10.0), server.client(timeout=10.0)
+    server.start()
+    results = {}
+
+    def request(name, client, **kwargs):
+        try:
+            results[name] = client.act(np.ones((1, 2)), **kwargs)
+        except RuntimeError as e:
+            results[name] = e
+
+    threads = [threading.Thread(target=request, args=('failing', failing), kwargs={'fail': True}),
+               threading.Thread(target=request, args=('passing', passing))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # a failing forward pass raises in the clients of the failed requests only
+    assert isinstance(results['failing'], RuntimeError) and isinstance(results['failing'].__cause__, ValueError)
+    assert np.allclose(results['passing'][0], 2.0)
+
+    # a request that no server picks up
+    server.stop()
+    slow = server.client(timeout=0.2)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        slow.act(np.ones((1, 2)))
+    assert time.perf_counter() - start < 5.0
+
+
+class _FailingOnceQueue(object):
+    """Reply queue whose second put fails once, like a reply that cannot be sent"""
+    def __init__(self, replies):
+        self._replies = replies
+        self._puts = 0
+
+    def put(self, item):
+        self._puts += 1
+        if self._puts == 2:
+            raise ValueError('failing reply')
+        self._replies.put(item)
+
+    def get(self, timeout=None):
+        return self._replies.get(timeout=timeout)
+
+
+def test_inference_server_answers_every_request_of_a_failed_batch():
+    # e.g. a request that timed out on the client and its next one, batched together
+    server = InferenceServer(ToyAgent(), max_batch_size=64, max_latency=0.5)
+    client = server.client(timeout=5.0)
+    # an idle second client, a batch holds at most as many requests as there are clients
+    server.client()
+    server._replies[client.client_id] = _FailingOnceQueue(server._replies[client.client_id])
+    server._requests.put((client.client_id, 1, time.perf_counter(), np.ones((1, 2)), {}))
+    client._request_id = 1
+    server.start()
+    try:
+        with pytest.raises(RuntimeError) as error:
+            client.act(np.ones((1, 2)))
+        assert isinstance(error.value.__cause__, ValueError)
+    finally:
+        server.stop()
+
+
+def test_inference_server_stop_answers_queued_requests():
+    server = InferenceServer(ToyAgent())
+    client = server.client()
+    result = {}
+
+    def request():
+        try:
+            client.act(np.ones((1, 2)))
+        except RuntimeError as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    time.sleep(0.1)
+    server.stop()
+    thread.join(5.0)
+    assert not thread.is_alive() and 'error' in result, 'a queued request was not answered by stop'